@@ -19,6 +19,9 @@ from hddcoin.util.ints import uint64, uint32
 
 NUM_ITERS = 200
 
+# number of blocks passed to CoinStore.new_blocks() at a time in --batch mode
+BATCH_SIZE = 32
+
 # farmer puzzle hash
 ph = bytes32(b"a" * 32)
 
@@ -65,6 +68,7 @@ async def run_new_block_benchmark():
     db_wrapper: DBWrapper = await setup_db()
 
     verbose: bool = "--verbose" in sys.argv
+    batch: bool = "--batch" in sys.argv
     try:
         coin_store = await CoinStore.create(db_wrapper)
 
@@ -155,7 +159,60 @@ async def run_new_block_benchmark():
 
         if verbose:
             print("")
-        print(f"{total_time:0.4f}s, MOSTLY ADDITIONS additions: {total_add} removals: {total_remove}")
+        print(
+            f"{total_time:0.4f}s, MOSTLY ADDITIONS additions: {total_add} removals: {total_remove} "
+            f"({total_add / total_time:0.0f} coins/s)"
+        )
+
+        if batch:
+            if verbose:
+                print(f"Profiling mostly additions, batches of {BATCH_SIZE} blocks ", end="")
+            total_time = 0
+            total_add = 0
+            total_remove = 0
+            for batch_start in range(block_height, block_height + NUM_ITERS, BATCH_SIZE):
+                new_blocks = []
+                for height in range(batch_start, min(batch_start + BATCH_SIZE, block_height + NUM_ITERS)):
+
+                    # add some new coins
+                    additions, hashes = make_coins(2000)
+                    total_add += 2000
+
+                    farmer_coin, pool_coin = rewards(height)
+                    all_coins += hashes
+                    total_add += 2
+
+                    # remove some coins we've added in previous batches
+                    random.shuffle(all_unspent)
+                    removals = all_unspent[:100]
+                    all_unspent = all_unspent[100:]
+                    total_remove += 100
+
+                    new_blocks.append((height, timestamp, set([pool_coin, farmer_coin]), additions, removals))
+                    all_unspent += hashes
+                    all_unspent += [pool_coin.name(), farmer_coin.name()]
+
+                    # 19 seconds per block
+                    timestamp += 19
+
+                start = time()
+                await coin_store.new_blocks(new_blocks)
+                await db_wrapper.db.commit()
+                stop = time()
+
+                total_time += stop - start
+                if verbose:
+                    print(".", end="")
+                    sys.stdout.flush()
+
+            block_height += NUM_ITERS
+
+            if verbose:
+                print("")
+            print(
+                f"{total_time:0.4f}s, MOSTLY ADDITIONS BATCHED additions: {total_add} removals: {total_remove} "
+                f"({total_add / total_time:0.0f} coins/s)"
+            )
 
         if verbose:
             print("Profiling mostly removals ", end="")
@@ -0,0 +1,87 @@
+import random
+import sys
+from time import monotonic
+from typing import Any, Callable, List
+
+from blspy import G2Element
+
+from hddcoin.consensus.cost_calculator import NPCResult
+from hddcoin.full_node.mempool import Mempool
+from hddcoin.types.blockchain_format.coin import Coin
+from hddcoin.types.blockchain_format.program import SerializedProgram
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.mempool_item import MempoolItem
+from hddcoin.types.spend_bundle import SpendBundle
+from hddcoin.util.ints import uint64
+
+# numbers of transactions to add, the mempool fits half of them
+SIZES = [1000, 10000, 100000]
+
+# number of minimum fee rate queries for every size
+NUM_QUERIES = 10000
+
+MAX_BLOCK_COST = 11000000000
+
+rand = random.Random(1337)
+
+
+def rand_hash() -> bytes32:
+    return bytes32(bytes(rand.getrandbits(8) for _ in range(32)))
+
+
+def make_item(cost: int) -> MempoolItem:
+    removal = Coin(rand_hash(), rand_hash(), uint64(1))
+    return MempoolItem(
+        SpendBundle([], G2Element()),
+        # few distinct fee rates, like a spam burst at the minimum fee
+        uint64(cost * rand.choice([1, 1, 1, 2, 5, 10])),
+        NPCResult(None, [], uint64(cost)),
+        uint64(cost),
+        rand_hash(),
+        [],
+        [removal],
+        SerializedProgram.from_bytes(b"\x80"),
+    )
+
+
+def timed(f: Callable[[], Any]) -> float:
+    start = monotonic()
+    f()
+    return monotonic() - start
+
+
+def add_all(mempool: Mempool, items: List[MempoolItem]) -> None:
+    for item in items:
+        mempool.add_to_pool(item)
+
+
+def query_min_fee_rate(mempool: Mempool) -> None:
+    for _ in range(NUM_QUERIES):
+        mempool.get_min_fee_rate(rand.randrange(1, mempool.max_size_in_cost // 2))
+
+
+def block_template(mempool: Mempool) -> None:
+    cost_sum = 0
+    for item in mempool.items_by_fee_rate():
+        if cost_sum + item.cost > MAX_BLOCK_COST:
+            break
+        cost_sum += item.cost
+
+
+def run_benchmarks() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(f"{'items':>8s} {'add+evict (s)':>14s} {'min fee (s)':>12s} {'template (s)':>13s} {'remove (s)':>11s}")
+    for size in sizes:
+        items = [make_item(rand.randrange(1000000, 20000000)) for _ in range(size)]
+        mempool = Mempool(sum(item.cost for item in items) // 2)
+        add_time = timed(lambda: add_all(mempool, items))
+        query_time = timed(lambda: query_min_fee_rate(mempool))
+        template_time = timed(lambda: block_template(mempool))
+        remaining = list(mempool.spends.values())
+        remove_time = timed(lambda: [mempool.remove_from_pool(item) for item in remaining])
+        assert mempool.total_mempool_cost == 0
+        print(f"{size:8d} {add_time:14.3f} {query_time:12.3f} {template_time:13.3f} {remove_time:11.3f}")
+
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,57 @@
+import random
+import sys
+from time import monotonic
+from typing import Any, Callable, List
+
+from hddcoin.util.merkle_set import MerkleSet, NodeMerkleSet
+
+# numbers of leaves to benchmark
+SIZES = [1000, 10000, 100000]
+
+# number of inclusion proofs generated for every size
+NUM_PROOFS = 1000
+
+rand = random.Random(1337)
+
+
+def rand_hash() -> bytes:
+    return bytes(rand.getrandbits(8) for _ in range(32))
+
+
+def timed(f: Callable[[], Any]) -> float:
+    start = monotonic()
+    f()
+    return monotonic() - start
+
+
+def build_root(cls: Any, leaves: List[bytes]) -> bytes:
+    merkle_set = cls()
+    for leaf in leaves:
+        merkle_set.add_already_hashed(leaf)
+    return merkle_set.get_root()
+
+
+def make_proofs(cls: Any, leaves: List[bytes]) -> List[bytes]:
+    merkle_set = cls()
+    for leaf in leaves:
+        merkle_set.add_already_hashed(leaf)
+    return [merkle_set.is_included_already_hashed(leaf)[1] for leaf in leaves[:NUM_PROOFS]]
+
+
+def run_benchmarks() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(f"{'leaves':>8s} {'impl':>6s} {'root (s)':>10s} {'proofs (s)':>11s}")
+    for size in sizes:
+        leaves = [rand_hash() for _ in range(size)]
+        roots = []
+        proofs = []
+        for name, cls in [("node", NodeMerkleSet), ("flat", MerkleSet)]:
+            root_time = timed(lambda: roots.append(build_root(cls, leaves)))
+            proof_time = timed(lambda: proofs.append(make_proofs(cls, leaves)))
+            print(f"{size:8d} {name:>6s} {root_time:10.3f} {proof_time:11.3f}")
+        assert roots[0] == roots[1]
+        assert proofs[0] == proofs[1]
+
+
+if __name__ == "__main__":
+    run_benchmarks()
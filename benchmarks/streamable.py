@@ -0,0 +1,127 @@
+import dataclasses
+import random
+import struct
+import sys
+from time import monotonic
+from typing import Any, Callable, List, Tuple, Type
+
+from blspy import G1Element, G2Element
+
+from hddcoin.protocols.full_node_protocol import RespondBlocks
+from hddcoin.types.coin_record import CoinRecord
+from hddcoin.types.blockchain_format.program import Program, SerializedProgram
+from hddcoin.types.condition_opcodes import ConditionOpcode
+from hddcoin.types.full_block import FullBlock
+from hddcoin.types.header_block import HeaderBlock
+from hddcoin.types.spend_bundle import SpendBundle
+from hddcoin.types.unfinished_block import UnfinishedBlock
+from hddcoin.types.weight_proof import WeightProof
+from hddcoin.util.ints import int512, uint128
+from hddcoin.util.streamable import Streamable
+from hddcoin.util.struct_stream import StructStream
+from hddcoin.util.type_checking import is_type_List, is_type_SpecificOptional, is_type_Tuple
+
+if sys.version_info < (3, 8):
+
+    def get_args(t: Type[Any]) -> Tuple[Any, ...]:
+        return getattr(t, "__args__", ())
+
+else:
+
+    from typing import get_args
+
+# every benchmark runs for (at least) this many seconds
+BENCHMARK_TIME = 2.0
+
+# number of elements in every list of the generated objects
+LIST_SIZE = 2
+
+rand = random.Random(1337)
+
+
+def rand_bytes(num: int) -> bytes:
+    return bytes(rand.getrandbits(8) for _ in range(num))
+
+
+def rand_object(f_type: Type) -> Any:
+    """
+    Builds an object of the given type with random content. It only needs to serialize, it's not a valid
+    block, proof or spend.
+    """
+    if is_type_SpecificOptional(f_type):
+        return rand_object(get_args(f_type)[0])
+    if is_type_List(f_type):
+        return [rand_object(get_args(f_type)[0]) for _ in range(LIST_SIZE)]
+    if is_type_Tuple(f_type):
+        return tuple(rand_object(t) for t in get_args(f_type))
+    if dataclasses.is_dataclass(f_type):
+        return f_type(**{field.name: rand_object(field.type) for field in dataclasses.fields(f_type)})
+    if f_type is bool:
+        return rand.random() < 0.5
+    if f_type is str:
+        return "streamable benchmark"
+    if f_type is bytes:
+        return rand_bytes(100)
+    if issubclass(f_type, StructStream):
+        return f_type(rand.randrange(0, 2 ** (struct.calcsize(f_type.PACK) * 8 - 1)))
+    if f_type in (uint128, int512):
+        return f_type(rand.randrange(0, 2 ** 127))
+    if issubclass(f_type, bytes) and hasattr(f_type, "SIZE"):
+        return f_type(rand_bytes(f_type.SIZE))
+    if f_type is G1Element:
+        return G1Element.generator()
+    if f_type is G2Element:
+        return G2Element.generator()
+    if f_type is Program:
+        return Program.to([1, rand_bytes(32), [2, 3]])
+    if f_type is SerializedProgram:
+        return SerializedProgram.from_program(Program.to([rand_bytes(500) for _ in range(10)]))
+    if f_type is ConditionOpcode:
+        return ConditionOpcode.CREATE_COIN
+    raise NotImplementedError(f"can't build a random {f_type}")
+
+
+def run_for(f: Callable[[], Any]) -> float:
+    """
+    Returns the number of calls per second
+    """
+    iterations = 0
+    start = monotonic()
+    while True:
+        f()
+        iterations += 1
+        elapsed = monotonic() - start
+        if elapsed >= BENCHMARK_TIME:
+            return iterations / elapsed
+
+
+def run_benchmarks() -> None:
+    benchmarks: List[Tuple[str, Streamable]] = [
+        ("CoinRecord", rand_object(CoinRecord)),
+        ("SpendBundle", rand_object(SpendBundle)),
+        ("UnfinishedBlock", rand_object(UnfinishedBlock)),
+        ("HeaderBlock", rand_object(HeaderBlock)),
+        ("FullBlock", rand_object(FullBlock)),
+        ("WeightProof", rand_object(WeightProof)),
+    ]
+    blocks = [rand_object(FullBlock) for _ in range(32)]
+    benchmarks.append(("RespondBlocks (32)", RespondBlocks(blocks[0].height, blocks[-1].height, blocks)))
+
+    selection = [arg for arg in sys.argv[1:] if not arg.startswith("-")]
+    print(f"{'type':20s} {'size':>9s} {'parse/s':>12s} {'stream/s':>12s} {'parse MiB/s':>12s}")
+    for name, obj in benchmarks:
+        if len(selection) > 0 and name.split(" ")[0] not in selection:
+            continue
+        blob = bytes(obj)
+        cls = type(obj)
+        assert cls.from_bytes(blob) == obj
+        parse_rate = run_for(lambda: cls.from_bytes(blob))
+        stream_rate = run_for(lambda: bytes(obj))
+        print(
+            f"{name:20s} {len(blob):9d} {parse_rate:12.0f} {stream_rate:12.0f} "
+            f"{parse_rate * len(blob) / 1024 / 1024:12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,113 @@
+import asyncio
+import sys
+from time import monotonic
+from typing import List
+
+from hddcoin.consensus.coinbase import create_puzzlehash_for_pk
+from hddcoin.full_node.full_node_api import FullNodeAPI
+from hddcoin.protocols import full_node_protocol
+from hddcoin.protocols.protocol_message_types import ProtocolMessageTypes
+from hddcoin.server.rate_limits import INBOUND_STATS
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.full_block import FullBlock
+from hddcoin.types.peer_info import PeerInfo
+from hddcoin.util.ints import uint16, uint32
+from hddcoin.wallet.derive_keys import master_sk_to_wallet_sk
+from hddcoin.wallet.wallet_node import WalletNode
+from tests.setup_nodes import bt, self_hostname, setup_simulators_and_wallets
+from tests.util.blockchain import persistent_blocks
+
+# number of blocks with rewards for the wallet, after 400 blocks without any
+NUM_REWARD_BLOCKS = 100
+
+# number of puzzle hashes of the wallet receiving the rewards, in turns, all of them are derived by a new wallet
+NUM_PUZZLE_HASHES = 4
+
+# the same wallet is created for every run
+KEY_SEED = b"wallet sync benchmark seed......"
+
+# the requests of the wallet the full node answers, both modes request every header block
+REQUEST_TYPES = [
+    ProtocolMessageTypes.request_header_blocks,
+    ProtocolMessageTypes.request_additions,
+    ProtocolMessageTypes.request_removals,
+    ProtocolMessageTypes.register_interest_in_puzzle_hash,
+    ProtocolMessageTypes.register_interest_in_coin,
+]
+
+
+def wallet_puzzle_hashes(wallet_node: WalletNode) -> List[bytes32]:
+    """
+    The first puzzle hashes of the wallet, derived from its key so the wallet itself stays as new
+    """
+    assert wallet_node.wallet_state_manager is not None
+    private_key = wallet_node.wallet_state_manager.private_key
+    return [
+        create_puzzlehash_for_pk(master_sk_to_wallet_sk(private_key, uint32(i)).get_g1())
+        for i in range(NUM_PUZZLE_HASHES)
+    ]
+
+
+def make_blocks(puzzle_hashes: List[bytes32], num_reward_blocks: int) -> List[FullBlock]:
+    blocks = persistent_blocks(400, "test_blocks_400_rc4.db", seed=b"alternate2")
+    for i in range(num_reward_blocks):
+        ph = puzzle_hashes[i % len(puzzle_hashes)]
+        blocks = bt.get_consecutive_blocks(
+            1,
+            block_list_input=blocks,
+            farmer_reward_puzzle_hash=ph,
+            pool_reward_puzzle_hash=ph,
+            guarantee_transaction_block=True,
+        )
+    return blocks
+
+
+async def sync_time(light_sync: bool, num_reward_blocks: int, blocks: List[FullBlock]) -> List[FullBlock]:
+    """
+    Syncs a new wallet from a full node with the blocks (made on the first run), prints how long it took and the
+    requests the wallet made
+    """
+    nodes = setup_simulators_and_wallets(1, 1, {}, key_seed=KEY_SEED)
+    full_nodes, wallets = await nodes.__anext__()
+    try:
+        full_node_api: FullNodeAPI = full_nodes[0]
+        wallet_node, wallet_server = wallets[0]
+        fn_server = full_node_api.full_node.server
+        wallet_node.config["light_sync"] = light_sync
+        # the coin states are only fetched from trusted peers
+        full_node_cert = fn_server.root_path / fn_server.config["ssl"]["public_crt"]
+        wallet_node.config["trusted_peers"] = {"full_node": str(full_node_cert)}
+        if len(blocks) == 0:
+            blocks = make_blocks(wallet_puzzle_hashes(wallet_node), num_reward_blocks)
+        for block in blocks:
+            await full_node_api.full_node.respond_block(full_node_protocol.RespondBlock(block))
+
+        requests_before = [INBOUND_STATS.messages[request_type.value] for request_type in REQUEST_TYPES]
+        start = monotonic()
+        await wallet_server.start_client(PeerInfo(self_hostname, uint16(fn_server._port)), None)
+        assert wallet_node.wallet_state_manager is not None
+        wsm = wallet_node.wallet_state_manager
+        while wsm.blockchain.get_peak_height() != blocks[-1].height or wsm.sync_mode:
+            await asyncio.sleep(0.05)
+        elapsed = monotonic() - start
+        balance = await wsm.main_wallet.get_confirmed_balance()
+        mode = "light sync" if light_sync else "additions and removals"
+        print(f"{mode}: {len(blocks)} blocks synced in {elapsed:0.3f} s, balance {balance}")
+        for request_type, before in zip(REQUEST_TYPES, requests_before):
+            print(f"  {request_type.name}: {INBOUND_STATS.messages[request_type.value] - before}")
+    finally:
+        try:
+            await nodes.__anext__()
+        except StopAsyncIteration:
+            pass
+    return blocks
+
+
+async def run_benchmarks() -> None:
+    num_reward_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REWARD_BLOCKS
+    blocks: List[FullBlock] = await sync_time(False, num_reward_blocks, [])
+    await sync_time(True, num_reward_blocks, blocks)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmarks())
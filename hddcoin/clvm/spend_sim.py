@@ -100,8 +100,7 @@ class SpendSim:
 
         await cursor.close()
         for row in rows:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            coins.add(coin)
+            coins.add(self.mempool_manager.coin_store.row_to_coin(row))
         return list(coins)
 
     async def generate_transaction_generator(self, bundle: Optional[SpendBundle]) -> Optional[BlockGenerator]:
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import click
+
+from hddcoin.cmds.db_upgrade_func import db_upgrade_func
+
+
+@click.group("db", short_help="Manage the blockchain database")
+def db_cmd() -> None:
+    pass
+
+
+@db_cmd.command("upgrade", short_help="Upgrade a v1 database to v2")
+@click.option("--input", default=None, type=click.Path(), help="Input database file (v1)")
+@click.option("--output", default=None, type=click.Path(), help="Output database file (v2)")
+@click.option(
+    "--no-update-config",
+    default=False,
+    is_flag=True,
+    help="Don't update config.yaml to use the new database file",
+)
+@click.option(
+    "--dictionary",
+    default=False,
+    is_flag=True,
+    help="Train a shared compression dictionary from the most recent blocks",
+)
+@click.pass_context
+def db_upgrade_cmd(ctx: click.Context, no_update_config: bool, dictionary: bool, **kwargs) -> None:
+    in_db_path = kwargs.get("input")
+    out_db_path = kwargs.get("output")
+    db_upgrade_func(
+        Path(ctx.obj["root_path"]),
+        None if in_db_path is None else Path(in_db_path),
+        None if out_db_path is None else Path(out_db_path),
+        no_update_config,
+        dictionary,
+    )
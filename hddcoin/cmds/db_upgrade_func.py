@@ -0,0 +1,238 @@
+import sqlite3
+from pathlib import Path
+from time import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from hddcoin.full_node.block_compression import BlockCompressor, train_dictionary
+from hddcoin.util.config import load_config, save_config
+from hddcoin.util.db_version import set_db_version
+from hddcoin.util.path import mkdir, path_from_root
+
+# number of rows read from the v1 database and written to the v2 database at a time
+BATCH_SIZE = 10000
+
+# the block compression dictionary is trained from this many of the most recent blocks
+DICTIONARY_SAMPLES = 2000
+DICTIONARY_SIZE = 64 * 1024
+
+
+def db_upgrade_func(
+    root_path: Path,
+    in_db_path: Optional[Path] = None,
+    out_db_path: Optional[Path] = None,
+    no_update_config: bool = False,
+    dictionary: bool = False,
+) -> None:
+    update_config: bool = in_db_path is None and out_db_path is None and not no_update_config
+
+    config: Dict
+    selected_network: str
+    db_pattern: str
+    if in_db_path is None or out_db_path is None:
+        config = load_config(root_path, "config.yaml")["full_node"]
+        selected_network = config["selected_network"]
+        db_pattern = config["database_path"]
+
+    if in_db_path is None:
+        in_db_path = path_from_root(root_path, db_pattern.replace("CHALLENGE", selected_network))
+
+    if out_db_path is None:
+        if "_v1_" not in db_pattern:
+            raise RuntimeError(f"can't derive the v2 database file name from {db_pattern}, use --output")
+        out_db_path = path_from_root(
+            root_path, db_pattern.replace("CHALLENGE", selected_network).replace("_v1_", "_v2_")
+        )
+        mkdir(out_db_path.parent)
+
+    convert_v1_to_v2(in_db_path, out_db_path, dictionary)
+
+    if update_config:
+        print("updating config.yaml")
+        config = load_config(root_path, "config.yaml")
+        config["full_node"]["database_path"] = db_pattern.replace("_v1_", "_v2_")
+        save_config(root_path, "config.yaml", config)
+
+    print(f"\n\nLEAVING PREVIOUS DB FILE UNTOUCHED {in_db_path}\n")
+
+
+def _copy_table(
+    in_db: sqlite3.Connection,
+    out_db: sqlite3.Connection,
+    select: str,
+    insert: str,
+    convert: Callable[[Tuple[Any, ...]], Tuple[Any, ...]],
+) -> int:
+    """
+    Streams the rows returned by the select statement through convert() into the insert
+    statement, BATCH_SIZE rows at a time. Returns the number of rows copied.
+    """
+    count = 0
+    cursor = in_db.execute(select)
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if len(rows) == 0:
+            break
+        out_db.executemany(insert, [convert(row) for row in rows])
+        out_db.commit()
+        count += len(rows)
+        print(f"\r{count:10d}", end="", flush=True)
+    cursor.close()
+    print("")
+    return count
+
+
+def convert_v1_to_v2(in_path: Path, out_path: Path, dictionary: bool = False) -> None:
+    if out_path.exists():
+        raise RuntimeError(f"output file already exists: {out_path}")
+
+    print(f"opening file for reading: {in_path}")
+    in_db = sqlite3.connect(in_path)
+    try:
+        cursor = in_db.execute("SELECT * from database_version")
+        row = cursor.fetchone()
+        cursor.close()
+        if row is not None and row[0] != 1:
+            raise RuntimeError(f"blockchain database already version {row[0]}")
+    except sqlite3.OperationalError:
+        # expects OperationalError('no such table: database_version'), i.e. a v1 database
+        pass
+
+    print(f"opening file for writing: {out_path}")
+    out_db = sqlite3.connect(out_path)
+    try:
+        # the output is a new file, if we fail half-way it's deleted
+        out_db.execute("pragma journal_mode=OFF")
+        out_db.execute("pragma synchronous=OFF")
+        out_db.execute("pragma locking_mode=exclusive")
+
+        # the tables are created without indices, those are added once all the
+        # rows are in place
+        out_db.execute(
+            "CREATE TABLE full_blocks(header_hash blob PRIMARY KEY, height bigint,"
+            "  is_block tinyint, is_fully_compactified tinyint, block blob, compression tinyint, dictionary int)"
+        )
+        out_db.execute("CREATE TABLE block_dictionaries(id INTEGER PRIMARY KEY, compression tinyint, dictionary blob)")
+        out_db.execute(
+            "CREATE TABLE block_records(header_hash blob PRIMARY KEY, prev_hash blob, height bigint,"
+            "block blob, sub_epoch_summary blob, is_peak tinyint, is_block tinyint)"
+        )
+        out_db.execute("CREATE TABLE sub_epoch_segments_v3(ses_block_hash blob PRIMARY KEY, challenge_segments blob)")
+        out_db.execute(
+            "CREATE TABLE coin_record("
+            "coin_name blob PRIMARY KEY,"
+            " confirmed_index bigint,"
+            " spent_index bigint,"
+            " spent int,"
+            " coinbase int,"
+            " puzzle_hash blob,"
+            " coin_parent blob,"
+            " amount blob,"
+            " timestamp bigint) WITHOUT ROWID"
+        )
+        out_db.execute("CREATE TABLE hints(id INTEGER PRIMARY KEY AUTOINCREMENT, coin_id blob,  hint blob)")
+        out_db.commit()
+
+        start_time = time()
+
+        compressor = BlockCompressor()
+        if dictionary:
+            print(f"training {compressor.compression.name.lower()} block compression dictionary")
+            cursor = in_db.execute(f"SELECT block FROM full_blocks ORDER BY height DESC LIMIT {DICTIONARY_SAMPLES}")
+            samples = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+            if len(samples) > 0:
+                dictionary_bytes = train_dictionary(compressor.compression, samples, DICTIONARY_SIZE)
+                out_db.execute(
+                    "INSERT INTO block_dictionaries VALUES(?, ?, ?)",
+                    (1, int(compressor.compression), dictionary_bytes),
+                )
+                out_db.commit()
+                compressor.add_dictionary(1, compressor.compression, dictionary_bytes)
+
+        def convert_block(r: Tuple[Any, ...]) -> Tuple[Any, ...]:
+            compression, dictionary_id, block = compressor.compress(r[4])
+            return bytes.fromhex(r[0]), r[1], r[2], r[3], block, int(compression), dictionary_id
+
+        print("[1/5] converting full_blocks")
+        _copy_table(
+            in_db,
+            out_db,
+            "SELECT header_hash, height, is_block, is_fully_compactified, block FROM full_blocks",
+            "INSERT INTO full_blocks VALUES(?, ?, ?, ?, ?, ?, ?)",
+            convert_block,
+        )
+
+        print("[2/5] converting block_records")
+        _copy_table(
+            in_db,
+            out_db,
+            "SELECT header_hash, prev_hash, height, block, sub_epoch_summary, is_peak, is_block FROM block_records",
+            "INSERT INTO block_records VALUES(?, ?, ?, ?, ?, ?, ?)",
+            lambda r: (bytes.fromhex(r[0]), bytes.fromhex(r[1]), r[2], r[3], r[4], r[5], r[6]),
+        )
+
+        print("[3/5] converting sub_epoch_segments_v3")
+        _copy_table(
+            in_db,
+            out_db,
+            "SELECT ses_block_hash, challenge_segments FROM sub_epoch_segments_v3",
+            "INSERT INTO sub_epoch_segments_v3 VALUES(?, ?)",
+            lambda r: (bytes.fromhex(r[0]), r[1]),
+        )
+
+        # hex strings sort the same way as the bytes they encode, so reading the
+        # coins in primary key order appends them to the new table in order
+        print("[4/5] converting coin_record")
+        _copy_table(
+            in_db,
+            out_db,
+            "SELECT coin_name, confirmed_index, spent_index, spent, coinbase, puzzle_hash, coin_parent, amount, "
+            "timestamp FROM coin_record ORDER BY coin_name",
+            "INSERT INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            lambda r: (
+                bytes.fromhex(r[0]),
+                r[1],
+                r[2],
+                r[3],
+                r[4],
+                bytes.fromhex(r[5]),
+                bytes.fromhex(r[6]),
+                r[7],
+                r[8],
+            ),
+        )
+
+        print("[5/5] converting hints")
+        _copy_table(
+            in_db,
+            out_db,
+            "SELECT coin_id, hint FROM hints ORDER BY id",
+            "INSERT INTO hints(coin_id, hint) VALUES(?, ?)",
+            lambda r: r,
+        )
+
+        print("creating indices")
+        out_db.execute("CREATE INDEX full_block_height on full_blocks(height)")
+        out_db.execute("CREATE INDEX is_fully_compactified on full_blocks(is_fully_compactified)")
+        out_db.execute("CREATE INDEX height on block_records(height)")
+        out_db.execute("CREATE INDEX peak on block_records(is_peak)")
+        out_db.execute("CREATE INDEX coin_confirmed_index on coin_record(confirmed_index)")
+        out_db.execute("CREATE INDEX coin_spent_index on coin_record(spent_index)")
+        out_db.execute("CREATE INDEX coin_puzzle_hash on coin_record(puzzle_hash)")
+        out_db.execute("CREATE INDEX coin_parent_index on coin_record(coin_parent)")
+        out_db.execute("CREATE INDEX hint_index on hints(hint)")
+        out_db.commit()
+
+        # the version is set last, a partially converted file is never
+        # mistaken for a valid v2 database
+        set_db_version(out_db, 2)
+
+        print(f"database converted in {time() - start_time:0.2f}s")
+    except BaseException:
+        out_db.close()
+        in_db.close()
+        out_path.unlink()
+        raise
+
+    out_db.close()
+    in_db.close()
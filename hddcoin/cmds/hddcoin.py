@@ -6,6 +6,7 @@ import click
 
 from hddcoin import __version__
 from hddcoin.cmds.configure import configure_cmd
+from hddcoin.cmds.db import db_cmd
 from hddcoin.cmds.farm import farm_cmd
 from hddcoin.cmds.hodl import hodl_cmd
 from hddcoin.cmds.init import init_cmd
@@ -141,6 +142,7 @@ cli.add_command(netspace_cmd)
 cli.add_command(farm_cmd)
 cli.add_command(plotters_cmd)
 cli.add_command(hodl_cmd)
+cli.add_command(db_cmd)
 
 if supports_keyring_passphrase():
     cli.add_command(passphrase_cmd)
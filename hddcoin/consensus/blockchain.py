@@ -4,6 +4,7 @@ import logging
 import multiprocessing
 from concurrent.futures.process import ProcessPoolExecutor
 from enum import Enum
+from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple, Union
 
 from clvm.casts import int_from_bytes
@@ -19,9 +20,11 @@ from hddcoin.consensus.find_fork_point import find_fork_point_in_chain
 from hddcoin.consensus.full_block_to_block_record import block_to_block_record
 from hddcoin.consensus.multiprocess_validation import (
     PreValidationResult,
+    create_validation_pool,
     pre_validate_blocks_multiprocessing,
     _run_generator,
 )
+from hddcoin.full_node.block_height_map import BlockHeightMap
 from hddcoin.full_node.block_store import BlockStore
 from hddcoin.full_node.coin_store import CoinStore
 from hddcoin.full_node.hint_store import HintStore
@@ -43,6 +46,7 @@ from hddcoin.util.errors import Err, ConsensusError
 from hddcoin.util.generator_tools import get_block_header, tx_removals_and_additions
 from hddcoin.util.ints import uint16, uint32, uint64, uint128
 from hddcoin.util.streamable import recurse_jsonify
+from hddcoin.util.streamable_view import StreamableView
 
 log = logging.getLogger(__name__)
 
@@ -71,11 +75,9 @@ class Blockchain(BlockchainInterface):
     __block_records: Dict[bytes32, BlockRecord]
     # all hashes of blocks in block_record by height, used for garbage collection
     __heights_in_cache: Dict[uint32, Set[bytes32]]
-    # Defines the path from genesis to the peak, no orphan blocks
-    __height_to_hash: Dict[uint32, bytes32]
-    # All sub-epoch summaries that have been included in the blockchain from the beginning until and including the peak
-    # (height_included, SubEpochSummary). Note: ONLY for the blocks in the path to the peak
-    __sub_epoch_summaries: Dict[uint32, SubEpochSummary] = {}
+    # Defines the path from genesis to the peak, no orphan blocks, and the sub-epoch summaries
+    # included in that path
+    __height_map: BlockHeightMap
     # Unspent Store
     coin_store: CoinStore
     # Store
@@ -95,12 +97,17 @@ class Blockchain(BlockchainInterface):
 
     @staticmethod
     async def create(
-        coin_store: CoinStore, block_store: BlockStore, consensus_constants: ConsensusConstants, hint_store: HintStore
+        coin_store: CoinStore,
+        block_store: BlockStore,
+        consensus_constants: ConsensusConstants,
+        hint_store: HintStore,
+        db_path: Optional[Path] = None,
     ):
         """
         Initializes a blockchain with the BlockRecords from disk, assuming they have all been
         validated. Uses the genesis block given in override_constants, or as a fallback,
-        in the consensus constants config.
+        in the consensus constants config. If db_path is set, the height to hash map is
+        persisted next to the database.
         """
         self = Blockchain()
         self.lock = asyncio.Lock()  # External lock handled by full node
@@ -109,15 +116,16 @@ class Blockchain(BlockchainInterface):
         if cpu_count > 61:
             cpu_count = 61  # Windows Server 2016 has an issue https://bugs.python.org/issue26903
         num_workers = max(cpu_count - 2, 1)
-        self.pool = ProcessPoolExecutor(max_workers=num_workers)
-        log.info(f"Started {num_workers} processes for block validation")
 
         self.constants = consensus_constants
         self.coin_store = coin_store
         self.block_store = block_store
         self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
+        # the workers get the constants when they start, so they're not sent with every batch
+        self.pool = create_validation_pool(num_workers, self.constants_json)
+        log.info(f"Started {num_workers} processes for block validation")
         self._shut_down = False
-        await self._load_chain_from_store()
+        await self._load_chain_from_store(db_path)
         self._seen_compact_proofs = set()
         self.hint_store = hint_store
         return self
@@ -125,14 +133,13 @@ class Blockchain(BlockchainInterface):
     def shut_down(self):
         self._shut_down = True
         self.pool.shutdown(wait=True)
+        self.__height_map.flush()
 
-    async def _load_chain_from_store(self) -> None:
+    async def _load_chain_from_store(self, db_path: Optional[Path]) -> None:
         """
         Initializes the state of the Blockchain class from the database.
         """
-        height_to_hash, sub_epoch_summaries = await self.block_store.get_peak_height_dicts()
-        self.__height_to_hash = height_to_hash
-        self.__sub_epoch_summaries = sub_epoch_summaries
+        self.__height_map = await BlockHeightMap.create(self.block_store, db_path)
         self.__block_records = {}
         self.__heights_in_cache = {}
         block_records, peak = await self.block_store.get_block_records_close_to_peak(self.constants.BLOCKS_CACHE_SIZE)
@@ -146,7 +153,8 @@ class Blockchain(BlockchainInterface):
 
         assert peak is not None
         self._peak_height = self.block_record(peak).height
-        assert len(self.__height_to_hash) == self._peak_height + 1
+        assert self.__height_map.contains_height(self._peak_height)
+        assert not self.__height_map.contains_height(uint32(self._peak_height + 1))
 
     def get_peak(self) -> Optional[BlockRecord]:
         """
@@ -279,13 +287,14 @@ class Blockchain(BlockchainInterface):
                 # Then update the memory cache. It is important that this task is not cancelled and does not throw
                 self.add_block_record(block_record)
                 for fetched_block_record in records:
-                    self.__height_to_hash[fetched_block_record.height] = fetched_block_record.header_hash
-                    if fetched_block_record.sub_epoch_summary_included is not None:
-                        self.__sub_epoch_summaries[
-                            fetched_block_record.height
-                        ] = fetched_block_record.sub_epoch_summary_included
+                    self.__height_map.update_height(
+                        fetched_block_record.height,
+                        fetched_block_record.header_hash,
+                        fetched_block_record.sub_epoch_summary_included,
+                    )
                 if peak_height is not None:
                     self._peak_height = peak_height
+                    self.__height_map.maybe_flush()
             except BaseException:
                 self.block_store.rollback_cache_block(header_hash)
                 await self.block_store.db_wrapper.rollback_transaction()
@@ -374,13 +383,7 @@ class Blockchain(BlockchainInterface):
                     lastest_coin_state[coin_record.name] = coin_record
 
             # Rollback sub_epoch_summaries
-            heights_to_delete = []
-            for ses_included_height in self.__sub_epoch_summaries.keys():
-                if ses_included_height > fork_height:
-                    heights_to_delete.append(ses_included_height)
-            for height in heights_to_delete:
-                log.info(f"delete ses at height {height}")
-                del self.__sub_epoch_summaries[height]
+            self.__height_map.rollback(fork_height)
 
             # Collect all blocks from fork point to new peak
             blocks_to_add: List[Tuple[FullBlock, BlockRecord]] = []
@@ -398,6 +401,9 @@ class Blockchain(BlockchainInterface):
                 curr = fetched_block_record.prev_hash
 
             records_to_add = []
+            # The coin changes of all the blocks from the fork point to the new peak are applied in one batch
+            coin_changes: List[Tuple[uint32, uint64, Set[Coin], List[Coin], List[bytes32]]] = []
+            npc_results: List[Optional[NPCResult]] = []
             for fetched_full_block, fetched_block_record in reversed(blocks_to_add):
                 records_to_add.append(fetched_block_record)
                 if fetched_full_block.is_transaction_block():
@@ -411,36 +417,42 @@ class Blockchain(BlockchainInterface):
                         )
 
                     assert fetched_full_block.foliage_transaction_block is not None
-                    added_rec = await self.coin_store.new_block(
-                        fetched_full_block.height,
-                        fetched_full_block.foliage_transaction_block.timestamp,
-                        fetched_full_block.get_included_reward_coins(),
-                        tx_additions,
-                        tx_removals,
+                    coin_changes.append(
+                        (
+                            fetched_full_block.height,
+                            fetched_full_block.foliage_transaction_block.timestamp,
+                            fetched_full_block.get_included_reward_coins(),
+                            tx_additions,
+                            tx_removals,
+                        )
                     )
-                    removed_rec: List[Optional[CoinRecord]] = [
-                        await self.coin_store.get_coin_record(name) for name in tx_removals
-                    ]
-
-                    # Set additions first, then removals in order to handle ephemeral coin state
-                    # Add in height order is also required
-                    record: Optional[CoinRecord]
-                    for record in added_rec:
-                        assert record
-                        lastest_coin_state[record.name] = record
-                    for record in removed_rec:
-                        assert record
-                        lastest_coin_state[record.name] = record
-
-                    if npc_res is not None:
-                        hint_list: List[Tuple[bytes32, bytes]] = self.get_hint_list(npc_res)
-                        await self.hint_store.add_hints(hint_list)
-                        # There can be multiple coins for the same hint
-                        for coin_id, hint in hint_list:
-                            key = hint
-                            if key not in hint_coin_state:
-                                hint_coin_state[key] = {}
-                            hint_coin_state[key][coin_id] = lastest_coin_state[coin_id]
+                    npc_results.append(npc_res)
+
+            all_added_rec = await self.coin_store.new_blocks(coin_changes) if len(coin_changes) > 0 else []
+            for (_, _, _, _, tx_removals), added_rec, npc_res in zip(coin_changes, all_added_rec, npc_results):
+                removed_rec: List[Optional[CoinRecord]] = [
+                    await self.coin_store.get_coin_record(name) for name in tx_removals
+                ]
+
+                # Set additions first, then removals in order to handle ephemeral coin state
+                # Add in height order is also required
+                record: Optional[CoinRecord]
+                for record in added_rec:
+                    assert record
+                    lastest_coin_state[record.name] = record
+                for record in removed_rec:
+                    assert record
+                    lastest_coin_state[record.name] = record
+
+                if npc_res is not None:
+                    hint_list: List[Tuple[bytes32, bytes]] = self.get_hint_list(npc_res)
+                    await self.hint_store.add_hints(hint_list)
+                    # There can be multiple coins for the same hint
+                    for coin_id, hint in hint_list:
+                        key = hint
+                        if key not in hint_coin_state:
+                            hint_coin_state[key] = {}
+                        hint_coin_state[key][coin_id] = lastest_coin_state[coin_id]
 
             # Changes the peak to be the new peak
             await self.block_store.set_peak(block_record.header_hash)
@@ -455,7 +467,7 @@ class Blockchain(BlockchainInterface):
         return None, None, [], ([], {})
 
     async def get_tx_removals_and_additions(
-        self, block: FullBlock, npc_result: Optional[NPCResult] = None
+        self, block: Union[FullBlock, StreamableView], npc_result: Optional[NPCResult] = None
     ) -> Tuple[List[bytes32], List[Coin], Optional[NPCResult]]:
         if block.is_transaction_block():
             if block.transactions_generator is not None:
@@ -630,11 +642,15 @@ class Blockchain(BlockchainInterface):
         npc_results: Dict[uint32, NPCResult],
         batch_size: int = 4,
         wp_summaries: Optional[List[SubEpochSummary]] = None,
+        block_records: Optional[BlockchainInterface] = None,
     ) -> Optional[List[PreValidationResult]]:
+        """
+        block_records are the block records the blocks are validated against, the ones of this blockchain by default
+        """
         return await pre_validate_blocks_multiprocessing(
             self.constants,
-            self.constants_json,
-            self,
+            None,
+            self if block_records is None else block_records,
             blocks,
             self.pool,
             True,
@@ -648,7 +664,7 @@ class Blockchain(BlockchainInterface):
         task = asyncio.get_running_loop().run_in_executor(
             self.pool,
             _run_generator,
-            self.constants_json,
+            None,
             unfinished_block,
             bytes(generator),
         )
@@ -674,16 +690,16 @@ class Blockchain(BlockchainInterface):
         return self.block_record(header_hash)
 
     def get_ses_heights(self) -> List[uint32]:
-        return sorted(self.__sub_epoch_summaries.keys())
+        return self.__height_map.get_ses_heights()
 
     def get_ses(self, height: uint32) -> SubEpochSummary:
-        return self.__sub_epoch_summaries[height]
+        return self.__height_map.get_ses(height)
 
     def height_to_hash(self, height: uint32) -> Optional[bytes32]:
-        return self.__height_to_hash[height]
+        return self.__height_map.get_hash(height)
 
     def contains_height(self, height: uint32) -> bool:
-        return height in self.__height_to_hash
+        return self.__height_map.contains_height(height)
 
     def get_peak_height(self) -> Optional[uint32]:
         return self._peak_height
@@ -855,7 +871,7 @@ class Blockchain(BlockchainInterface):
         return False
 
     async def get_block_generator(
-        self, block: Union[FullBlock, UnfinishedBlock], additional_blocks=None
+        self, block: Union[FullBlock, UnfinishedBlock, StreamableView], additional_blocks=None
     ) -> Optional[BlockGenerator]:
         if additional_blocks is None:
             additional_blocks = {}
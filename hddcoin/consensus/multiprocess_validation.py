@@ -5,6 +5,11 @@ from concurrent.futures.process import ProcessPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Sequence, Tuple, Union, Callable
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None  # type: ignore
+
 from hddcoin.consensus.block_header_validation import validate_finished_header_block
 from hddcoin.consensus.block_record import BlockRecord
 from hddcoin.consensus.blockchain_interface import BlockchainInterface
@@ -26,10 +31,17 @@ from hddcoin.util.block_cache import BlockCache
 from hddcoin.util.errors import Err, ValidationError
 from hddcoin.util.generator_tools import get_block_header, tx_removals_and_additions
 from hddcoin.util.ints import uint16, uint64, uint32
+from hddcoin.util.lru_cache import LRUCache
 from hddcoin.util.streamable import Streamable, dataclass_from_dict, streamable
 
 log = logging.getLogger(__name__)
 
+# Number of block records every validation worker keeps between batches
+WORKER_BLOCK_RECORDS_CACHE_SIZE = 4096
+
+# Offset and length of an item in a SharedBlockArena
+Span = Tuple[int, int]
+
 
 @dataclass(frozen=True)
 @streamable
@@ -39,8 +51,77 @@ class PreValidationResult(Streamable):
     npc_result: Optional[NPCResult]  # Iff error is None and block is a transaction block
 
 
+# State of the worker processes. The constants are set once when the worker starts (see create_validation_pool),
+# and block records are kept between batches, since a block record never changes for a given header hash.
+_worker_constants: Optional[ConsensusConstants] = None
+_worker_block_records: LRUCache = LRUCache(WORKER_BLOCK_RECORDS_CACHE_SIZE)
+
+
+def _init_validation_worker(constants_dict: Dict) -> None:
+    global _worker_constants
+    _worker_constants = dataclass_from_dict(ConsensusConstants, constants_dict)
+
+
+def create_validation_pool(num_workers: int, constants_dict: Dict) -> ProcessPoolExecutor:
+    """
+    Creates a pool for block validation whose workers get the constants when they start. Validation tasks
+    for this pool can pass None as the constants, instead of sending them with every task.
+    """
+    return ProcessPoolExecutor(max_workers=num_workers, initializer=_init_validation_worker, initargs=(constants_dict,))
+
+
+def _get_constants(constants_dict: Optional[Dict]) -> ConsensusConstants:
+    if constants_dict is None:
+        assert _worker_constants is not None, "the pool was not created with create_validation_pool"
+        return _worker_constants
+    return dataclass_from_dict(ConsensusConstants, constants_dict)
+
+
+class SharedBlockArena:
+    """
+    The serialized blocks, generators and block records of one pre_validation_blocks_multiprocessing call.
+    They are written to shared memory once, and the validation tasks only get their offsets, instead of
+    every task pickling its own copy of them.
+    """
+
+    parts: List[bytes]
+    size: int
+    shm: Optional["shared_memory.SharedMemory"]
+
+    def __init__(self) -> None:
+        self.parts = []
+        self.size = 0
+        self.shm = None
+
+    def add(self, data: bytes) -> Span:
+        assert self.shm is None
+        span = (self.size, len(data))
+        self.parts.append(data)
+        self.size += len(data)
+        return span
+
+    def create(self) -> str:
+        """
+        Copies everything that was added into a new shared memory block and returns its name
+        """
+        # a shared memory block can't be empty
+        self.shm = shared_memory.SharedMemory(create=True, size=max(self.size, 1))
+        pos = 0
+        for part in self.parts:
+            self.shm.buf[pos : pos + len(part)] = part
+            pos += len(part)
+        self.parts = []
+        return self.shm.name
+
+    def close(self) -> None:
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
 def batch_pre_validate_blocks(
-    constants_dict: Dict,
+    constants_dict: Optional[Dict],
     blocks_pickled: Dict[bytes, bytes],
     full_blocks_pickled: Optional[List[bytes]],
     header_blocks_pickled: Optional[List[bytes]],
@@ -53,8 +134,75 @@ def batch_pre_validate_blocks(
     blocks = {}
     for k, v in blocks_pickled.items():
         blocks[k] = BlockRecord.from_bytes(v)
+    return _pre_validate_blocks(
+        _get_constants(constants_dict),
+        blocks,
+        full_blocks_pickled,
+        header_blocks_pickled,
+        prev_transaction_generators,
+        npc_results,
+        check_filter,
+        expected_difficulty,
+        expected_sub_slot_iters,
+    )
+
+
+def batch_pre_validate_shared_blocks(
+    constants_dict: Optional[Dict],
+    arena_name: str,
+    block_records: List[Tuple[bytes, int, int]],
+    full_blocks: Optional[List[Span]],
+    header_blocks: Optional[List[Span]],
+    prev_transaction_generators: List[Optional[Span]],
+    npc_results: Dict[uint32, Span],
+    check_filter: bool,
+    expected_difficulty: List[uint64],
+    expected_sub_slot_iters: List[uint64],
+) -> List[bytes]:
+    """
+    Same as batch_pre_validate_blocks, but everything is read from a SharedBlockArena. Block records the
+    worker already has from previous batches aren't parsed again.
+    """
+    arena = shared_memory.SharedMemory(name=arena_name)
+    try:
+
+        def read(span: Span) -> bytes:
+            return bytes(arena.buf[span[0] : span[0] + span[1]])
+
+        blocks: Dict[bytes, BlockRecord] = {}
+        for header_hash, offset, length in block_records:
+            block_record: Optional[BlockRecord] = _worker_block_records.get(header_hash)
+            if block_record is None:
+                block_record = BlockRecord.from_bytes(read((offset, length)))
+                _worker_block_records.put(header_hash, block_record)
+            blocks[header_hash] = block_record
+        return _pre_validate_blocks(
+            _get_constants(constants_dict),
+            blocks,
+            None if full_blocks is None else [read(span) for span in full_blocks],
+            None if header_blocks is None else [read(span) for span in header_blocks],
+            [None if span is None else read(span) for span in prev_transaction_generators],
+            {height: read(span) for height, span in npc_results.items()},
+            check_filter,
+            expected_difficulty,
+            expected_sub_slot_iters,
+        )
+    finally:
+        arena.close()
+
+
+def _pre_validate_blocks(
+    constants: ConsensusConstants,
+    blocks: Dict[bytes, BlockRecord],
+    full_blocks_pickled: Optional[List[bytes]],
+    header_blocks_pickled: Optional[List[bytes]],
+    prev_transaction_generators: List[Optional[bytes]],
+    npc_results: Dict[uint32, bytes],
+    check_filter: bool,
+    expected_difficulty: List[uint64],
+    expected_sub_slot_iters: List[uint64],
+) -> List[bytes]:
     results: List[PreValidationResult] = []
-    constants: ConsensusConstants = dataclass_from_dict(ConsensusConstants, constants_dict)
     if full_blocks_pickled is not None and header_blocks_pickled is not None:
         assert ValueError("Only one should be passed here")
     if full_blocks_pickled is not None:
@@ -129,7 +277,7 @@ def batch_pre_validate_blocks(
 
 async def pre_validate_blocks_multiprocessing(
     constants: ConsensusConstants,
-    constants_json: Dict,
+    constants_json: Optional[Dict],
     block_records: BlockchainInterface,
     blocks: Sequence[Union[FullBlock, HeaderBlock]],
     pool: ProcessPoolExecutor,
@@ -146,7 +294,7 @@ async def pre_validate_blocks_multiprocessing(
 
     Args:
         check_filter:
-        constants_json:
+        constants_json: None if the pool was created with create_validation_pool
         pool:
         constants:
         block_records:
@@ -251,21 +399,14 @@ async def pre_validate_blocks_multiprocessing(
         if not block_record_was_present[i]:
             block_records.remove_block_record(block.header_hash)
 
-    recent_sb_compressed_pickled = {bytes(k): bytes(v) for k, v in recent_blocks_compressed.items()}
-    npc_results_pickled = {}
-    for k, v in npc_results.items():
-        npc_results_pickled[k] = bytes(v)
-    futures = []
-    # Pool of workers to validate blocks concurrently
+    # The blocks of all batches are prepared first, so they can be written to shared memory at once
+    arena: Optional[SharedBlockArena] = SharedBlockArena() if shared_memory is not None else None
+    batches: List[Tuple[int, int, List[bytes], bool, List[Optional[bytes]]]] = []
     for i in range(0, len(blocks), batch_size):
         end_i = min(i + batch_size, len(blocks))
         blocks_to_validate = blocks[i:end_i]
-        if any([len(block.finished_sub_slots) > 0 for block in blocks_to_validate]):
-            final_pickled = {bytes(k): bytes(v) for k, v in recent_blocks.items()}
-        else:
-            final_pickled = recent_sb_compressed_pickled
-        b_pickled: Optional[List[bytes]] = None
-        hb_pickled: Optional[List[bytes]] = None
+        blocks_bytes: List[bytes] = []
+        is_full_block = False
         previous_generators: List[Optional[bytes]] = []
         for block in blocks_to_validate:
             # We ONLY add blocks which are in the past, based on header hashes (which are validated later) to the
@@ -278,11 +419,10 @@ async def pre_validate_blocks_multiprocessing(
                 curr_b = block_dict[curr_b.prev_header_hash]
                 prev_blocks_dict[curr_b.header_hash] = curr_b
 
+            blocks_bytes.append(bytes(block))
             if isinstance(block, FullBlock):
                 assert get_block_generator is not None
-                if b_pickled is None:
-                    b_pickled = []
-                b_pickled.append(bytes(block))
+                is_full_block = True
                 try:
                     block_generator: Optional[BlockGenerator] = await get_block_generator(block, prev_blocks_dict)
                 except ValueError:
@@ -291,36 +431,89 @@ async def pre_validate_blocks_multiprocessing(
                     previous_generators.append(bytes(block_generator))
                 else:
                     previous_generators.append(None)
-            else:
-                if hb_pickled is None:
-                    hb_pickled = []
-                hb_pickled.append(bytes(block))
-
-        futures.append(
-            asyncio.get_running_loop().run_in_executor(
-                pool,
-                batch_pre_validate_blocks,
-                constants_json,
-                final_pickled,
-                b_pickled,
-                hb_pickled,
-                previous_generators,
-                npc_results_pickled,
-                check_filter,
-                [diff_ssis[j][0] for j in range(i, end_i)],
-                [diff_ssis[j][1] for j in range(i, end_i)],
-            )
-        )
-    # Collect all results into one flat list
-    return [
-        PreValidationResult.from_bytes(result)
-        for batch_result in (await asyncio.gather(*futures))
-        for result in batch_result
-    ]
+        batches.append((i, end_i, blocks_bytes, is_full_block, previous_generators))
+
+    futures = []
+    try:
+        if arena is not None:
+            record_spans: Dict[bytes32, Span] = {}
+            for header_hash, block_record in recent_blocks.items():
+                record_spans[header_hash] = arena.add(bytes(block_record))
+            recent_spans = [(bytes(header_hash), *span) for header_hash, span in record_spans.items()]
+            recent_compressed_spans = [
+                (bytes(header_hash), *record_spans[header_hash]) for header_hash in recent_blocks_compressed
+            ]
+            npc_result_spans: Dict[uint32, Span] = {k: arena.add(bytes(v)) for k, v in npc_results.items()}
+            batch_spans = []
+            for i, end_i, blocks_bytes, is_full_block, previous_generators in batches:
+                block_spans = [arena.add(block_bytes) for block_bytes in blocks_bytes]
+                generator_spans = [None if g is None else arena.add(g) for g in previous_generators]
+                batch_spans.append((block_spans, generator_spans))
+            arena_name = arena.create()
+
+            # Pool of workers to validate blocks concurrently
+            for (i, end_i, _, is_full_block, _), (block_spans, generator_spans) in zip(batches, batch_spans):
+                if any([len(block.finished_sub_slots) > 0 for block in blocks[i:end_i]]):
+                    records = recent_spans
+                else:
+                    records = recent_compressed_spans
+                futures.append(
+                    asyncio.get_running_loop().run_in_executor(
+                        pool,
+                        batch_pre_validate_shared_blocks,
+                        constants_json,
+                        arena_name,
+                        records,
+                        block_spans if is_full_block else None,
+                        None if is_full_block else block_spans,
+                        generator_spans,
+                        npc_result_spans,
+                        check_filter,
+                        [diff_ssis[j][0] for j in range(i, end_i)],
+                        [diff_ssis[j][1] for j in range(i, end_i)],
+                    )
+                )
+        else:
+            recent_sb_compressed_pickled = {bytes(k): bytes(v) for k, v in recent_blocks_compressed.items()}
+            npc_results_pickled = {}
+            for k, v in npc_results.items():
+                npc_results_pickled[k] = bytes(v)
+            # Pool of workers to validate blocks concurrently
+            for i, end_i, blocks_bytes, is_full_block, previous_generators in batches:
+                if any([len(block.finished_sub_slots) > 0 for block in blocks[i:end_i]]):
+                    final_pickled = {bytes(k): bytes(v) for k, v in recent_blocks.items()}
+                else:
+                    final_pickled = recent_sb_compressed_pickled
+                futures.append(
+                    asyncio.get_running_loop().run_in_executor(
+                        pool,
+                        batch_pre_validate_blocks,
+                        constants_json,
+                        final_pickled,
+                        blocks_bytes if is_full_block else None,
+                        None if is_full_block else blocks_bytes,
+                        previous_generators,
+                        npc_results_pickled,
+                        check_filter,
+                        [diff_ssis[j][0] for j in range(i, end_i)],
+                        [diff_ssis[j][1] for j in range(i, end_i)],
+                    )
+                )
+        # Collect all results into one flat list
+        return [
+            PreValidationResult.from_bytes(result)
+            for batch_result in (await asyncio.gather(*futures))
+            for result in batch_result
+        ]
+    finally:
+        if arena is not None:
+            # the workers are done with the arena once all the futures completed
+            await asyncio.gather(*futures, return_exceptions=True)
+            arena.close()
 
 
 def _run_generator(
-    constants_dict: bytes,
+    constants_dict: Optional[Dict],
     unfinished_block_bytes: bytes,
     block_generator_bytes: bytes,
 ) -> Tuple[Optional[Err], Optional[bytes]]:
@@ -329,7 +522,7 @@ def _run_generator(
     validate the heavy parts of a block (clvm program) in a different process.
     """
     try:
-        constants: ConsensusConstants = dataclass_from_dict(ConsensusConstants, constants_dict)
+        constants: ConsensusConstants = _get_constants(constants_dict)
         unfinished_block: UnfinishedBlock = UnfinishedBlock.from_bytes(unfinished_block_bytes)
         assert unfinished_block.transactions_info is not None
         block_generator: BlockGenerator = BlockGenerator.from_bytes(block_generator_bytes)
@@ -0,0 +1,124 @@
+import zlib
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+# zlib only ever looks back this far, a longer preset dictionary is wasted
+ZLIB_WINDOW = 32 * 1024
+
+
+class BlockCompression(IntEnum):
+    """
+    Stored next to every compressed row, so rows written with different settings (or by a node that
+    did not have zstandard installed) can live side by side in the same table.
+    """
+
+    NONE = 0
+    ZLIB = 1
+    ZSTD = 2
+
+
+def default_compression() -> BlockCompression:
+    return BlockCompression.ZLIB if zstandard is None else BlockCompression.ZSTD
+
+
+def train_dictionary(compression: BlockCompression, samples: List[bytes], size: int) -> bytes:
+    """
+    Builds a shared dictionary from serialized blocks. zstd trains a real dictionary, zlib can only use
+    raw content, so it gets the tails of the most recent samples (zlib weights the end of the
+    dictionary the most).
+    """
+    if compression == BlockCompression.ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed, cannot train a zstd dictionary")
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    if compression == BlockCompression.ZLIB:
+        size = min(size, ZLIB_WINDOW)
+        per_sample = max(size // max(len(samples), 1), 1)
+        return b"".join(sample[-per_sample:] for sample in samples)[-size:]
+    raise ValueError(f"compression {compression} does not use a dictionary")
+
+
+class BlockCompressor:
+    """
+    Compresses serialized full blocks for storage, and decompresses them again. Dictionaries are
+    referred to by the id they are stored under in the database. New rows use the most recently added
+    dictionary for the configured codec; any dictionary added can still be used to decompress.
+    """
+
+    compression: BlockCompression
+    level: int
+    dictionary_id: Optional[int]
+    _dictionaries: Dict[int, Tuple[BlockCompression, bytes]]
+    _zstd_compressor: Any
+    _zstd_decompressors: Dict[Optional[int], Any]
+
+    def __init__(self, compression: Optional[BlockCompression] = None, level: int = 3):
+        self.compression = default_compression() if compression is None else compression
+        if self.compression == BlockCompression.ZSTD and zstandard is None:
+            raise RuntimeError("zstd block compression requires zstandard to be installed")
+        self.level = level
+        self.dictionary_id = None
+        self._dictionaries = {}
+        self._zstd_compressor = None
+        self._zstd_decompressors = {}
+
+    def add_dictionary(self, dictionary_id: int, compression: BlockCompression, dictionary: bytes) -> None:
+        self._dictionaries[dictionary_id] = (compression, dictionary)
+        if compression == self.compression:
+            self.dictionary_id = dictionary_id
+            self._zstd_compressor = None
+
+    def compress(self, data: bytes) -> Tuple[BlockCompression, Optional[int], bytes]:
+        """
+        Returns the codec, the dictionary id (if any) and the bytes to store. Data that doesn't get
+        smaller is stored as is.
+        """
+        compressed: bytes
+        if self.compression == BlockCompression.ZSTD:
+            if self._zstd_compressor is None:
+                self._zstd_compressor = zstandard.ZstdCompressor(
+                    level=self.level, dict_data=self._zstd_dict(self.dictionary_id)
+                )
+            compressed = self._zstd_compressor.compress(data)
+        elif self.compression == BlockCompression.ZLIB:
+            if self.dictionary_id is None:
+                compressed = zlib.compress(data, self.level)
+            else:
+                compressor = zlib.compressobj(self.level, zdict=self._dictionaries[self.dictionary_id][1])
+                compressed = compressor.compress(data) + compressor.flush()
+        else:
+            return BlockCompression.NONE, None, data
+
+        if len(compressed) >= len(data):
+            return BlockCompression.NONE, None, data
+        return self.compression, self.dictionary_id, compressed
+
+    def decompress(self, compression: int, dictionary_id: Optional[int], data: bytes) -> bytes:
+        if compression == BlockCompression.NONE:
+            return data
+        if dictionary_id is not None and dictionary_id not in self._dictionaries:
+            raise ValueError(f"unknown block compression dictionary {dictionary_id}")
+        if compression == BlockCompression.ZSTD:
+            if zstandard is None:
+                raise RuntimeError("block is compressed with zstd, but zstandard is not installed")
+            decompressor = self._zstd_decompressors.get(dictionary_id)
+            if decompressor is None:
+                decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict(dictionary_id))
+                self._zstd_decompressors[dictionary_id] = decompressor
+            return decompressor.decompress(data)
+        if compression == BlockCompression.ZLIB:
+            if dictionary_id is None:
+                return zlib.decompress(data)
+            decompressor = zlib.decompressobj(zdict=self._dictionaries[dictionary_id][1])
+            return decompressor.decompress(data) + decompressor.flush()
+        raise ValueError(f"unknown block compression {compression}")
+
+    def _zstd_dict(self, dictionary_id: Optional[int]) -> Any:
+        if dictionary_id is None:
+            return None
+        return zstandard.ZstdCompressionDict(self._dictionaries[dictionary_id][1])
@@ -0,0 +1,212 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from hddcoin.full_node.block_store import BlockStore
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.blockchain_format.sub_epoch_summary import SubEpochSummary
+from hddcoin.util.ints import uint32
+from hddcoin.util.streamable import Streamable, streamable
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+@streamable
+class SesCache(Streamable):
+    content: List[Tuple[uint32, bytes]]
+
+
+class BlockHeightMap:
+    """
+    Maps the heights of the main chain (genesis to peak) to header hashes, and keeps the sub-epoch
+    summaries included in the main chain. Both are persisted next to the blockchain database, so
+    that the full node does not have to walk all block records on startup. The height-to-hash file
+    is a flat array of 32 byte header hashes, indexed by height.
+
+    The files may lag behind the database. On load they are validated against the peak in the
+    database, and only the part of the chain that disagrees is reloaded from the block records.
+    """
+
+    db: BlockStore
+
+    # the block hashes of the main chain, 32 bytes per height
+    __height_to_hash: bytearray
+
+    # All sub-epoch summaries that have been included in the blockchain from the beginning until and including the peak
+    # (height_included, SubEpochSummary). Note: ONLY for the blocks in the path to the peak
+    __sub_epoch_summaries: Dict[uint32, SubEpochSummary]
+
+    # the lowest height that changed since the last flush, or None if the files are up to date
+    __first_dirty: Optional[int]
+    __num_dirty: int
+
+    __height_to_hash_filename: Optional[Path]
+    __ses_filename: Optional[Path]
+
+    # number of block records loaded from the database at a time when walking the chain
+    WINDOW_SIZE = 1000
+
+    # the files are rewritten once this many heights have changed
+    FLUSH_THRESHOLD = 1000
+
+    @classmethod
+    async def create(cls, block_store: BlockStore, db_path: Optional[Path] = None) -> "BlockHeightMap":
+        """
+        Loads the height map for the main chain in block_store. If db_path is set, the map is read
+        from (and persisted to) files next to the database, otherwise it is rebuilt from the block
+        records.
+        """
+        self = cls()
+        self.db = block_store
+        self.__height_to_hash = bytearray()
+        self.__sub_epoch_summaries = {}
+        self.__first_dirty = None
+        self.__num_dirty = 0
+
+        if db_path is None:
+            self.__height_to_hash_filename = None
+            self.__ses_filename = None
+        else:
+            self.__height_to_hash_filename = db_path.with_suffix(".height-to-hash")
+            self.__ses_filename = db_path.with_suffix(".sub-epoch-summaries")
+            self._load_files()
+
+        peak = await self.db.get_peak()
+        if peak is None:
+            if len(self.__height_to_hash) > 0:
+                log.info("height map does not match the (empty) blockchain database, discarding it")
+            self.__height_to_hash = bytearray()
+            self.__sub_epoch_summaries = {}
+            self._mark_dirty(0)
+            return self
+
+        peak_hash, peak_height = peak
+
+        # anything above the peak belongs to a chain we reorged away from
+        del self.__height_to_hash[(peak_height + 1) * 32 :]
+        for height in [h for h in self.__sub_epoch_summaries.keys() if h > peak_height]:
+            del self.__sub_epoch_summaries[height]
+        self._mark_dirty(peak_height + 1)
+
+        if self.contains_height(peak_height) and self.get_hash(peak_height) == peak_hash:
+            log.info(f"loaded height map up to peak height {peak_height}")
+        else:
+            log.info(f"height map does not match the blockchain peak at height {peak_height}, reloading it")
+            await self._load_blocks_from(peak_height, peak_hash)
+        return self
+
+    def _load_files(self) -> None:
+        assert self.__height_to_hash_filename is not None
+        assert self.__ses_filename is not None
+        try:
+            height_to_hash = bytearray(self.__height_to_hash_filename.read_bytes())
+            ses_cache = SesCache.from_bytes(self.__ses_filename.read_bytes())
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.warning(f"failed to load height map, rebuilding it: {e}")
+            return
+
+        # a partially written file may end in a truncated hash
+        del height_to_hash[len(height_to_hash) - len(height_to_hash) % 32 :]
+        self.__height_to_hash = height_to_hash
+        self.__sub_epoch_summaries = {
+            height: SubEpochSummary.from_bytes(ses_bytes) for height, ses_bytes in ses_cache.content
+        }
+
+    async def _load_blocks_from(self, height: uint32, header_hash: bytes32) -> None:
+        """
+        Walks the chain backwards from header_hash at height, until it reaches a block that is
+        already in the map, or the genesis block.
+        """
+        while True:
+            window_start = max(0, height - self.WINDOW_SIZE)
+            records: Dict[bytes32, Tuple[bytes32, Optional[SubEpochSummary]]] = await self.db.get_prev_hash_and_ses(
+                window_start, height
+            )
+            while height >= window_start:
+                if self.contains_height(height) and self.get_hash(height) == header_hash:
+                    return
+                prev_hash, ses = records[header_hash]
+                self.update_height(height, header_hash, ses)
+                if height == 0:
+                    return
+                header_hash = prev_hash
+                height = uint32(height - 1)
+
+    def update_height(self, height: uint32, header_hash: bytes32, ses: Optional[SubEpochSummary]) -> None:
+        idx = height * 32
+        if len(self.__height_to_hash) < idx + 32:
+            self.__height_to_hash.extend(bytes(idx + 32 - len(self.__height_to_hash)))
+        self.__height_to_hash[idx : idx + 32] = header_hash
+        if ses is not None:
+            self.__sub_epoch_summaries[height] = ses
+        elif height in self.__sub_epoch_summaries:
+            del self.__sub_epoch_summaries[height]
+        self._mark_dirty(height)
+
+    def get_hash(self, height: uint32) -> bytes32:
+        idx = height * 32
+        assert idx + 32 <= len(self.__height_to_hash)
+        return bytes32(self.__height_to_hash[idx : idx + 32])
+
+    def contains_height(self, height: uint32) -> bool:
+        return height * 32 < len(self.__height_to_hash)
+
+    def rollback(self, fork_height: int) -> None:
+        """
+        Removes the sub-epoch summaries above fork_height. The hashes above the fork are left in
+        place, they are overwritten as the new chain is added.
+        """
+        heights_to_delete = []
+        for ses_included_height in self.__sub_epoch_summaries.keys():
+            if ses_included_height > fork_height:
+                heights_to_delete.append(ses_included_height)
+        for height in heights_to_delete:
+            log.info(f"delete ses at height {height}")
+            del self.__sub_epoch_summaries[height]
+        if len(heights_to_delete) > 0:
+            self._mark_dirty(max(fork_height + 1, 0))
+
+    def get_ses(self, height: uint32) -> SubEpochSummary:
+        return self.__sub_epoch_summaries[height]
+
+    def get_ses_heights(self) -> List[uint32]:
+        return sorted(self.__sub_epoch_summaries.keys())
+
+    def _mark_dirty(self, height: int) -> None:
+        if self.__first_dirty is None or height < self.__first_dirty:
+            self.__first_dirty = height
+        self.__num_dirty += 1
+
+    def maybe_flush(self) -> None:
+        if self.__num_dirty < self.FLUSH_THRESHOLD:
+            return
+        self.flush()
+
+    def flush(self) -> None:
+        if self.__first_dirty is None:
+            return
+        if self.__height_to_hash_filename is None or self.__ses_filename is None:
+            return
+
+        # the sub epoch summaries are written first. If we're interrupted before the height-to-hash
+        # file is updated, the peak won't match on the next start and the map is repaired from
+        # the database
+        ses_cache = SesCache([(height, bytes(ses)) for height, ses in sorted(self.__sub_epoch_summaries.items())])
+        self.__ses_filename.write_bytes(bytes(ses_cache))
+
+        # only the part of the height-to-hash file that changed is written
+        offset = self.__first_dirty * 32
+        mode = "r+b" if self.__height_to_hash_filename.exists() else "wb"
+        with open(self.__height_to_hash_filename, mode) as f:
+            f.seek(0, 2)
+            offset = min(offset, f.tell())
+            f.seek(offset)
+            f.write(self.__height_to_hash[offset:])
+            f.truncate()
+
+        self.__first_dirty = None
+        self.__num_dirty = 0
@@ -1,9 +1,10 @@
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiosqlite
 
 from hddcoin.consensus.block_record import BlockRecord
+from hddcoin.full_node.block_compression import BlockCompression, BlockCompressor
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.types.blockchain_format.sub_epoch_summary import SubEpochSummary
 from hddcoin.types.full_block import FullBlock
@@ -11,6 +12,7 @@ from hddcoin.types.weight_proof import SubEpochChallengeSegment, SubEpochSegment
 from hddcoin.util.db_wrapper import DBWrapper
 from hddcoin.util.ints import uint32
 from hddcoin.util.lru_cache import LRUCache
+from hddcoin.util.streamable_view import StreamableView
 
 log = logging.getLogger(__name__)
 
@@ -20,75 +22,164 @@ class BlockStore:
     block_cache: LRUCache
     db_wrapper: DBWrapper
     ses_challenge_cache: LRUCache
+    compressor: BlockCompressor
 
     @classmethod
-    async def create(cls, db_wrapper: DBWrapper):
+    async def create(cls, db_wrapper: DBWrapper, compression: Optional[BlockCompression] = None):
         self = cls()
 
         # All full blocks which have been added to the blockchain. Header_hash -> block
         self.db_wrapper = db_wrapper
         self.db = db_wrapper.db
-        await self.db.execute(
-            "CREATE TABLE IF NOT EXISTS full_blocks(header_hash text PRIMARY KEY, height bigint,"
-            "  is_block tinyint, is_fully_compactified tinyint, block blob)"
-        )
+        self.compressor = BlockCompressor(compression)
+        if self.db_wrapper.db_version == 2:
+            # blocks are stored compressed, with the codec and the dictionary (if any) they were
+            # compressed with, see block_compression.py
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS full_blocks(header_hash blob PRIMARY KEY, height bigint,"
+                "  is_block tinyint, is_fully_compactified tinyint, block blob, compression tinyint, dictionary int)"
+            )
 
-        # Block records
-        await self.db.execute(
-            "CREATE TABLE IF NOT EXISTS block_records(header_hash "
-            "text PRIMARY KEY, prev_hash text, height bigint,"
-            "block blob, sub_epoch_summary blob, is_peak tinyint, is_block tinyint)"
-        )
+            # Shared dictionaries for the compressed blocks, trained from chain data
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS block_dictionaries(id INTEGER PRIMARY KEY, compression tinyint,"
+                " dictionary blob)"
+            )
 
-        # todo remove in v1.2
-        await self.db.execute("DROP TABLE IF EXISTS sub_epoch_segments_v2")
+            # Block records
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS block_records(header_hash "
+                "blob PRIMARY KEY, prev_hash blob, height bigint,"
+                "block blob, sub_epoch_summary blob, is_peak tinyint, is_block tinyint)"
+            )
 
-        # Sub epoch segments for weight proofs
-        await self.db.execute(
-            "CREATE TABLE IF NOT EXISTS sub_epoch_segments_v3(ses_block_hash text PRIMARY KEY, challenge_segments blob)"
-        )
+            # Sub epoch segments for weight proofs
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS sub_epoch_segments_v3(ses_block_hash blob PRIMARY KEY,"
+                " challenge_segments blob)"
+            )
 
-        # Height index so we can look up in order of height for sync purposes
-        await self.db.execute("CREATE INDEX IF NOT EXISTS full_block_height on full_blocks(height)")
-        # this index is not used by any queries, don't create it for new
-        # installs, and remove it from existing installs in the future
-        # await self.db.execute("DROP INDEX IF EXISTS is_block on full_blocks(is_block)")
-        await self.db.execute("CREATE INDEX IF NOT EXISTS is_fully_compactified on full_blocks(is_fully_compactified)")
+            await self.db.execute("CREATE INDEX IF NOT EXISTS full_block_height on full_blocks(height)")
+            await self.db.execute(
+                "CREATE INDEX IF NOT EXISTS is_fully_compactified on full_blocks(is_fully_compactified)"
+            )
+            await self.db.execute("CREATE INDEX IF NOT EXISTS height on block_records(height)")
+            await self.db.execute("CREATE INDEX IF NOT EXISTS peak on block_records(is_peak)")
 
-        await self.db.execute("CREATE INDEX IF NOT EXISTS height on block_records(height)")
+        else:
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS full_blocks(header_hash text PRIMARY KEY, height bigint,"
+                "  is_block tinyint, is_fully_compactified tinyint, block blob)"
+            )
 
-        await self.db.execute("CREATE INDEX IF NOT EXISTS hh on block_records(header_hash)")
-        await self.db.execute("CREATE INDEX IF NOT EXISTS peak on block_records(is_peak)")
+            # Block records
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS block_records(header_hash "
+                "text PRIMARY KEY, prev_hash text, height bigint,"
+                "block blob, sub_epoch_summary blob, is_peak tinyint, is_block tinyint)"
+            )
 
-        # this index is not used by any queries, don't create it for new
-        # installs, and remove it from existing installs in the future
-        # await self.db.execute("DROP INDEX IF EXISTS is_block on block_records(is_block)")
+            # todo remove in v1.2
+            await self.db.execute("DROP TABLE IF EXISTS sub_epoch_segments_v2")
+
+            # Sub epoch segments for weight proofs
+            await self.db.execute(
+                "CREATE TABLE IF NOT EXISTS sub_epoch_segments_v3(ses_block_hash text PRIMARY KEY, "
+                "challenge_segments blob)"
+            )
+
+            # Height index so we can look up in order of height for sync purposes
+            await self.db.execute("CREATE INDEX IF NOT EXISTS full_block_height on full_blocks(height)")
+            # this index is not used by any queries, don't create it for new
+            # installs, and remove it from existing installs in the future
+            # await self.db.execute("DROP INDEX IF EXISTS is_block on full_blocks(is_block)")
+            await self.db.execute(
+                "CREATE INDEX IF NOT EXISTS is_fully_compactified on full_blocks(is_fully_compactified)"
+            )
+
+            await self.db.execute("CREATE INDEX IF NOT EXISTS height on block_records(height)")
+
+            await self.db.execute("CREATE INDEX IF NOT EXISTS hh on block_records(header_hash)")
+            await self.db.execute("CREATE INDEX IF NOT EXISTS peak on block_records(is_peak)")
+
+            # this index is not used by any queries, don't create it for new
+            # installs, and remove it from existing installs in the future
+            # await self.db.execute("DROP INDEX IF EXISTS is_block on block_records(is_block)")
 
         await self.db.commit()
+
+        if self.db_wrapper.db_version == 2:
+            cursor = await self.db.execute("SELECT id, compression, dictionary FROM block_dictionaries ORDER BY id")
+            for row in await cursor.fetchall():
+                self.compressor.add_dictionary(row[0], BlockCompression(row[1]), row[2])
+            await cursor.close()
+
         self.block_cache = LRUCache(1000)
         self.ses_challenge_cache = LRUCache(50)
         return self
 
+    def maybe_from_hex(self, field: Any) -> bytes:
+        if self.db_wrapper.db_version == 2:
+            return field
+        else:
+            return bytes.fromhex(field)
+
+    def maybe_to_hex(self, field: bytes) -> Any:
+        if self.db_wrapper.db_version == 2:
+            return field
+        else:
+            return field.hex()
+
+    def block_select(self) -> str:
+        if self.db_wrapper.db_version == 2:
+            return "block, compression, dictionary"
+        else:
+            return "block"
+
+    def block_from_row(self, row: Any, offset: int = 0) -> bytes:
+        """
+        Returns the serialized block selected by block_select(), starting at the column offset
+        """
+        if self.db_wrapper.db_version == 2:
+            return self.compressor.decompress(row[offset + 1], row[offset + 2], row[offset])
+        else:
+            return row[offset]
+
     async def add_full_block(self, header_hash: bytes32, block: FullBlock, block_record: BlockRecord) -> None:
         self.block_cache.put(header_hash, block)
-        cursor_1 = await self.db.execute(
-            "INSERT OR REPLACE INTO full_blocks VALUES(?, ?, ?, ?, ?)",
-            (
-                header_hash.hex(),
-                block.height,
-                int(block.is_transaction_block()),
-                int(block.is_fully_compactified()),
-                bytes(block),
-            ),
-        )
+        if self.db_wrapper.db_version == 2:
+            compression, dictionary, block_bytes = self.compressor.compress(bytes(block))
+            cursor_1 = await self.db.execute(
+                "INSERT OR REPLACE INTO full_blocks VALUES(?, ?, ?, ?, ?, ?, ?)",
+                (
+                    header_hash,
+                    block.height,
+                    int(block.is_transaction_block()),
+                    int(block.is_fully_compactified()),
+                    block_bytes,
+                    int(compression),
+                    dictionary,
+                ),
+            )
+        else:
+            cursor_1 = await self.db.execute(
+                "INSERT OR REPLACE INTO full_blocks VALUES(?, ?, ?, ?, ?)",
+                (
+                    header_hash.hex(),
+                    block.height,
+                    int(block.is_transaction_block()),
+                    int(block.is_fully_compactified()),
+                    bytes(block),
+                ),
+            )
 
         await cursor_1.close()
 
         cursor_2 = await self.db.execute(
             "INSERT OR REPLACE INTO block_records VALUES(?, ?, ?, ?,?, ?, ?)",
             (
-                header_hash.hex(),
-                block.prev_header_hash.hex(),
+                self.maybe_to_hex(header_hash),
+                self.maybe_to_hex(block.prev_header_hash),
                 block.height,
                 bytes(block_record),
                 None
@@ -106,7 +197,7 @@ class BlockStore:
         async with self.db_wrapper.lock:
             cursor_1 = await self.db.execute(
                 "INSERT OR REPLACE INTO sub_epoch_segments_v3 VALUES(?, ?)",
-                (ses_block_hash.hex(), bytes(SubEpochSegments(segments))),
+                (self.maybe_to_hex(ses_block_hash), bytes(SubEpochSegments(segments))),
             )
             await cursor_1.close()
             await self.db.commit()
@@ -119,7 +210,8 @@ class BlockStore:
         if cached is not None:
             return cached
         cursor = await self.db.execute(
-            "SELECT challenge_segments from sub_epoch_segments_v3 WHERE ses_block_hash=?", (ses_block_hash.hex(),)
+            "SELECT challenge_segments from sub_epoch_segments_v3 WHERE ses_block_hash=?",
+            (self.maybe_to_hex(ses_block_hash),),
         )
         row = await cursor.fetchone()
         await cursor.close()
@@ -143,11 +235,13 @@ class BlockStore:
             log.debug(f"cache hit for block {header_hash.hex()}")
             return cached
         log.debug(f"cache miss for block {header_hash.hex()}")
-        cursor = await self.db.execute("SELECT block from full_blocks WHERE header_hash=?", (header_hash.hex(),))
+        cursor = await self.db.execute(
+            f"SELECT {self.block_select()} from full_blocks WHERE header_hash=?", (self.maybe_to_hex(header_hash),)
+        )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
-            block = FullBlock.from_bytes(row[0])
+            block = FullBlock.from_bytes(self.block_from_row(row))
             self.block_cache.put(header_hash, block)
             return block
         return None
@@ -158,23 +252,37 @@ class BlockStore:
             log.debug(f"cache hit for block {header_hash.hex()}")
             return bytes(cached)
         log.debug(f"cache miss for block {header_hash.hex()}")
-        cursor = await self.db.execute("SELECT block from full_blocks WHERE header_hash=?", (header_hash.hex(),))
+        cursor = await self.db.execute(
+            f"SELECT {self.block_select()} from full_blocks WHERE header_hash=?", (self.maybe_to_hex(header_hash),)
+        )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
-            return row[0]
+            return self.block_from_row(row)
         return None
 
+    async def get_full_block_view(self, header_hash: bytes32) -> Optional[StreamableView]:
+        """
+        Like get_full_block(), but the block is only parsed as far as its fields are used. The view is not
+        added to the block cache.
+        """
+        block_bytes = await self.get_full_block_bytes(header_hash)
+        if block_bytes is None:
+            return None
+        return StreamableView(FullBlock, block_bytes)
+
     async def get_full_blocks_at(self, heights: List[uint32]) -> List[FullBlock]:
         if len(heights) == 0:
             return []
 
         heights_db = tuple(heights)
-        formatted_str = f'SELECT block from full_blocks WHERE height in ({"?," * (len(heights_db) - 1)}?)'
+        formatted_str = (
+            f"SELECT {self.block_select()} from full_blocks " f'WHERE height in ({"?," * (len(heights_db) - 1)}?)'
+        )
         cursor = await self.db.execute(formatted_str, heights_db)
         rows = await cursor.fetchall()
         await cursor.close()
-        return [FullBlock.from_bytes(row[0]) for row in rows]
+        return [FullBlock.from_bytes(self.block_from_row(row)) for row in rows]
 
     async def get_block_records_by_hash(self, header_hashes: List[bytes32]):
         """
@@ -184,7 +292,7 @@ class BlockStore:
         if len(header_hashes) == 0:
             return []
 
-        header_hashes_db = tuple([hh.hex() for hh in header_hashes])
+        header_hashes_db = tuple([self.maybe_to_hex(hh) for hh in header_hashes])
         formatted_str = f'SELECT block from block_records WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
         cursor = await self.db.execute(formatted_str, header_hashes_db)
         rows = await cursor.fetchall()
@@ -209,30 +317,73 @@ class BlockStore:
         if len(header_hashes) == 0:
             return []
 
-        header_hashes_db = tuple([hh.hex() for hh in header_hashes])
+        # only the blocks that aren't cached are read (and decompressed)
+        all_blocks: Dict[bytes32, FullBlock] = {}
+        for hh in header_hashes:
+            cached = self.block_cache.get(hh)
+            if cached is not None:
+                all_blocks[hh] = cached
+
+        header_hashes_db = tuple(set([self.maybe_to_hex(hh) for hh in header_hashes if hh not in all_blocks]))
+        if len(header_hashes_db) > 0:
+            formatted_str = (
+                f"SELECT header_hash, {self.block_select()} from full_blocks "
+                f'WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
+            )
+            cursor = await self.db.execute(formatted_str, header_hashes_db)
+            rows = await cursor.fetchall()
+            await cursor.close()
+            for row in rows:
+                header_hash = bytes32(self.maybe_from_hex(row[0]))
+                full_block: FullBlock = FullBlock.from_bytes(self.block_from_row(row, 1))
+                all_blocks[header_hash] = full_block
+                self.block_cache.put(header_hash, full_block)
+        ret: List[FullBlock] = []
+        for hh in header_hashes:
+            if hh not in all_blocks:
+                raise ValueError(f"Header hash {hh} not in the blockchain")
+            ret.append(all_blocks[hh])
+        return ret
+
+    async def get_block_bytes_by_hash(self, header_hashes: List[bytes32]) -> List[bytes]:
+        """
+        Returns a list of serialized Full Blocks, ordered by the same order in which header_hashes are passed in.
+        The blocks are read as stored, without going through the block cache or FullBlock.
+        Throws an exception if the blocks are not present
+        """
+
+        if len(header_hashes) == 0:
+            return []
+
+        header_hashes_db = tuple(set([self.maybe_to_hex(hh) for hh in header_hashes]))
         formatted_str = (
-            f'SELECT header_hash, block from full_blocks WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
+            f"SELECT header_hash, {self.block_select()} from full_blocks "
+            f'WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
         )
         cursor = await self.db.execute(formatted_str, header_hashes_db)
         rows = await cursor.fetchall()
         await cursor.close()
-        all_blocks: Dict[bytes32, FullBlock] = {}
+        all_blocks: Dict[bytes32, bytes] = {}
         for row in rows:
-            header_hash = bytes.fromhex(row[0])
-            full_block: FullBlock = FullBlock.from_bytes(row[1])
-            all_blocks[header_hash] = full_block
-            self.block_cache.put(header_hash, full_block)
-        ret: List[FullBlock] = []
+            all_blocks[bytes32(self.maybe_from_hex(row[0]))] = self.block_from_row(row, 1)
+        ret: List[bytes] = []
         for hh in header_hashes:
             if hh not in all_blocks:
                 raise ValueError(f"Header hash {hh} not in the blockchain")
             ret.append(all_blocks[hh])
         return ret
 
+    async def get_block_views_by_hash(self, header_hashes: List[bytes32]) -> List[StreamableView]:
+        """
+        Returns views of the Full Blocks, ordered by the same order in which header_hashes are passed in.
+        Throws an exception if the blocks are not present
+        """
+        return [StreamableView(FullBlock, block) for block in await self.get_block_bytes_by_hash(header_hashes)]
+
     async def get_block_record(self, header_hash: bytes32) -> Optional[BlockRecord]:
         cursor = await self.db.execute(
             "SELECT block from block_records WHERE header_hash=?",
-            (header_hash.hex(),),
+            (self.maybe_to_hex(header_hash),),
         )
         row = await cursor.fetchone()
         await cursor.close()
@@ -257,7 +408,7 @@ class BlockStore:
         await cursor.close()
         ret: Dict[bytes32, BlockRecord] = {}
         for row in rows:
-            header_hash = bytes.fromhex(row[0])
+            header_hash = self.maybe_from_hex(row[0])
             ret[header_hash] = BlockRecord.from_bytes(row[1])
 
         return ret
@@ -282,50 +433,41 @@ class BlockStore:
         await cursor.close()
         ret: Dict[bytes32, BlockRecord] = {}
         for row in rows:
-            header_hash = bytes.fromhex(row[0])
+            header_hash = self.maybe_from_hex(row[0])
             ret[header_hash] = BlockRecord.from_bytes(row[1])
-        return ret, bytes.fromhex(peak_row[0])
+        return ret, self.maybe_from_hex(peak_row[0])
 
-    async def get_peak_height_dicts(self) -> Tuple[Dict[uint32, bytes32], Dict[uint32, SubEpochSummary]]:
+    async def get_peak(self) -> Optional[Tuple[bytes32, uint32]]:
         """
-        Returns a dictionary with all blocks, as well as the header hash of the peak,
-        if present.
+        Returns the header hash and height of the peak, if present.
         """
 
-        res = await self.db.execute("SELECT * from block_records WHERE is_peak = 1")
+        res = await self.db.execute("SELECT header_hash, height from block_records WHERE is_peak = 1")
         row = await res.fetchone()
         await res.close()
         if row is None:
-            return {}, {}
+            return None
+        return bytes32(self.maybe_from_hex(row[0])), uint32(row[1])
+
+    async def get_prev_hash_and_ses(
+        self, start: int, stop: int
+    ) -> Dict[bytes32, Tuple[bytes32, Optional[SubEpochSummary]]]:
+        """
+        Returns a dictionary from header hash to the previous header hash and included sub-epoch
+        summary, for all block records with heights between start and stop (inclusive).
+        """
 
-        peak: bytes32 = bytes.fromhex(row[0])
-        cursor = await self.db.execute("SELECT header_hash,prev_hash,height,sub_epoch_summary from block_records")
+        cursor = await self.db.execute(
+            "SELECT header_hash, prev_hash, sub_epoch_summary from block_records WHERE height >= ? and height <= ?",
+            (start, stop),
+        )
         rows = await cursor.fetchall()
         await cursor.close()
-        hash_to_prev_hash: Dict[bytes32, bytes32] = {}
-        hash_to_height: Dict[bytes32, uint32] = {}
-        hash_to_summary: Dict[bytes32, SubEpochSummary] = {}
-
+        ret: Dict[bytes32, Tuple[bytes32, Optional[SubEpochSummary]]] = {}
         for row in rows:
-            hash_to_prev_hash[bytes.fromhex(row[0])] = bytes.fromhex(row[1])
-            hash_to_height[bytes.fromhex(row[0])] = row[2]
-            if row[3] is not None:
-                hash_to_summary[bytes.fromhex(row[0])] = SubEpochSummary.from_bytes(row[3])
-
-        height_to_hash: Dict[uint32, bytes32] = {}
-        sub_epoch_summaries: Dict[uint32, SubEpochSummary] = {}
-
-        curr_header_hash = peak
-        curr_height = hash_to_height[curr_header_hash]
-        while True:
-            height_to_hash[curr_height] = curr_header_hash
-            if curr_header_hash in hash_to_summary:
-                sub_epoch_summaries[curr_height] = hash_to_summary[curr_header_hash]
-            if curr_height == 0:
-                break
-            curr_header_hash = hash_to_prev_hash[curr_header_hash]
-            curr_height = hash_to_height[curr_header_hash]
-        return height_to_hash, sub_epoch_summaries
+            ses = None if row[2] is None else SubEpochSummary.from_bytes(row[2])
+            ret[bytes32(self.maybe_from_hex(row[0]))] = (bytes32(self.maybe_from_hex(row[1])), ses)
+        return ret
 
     async def set_peak(self, header_hash: bytes32) -> None:
         # We need to be in a sqlite transaction here.
@@ -334,13 +476,13 @@ class BlockStore:
         await cursor_1.close()
         cursor_2 = await self.db.execute(
             "UPDATE block_records SET is_peak=1 WHERE header_hash=?",
-            (header_hash.hex(),),
+            (self.maybe_to_hex(header_hash),),
         )
         await cursor_2.close()
 
     async def is_fully_compactified(self, header_hash: bytes32) -> Optional[bool]:
         cursor = await self.db.execute(
-            "SELECT is_fully_compactified from full_blocks WHERE header_hash=?", (header_hash.hex(),)
+            "SELECT is_fully_compactified from full_blocks WHERE header_hash=?", (self.maybe_to_hex(header_hash),)
         )
         row = await cursor.fetchone()
         await cursor.close()
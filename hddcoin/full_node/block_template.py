@@ -0,0 +1,177 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from blspy import AugSchemeMPL, G2Element
+
+from hddcoin.full_node.bundle_tools import (
+    bundle_suitable_for_compression,
+    serialized_coin_spend_entries,
+    simple_solution_generator_from_entries,
+)
+from hddcoin.full_node.mempool import Mempool
+from hddcoin.types.blockchain_format.coin import Coin
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.coin_spend import CoinSpend
+from hddcoin.types.generator_types import BlockGenerator
+from hddcoin.types.mempool_item import MempoolItem
+from hddcoin.types.spend_bundle import SpendBundle
+
+log = logging.getLogger(__name__)
+
+# The template is rebuilt instead of updated when more new transactions than this arrived in the meantime
+MAX_NEW_ITEMS = 1000
+
+
+class BlockTemplate:
+    """
+    The mempool items selected for a block, with their coin spends, aggregated signature and generator bytes
+    aggregated as the items are added
+    """
+
+    peak_hash: bytes32
+    items: List[MempoolItem]
+    cost: int
+    fees: int
+    additions: List[Coin]
+    removals: List[Coin]
+    suitable_for_compression: bool
+
+    def __init__(self, peak_hash: bytes32):
+        self.peak_hash = peak_hash
+        self.items = []
+        self.cost = 0
+        self.fees = 0
+        self.additions = []
+        self.removals = []
+        self.suitable_for_compression = True
+        self._coin_spends: List[CoinSpend] = []
+        self._signature: G2Element = G2Element()
+        self._entries: List[bytes] = []
+        self._spend_bundle: Optional[SpendBundle] = None
+
+    def add(self, item: MempoolItem, entries: bytes, suitable_for_compression: bool) -> None:
+        self.items.append(item)
+        self.cost += item.cost
+        self.fees += item.fee
+        self.additions.extend(item.additions)
+        self.removals.extend(item.removals)
+        self.suitable_for_compression = self.suitable_for_compression and suitable_for_compression
+        self._coin_spends.extend(item.spend_bundle.coin_spends)
+        self._signature = AugSchemeMPL.aggregate([self._signature, item.spend_bundle.aggregated_signature])
+        self._entries.append(entries)
+        self._spend_bundle = None
+
+    def min_fee_rate(self) -> float:
+        # the items are added in order of decreasing fee rate, except for the ones filling up the remaining cost
+        return min(item.fee_per_cost for item in self.items)
+
+    @property
+    def spend_bundle(self) -> SpendBundle:
+        if self._spend_bundle is None:
+            self._spend_bundle = SpendBundle(list(self._coin_spends), self._signature)
+        return self._spend_bundle
+
+    def simple_generator(self) -> BlockGenerator:
+        """
+        The same as simple_solution_generator(self.spend_bundle), from the serialized coin spends of the items
+        """
+        return simple_solution_generator_from_entries(b"".join(self._entries))
+
+
+class BlockTemplateBuilder:
+    """
+    Packs the mempool items with the highest fee per cost into a block. The items are taken in order of decreasing
+    fee per cost, and an item which doesn't fit is skipped rather than ending the block, so cheaper items can fill
+    the remaining cost.
+
+    The template is kept until the peak changes. Transactions which arrive in the meantime are added to it if they
+    fit, it's only rebuilt when one of its items left the mempool or a new transaction has a higher fee per cost
+    than an item in the template but doesn't fit.
+    """
+
+    def __init__(self) -> None:
+        self._template: Optional[BlockTemplate] = None
+        self._max_cost = 0
+        self._max_fees = 0
+        # items which entered the mempool since the template was built
+        self._new_items: List[MempoolItem] = []
+        # serialized coin spends and compressibility of the mempool items, they don't change
+        self._item_data: Dict[bytes32, Tuple[bytes, bool]] = {}
+        self.builds = 0
+        self.updates = 0
+
+    def reset(self) -> None:
+        # the serialized coin spends are kept, the items are usually still in the mempool of the new peak
+        self._template = None
+        self._new_items = []
+
+    def item_added(self, item: MempoolItem) -> None:
+        if self._template is not None:
+            self._new_items.append(item)
+            if len(self._new_items) > MAX_NEW_ITEMS:
+                self.reset()
+
+    def _data(self, item: MempoolItem) -> Tuple[bytes, bool]:
+        data = self._item_data.get(item.name)
+        if data is None:
+            data = (
+                serialized_coin_spend_entries(item.spend_bundle.coin_spends),
+                bundle_suitable_for_compression(item.spend_bundle),
+            )
+            self._item_data[item.name] = data
+        return data
+
+    def _fits(self, template: BlockTemplate, item: MempoolItem) -> bool:
+        return template.cost + item.cost <= self._max_cost and template.fees + item.fee <= self._max_fees
+
+    def _build(self, mempool: Mempool, peak_hash: bytes32) -> BlockTemplate:
+        template = BlockTemplate(peak_hash)
+        for item in mempool.items_by_fee_rate():
+            if self._fits(template, item):
+                entries, suitable_for_compression = self._data(item)
+                template.add(item, entries, suitable_for_compression)
+            if self._max_cost - template.cost <= 0:
+                break
+        # drops the data of items which left the mempool
+        self._item_data = {name: data for name, data in self._item_data.items() if name in mempool.spends}
+        self.builds += 1
+        return template
+
+    def _update(self, mempool: Mempool, template: BlockTemplate) -> bool:
+        """
+        Adds the new items to the template, returns False if the template has to be rebuilt
+        """
+        for item in template.items:
+            if item.name not in mempool.spends:
+                return False
+        if len(self._new_items) == 0:
+            return True
+        min_fee_rate = template.min_fee_rate() if len(template.items) > 0 else 0
+        for item in sorted(self._new_items, key=lambda i: i.fee_per_cost, reverse=True):
+            if item.name not in mempool.spends:
+                continue
+            if self._fits(template, item):
+                entries, suitable_for_compression = self._data(item)
+                template.add(item, entries, suitable_for_compression)
+            elif item.fee_per_cost > min_fee_rate:
+                return False
+        self.updates += 1
+        return True
+
+    def get(self, mempool: Mempool, peak_hash: bytes32, max_cost: int, max_fees: int) -> BlockTemplate:
+        if (
+            self._template is None
+            or self._template.peak_hash != peak_hash
+            or self._max_cost != max_cost
+            or self._max_fees != max_fees
+            or not self._update(mempool, self._template)
+        ):
+            self._max_cost = max_cost
+            self._max_fees = max_fees
+            self._template = self._build(mempool, peak_hash)
+        self._new_items = []
+        log.info(
+            f"Block template with {len(self._template.items)} items, cost {self._template.cost}, proportion full: "
+            f"{self._template.cost / max_cost if max_cost > 0 else 0}"
+        )
+        return self._template
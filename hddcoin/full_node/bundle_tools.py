@@ -13,24 +13,37 @@ from hddcoin.util.byte_types import hexstr_to_bytes
 from hddcoin.util.ints import uint32, uint64
 
 
-def spend_bundle_to_serialized_coin_spend_entry_list(bundle: SpendBundle) -> bytes:
+def serialized_coin_spend_entries(coin_spends: List[CoinSpend]) -> bytes:
+    """
+    The serialized coin spend entries without the terminating nil, entries of several bundles can be concatenated
+    """
     r = b""
-    for coin_spend in bundle.coin_spends:
+    for coin_spend in coin_spends:
         r += b"\xff"
         r += b"\xff" + SExp.to(coin_spend.coin.parent_coin_info).as_bin()
         r += b"\xff" + bytes(coin_spend.puzzle_reveal)
         r += b"\xff" + SExp.to(coin_spend.coin.amount).as_bin()
         r += b"\xff" + bytes(coin_spend.solution)
         r += b"\x80"
-    r += b"\x80"
     return r
 
 
+def spend_bundle_to_serialized_coin_spend_entry_list(bundle: SpendBundle) -> bytes:
+    return serialized_coin_spend_entries(bundle.coin_spends) + b"\x80"
+
+
 def simple_solution_generator(bundle: SpendBundle) -> BlockGenerator:
     """
     Simply quotes the solutions we know.
     """
-    cse_list = spend_bundle_to_serialized_coin_spend_entry_list(bundle)
+    return simple_solution_generator_from_entries(serialized_coin_spend_entries(bundle.coin_spends))
+
+
+def simple_solution_generator_from_entries(coin_spend_entries: bytes) -> BlockGenerator:
+    """
+    Like simple_solution_generator, from the output of serialized_coin_spend_entries
+    """
+    cse_list = coin_spend_entries + b"\x80"
     block_program = b"\xff"
 
     block_program += SExp.to(binutils.assemble("#q")).as_bin()
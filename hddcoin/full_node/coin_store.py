@@ -1,4 +1,4 @@
-from typing import List, Optional, Set, Dict
+from typing import Any, List, Optional, Set, Dict, Tuple
 import aiosqlite
 from hddcoin.protocols.wallet_protocol import CoinState
 from hddcoin.types.blockchain_format.coin import Coin
@@ -33,20 +33,38 @@ class CoinStore:
         self.coin_record_db = db_wrapper.db
         # the coin_name is unique in this table because the CoinStore always
         # only represent a single peak
-        await self.coin_record_db.execute(
-            (
-                "CREATE TABLE IF NOT EXISTS coin_record("
-                "coin_name text PRIMARY KEY,"
-                " confirmed_index bigint,"
-                " spent_index bigint,"
-                " spent int,"
-                " coinbase int,"
-                " puzzle_hash text,"
-                " coin_parent text,"
-                " amount blob,"
-                " timestamp bigint)"
+        if self.db_wrapper.db_version == 2:
+            # the rows are small and always looked up by coin_name, so they're
+            # stored clustered by the primary key
+            await self.coin_record_db.execute(
+                (
+                    "CREATE TABLE IF NOT EXISTS coin_record("
+                    "coin_name blob PRIMARY KEY,"
+                    " confirmed_index bigint,"
+                    " spent_index bigint,"
+                    " spent int,"
+                    " coinbase int,"
+                    " puzzle_hash blob,"
+                    " coin_parent blob,"
+                    " amount blob,"
+                    " timestamp bigint) WITHOUT ROWID"
+                )
+            )
+        else:
+            await self.coin_record_db.execute(
+                (
+                    "CREATE TABLE IF NOT EXISTS coin_record("
+                    "coin_name text PRIMARY KEY,"
+                    " confirmed_index bigint,"
+                    " spent_index bigint,"
+                    " spent int,"
+                    " coinbase int,"
+                    " puzzle_hash text,"
+                    " coin_parent text,"
+                    " amount blob,"
+                    " timestamp bigint)"
+                )
             )
-        )
 
         # Useful for reorg lookups
         await self.coin_record_db.execute(
@@ -83,35 +101,7 @@ class CoinStore:
 
         start = time()
 
-        additions = []
-
-        for coin in tx_additions:
-            record: CoinRecord = CoinRecord(
-                coin,
-                height,
-                uint32(0),
-                False,
-                False,
-                timestamp,
-            )
-            additions.append(record)
-
-        if height == 0:
-            assert len(included_reward_coins) == 0
-        else:
-            assert len(included_reward_coins) >= 2
-
-        for coin in included_reward_coins:
-            reward_coin_r: CoinRecord = CoinRecord(
-                coin,
-                height,
-                uint32(0),
-                False,
-                True,
-                timestamp,
-            )
-            additions.append(reward_coin_r)
-
+        additions = self._block_coin_records(height, timestamp, included_reward_coins, tx_additions)
         await self._add_coin_records(additions)
         await self._set_spent(tx_removals, height)
 
@@ -125,12 +115,63 @@ class CoinStore:
 
         return additions
 
+    async def new_blocks(
+        self,
+        blocks: List[Tuple[uint32, uint64, Set[Coin], List[Coin], List[bytes32]]],
+    ) -> List[List[CoinRecord]]:
+        """
+        Batched version of new_block, for a run of consecutive transaction blocks. Each entry is
+        (height, timestamp, included_reward_coins, tx_additions, tx_removals), in height order.
+        The additions of the whole batch are written with a single executemany, followed by the
+        removals, so coins created and spent within the batch end up spent.
+        Returns the list of added CoinRecords for each block
+        """
+
+        start = time()
+
+        all_additions: List[List[CoinRecord]] = []
+        spent_updates: List[Tuple[bytes32, uint32]] = []
+        for height, timestamp, included_reward_coins, tx_additions, tx_removals in blocks:
+            all_additions.append(self._block_coin_records(height, timestamp, included_reward_coins, tx_additions))
+            spent_updates.extend((name, height) for name in tx_removals)
+
+        await self._add_coin_records([record for additions in all_additions for record in additions])
+        await self._set_spent_at_heights(spent_updates)
+
+        end = time()
+        log.log(
+            logging.WARNING if end - start > 10 else logging.DEBUG,
+            f"It took {end - start:0.2f}s to apply {len(blocks)} blocks with "
+            + f"{sum(len(a) for a in all_additions)} additions and {len(spent_updates)} removals "
+            + "to the coin store. Make sure blockchain database is on a fast drive",
+        )
+
+        return all_additions
+
+    def _block_coin_records(
+        self,
+        height: uint32,
+        timestamp: uint64,
+        included_reward_coins: Set[Coin],
+        tx_additions: List[Coin],
+    ) -> List[CoinRecord]:
+        if height == 0:
+            assert len(included_reward_coins) == 0
+        else:
+            assert len(included_reward_coins) >= 2
+
+        additions = [CoinRecord(coin, height, uint32(0), False, False, timestamp) for coin in tx_additions]
+        additions.extend(CoinRecord(coin, height, uint32(0), False, True, timestamp) for coin in included_reward_coins)
+        return additions
+
     # Checks DB and DiffStores for CoinRecord with coin_name and returns it
     async def get_coin_record(self, coin_name: bytes32) -> Optional[CoinRecord]:
         cached = self.coin_record_cache.get(coin_name)
         if cached is not None:
             return cached
-        cursor = await self.coin_record_db.execute("SELECT * from coin_record WHERE coin_name=?", (coin_name.hex(),))
+        cursor = await self.coin_record_db.execute(
+            "SELECT * from coin_record WHERE coin_name=?", (self.maybe_to_hex(coin_name),)
+        )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
@@ -180,7 +221,7 @@ class CoinStore:
             f"SELECT * from coin_record INDEXED BY coin_puzzle_hash WHERE puzzle_hash=? "
             f"AND confirmed_index>=? AND confirmed_index<? "
             f"{'' if include_spent_coins else 'AND spent=0'}",
-            (puzzle_hash.hex(), start_height, end_height),
+            (self.maybe_to_hex(puzzle_hash), start_height, end_height),
         )
         rows = await cursor.fetchall()
 
@@ -201,7 +242,7 @@ class CoinStore:
             return []
 
         coins = set()
-        puzzle_hashes_db = tuple([ph.hex() for ph in puzzle_hashes])
+        puzzle_hashes_db = tuple([self.maybe_to_hex(ph) for ph in puzzle_hashes])
         cursor = await self.coin_record_db.execute(
             f"SELECT * from coin_record INDEXED BY coin_puzzle_hash "
             f'WHERE puzzle_hash in ({"?," * (len(puzzle_hashes) - 1)}?) '
@@ -229,7 +270,7 @@ class CoinStore:
             return []
 
         coins = set()
-        names_db = tuple([name.hex() for name in names])
+        names_db = tuple([self.maybe_to_hex(name) for name in names])
         cursor = await self.coin_record_db.execute(
             f'SELECT * from coin_record WHERE coin_name in ({"?," * (len(names) - 1)}?) '
             f"AND confirmed_index>=? AND confirmed_index<? "
@@ -245,8 +286,22 @@ class CoinStore:
 
         return list(coins)
 
+    def maybe_from_hex(self, field: Any) -> bytes:
+        if self.db_wrapper.db_version == 2:
+            return field
+        else:
+            return bytes.fromhex(field)
+
+    def maybe_to_hex(self, field: bytes) -> Any:
+        if self.db_wrapper.db_version == 2:
+            return field
+        else:
+            return field.hex()
+
     def row_to_coin(self, row) -> Coin:
-        return Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
+        return Coin(
+            bytes32(self.maybe_from_hex(row[6])), bytes32(self.maybe_from_hex(row[5])), uint64.from_bytes(row[7])
+        )
 
     def row_to_coin_state(self, row):
         coin = self.row_to_coin(row)
@@ -266,7 +321,7 @@ class CoinStore:
             return []
 
         coins = set()
-        puzzle_hashes_db = tuple([ph.hex() for ph in puzzle_hashes])
+        puzzle_hashes_db = tuple([self.maybe_to_hex(ph) for ph in puzzle_hashes])
         cursor = await self.coin_record_db.execute(
             f'SELECT * from coin_record WHERE puzzle_hash in ({"?," * (len(puzzle_hashes) - 1)}?) '
             f"AND confirmed_index>=? AND confirmed_index<? "
@@ -293,7 +348,7 @@ class CoinStore:
             return []
 
         coins = set()
-        parent_ids_db = tuple([pid.hex() for pid in parent_ids])
+        parent_ids_db = tuple([self.maybe_to_hex(pid) for pid in parent_ids])
         cursor = await self.coin_record_db.execute(
             f'SELECT * from coin_record WHERE coin_parent in ({"?," * (len(parent_ids) - 1)}?) '
             f"AND confirmed_index>=? AND confirmed_index<? "
@@ -320,7 +375,7 @@ class CoinStore:
             return []
 
         coins = set()
-        coin_ids_db = tuple([pid.hex() for pid in coin_ids])
+        coin_ids_db = tuple([self.maybe_to_hex(pid) for pid in coin_ids])
         cursor = await self.coin_record_db.execute(
             f'SELECT * from coin_record WHERE coin_name in ({"?," * (len(coin_ids) - 1)}?) '
             f"AND confirmed_index>=? AND confirmed_index<? "
@@ -397,21 +452,25 @@ class CoinStore:
 
         values = []
         for record in records:
-            self.coin_record_cache.put(record.coin.name(), record)
+            name = record.coin.name()
+            self.coin_record_cache.put(name, record)
             values.append(
                 (
-                    record.coin.name().hex(),
+                    self.maybe_to_hex(name),
                     record.confirmed_block_index,
                     record.spent_block_index,
                     int(record.spent),
                     int(record.coinbase),
-                    record.coin.puzzle_hash.hex(),
-                    record.coin.parent_coin_info.hex(),
+                    self.maybe_to_hex(record.coin.puzzle_hash),
+                    self.maybe_to_hex(record.coin.parent_coin_info),
                     bytes(record.coin.amount),
                     record.timestamp,
                 )
             )
 
+        # coin names are uniformly distributed, inserting them in key order keeps
+        # the primary key b-tree updates localized
+        values.sort()
         cursor = await self.coin_record_db.executemany(
             "INSERT INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
             values,
@@ -420,16 +479,19 @@ class CoinStore:
 
     # Update coin_record to be spent in DB
     async def _set_spent(self, coin_names: List[bytes32], index: uint32):
+        await self._set_spent_at_heights([(coin_name, index) for coin_name in coin_names])
+
+    async def _set_spent_at_heights(self, spends: List[Tuple[bytes32, uint32]]):
 
         # if this coin is in the cache, mark it as spent in there
         updates = []
-        for coin_name in coin_names:
+        for coin_name, index in spends:
             r = self.coin_record_cache.get(coin_name)
             if r is not None:
                 self.coin_record_cache.put(
                     r.name, CoinRecord(r.coin, r.confirmed_block_index, index, True, r.coinbase, r.timestamp)
                 )
-            updates.append((index, coin_name.hex()))
+            updates.append((index, self.maybe_to_hex(coin_name)))
 
         await self.coin_record_db.executemany(
             "UPDATE OR FAIL coin_record SET spent=1,spent_index=? WHERE coin_name=?", updates
@@ -0,0 +1,175 @@
+import random
+from typing import Generic, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+MAX_LEVEL = 32
+# probability of a node being linked on the next level too
+LEVEL_PROBABILITY = 0.25
+
+Key = Tuple[float, int]
+
+
+class _Node(Generic[T]):
+    __slots__ = ("key", "value", "cost", "next", "span", "prev")
+
+    def __init__(self, key: Key, value: Optional[T], cost: int, level: int):
+        self.key = key
+        self.value = value
+        self.cost = cost
+        self.next: List[Optional["_Node[T]"]] = [None] * level
+        # span[level] is the total cost of the nodes after this one, up to and including next[level] (or up to the
+        # end of the list if there is no next node)
+        self.span: List[int] = [0] * level
+        self.prev: Optional["_Node[T]"] = None
+
+
+class FeeRateIndex(Generic[T]):
+    """
+    A skip list of values ordered by (fee per cost, sequence number), where every link also stores the total cost
+    it skips. Insertion, removal and finding the value at which the cumulative cost from the lowest fee rate
+    reaches a given amount are O(log n).
+    """
+
+    def __init__(self) -> None:
+        self._head: _Node[T] = _Node((0.0, 0), None, 0, MAX_LEVEL)
+        self._tail: Optional[_Node[T]] = None
+        self._level = 1
+        self._length = 0
+        self._total_cost = 0
+        self._random = random.Random()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def total_cost(self) -> int:
+        return self._total_cost
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < LEVEL_PROBABILITY:
+            level += 1
+        return level
+
+    def _find(self, key: Key) -> Tuple[List[_Node[T]], List[int], int]:
+        # Returns the last node before key on every level, the cost up to and including each of them, and the cost
+        # up to and including the last node before key
+        update: List[_Node[T]] = [self._head] * MAX_LEVEL
+        update_cost: List[int] = [0] * MAX_LEVEL
+        node = self._head
+        cost = 0
+        for level in reversed(range(self._level)):
+            next_node = node.next[level]
+            while next_node is not None and next_node.key < key:
+                cost += node.span[level]
+                node = next_node
+                next_node = node.next[level]
+            update[level] = node
+            update_cost[level] = cost
+        return update, update_cost, cost
+
+    def insert(self, key: Key, value: T, cost: int) -> None:
+        update, update_cost, before = self._find(key)
+        level = self._random_level()
+        if level > self._level:
+            for new_level in range(self._level, level):
+                # the head skips the whole list on the new levels
+                self._head.span[new_level] = self._total_cost
+            self._level = level
+        node: _Node[T] = _Node(key, value, cost, level)
+        for i in range(self._level):
+            previous = update[i]
+            skipped = before - update_cost[i]
+            if i < level:
+                node.next[i] = previous.next[i]
+                node.span[i] = previous.span[i] - skipped
+                previous.next[i] = node
+                previous.span[i] = skipped + cost
+            else:
+                previous.span[i] += cost
+        node.prev = update[0] if update[0] is not self._head else None
+        if node.next[0] is not None:
+            node.next[0].prev = node
+        else:
+            self._tail = node
+        self._length += 1
+        self._total_cost += cost
+
+    def remove(self, key: Key) -> T:
+        update, _, _ = self._find(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self._level):
+            previous = update[i]
+            if previous.next[i] is node:
+                previous.span[i] += node.span[i] - node.cost
+                previous.next[i] = node.next[i]
+            else:
+                previous.span[i] -= node.cost
+        if node.next[0] is not None:
+            node.next[0].prev = node.prev
+        else:
+            self._tail = node.prev
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._length -= 1
+        self._total_cost -= node.cost
+        assert node.value is not None
+        return node.value
+
+    def first(self) -> Optional[Tuple[Key, T]]:
+        """
+        Returns the key and value with the lowest fee rate
+        """
+        node = self._head.next[0]
+        if node is None:
+            return None
+        assert node.value is not None
+        return node.key, node.value
+
+    def find_cumulative_cost(self, cost: int) -> Optional[Tuple[Key, T]]:
+        """
+        Returns the key and value of the first node at which the total cost of the nodes from the lowest fee rate
+        up to and including it is at least cost, or None if the total cost of all nodes is lower
+        """
+        node = self._head
+        cumulative = 0
+        for level in reversed(range(self._level)):
+            next_node = node.next[level]
+            while next_node is not None and cumulative + node.span[level] < cost:
+                cumulative += node.span[level]
+                node = next_node
+                next_node = node.next[level]
+        found = node.next[0]
+        if found is None:
+            return None
+        assert found.value is not None
+        return found.key, found.value
+
+    def items(self) -> Iterator[Tuple[Key, T]]:
+        """
+        Iterates from the lowest fee rate to the highest
+        """
+        node = self._head.next[0]
+        while node is not None:
+            assert node.value is not None
+            yield node.key, node.value
+            node = node.next[0]
+
+    def items_descending(self) -> Iterator[Tuple[Key, T]]:
+        """
+        Iterates from the highest fee rate to the lowest, values with the same fee rate in the order they were
+        inserted in
+        """
+        node = self._tail
+        while node is not None:
+            # collects the values with the same fee rate, they're yielded in ascending sequence order
+            same_rate: List[_Node[T]] = []
+            fee_rate = node.key[0]
+            while node is not None and node.key[0] == fee_rate:
+                same_rate.append(node)
+                node = node.prev
+            for same in reversed(same_rate):
+                assert same.value is not None
+                yield same.key, same.value
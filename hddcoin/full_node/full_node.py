@@ -18,6 +18,7 @@ from hddcoin.consensus.blockchain_interface import BlockchainInterface
 from hddcoin.consensus.constants import ConsensusConstants
 from hddcoin.consensus.cost_calculator import NPCResult
 from hddcoin.consensus.difficulty_adjustment import get_next_sub_slot_iters_and_difficulty
+from hddcoin.consensus.full_block_to_block_record import block_to_block_record
 from hddcoin.consensus.make_sub_epoch_summary import next_sub_epoch_summary
 from hddcoin.consensus.multiprocess_validation import PreValidationResult
 from hddcoin.consensus.pot_iterations import calculate_sp_iters
@@ -29,6 +30,7 @@ from hddcoin.full_node.full_node_store import FullNodeStore, FullNodeStorePeakRe
 from hddcoin.full_node.hint_store import HintStore
 from hddcoin.full_node.mempool_manager import MempoolManager
 from hddcoin.full_node.signage_point import SignagePoint
+from hddcoin.full_node.sync_scheduler import BlockRecordOverlay, SyncScheduler
 from hddcoin.full_node.sync_store import SyncStore
 from hddcoin.full_node.weight_proof import WeightProofHandler
 from hddcoin.protocols import farmer_protocol, full_node_protocol, timelord_protocol, wallet_protocol
@@ -62,10 +64,12 @@ from hddcoin.util.bech32m import encode_puzzle_hash
 from hddcoin.util.check_fork_next_block import check_fork_next_block
 from hddcoin.util.condition_tools import pkm_pairs
 from hddcoin.util.db_wrapper import DBWrapper
+from hddcoin.util.db_version import lookup_db_version
 from hddcoin.util.errors import ConsensusError, Err, ValidationError
 from hddcoin.util.ints import uint8, uint32, uint64, uint128
 from hddcoin.util.path import mkdir, path_from_root
 from hddcoin.util.safe_cancel_task import cancel_task_safe
+from hddcoin.util.shared_pairing_cache import SharedPairingCache, shared_memory
 from hddcoin.util.profiler import profile_task
 from datetime import datetime
 from hddcoin.util.db_synchronous import db_synchronous_on
@@ -120,6 +124,7 @@ class FullNode:
         self.state_changed_callback: Optional[Callable] = None
         self.full_node_peers = None
         self.sync_store = None
+        self.sync_scheduler: Optional[SyncScheduler] = None
         self.signage_point_times = [time.time() for _ in range(self.constants.NUM_SPS_SUB_SLOT)]
         self.full_node_store = FullNodeStore(self.constants)
         self.uncompact_task = None
@@ -128,6 +133,8 @@ class FullNode:
 
         # Used for metrics
         self.dropped_tx: Set[bytes32] = set()
+        # BLS pairings shared by this process and the transaction validation workers
+        self.pairing_cache: Optional[SharedPairingCache] = None
         self.not_dropped_tx = 0
 
         self._ui_tasks = set()
@@ -173,15 +180,29 @@ class FullNode:
                 log.close()
 
             await self.connection.set_trace_callback(sql_trace_callback)
-        self.db_wrapper = DBWrapper(self.connection)
+        db_version: int = await lookup_db_version(self.connection)
+        self.log.info(f"using blockchain database {self.db_path}, which is version {db_version}")
+        self.db_wrapper = DBWrapper(self.connection, db_version=db_version)
         self.block_store = await BlockStore.create(self.db_wrapper)
         self.sync_store = await SyncStore.create()
         self.hint_store = await HintStore.create(self.db_wrapper)
         self.coin_store = await CoinStore.create(self.db_wrapper)
         self.log.info("Initializing blockchain from disk")
         start_time = time.time()
-        self.blockchain = await Blockchain.create(self.coin_store, self.block_store, self.constants, self.hint_store)
-        self.mempool_manager = MempoolManager(self.coin_store, self.constants)
+        self.blockchain = await Blockchain.create(
+            self.coin_store, self.block_store, self.constants, self.hint_store, self.db_path
+        )
+        pairing_cache_slots = self.config.get("shared_pairing_cache_slots", 65536)
+        if pairing_cache_slots > 0 and shared_memory is not None:
+            self.pairing_cache = SharedPairingCache.create(pairing_cache_slots)
+            cached_bls.set_shared_cache(self.pairing_cache)
+        self.mempool_manager = MempoolManager(
+            self.coin_store,
+            self.constants,
+            self.config.get("mempool_validation_workers", 2),
+            self.config.get("mempool_validation_batch_size", 16),
+            None if self.pairing_cache is None else self.pairing_cache.name,
+        )
 
         # Blocks are validated under high priority, and transactions under low priority. This guarantees blocks will
         # be validated first.
@@ -701,6 +722,11 @@ class FullNode:
         # same for mempool_manager
         if hasattr(self, "mempool_manager"):
             self.mempool_manager.shut_down()
+        if self.pairing_cache is not None:
+            if cached_bls.SHARED_CACHE is self.pairing_cache:
+                cached_bls.set_shared_cache(None)
+            self.pairing_cache.close()
+            self.pairing_cache = None
 
         if self.full_node_peers is not None:
             asyncio.create_task(self.full_node_peers.close())
@@ -858,61 +884,140 @@ class FullNode:
         peak_hash: bytes32,
         summaries: List[SubEpochSummary],
     ):
-        buffer_size = 4
         self.log.info(f"Start syncing from fork point at {fork_point_height} up to {target_peak_sb_height}")
         peers_with_peak = self.get_peers_with_peak(peak_hash)
         fork_point_height = await check_fork_next_block(
             self.blockchain, fork_point_height, peers_with_peak, node_next_block_check
         )
-        batch_size = self.constants.MAX_BLOCK_COUNT_PER_REQUESTS
+        scheduler = SyncScheduler(
+            fork_point_height,
+            target_peak_sb_height,
+            self.constants.MAX_BLOCK_COUNT_PER_REQUESTS,
+            self.config.get("sync_batches_in_flight", 8),
+        )
+        self.sync_scheduler = scheduler
 
-        async def fetch_block_batches(batch_queue, peers_with_peak: List[ws.WSHDDcoinConnection]):
+        async def fetch_blocks(peer: ws.WSHDDcoinConnection):
+            stats = scheduler.stats(peer.peer_node_id)
+            start_height: Optional[int] = None
             try:
-                for start_height in range(fork_point_height, target_peak_sb_height, batch_size):
-                    end_height = min(target_peak_sb_height, start_height + batch_size)
-                    request = RequestBlocks(uint32(start_height), uint32(end_height), True)
-                    fetched = False
-                    for peer in random.sample(peers_with_peak, len(peers_with_peak)):
-                        if peer.closed:
-                            peers_with_peak.remove(peer)
-                            continue
-                        response = await peer.request_blocks(request, timeout=10)
-                        if response is None:
-                            await peer.close()
-                            peers_with_peak.remove(peer)
-                        elif isinstance(response, RespondBlocks):
-                            await batch_queue.put((peer, response.blocks))
-                            fetched = True
-                            break
-                    if fetched is False:
-                        self.log.error(f"failed fetching {start_height} to {end_height} from peers")
-                        await batch_queue.put(None)
+                while not peer.closed:
+                    batch = await scheduler.take(peer.peer_node_id)
+                    if batch is None:
                         return
+                    start_height, end_height = batch
+                    request = RequestBlocks(uint32(start_height), uint32(end_height), True)
+                    request_start = time.monotonic()
+                    response = await peer.request_blocks(request, timeout=10)
+                    if isinstance(response, RespondBlocks) and len(response.blocks) == end_height - start_height + 1:
+                        stats.add_request(len(response.blocks), time.monotonic() - request_start)
+                        scheduler.fetched(start_height, peer, response.blocks)
+                        start_height = None
+                        continue
+                    stats.add_failure()
+                    if response is None:
+                        await peer.close()
+                    # a peer that doesn't send the blocks isn't asked again during this sync
+                    return
+            except Exception as e:
+                self.log.error(f"Exception fetching blocks from peer {peer.get_peer_logging()}: {e}")
+            finally:
+                if start_height is not None:
+                    scheduler.failed(start_height, peer.peer_node_id)
+
+        async def fetch_block_batches():
+            # one task per peer with the peak, every peer takes the next range when it's done with the previous one
+            fetch_tasks: Dict[bytes32, asyncio.Task] = {}
+            try:
+                while not scheduler.done():
                     if self.sync_store.peers_changed.is_set():
-                        peers_with_peak = self.get_peers_with_peak(peak_hash)
+                        peers_with_peak.extend(self.get_peers_with_peak(peak_hash))
                         self.sync_store.peers_changed.clear()
-            except Exception as e:
-                self.log.error(f"Exception fetching {start_height} to {end_height} from peer {e}")
+                    for peer in peers_with_peak:
+                        if peer.peer_node_id not in fetch_tasks and not peer.closed:
+                            fetch_tasks[peer.peer_node_id] = asyncio.create_task(fetch_blocks(peer))
+                    peers_with_peak.clear()
+                    if all(task.done() for task in fetch_tasks.values()):
+                        self.log.error(f"failed fetching blocks from {scheduler.to_json_dict()['next_height']}")
+                        scheduler.fail()
+                        return
+                    await asyncio.wait(list(fetch_tasks.values()), timeout=1)
             finally:
-                # finished signal with None
-                await batch_queue.put(None)
+                for task in fetch_tasks.values():
+                    task.cancel()
+
+        async def pre_validate_next(
+            blocks: List[FullBlock],
+            pre_validation_results: List[PreValidationResult],
+            next_blocks: List[FullBlock],
+        ) -> Optional[List[PreValidationResult]]:
+            # Pre-validates the next batch while the previous one is still being added, on top of the block
+            # records of the previous batch. This gives up (and the batch is pre-validated again once the
+            # previous one is added) if anything doesn't line up.
+            first_height = blocks[0].height
+            for block in next_blocks:
+                if any(
+                    first_height <= height < next_blocks[0].height for height in block.transactions_generator_ref_list
+                ):
+                    # the generators of the previous batch aren't in the database yet
+                    return None
+            try:
+                overlay = BlockRecordOverlay(self.blockchain)
+                for block, result in zip(blocks, pre_validation_results):
+                    if overlay.contains_block(block.header_hash):
+                        continue
+                    if result.error is not None or result.required_iters is None:
+                        return None
+                    overlay.add_pending(
+                        block_to_block_record(self.constants, overlay, result.required_iters, block, None)
+                    )
+                results = await self.blockchain.pre_validate_blocks_multiprocessing(
+                    next_blocks, {}, wp_summaries=summaries, block_records=overlay
+                )
+            except Exception as e:
+                self.log.debug(f"Pre-validation of the next batch failed, pre-validating it again: {e}")
+                return None
+            if results is None or any(result.error is not None for result in results):
+                return None
+            return results
 
-        async def validate_block_batches(batch_queue):
+        async def validate_block_batches():
             advanced_peak = False
-            while True:
-                res = await batch_queue.get()
-                if res is None:
-                    self.log.debug("done fetching blocks")
-                    return
-                peer, blocks = res
+            batch = await scheduler.next_batch()
+            pre_validation_results: Optional[List[PreValidationResult]] = None
+            while batch is not None:
+                peer, blocks = batch
                 start_height = blocks[0].height
                 end_height = blocks[-1].height
-                success, advanced_peak, fork_height, coin_states = await self.receive_block_batch(
-                    blocks, peer, None if advanced_peak else uint32(fork_point_height), summaries
+                if pre_validation_results is None:
+                    pre_validation_results = await self.blockchain.pre_validate_blocks_multiprocessing(
+                        blocks, {}, wp_summaries=summaries
+                    )
+                add_task = asyncio.create_task(
+                    self.receive_block_batch(
+                        blocks,
+                        peer,
+                        None if advanced_peak else uint32(fork_point_height),
+                        summaries,
+                        pre_validation_results,
+                    )
                 )
+                # the next batch is pre-validated while this one is written to the database
+                next_batch = await scheduler.next_batch()
+                next_pre_validation: Optional[asyncio.Task] = None
+                if next_batch is not None and pre_validation_results is not None:
+                    next_pre_validation = asyncio.create_task(
+                        pre_validate_next(blocks, pre_validation_results, next_batch[1])
+                    )
+                try:
+                    success, advanced_peak, fork_height, coin_states = await add_task
+                except Exception:
+                    if next_pre_validation is not None:
+                        next_pre_validation.cancel()
+                    raise
                 if success is False:
-                    if peer in peers_with_peak:
-                        peers_with_peak.remove(peer)
+                    if next_pre_validation is not None:
+                        next_pre_validation.cancel()
                     await peer.close(600)
                     raise ValueError(f"Failed to validate block batch {start_height} to {end_height}")
                 self.log.info(f"Added blocks {start_height} to {end_height}")
@@ -922,16 +1027,19 @@ class FullNode:
                     await self.update_wallets(peak.height, fork_height, peak.header_hash, coin_states)
                 self.blockchain.clean_block_record(end_height - self.constants.BLOCKS_CACHE_SIZE)
 
-        loop = asyncio.get_event_loop()
-        batch_queue: asyncio.Queue[Tuple[ws.WSHDDcoinConnection, List[FullBlock]]] = asyncio.Queue(
-            loop=loop, maxsize=buffer_size
-        )
-        fetch_task = asyncio.Task(fetch_block_batches(batch_queue, peers_with_peak))
-        validate_task = asyncio.Task(validate_block_batches(batch_queue))
+                pre_validation_results = None
+                if next_pre_validation is not None:
+                    pre_validation_results = await next_pre_validation
+                batch = next_batch
+            self.log.debug("done fetching blocks")
+
+        fetch_task = asyncio.Task(fetch_block_batches())
+        validate_task = asyncio.Task(validate_block_batches())
         try:
             await asyncio.gather(fetch_task, validate_task)
         except Exception as e:
             assert validate_task.done()
+            scheduler.fail()
             fetch_task.cancel()  # no need to cancel validate_task, if we end up here validate_task is already done
             self.log.error(f"sync from fork point failed err: {e}")
 
@@ -1003,7 +1111,11 @@ class FullNode:
         peer: ws.WSHDDcoinConnection,
         fork_point: Optional[uint32],
         wp_summaries: Optional[List[SubEpochSummary]] = None,
+        all_pre_validation_results: Optional[List[PreValidationResult]] = None,
     ) -> Tuple[bool, bool, Optional[uint32], Tuple[List[CoinRecord], Dict[bytes, Dict[bytes, CoinRecord]]]]:
+        """
+        all_pre_validation_results are the pre-validation results of all_blocks, if they were pre-validated already
+        """
         advanced_peak = False
         fork_height: Optional[uint32] = uint32(0)
 
@@ -1016,9 +1128,13 @@ class FullNode:
             return True, False, fork_height, ([], {})
 
         pre_validate_start = time.time()
-        pre_validation_results: Optional[
-            List[PreValidationResult]
-        ] = await self.blockchain.pre_validate_blocks_multiprocessing(blocks_to_validate, {}, wp_summaries=wp_summaries)
+        pre_validation_results: Optional[List[PreValidationResult]]
+        if all_pre_validation_results is not None:
+            pre_validation_results = all_pre_validation_results[len(all_blocks) - len(blocks_to_validate) :]
+        else:
+            pre_validation_results = await self.blockchain.pre_validate_blocks_multiprocessing(
+                blocks_to_validate, {}, wp_summaries=wp_summaries
+            )
         pre_validate_end = time.time()
         if pre_validate_end - pre_validate_start > 10:
             self.log.warning(f"Block pre-validation time: {pre_validate_end - pre_validate_start:0.2f} seconds")
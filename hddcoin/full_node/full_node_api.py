@@ -12,7 +12,8 @@ import hddcoin.server.ws_connection as ws
 from hddcoin.consensus.block_creation import create_unfinished_block
 from hddcoin.consensus.block_record import BlockRecord
 from hddcoin.consensus.pot_iterations import calculate_ip_iters, calculate_iterations_quality, calculate_sp_iters
-from hddcoin.full_node.bundle_tools import best_solution_generator_from_template, simple_solution_generator
+from hddcoin.full_node.block_template import BlockTemplate
+from hddcoin.full_node.bundle_tools import compressed_spend_bundle_solution
 from hddcoin.full_node.full_node import FullNode
 from hddcoin.full_node.mempool_check_conditions import get_puzzle_and_solution_for_coin
 from hddcoin.full_node.signage_point import SignagePoint
@@ -42,17 +43,24 @@ from hddcoin.types.peer_info import PeerInfo
 from hddcoin.types.transaction_queue_entry import TransactionQueueEntry
 from hddcoin.types.unfinished_block import UnfinishedBlock
 from hddcoin.util.api_decorators import api_request, peer_required, bytes_required, execute_task, reply_type
-from hddcoin.util.generator_tools import get_block_header
+from hddcoin.util.generator_tools import get_block_header_bytes
 from hddcoin.util.hash import std_hash
 from hddcoin.util.ints import uint8, uint32, uint64, uint128
+from hddcoin.util.lru_cache import LRUCache
 from hddcoin.util.merkle_set import MerkleSet
+from hddcoin.util.streamable_view import StreamableView
 
 
 class FullNodeAPI:
     full_node: FullNode
+    served_blocks_cache: LRUCache
 
     def __init__(self, full_node) -> None:
         self.full_node = full_node
+        # Serialized respond_blocks payloads that were recently sent, so peers syncing from us at the same
+        # time don't each cost a database read. They are keyed by the start height and the header hash at
+        # the end of the range, which commits to every block in the range.
+        self.served_blocks_cache = LRUCache(self.full_node.config.get("served_blocks_cache_size", 16))
 
     def _set_state_changed_callback(self, callback: Callable):
         self.full_node.state_changed_callback = callback
@@ -310,11 +318,19 @@ class FullNodeAPI:
             msg = make_msg(ProtocolMessageTypes.reject_block, reject)
             return msg
         header_hash = self.full_node.blockchain.height_to_hash(request.height)
-        block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(header_hash)
+        if request.include_transaction_block:
+            # RespondBlock is just the block, the stored bytes can be sent as they are
+            block_bytes: Optional[bytes] = await self.full_node.block_store.get_full_block_bytes(header_hash)
+            if block_bytes is not None:
+                return make_msg(ProtocolMessageTypes.respond_block, block_bytes)
+            reject = RejectBlock(request.height)
+            msg = make_msg(ProtocolMessageTypes.reject_block, reject)
+            return msg
+
+        # the generator is cut out of the stored bytes, the rest of the block isn't parsed
+        block: Optional[StreamableView] = await self.full_node.block_store.get_full_block_view(header_hash)
         if block is not None:
-            if not request.include_transaction_block and block.transactions_generator is not None:
-                block = dataclasses.replace(block, transactions_generator=None)
-            return make_msg(ProtocolMessageTypes.respond_block, full_node_protocol.RespondBlock(block))
+            return make_msg(ProtocolMessageTypes.respond_block, block.replace(transactions_generator=None))
         reject = RejectBlock(request.height)
         msg = make_msg(ProtocolMessageTypes.reject_block, reject)
         return msg
@@ -332,44 +348,40 @@ class FullNodeAPI:
                 msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
                 return msg
 
-        if not request.include_transaction_block:
-            blocks: List[FullBlock] = []
-            for i in range(request.start_height, request.end_height + 1):
-                block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(
-                    self.full_node.blockchain.height_to_hash(uint32(i))
-                )
-                if block is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                    return msg
-                block = dataclasses.replace(block, transactions_generator=None)
-                blocks.append(block)
-            msg = make_msg(
-                ProtocolMessageTypes.respond_blocks,
-                full_node_protocol.RespondBlocks(request.start_height, request.end_height, blocks),
-            )
-        else:
-            blocks_bytes: List[bytes] = []
-            for i in range(request.start_height, request.end_height + 1):
-                block_bytes: Optional[bytes] = await self.full_node.block_store.get_full_block_bytes(
-                    self.full_node.blockchain.height_to_hash(uint32(i))
-                )
-                if block_bytes is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                    return msg
-
-                blocks_bytes.append(block_bytes)
-
-            respond_blocks_manually_streamed: bytes = (
-                bytes(uint32(request.start_height))
-                + bytes(uint32(request.end_height))
-                + len(blocks_bytes).to_bytes(4, "big", signed=False)
-            )
-            for block_bytes in blocks_bytes:
-                respond_blocks_manually_streamed += block_bytes
-            msg = make_msg(ProtocolMessageTypes.respond_blocks, respond_blocks_manually_streamed)
+        end_hash: bytes32 = self.full_node.blockchain.height_to_hash(request.end_height)
+        cache_key = (request.start_height, end_hash, request.include_transaction_block)
+        cached: Optional[bytes] = self.served_blocks_cache.get(cache_key)
+        if cached is not None:
+            return make_msg(ProtocolMessageTypes.respond_blocks, cached)
+
+        header_hashes: List[bytes32] = [
+            self.full_node.blockchain.height_to_hash(uint32(i))
+            for i in range(request.start_height, request.end_height + 1)
+        ]
+        # the RespondBlocks message is streamed by hand from the stored block bytes, without
+        # deserializing them into FullBlocks first
+        try:
+            if request.include_transaction_block:
+                blocks_bytes: List[bytes] = await self.full_node.block_store.get_block_bytes_by_hash(header_hashes)
+            else:
+                # only the generators are cut out of the blocks
+                views = await self.full_node.block_store.get_block_views_by_hash(header_hashes)
+                blocks_bytes = [view.replace(transactions_generator=None) for view in views]
+        except ValueError:
+            reject = RejectBlocks(request.start_height, request.end_height)
+            msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
+            return msg
+        respond_blocks: bytes = b"".join(
+            [
+                bytes(uint32(request.start_height)),
+                bytes(uint32(request.end_height)),
+                len(blocks_bytes).to_bytes(4, "big", signed=False),
+                *blocks_bytes,
+            ]
+        )
 
+        self.served_blocks_cache.put(cache_key, respond_blocks)
+        msg = make_msg(ProtocolMessageTypes.respond_blocks, respond_blocks)
         return msg
 
     @api_request
@@ -744,30 +756,28 @@ class FullNodeAPI:
                     curr_l_tb: BlockRecord = peak
                     while not curr_l_tb.is_transaction_block:
                         curr_l_tb = self.full_node.blockchain.block_record(curr_l_tb.prev_hash)
+                    block_template: Optional[BlockTemplate]
                     try:
-                        mempool_bundle = await self.full_node.mempool_manager.create_bundle_from_mempool(
+                        block_template = await self.full_node.mempool_manager.create_block_template(
                             curr_l_tb.header_hash
                         )
                     except Exception as e:
                         self.log.error(f"Traceback: {traceback.format_exc()}")
                         self.full_node.log.error(f"Error making spend bundle {e} peak: {peak}")
-                        mempool_bundle = None
-                    if mempool_bundle is not None:
-                        spend_bundle = mempool_bundle[0]
-                        additions = mempool_bundle[1]
-                        removals = mempool_bundle[2]
+                        block_template = None
+                    if block_template is not None:
+                        spend_bundle = block_template.spend_bundle
+                        additions = list(block_template.additions)
+                        removals = list(block_template.removals)
                         self.full_node.log.info(f"Add rem: {len(additions)} {len(removals)}")
                         aggregate_signature = spend_bundle.aggregated_signature
-                        if self.full_node.full_node_store.previous_generator is not None:
-                            self.log.info(
-                                f"Using previous generator for height "
-                                f"{self.full_node.full_node_store.previous_generator}"
-                            )
-                            block_generator = best_solution_generator_from_template(
-                                self.full_node.full_node_store.previous_generator, spend_bundle
-                            )
+                        previous_generator = self.full_node.full_node_store.previous_generator
+                        if previous_generator is not None and block_template.suitable_for_compression:
+                            self.log.info(f"Using previous generator for height {previous_generator}")
+                            block_generator = compressed_spend_bundle_solution(previous_generator, spend_bundle)
                         else:
-                            block_generator = simple_solution_generator(spend_bundle)
+                            # the serialized coin spends of the template are reused
+                            block_generator = block_template.simple_generator()
 
             def get_plot_sig(to_sign, _) -> G2Element:
                 if to_sign == request.challenge_chain_sp:
@@ -1088,14 +1098,12 @@ class FullNodeAPI:
         if header_hash is None:
             msg = make_msg(ProtocolMessageTypes.reject_header_request, RejectHeaderRequest(request.height))
             return msg
-        block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(header_hash)
+        block: Optional[StreamableView] = await self.full_node.block_store.get_full_block_view(header_hash)
         if block is not None:
             tx_removals, tx_additions, _ = await self.full_node.blockchain.get_tx_removals_and_additions(block)
-            header_block = get_block_header(block, tx_additions, tx_removals)
-            msg = make_msg(
-                ProtocolMessageTypes.respond_block_header,
-                wallet_protocol.RespondBlockHeader(header_block),
-            )
+            # RespondBlockHeader is just the header block
+            header_block = get_block_header_bytes(block, tx_additions, tx_removals)
+            msg = make_msg(ProtocolMessageTypes.respond_block_header, header_block)
             return msg
         return None
 
@@ -1307,20 +1315,25 @@ class FullNodeAPI:
                 return msg
             header_hashes.append(self.full_node.blockchain.height_to_hash(uint32(i)))
 
-        blocks: List[FullBlock] = await self.full_node.block_store.get_blocks_by_hash(header_hashes)
-        header_blocks = []
+        # the header blocks are copied from the stored block bytes, the generators are never parsed
+        blocks: List[StreamableView] = await self.full_node.block_store.get_block_views_by_hash(header_hashes)
+        header_blocks: List[bytes] = []
         for block in blocks:
             added_coins_records = await self.full_node.coin_store.get_coins_added_at_height(block.height)
             removed_coins_records = await self.full_node.coin_store.get_coins_removed_at_height(block.height)
             added_coins = [record.coin for record in added_coins_records if not record.coinbase]
             removal_names = [record.coin.name() for record in removed_coins_records]
-            header_block = get_block_header(block, added_coins, removal_names)
-            header_blocks.append(header_block)
-
-        msg = make_msg(
-            ProtocolMessageTypes.respond_header_blocks,
-            wallet_protocol.RespondHeaderBlocks(request.start_height, request.end_height, header_blocks),
+            header_blocks.append(get_block_header_bytes(block, added_coins, removal_names))
+
+        respond_header_blocks: bytes = b"".join(
+            [
+                bytes(uint32(request.start_height)),
+                bytes(uint32(request.end_height)),
+                len(header_blocks).to_bytes(4, "big", signed=False),
+                *header_blocks,
+            ]
         )
+        msg = make_msg(ProtocolMessageTypes.respond_header_blocks, respond_header_blocks)
         return msg
 
     @api_request
@@ -1,7 +1,7 @@
-from typing import Dict, List
-
-from sortedcontainers import SortedDict
+import itertools
+from typing import Dict, Iterator, List, Tuple
 
+from hddcoin.full_node.fee_rate_index import FeeRateIndex
 from hddcoin.types.blockchain_format.coin import Coin
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.types.mempool_item import MempoolItem
@@ -10,7 +10,11 @@ from hddcoin.types.mempool_item import MempoolItem
 class Mempool:
     def __init__(self, max_size_in_cost: int):
         self.spends: Dict[bytes32, MempoolItem] = {}
-        self.sorted_spends: SortedDict = SortedDict()
+        # All items by fee per cost, with the cost sums needed to find the items to evict in O(log n)
+        self.fee_rate_index: FeeRateIndex[MempoolItem] = FeeRateIndex()
+        # The key of every item in fee_rate_index, items with the same fee per cost are ordered by insertion
+        self.fee_rate_keys: Dict[bytes32, Tuple[float, int]] = {}
+        self._sequence = itertools.count()
         self.additions: Dict[bytes32, MempoolItem] = {}
         self.removals: Dict[bytes32, MempoolItem] = {}
         self.max_size_in_cost: int = max_size_in_cost
@@ -22,21 +26,25 @@ class Mempool:
         """
 
         if self.at_full_capacity(cost):
-            current_cost = self.total_mempool_cost
-
-            # Iterates through all spends in increasing fee per cost
-            for fee_per_cost, spends_with_fpc in self.sorted_spends.items():
-                for spend_name, item in spends_with_fpc.items():
-                    current_cost -= item.cost
-                    # Removing one at a time, until our transaction of size cost fits
-                    if current_cost + cost <= self.max_size_in_cost:
-                        return fee_per_cost
-            raise ValueError(
-                f"Transaction with cost {cost} does not fit in mempool of max cost {self.max_size_in_cost}"
-            )
+            # The items with the lowest fee per cost that would have to be removed, until our transaction of size
+            # cost fits
+            found = self.fee_rate_index.find_cumulative_cost(self.total_mempool_cost + cost - self.max_size_in_cost)
+            if found is None:
+                raise ValueError(
+                    f"Transaction with cost {cost} does not fit in mempool of max cost {self.max_size_in_cost}"
+                )
+            (fee_per_cost, _), _ = found
+            return fee_per_cost
         else:
             return 0
 
+    def items_by_fee_rate(self) -> Iterator[MempoolItem]:
+        """
+        Iterates over the items from the highest fee per cost to the lowest
+        """
+        for _, item in self.fee_rate_index.items_descending():
+            yield item
+
     def remove_from_pool(self, item: MempoolItem):
         """
         Removes an item from the mempool.
@@ -48,10 +56,7 @@ class Mempool:
         for add in additions:
             del self.additions[add.name()]
         del self.spends[item.name]
-        del self.sorted_spends[item.fee_per_cost][item.name]
-        dic = self.sorted_spends[item.fee_per_cost]
-        if len(dic.values()) == 0:
-            del self.sorted_spends[item.fee_per_cost]
+        self.fee_rate_index.remove(self.fee_rate_keys.pop(item.name))
         self.total_mempool_cost -= item.cost
         assert self.total_mempool_cost >= 0
 
@@ -64,18 +69,15 @@ class Mempool:
         """
 
         while self.at_full_capacity(item.cost):
-            # Val is Dict[hash, MempoolItem]
-            fee_per_cost, val = self.sorted_spends.peekitem(index=0)
-            to_remove = list(val.values())[0]
-            self.remove_from_pool(to_remove)
+            first = self.fee_rate_index.first()
+            assert first is not None
+            self.remove_from_pool(first[1])
 
         self.spends[item.name] = item
 
-        # sorted_spends is Dict[float, Dict[bytes32, MempoolItem]]
-        if item.fee_per_cost not in self.sorted_spends:
-            self.sorted_spends[item.fee_per_cost] = {}
-
-        self.sorted_spends[item.fee_per_cost][item.name] = item
+        key = (item.fee_per_cost, next(self._sequence))
+        self.fee_rate_keys[item.name] = key
+        self.fee_rate_index.insert(key, item, item.cost)
 
         for add in item.additions:
             self.additions[add.name()] = item
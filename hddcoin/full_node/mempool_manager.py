@@ -3,19 +3,19 @@ import collections
 import dataclasses
 import logging
 import time
-from concurrent.futures.process import ProcessPoolExecutor
 from typing import Dict, List, Optional, Set, Tuple
-from blspy import G1Element, GTElement
+from blspy import GTElement
 from chiabip158 import PyBIP158
 
-from hddcoin.util import cached_bls
 from hddcoin.consensus.block_record import BlockRecord
 from hddcoin.consensus.constants import ConsensusConstants
 from hddcoin.consensus.cost_calculator import NPCResult, calculate_cost_of_program
+from hddcoin.full_node.block_template import BlockTemplate, BlockTemplateBuilder
 from hddcoin.full_node.bundle_tools import simple_solution_generator
 from hddcoin.full_node.coin_store import CoinStore
 from hddcoin.full_node.mempool import Mempool
-from hddcoin.full_node.mempool_check_conditions import mempool_check_conditions_dict, get_name_puzzle_conditions
+from hddcoin.full_node.mempool_check_conditions import mempool_check_conditions_dict
+from hddcoin.full_node.mempool_validation import MempoolValidationPool
 from hddcoin.full_node.pending_tx_cache import PendingTxCache
 from hddcoin.types.blockchain_format.coin import Coin
 from hddcoin.types.blockchain_format.program import SerializedProgram
@@ -28,54 +28,23 @@ from hddcoin.types.mempool_item import MempoolItem
 from hddcoin.types.spend_bundle import SpendBundle
 from hddcoin.util.cached_bls import LOCAL_CACHE
 from hddcoin.util.clvm import int_from_bytes
-from hddcoin.util.condition_tools import pkm_pairs
 from hddcoin.util.errors import Err, ValidationError
 from hddcoin.util.generator_tools import additions_for_npc
 from hddcoin.util.ints import uint32, uint64
-from hddcoin.util.lru_cache import LRUCache
 from hddcoin.util.streamable import recurse_jsonify
 
 log = logging.getLogger(__name__)
 
 
-def validate_clvm_and_signature(
-    spend_bundle_bytes: bytes, max_cost: int, cost_per_byte: int, additional_data: bytes
-) -> Tuple[Optional[Err], bytes, Dict[bytes, bytes]]:
-    """
-    Validates CLVM and aggregate signature for a spendbundle. This is meant to be called under a ProcessPoolExecutor
-    in order to validate the heavy parts of a transction in a different thread. Returns an optional error,
-    the NPCResult and a cache of the new pairings validated (if not error)
-    """
-    try:
-        bundle: SpendBundle = SpendBundle.from_bytes(spend_bundle_bytes)
-        program = simple_solution_generator(bundle)
-        # npc contains names of the coins removed, puzzle_hashes and their spend conditions
-        result: NPCResult = get_name_puzzle_conditions(program, max_cost, cost_per_byte=cost_per_byte, safe_mode=True)
-
-        if result.error is not None:
-            return Err(result.error), b"", {}
-
-        pks: List[G1Element] = []
-        msgs: List[bytes32] = []
-        pks, msgs = pkm_pairs(result.npc_list, additional_data)
-
-        # Verify aggregated signature
-        cache: LRUCache = LRUCache(10000)
-        if not cached_bls.aggregate_verify(pks, msgs, bundle.aggregated_signature, True, cache):
-            return Err.BAD_AGGREGATE_SIGNATURE, b"", {}
-        new_cache_entries: Dict[bytes, bytes] = {}
-        for k, v in cache.cache.items():
-            new_cache_entries[k] = bytes(v)
-    except ValidationError as e:
-        return e.code, b"", {}
-    except Exception:
-        return Err.UNKNOWN, b"", {}
-
-    return None, bytes(result), new_cache_entries
-
-
 class MempoolManager:
-    def __init__(self, coin_store: CoinStore, consensus_constants: ConsensusConstants):
+    def __init__(
+        self,
+        coin_store: CoinStore,
+        consensus_constants: ConsensusConstants,
+        validation_workers: int = 2,
+        validation_batch_size: int = 16,
+        shared_pairing_cache: Optional[str] = None,
+    ):
         self.constants: ConsensusConstants = consensus_constants
         self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
 
@@ -96,14 +65,37 @@ class MempoolManager:
         # Transactions that were unable to enter mempool, used for retry. (they were invalid)
         self.potential_cache = PendingTxCache(self.constants.MAX_BLOCK_COST_CLVM * 5)
         self.seen_cache_size = 10000
-        self.pool = ProcessPoolExecutor(max_workers=2)
+        # Validates the CLVM and the signatures of new transactions in worker processes
+        self.validation_pool = MempoolValidationPool(
+            validation_workers, validation_batch_size, shared_cache_name=shared_pairing_cache
+        )
 
         # The mempool will correspond to a certain peak
         self.peak: Optional[BlockRecord] = None
         self.mempool: Mempool = Mempool(self.mempool_max_total_cost)
+        # The transactions for the next block, kept between signage points
+        self.block_template_builder = BlockTemplateBuilder()
 
     def shut_down(self):
-        self.pool.shutdown(wait=True)
+        self.validation_pool.shutdown()
+
+    async def create_block_template(self, last_tb_header_hash: bytes32) -> Optional[BlockTemplate]:
+        """
+        Returns the template of the transactions for a new block on top of the given transaction block, or None if
+        it's not the peak of the mempool or there are no transactions
+        """
+        if self.peak is None or self.peak.header_hash != last_tb_header_hash:
+            return None
+        log.info(f"Starting to make block, max cost: {self.constants.MAX_BLOCK_COST_CLVM}")
+        template = self.block_template_builder.get(
+            self.mempool,
+            self.peak.header_hash,
+            int(self.limit_factor * self.constants.MAX_BLOCK_COST_CLVM),
+            self.constants.MAX_COIN_AMOUNT,
+        )
+        if len(template.items) == 0:
+            return None
+        return template
 
     async def create_bundle_from_mempool(
         self, last_tb_header_hash: bytes32
@@ -112,42 +104,10 @@ class MempoolManager:
         Returns aggregated spendbundle that can be used for creating new block,
         additions and removals in that spend_bundle
         """
-        if self.peak is None or self.peak.header_hash != last_tb_header_hash:
-            return None
-
-        cost_sum = 0  # Checks that total cost does not exceed block maximum
-        fee_sum = 0  # Checks that total fees don't exceed 64 bits
-        spend_bundles: List[SpendBundle] = []
-        removals = []
-        additions = []
-        broke_from_inner_loop = False
-        log.info(f"Starting to make block, max cost: {self.constants.MAX_BLOCK_COST_CLVM}")
-        for dic in reversed(self.mempool.sorted_spends.values()):
-            if broke_from_inner_loop:
-                break
-            for item in dic.values():
-                log.info(f"Cumulative cost: {cost_sum}, fee per cost: {item.fee / item.cost}")
-                if (
-                    item.cost + cost_sum <= self.limit_factor * self.constants.MAX_BLOCK_COST_CLVM
-                    and item.fee + fee_sum <= self.constants.MAX_COIN_AMOUNT
-                ):
-                    spend_bundles.append(item.spend_bundle)
-                    cost_sum += item.cost
-                    fee_sum += item.fee
-                    removals.extend(item.removals)
-                    additions.extend(item.additions)
-                else:
-                    broke_from_inner_loop = True
-                    break
-        if len(spend_bundles) > 0:
-            log.info(
-                f"Cumulative cost of block (real cost should be less) {cost_sum}. Proportion "
-                f"full: {cost_sum / self.constants.MAX_BLOCK_COST_CLVM}"
-            )
-            agg = SpendBundle.aggregate(spend_bundles)
-            return agg, additions, removals
-        else:
+        template = await self.create_block_template(last_tb_header_hash)
+        if template is None:
             return None
+        return template.spend_bundle, list(template.additions), list(template.removals)
 
     def get_filter(self) -> bytes:
         all_transactions: Set[bytes32] = set()
@@ -241,9 +201,7 @@ class MempoolManager:
         start_time = time.time()
         if new_spend_bytes is None:
             new_spend_bytes = bytes(new_spend)
-        err, cached_result_bytes, new_cache_entries = await asyncio.get_running_loop().run_in_executor(
-            self.pool,
-            validate_clvm_and_signature,
+        err, cached_result_bytes, new_cache_entries = await self.validation_pool.validate(
             new_spend_bytes,
             int(self.limit_factor * self.constants.MAX_BLOCK_COST_CLVM),
             self.constants.COST_PER_BYTE,
@@ -454,6 +412,7 @@ class MempoolManager:
 
         new_item = MempoolItem(new_spend, uint64(fees), npc_result, cost, spend_name, additions, removals, program)
         self.mempool.add_to_pool(new_item)
+        self.block_template_builder.item_added(new_item)
         now = time.time()
         log.log(
             logging.DEBUG,
@@ -529,6 +488,7 @@ class MempoolManager:
 
         old_pool = self.mempool
         self.mempool = Mempool(self.mempool_max_total_cost)
+        self.block_template_builder.reset()
 
         for item in old_pool.spends.values():
             if use_optimization:
@@ -574,19 +534,14 @@ class MempoolManager:
     async def get_items_not_in_filter(self, mempool_filter: PyBIP158, limit: int = 100) -> List[MempoolItem]:
         items: List[MempoolItem] = []
         counter = 0
-        broke_from_inner_loop = False
 
         # Send 100 with highest fee per cost
-        for dic in self.mempool.sorted_spends.values():
-            if broke_from_inner_loop:
+        for _, item in self.mempool.fee_rate_index.items():
+            if counter == limit:
                 break
-            for item in dic.values():
-                if counter == limit:
-                    broke_from_inner_loop = True
-                    break
-                if mempool_filter.Match(bytearray(item.spend_bundle_name)):
-                    continue
-                items.append(item)
-                counter += 1
+            if mempool_filter.Match(bytearray(item.spend_bundle_name)):
+                continue
+            items.append(item)
+            counter += 1
 
         return items
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures.process import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from blspy import G1Element
+
+from hddcoin.consensus.cost_calculator import NPCResult
+from hddcoin.full_node.bundle_tools import simple_solution_generator
+from hddcoin.full_node.mempool_check_conditions import get_name_puzzle_conditions
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.spend_bundle import SpendBundle
+from hddcoin.util import cached_bls
+from hddcoin.util.condition_tools import pkm_pairs
+from hddcoin.util.errors import Err, ValidationError
+from hddcoin.util.lru_cache import LRUCache
+from hddcoin.util.shared_pairing_cache import SharedPairingCache
+
+log = logging.getLogger(__name__)
+
+# Number of pairings every validation worker keeps between transactions
+WORKER_CACHE_SIZE = 10000
+
+ValidationResult = Tuple[Optional[Err], bytes, Dict[bytes, bytes]]
+
+
+class RecordingLRUCache(LRUCache):
+    """
+    An LRUCache which remembers the keys put into it, so the new entries can be sent to another process
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.new_keys: List[Any] = []
+
+    def put(self, key: Any, value: Any) -> None:
+        super().put(key, value)
+        self.new_keys.append(key)
+
+    def take_new_entries(self) -> Dict[bytes, bytes]:
+        new_entries: Dict[bytes, bytes] = {}
+        for key in self.new_keys:
+            value = self.cache.get(key)
+            if value is not None:
+                new_entries[key] = bytes(value)
+        self.new_keys = []
+        return new_entries
+
+
+def validate_clvm_and_signature(
+    spend_bundle_bytes: bytes,
+    max_cost: int,
+    cost_per_byte: int,
+    additional_data: bytes,
+    cache: Optional[RecordingLRUCache] = None,
+) -> ValidationResult:
+    """
+    Validates CLVM and aggregate signature for a spendbundle. This is meant to be called under a ProcessPoolExecutor
+    in order to validate the heavy parts of a transction in a different thread. Returns an optional error,
+    the NPCResult and a cache of the new pairings validated (if not error)
+    """
+    if cache is None:
+        cache = RecordingLRUCache(10000)
+    try:
+        bundle: SpendBundle = SpendBundle.from_bytes(spend_bundle_bytes)
+        program = simple_solution_generator(bundle)
+        # npc contains names of the coins removed, puzzle_hashes and their spend conditions
+        result: NPCResult = get_name_puzzle_conditions(program, max_cost, cost_per_byte=cost_per_byte, safe_mode=True)
+
+        if result.error is not None:
+            return Err(result.error), b"", {}
+
+        pks: List[G1Element] = []
+        msgs: List[bytes32] = []
+        pks, msgs = pkm_pairs(result.npc_list, additional_data)
+
+        # Verify aggregated signature
+        if not cached_bls.aggregate_verify(pks, msgs, bundle.aggregated_signature, True, cache):
+            return Err.BAD_AGGREGATE_SIGNATURE, b"", {}
+        new_cache_entries = cache.take_new_entries()
+    except ValidationError as e:
+        return e.code, b"", {}
+    except Exception:
+        return Err.UNKNOWN, b"", {}
+    finally:
+        cache.new_keys = []
+
+    return None, bytes(result), new_cache_entries
+
+
+# The pairing cache of a validation worker process, it's kept for the lifetime of the process
+_worker_cache: Optional[RecordingLRUCache] = None
+
+
+def _init_worker(cache_size: int, shared_cache_name: Optional[str]) -> None:
+    global _worker_cache
+    _worker_cache = RecordingLRUCache(cache_size)
+    if shared_cache_name is not None:
+        cached_bls.set_shared_cache(SharedPairingCache.attach(shared_cache_name))
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def validate_batch(
+    spend_bundles: List[bytes], max_cost: int, cost_per_byte: int, additional_data: bytes
+) -> Tuple[List[ValidationResult], float]:
+    """
+    Validates the spend bundles in a worker process. Returns the results, and the time it took.
+    """
+    start = time.monotonic()
+    results = [
+        validate_clvm_and_signature(spend_bundle, max_cost, cost_per_byte, additional_data, _worker_cache)
+        for spend_bundle in spend_bundles
+    ]
+    if cached_bls.SHARED_CACHE is not None:
+        # the main process finds the new pairings in the shared cache
+        results = [(err, npc_result, {}) for err, npc_result, _ in results]
+    return results, time.monotonic() - start
+
+
+class StageLatency:
+    count: int
+    total: float
+    max: float
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float, count: int = 1) -> None:
+        self.count += count
+        self.total += seconds * count
+        self.max = max(self.max, seconds)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "average": self.total / self.count if self.count > 0 else 0,
+            "max": self.max,
+        }
+
+
+class _Job:
+    def __init__(self, spend_bundle: bytes, params: Tuple[int, int, bytes], future: asyncio.Future):
+        self.spend_bundle = spend_bundle
+        self.params = params
+        self.future = future
+        self.queued = time.monotonic()
+
+
+class MempoolValidationPool:
+    """
+    Validates the CLVM and the signatures of transactions in worker processes. The workers are started right away
+    and keep their pairing caches between transactions. Transactions are sent as soon as a worker is free, the ones
+    which arrive while all workers are busy are sent together in batches of up to batch_size.
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        batch_size: int,
+        cache_size: int = WORKER_CACHE_SIZE,
+        shared_cache_name: Optional[str] = None,
+    ):
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers, initializer=_init_worker, initargs=(cache_size, shared_cache_name)
+        )
+        for _ in range(num_workers):
+            self._executor.submit(_warm_up)
+        self._pending: List[_Job] = []
+        self._batches_in_flight = 0
+        self._items_in_flight = 0
+        self.validated = 0
+        self.failed = 0
+        self.batches = 0
+        self.queue_latency = StageLatency()
+        self.validation_latency = StageLatency()
+        self.round_trip_latency = StageLatency()
+
+    async def validate(
+        self, spend_bundle: bytes, max_cost: int, cost_per_byte: int, additional_data: bytes
+    ) -> ValidationResult:
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Job(spend_bundle, (max_cost, cost_per_byte, additional_data), future))
+        self._submit()
+        return await future
+
+    def _submit(self) -> None:
+        while len(self._pending) > 0 and self._batches_in_flight < self.num_workers:
+            # a batch only holds transactions validated with the same parameters
+            params = self._pending[0].params
+            batch: List[_Job] = []
+            while len(self._pending) > 0 and len(batch) < self.batch_size and self._pending[0].params == params:
+                batch.append(self._pending.pop(0))
+            now = time.monotonic()
+            for job in batch:
+                self.queue_latency.add(now - job.queued)
+            self._batches_in_flight += 1
+            self._items_in_flight += len(batch)
+            asyncio.get_running_loop().create_task(self._run(batch, params))
+
+    async def _run(self, batch: List[_Job], params: Tuple[int, int, bytes]) -> None:
+        start = time.monotonic()
+        try:
+            results, validation_time = await asyncio.get_running_loop().run_in_executor(
+                self._executor, validate_batch, [job.spend_bundle for job in batch], *params
+            )
+            self.validation_latency.add(validation_time / len(batch), len(batch))
+            for job, result in zip(batch, results):
+                if result[0] is not None:
+                    self.failed += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+        except Exception as e:
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_exception(e)
+        finally:
+            self.round_trip_latency.add(time.monotonic() - start)
+            self.validated += len(batch)
+            self.batches += 1
+            self._batches_in_flight -= 1
+            self._items_in_flight -= len(batch)
+            self._submit()
+
+    def shutdown(self) -> None:
+        for job in self._pending:
+            job.future.cancel()
+        self._pending = []
+        self._executor.shutdown(wait=True)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": self.num_workers,
+            "batch_size": self.batch_size,
+            "queued": len(self._pending),
+            "in_flight": self._items_in_flight,
+            "validated": self.validated,
+            "failed": self.failed,
+            "batches": self.batches,
+            "average_batch_size": self.validated / self.batches if self.batches > 0 else 0,
+            "queue_latency": self.queue_latency.to_json_dict(),
+            "validation_latency": self.validation_latency.to_json_dict(),
+            "round_trip_latency": self.round_trip_latency.to_json_dict(),
+        }
@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from hddcoin.consensus.block_record import BlockRecord
+from hddcoin.consensus.blockchain_interface import BlockchainInterface
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.blockchain_format.sub_epoch_summary import SubEpochSummary
+from hddcoin.types.full_block import FullBlock
+from hddcoin.util.ints import uint32
+
+# The batch size of a peer is chosen so a request takes about this many seconds
+TARGET_REQUEST_TIME = 2.0
+
+# Batch size for peers we haven't received any blocks from yet
+INITIAL_BATCH_SIZE = 8
+
+# Weight of the latest request in the moving averages of a peer
+EWMA_WEIGHT = 0.3
+
+# A peer without a batch to fetch also requests the batch the validation is waiting for, if that one has been
+# requested for longer than this many seconds
+STEAL_AFTER = 2 * TARGET_REQUEST_TIME
+
+
+class PeerSyncStats:
+    """
+    Moving averages of the requests made to one peer during a long sync
+    """
+
+    latency: Optional[float]  # seconds per request
+    blocks_per_second: Optional[float]
+    requests: int
+    failures: int
+
+    def __init__(self) -> None:
+        self.latency = None
+        self.blocks_per_second = None
+        self.requests = 0
+        self.failures = 0
+
+    def add_request(self, num_blocks: int, duration: float) -> None:
+        duration = max(duration, 0.001)
+        self.requests += 1
+        if self.latency is None or self.blocks_per_second is None:
+            self.latency = duration
+            self.blocks_per_second = num_blocks / duration
+        else:
+            self.latency += EWMA_WEIGHT * (duration - self.latency)
+            self.blocks_per_second += EWMA_WEIGHT * (num_blocks / duration - self.blocks_per_second)
+
+    def add_failure(self) -> None:
+        self.failures += 1
+        if self.blocks_per_second is not None:
+            # back off, a failed request is usually a slow one
+            self.blocks_per_second /= 2
+
+    def batch_size(self, max_batch_size: int) -> int:
+        if self.blocks_per_second is None:
+            return min(INITIAL_BATCH_SIZE, max_batch_size)
+        return max(1, min(int(self.blocks_per_second * TARGET_REQUEST_TIME), max_batch_size))
+
+    def to_json_dict(self, max_batch_size: int) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size(max_batch_size),
+            "latency": self.latency,
+            "blocks_per_second": self.blocks_per_second,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class _Batch:
+    start: int
+    end: int
+    peers: Set[bytes32]  # peers currently fetching it
+    requested: float
+
+    def __init__(self, start: int, end: int) -> None:
+        self.start = start
+        self.end = end
+        self.peers = set()
+        self.requested = 0.0
+
+
+class SyncScheduler:
+    """
+    Hands out the block ranges of a long sync to the peers, and hands the fetched batches to the validation in
+    height order. Every peer takes the next range when it's done with the previous one, sized from how fast that
+    peer has been so far. At most max_in_flight ranges are being fetched or waiting for validation at a time.
+    Ranges that failed are fetched again by the next free peer, and a free peer also fetches the range the
+    validation is waiting for, if it's taking too long.
+    """
+
+    end_height: int
+    max_batch_size: int
+    max_in_flight: int
+    peer_stats: Dict[bytes32, PeerSyncStats]
+
+    def __init__(self, start_height: int, end_height: int, max_batch_size: int, max_in_flight: int) -> None:
+        self.end_height = end_height
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self.peer_stats = {}
+        self._next_start = start_height  # first height that's not part of a batch yet
+        self._next_validate = start_height  # first height of the batch the validation is waiting for
+        self._batches: Dict[int, _Batch] = {}
+        self._retry: List[int] = []
+        self._fetched: Dict[int, Tuple[Any, List[FullBlock]]] = {}
+        self._failed = False
+        self._changed = asyncio.Event()
+
+        self._start_time = time.monotonic()
+        self.blocks_validated = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+
+    def done(self) -> bool:
+        return self._failed or self._next_validate > self.end_height
+
+    def fail(self) -> None:
+        """
+        Stops the sync, the validation gets None as the next batch
+        """
+        self._failed = True
+        self._changed.set()
+
+    def stats(self, peer_id: bytes32) -> PeerSyncStats:
+        if peer_id not in self.peer_stats:
+            self.peer_stats[peer_id] = PeerSyncStats()
+        return self.peer_stats[peer_id]
+
+    async def _wait(self) -> None:
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), STEAL_AFTER)
+        except asyncio.TimeoutError:
+            pass
+
+    def _take(self, peer_id: bytes32) -> Optional[_Batch]:
+        if len(self._retry) > 0:
+            return self._batches[heapq.heappop(self._retry)]
+        if self._next_start <= self.end_height and len(self._batches) < self.max_in_flight:
+            end = min(self._next_start + self.stats(peer_id).batch_size(self.max_batch_size) - 1, self.end_height)
+            batch = _Batch(self._next_start, end)
+            self._batches[batch.start] = batch
+            self._next_start = end + 1
+            return batch
+        waiting_for = self._batches.get(self._next_validate)
+        if (
+            waiting_for is not None
+            and waiting_for.start not in self._fetched
+            and peer_id not in waiting_for.peers
+            and time.monotonic() - waiting_for.requested > STEAL_AFTER
+        ):
+            return waiting_for
+        return None
+
+    async def take(self, peer_id: bytes32) -> Optional[Tuple[int, int]]:
+        """
+        Returns the next range of heights (inclusive) for the peer to fetch, or None when the sync is done
+        """
+        while not self.done():
+            batch = self._take(peer_id)
+            if batch is not None:
+                batch.peers.add(peer_id)
+                batch.requested = time.monotonic()
+                return batch.start, batch.end
+            await self._wait()
+        return None
+
+    def fetched(self, start: int, peer: Any, blocks: List[FullBlock]) -> None:
+        batch = self._batches.get(start)
+        if batch is None or start in self._fetched:
+            # another peer was faster
+            return
+        batch.peers.discard(peer.peer_node_id)
+        self._fetched[start] = (peer, blocks)
+        self._changed.set()
+
+    def failed(self, start: int, peer_id: bytes32) -> None:
+        batch = self._batches.get(start)
+        if batch is None:
+            return
+        batch.peers.discard(peer_id)
+        if len(batch.peers) == 0 and start not in self._fetched and start not in self._retry:
+            heapq.heappush(self._retry, start)
+        self._changed.set()
+
+    async def next_batch(self) -> Optional[Tuple[Any, List[FullBlock]]]:
+        """
+        Returns the peer and the blocks of the next batch to validate, or None when the sync is done
+        """
+        stall_start: Optional[float] = None
+        while not self.done():
+            fetched = self._fetched.pop(self._next_validate, None)
+            if fetched is not None:
+                batch = self._batches.pop(self._next_validate)
+                self._next_validate = batch.end + 1
+                self.blocks_validated += len(fetched[1])
+                if stall_start is not None:
+                    self.stalls += 1
+                    self.stall_time += time.monotonic() - stall_start
+                self._changed.set()
+                return fetched
+            if stall_start is None:
+                stall_start = time.monotonic()
+            await self._wait()
+        return None
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._start_time
+        return {
+            "blocks_per_second": self.blocks_validated / elapsed if elapsed > 0 else 0,
+            "blocks_validated": self.blocks_validated,
+            "next_height": self._next_validate,
+            "end_height": self.end_height,
+            "queue_depth": len(self._fetched),
+            "in_flight": len(self._batches) - len(self._fetched),
+            "stalls": self.stalls,
+            "stall_time": self.stall_time,
+            "peers": {
+                peer_id.hex(): stats.to_json_dict(self.max_batch_size) for peer_id, stats in self.peer_stats.items()
+            },
+        }
+
+
+class BlockRecordOverlay(BlockchainInterface):
+    """
+    The blockchain with the block records of a batch that's still being added to it. This is used to pre-validate
+    the next batch of a long sync while the previous one is written to the database.
+    """
+
+    def __init__(self, blockchain: BlockchainInterface) -> None:
+        self.blockchain = blockchain
+        self.records: Dict[bytes32, BlockRecord] = {}
+        self.heights: Dict[uint32, bytes32] = {}
+
+    def add_pending(self, block_record: BlockRecord) -> None:
+        self.records[block_record.header_hash] = block_record
+        self.heights[block_record.height] = block_record.header_hash
+
+    def get_peak(self) -> Optional[BlockRecord]:
+        return self.blockchain.get_peak()
+
+    def get_peak_height(self) -> Optional[uint32]:
+        return self.blockchain.get_peak_height()
+
+    def block_record(self, header_hash: bytes32) -> BlockRecord:
+        if header_hash in self.records:
+            return self.records[header_hash]
+        return self.blockchain.block_record(header_hash)
+
+    def height_to_block_record(self, height: uint32) -> BlockRecord:
+        if height in self.heights:
+            return self.records[self.heights[height]]
+        return self.blockchain.height_to_block_record(height)
+
+    def get_ses_heights(self) -> List[uint32]:
+        return self.blockchain.get_ses_heights()
+
+    def get_ses(self, height: uint32) -> SubEpochSummary:
+        return self.blockchain.get_ses(height)
+
+    def height_to_hash(self, height: uint32) -> Optional[bytes32]:
+        if height in self.heights:
+            return self.heights[height]
+        return self.blockchain.height_to_hash(height)
+
+    def contains_block(self, header_hash: bytes32) -> bool:
+        return header_hash in self.records or self.blockchain.contains_block(header_hash)
+
+    def remove_block_record(self, header_hash: bytes32):
+        del self.records[header_hash]
+
+    def add_block_record(self, block_record: BlockRecord):
+        self.records[block_record.header_hash] = block_record
+
+    def contains_height(self, height: uint32) -> bool:
+        return height in self.heights or self.blockchain.contains_height(height)
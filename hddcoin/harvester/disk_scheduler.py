@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from concurrent.futures.thread import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+log = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the buckets of the lookup latency histograms, the last bucket has no upper bound
+LATENCY_BUCKETS: List[float] = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30]
+
+
+class DeadlineExpired(Exception):
+    pass
+
+
+class LatencyHistogram:
+    counts: List[int]
+    total: float
+    max: float
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        count = self.count()
+        return {
+            "buckets": [*LATENCY_BUCKETS, None],
+            "counts": self.counts,
+            "count": count,
+            "average": self.total / count if count > 0 else 0,
+            "max": self.max,
+        }
+
+
+class _Job:
+    def __init__(self, deadline: float, future: asyncio.Future, f: Callable, args: Tuple) -> None:
+        self.deadline = deadline
+        self.future = future
+        self.f = f
+        self.args = args
+        self.queued = time.monotonic()
+
+
+class DiskQueue:
+    """
+    The lookups of all plots on one device. They are run by a fixed number of threads of their own, earliest
+    deadline first, so a slow disk only delays the lookups of its own plots. Lookups that are still queued when
+    their deadline passes are dropped.
+    """
+
+    device: int
+    mount: str
+
+    def __init__(self, device: int, mount: str, num_threads: int) -> None:
+        self.device = device
+        self.mount = mount
+        self.num_threads = num_threads
+        self._executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix=f"disk_{device}")
+        self._queue: List[Tuple[float, int, _Job]] = []
+        self._counter = itertools.count()
+        self._running = 0
+        self.expired = 0
+        self.queue_latency = LatencyHistogram()
+        self.lookup_latency = LatencyHistogram()
+
+    def submit(self, deadline: float, f: Callable, *args: Any) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (deadline, next(self._counter), _Job(deadline, future, f, args)))
+        self._start_next()
+        return future
+
+    def _start_next(self) -> None:
+        while self._running < self.num_threads and len(self._queue) > 0:
+            _, _, job = heapq.heappop(self._queue)
+            if job.future.cancelled():
+                continue
+            now = time.monotonic()
+            if now > job.deadline:
+                self.expired += 1
+                job.future.set_exception(DeadlineExpired())
+                continue
+            self.queue_latency.add(now - job.queued)
+            self._running += 1
+            asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: _Job) -> None:
+        start = time.monotonic()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, job.f, *job.args)
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self.lookup_latency.add(time.monotonic() - start)
+            self._running -= 1
+            self._start_next()
+
+    def shutdown(self) -> None:
+        for _, _, job in self._queue:
+            job.future.cancel()
+        self._queue = []
+        self._executor.shutdown(wait=True)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "device": self.device,
+            "mount": self.mount,
+            "threads": self.num_threads,
+            "queued": len(self._queue),
+            "running": self._running,
+            "expired": self.expired,
+            "queue_latency": self.queue_latency.to_json_dict(),
+            "lookup_latency": self.lookup_latency.to_json_dict(),
+        }
+
+
+def find_mount(path: Path) -> str:
+    path = path.resolve()
+    while not os.path.ismount(path) and path.parent != path:
+        path = path.parent
+    return str(path)
+
+
+class DiskScheduler:
+    """
+    Runs the blocking lookups of the harvester in one DiskQueue per device the plots are stored on
+    """
+
+    def __init__(self, threads_per_disk: int) -> None:
+        self.threads_per_disk = threads_per_disk
+        self._queues: Dict[int, DiskQueue] = {}
+        self._devices: Dict[Path, int] = {}
+
+    def _device(self, path: Path) -> int:
+        directory = path.parent
+        device = self._devices.get(directory)
+        if device is None:
+            try:
+                device = os.stat(directory).st_dev
+            except OSError as e:
+                # the lookup will fail anyway
+                log.warning(f"Can't stat plot directory {directory}: {e}")
+                return -1
+            self._devices[directory] = device
+        return device
+
+    def queue(self, path: Path) -> DiskQueue:
+        device = self._device(path)
+        queue = self._queues.get(device)
+        if queue is None:
+            queue = DiskQueue(device, find_mount(path.parent), self.threads_per_disk)
+            self._queues[device] = queue
+        return queue
+
+    async def run(self, path: Path, deadline: float, f: Callable, *args: Any) -> Any:
+        """
+        Runs f(*args) in the queue of the device path is stored on. Raises DeadlineExpired if it didn't start
+        before the deadline (in time.monotonic() seconds).
+        """
+        return await self.queue(path).submit(deadline, f, *args)
+
+    def forget_directories(self) -> None:
+        # plot directories can be remounted
+        self._devices = {}
+
+    def shutdown(self) -> None:
+        for queue in self._queues.values():
+            queue.shutdown()
+
+    def to_json_dict(self) -> List[Dict[str, Any]]:
+        return [queue.to_json_dict() for queue in self._queues.values()]
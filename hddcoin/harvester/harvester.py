@@ -3,30 +3,39 @@ import concurrent
 import logging
 from concurrent.futures.thread import ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import hddcoin.server.ws_connection as ws  # lgtm [py/import-and-import-from]
 from hddcoin.consensus.constants import ConsensusConstants
+from hddcoin.harvester.disk_scheduler import DiskScheduler
 from hddcoin.plotting.manager import PlotManager
+from hddcoin.plotting.prover_pool import LazyDiskProver, ProverPool, process_memory, process_open_files
 from hddcoin.plotting.util import (
     add_plot_directory,
     get_plot_directories,
+    plots_passing_filter,
+    PlotInfo,
     remove_plot_directory,
     remove_plot,
     PlotsRefreshParameter,
     PlotRefreshResult,
     PlotRefreshEvents,
 )
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.util.streamable import dataclass_from_dict
 
 log = logging.getLogger(__name__)
 
+# Number of plots the plot filter is evaluated for in one job of the filter executor
+PLOT_FILTER_CHUNK_SIZE = 8192
+
 
 class Harvester:
     plot_manager: PlotManager
     root_path: Path
     _is_shutdown: bool
-    executor: ThreadPoolExecutor
+    disk_scheduler: DiskScheduler
+    filter_executor: ThreadPoolExecutor
     state_changed_callback: Optional[Callable]
     cached_challenges: List
     constants: ConsensusConstants
@@ -46,11 +55,31 @@ class Harvester:
         if "plots_refresh_parameter" in config:
             refresh_parameter = dataclass_from_dict(PlotsRefreshParameter, config["plots_refresh_parameter"])
 
+        # With lazy provers, plots known from the plot cache are registered without opening them. At most
+        # max_open_provers of them are kept open, the least recently used ones are closed.
+        prover_pool: Optional[ProverPool] = None
+        if config.get("lazy_provers", False):
+            prover_pool = ProverPool(config.get("max_open_provers", 1000))
         self.plot_manager = PlotManager(
-            root_path, refresh_parameter=refresh_parameter, refresh_callback=self._plot_refresh_callback
+            root_path,
+            refresh_parameter=refresh_parameter,
+            refresh_callback=self._plot_refresh_callback,
+            prover_pool=prover_pool,
         )
         self._is_shutdown = False
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=config["num_threads"])
+        # The lookups of the plots on every disk run in their own threads, so a slow disk doesn't hold up the others
+        disk_threads: int = config.get("disk_threads", 4)
+        if "disk_threads" not in config and "num_threads" in config:
+            # The configs from before disk_threads had num_threads lookup threads for all the disks together
+            disk_threads = config["num_threads"]
+            log.warning(
+                f"harvester.num_threads is replaced by harvester.disk_threads, the threads for each disk. Using "
+                f"{disk_threads} threads for each disk, set disk_threads in the config to change it."
+            )
+        self.disk_scheduler = DiskScheduler(disk_threads)
+        self.filter_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=config.get("plot_filter_threads", 2), thread_name_prefix="plot_filter"
+        )
         self.state_changed_callback = None
         self.server = None
         self.constants = constants
@@ -64,7 +93,8 @@ class Harvester:
 
     def _close(self):
         self._is_shutdown = True
-        self.executor.shutdown(wait=True)
+        self.disk_scheduler.shutdown()
+        self.filter_executor.shutdown(wait=True)
         self.plot_manager.stop_refreshing()
 
     async def _await_closed(self):
@@ -84,9 +114,45 @@ class Harvester:
             f"remaining {update_result.remaining}, "
             f"duration: {update_result.duration:.2f} seconds"
         )
+        if event == PlotRefreshEvents.done:
+            # plot directories might have been remounted on other devices
+            self.disk_scheduler.forget_directories()
         if update_result.loaded > 0:
             self.event_loop.call_soon_threadsafe(self._state_changed, "plots")
 
+    async def find_eligible_plots(
+        self, challenge_hash: bytes32, signage_point: bytes32
+    ) -> Tuple[List[Tuple[Path, PlotInfo]], int]:
+        """
+        Returns the plots which pass the plot filter for the signage point, and the number of plots checked. The
+        filter is evaluated over the plot IDs of the plot manager in chunks, in the filter executor.
+        """
+        plot_ids, paths = self.plot_manager.get_plot_ids()
+        loop = asyncio.get_running_loop()
+        jobs = [
+            loop.run_in_executor(
+                self.filter_executor,
+                plots_passing_filter,
+                plot_ids,
+                start,
+                min(start + PLOT_FILTER_CHUNK_SIZE, len(paths)),
+                challenge_hash,
+                signage_point,
+                self.constants.NUMBER_ZERO_BITS_PLOT_FILTER,
+            )
+            for start in range(0, len(paths), PLOT_FILTER_CHUNK_SIZE)
+        ]
+        eligible: List[Tuple[Path, PlotInfo]] = []
+        passed = await asyncio.gather(*jobs)
+        with self.plot_manager:
+            for indices in passed:
+                for index in indices:
+                    # the plot might have been removed in the meantime
+                    plot_info = self.plot_manager.plots.get(paths[index])
+                    if plot_info is not None:
+                        eligible.append((paths[index], plot_info))
+        return eligible, len(paths)
+
     def on_disconnect(self, connection: ws.WSHDDcoinConnection):
         self.log.info(f"peer disconnected {connection.get_peer_logging()}")
         self._state_changed("close_connection")
@@ -108,6 +174,7 @@ class Harvester:
                         "plot_public_key": plot_info.plot_public_key,
                         "file_size": plot_info.file_size,
                         "time_modified": plot_info.time_modified,
+                        "prover_open": not isinstance(prover, LazyDiskProver) or prover.is_open(),
                     }
                 )
             self.log.debug(
@@ -121,6 +188,15 @@ class Harvester:
                 [str(s) for s in self.plot_manager.no_key_filenames],
             )
 
+    def get_resource_usage(self) -> Dict[str, Any]:
+        prover_pool = self.plot_manager.prover_pool
+        return {
+            "memory": process_memory(),
+            "open_files": process_open_files(),
+            "lazy_provers": prover_pool is not None,
+            "prover_pool": prover_pool.to_json_dict() if prover_pool is not None else None,
+        }
+
     def delete_plot(self, str_path: str):
         remove_plot(Path(str_path))
         self.plot_manager.trigger_refresh()
@@ -6,6 +6,7 @@ from typing import Callable, List, Tuple
 from blspy import AugSchemeMPL, G2Element, G1Element
 
 from hddcoin.consensus.pot_iterations import calculate_iterations_quality, calculate_sp_interval_iters
+from hddcoin.harvester.disk_scheduler import DeadlineExpired
 from hddcoin.harvester.harvester import Harvester
 from hddcoin.plotting.util import PlotInfo, parse_plot_info
 from hddcoin.protocols import harvester_protocol
@@ -20,6 +21,10 @@ from hddcoin.util.api_decorators import api_request, peer_required
 from hddcoin.util.ints import uint8, uint32, uint64
 from hddcoin.wallet.derive_keys import master_sk_to_local_sk
 
+# Lookups that haven't started this many seconds after the signage point arrived are dropped, the farmer doesn't
+# accept the proofs anymore by then
+LOOKUP_DEADLINE_SECONDS = 30
+
 
 class HarvesterAPI:
     harvester: Harvester
@@ -65,10 +70,9 @@ class HarvesterAPI:
             return None
 
         start = time.time()
+        deadline = time.monotonic() + LOOKUP_DEADLINE_SECONDS
         assert len(new_challenge.challenge_hash) == 32
 
-        loop = asyncio.get_running_loop()
-
         def blocking_lookup(filename: Path, plot_info: PlotInfo) -> List[Tuple[bytes32, ProofOfSpace]]:
             # Uses the DiskProver object to lookup qualities. This is a blocking call,
             # so it should be run in a thread pool.
@@ -163,9 +167,16 @@ class HarvesterAPI:
             all_responses: List[harvester_protocol.NewProofOfSpace] = []
             if self.harvester._is_shutdown:
                 return filename, []
-            proofs_of_space_and_q: List[Tuple[bytes32, ProofOfSpace]] = await loop.run_in_executor(
-                self.harvester.executor, blocking_lookup, filename, plot_info
-            )
+            try:
+                proofs_of_space_and_q: List[Tuple[bytes32, ProofOfSpace]] = await self.harvester.disk_scheduler.run(
+                    filename, deadline, blocking_lookup, filename, plot_info
+                )
+            except DeadlineExpired:
+                self.harvester.log.warning(
+                    f"Skipped looking up qualities on {filename}, the disk didn't get to it in "
+                    f"{LOOKUP_DEADLINE_SECONDS} seconds"
+                )
+                return filename, []
             for quality_str, proof_of_space in proofs_of_space_and_q:
                 all_responses.append(
                     harvester_protocol.NewProofOfSpace(
@@ -178,26 +189,23 @@ class HarvesterAPI:
                 )
             return filename, all_responses
 
+        # Passes the plot filter (does not check sp filter yet though, since we have not reached sp)
+        # This is being executed at the beginning of the slot
+        filter_start = time.time()
+        eligible_plots, total = await self.harvester.find_eligible_plots(
+            new_challenge.challenge_hash, new_challenge.sp_hash
+        )
+        filter_time = time.time() - filter_start
+
         awaitables = []
         passed = 0
-        total = 0
-        with self.harvester.plot_manager:
-            for try_plot_filename, try_plot_info in self.harvester.plot_manager.plots.items():
-                try:
-                    if try_plot_filename.exists():
-                        # Passes the plot filter (does not check sp filter yet though, since we have not reached sp)
-                        # This is being executed at the beginning of the slot
-                        total += 1
-                        if ProofOfSpace.passes_plot_filter(
-                            self.harvester.constants,
-                            try_plot_info.prover.get_id(),
-                            new_challenge.challenge_hash,
-                            new_challenge.sp_hash,
-                        ):
-                            passed += 1
-                            awaitables.append(lookup_challenge(try_plot_filename, try_plot_info))
-                except Exception as e:
-                    self.harvester.log.error(f"Error plot file {try_plot_filename} may no longer exist {e}")
+        for try_plot_filename, try_plot_info in eligible_plots:
+            try:
+                if try_plot_filename.exists():
+                    passed += 1
+                    awaitables.append(lookup_challenge(try_plot_filename, try_plot_info))
+            except Exception as e:
+                self.harvester.log.error(f"Error plot file {try_plot_filename} may no longer exist {e}")
 
         # Concurrently executes all lookups on disk, to take advantage of multiple disk parallelism
         total_proofs_found = 0
@@ -231,7 +239,8 @@ class HarvesterAPI:
         await peer.send_message(pass_msg)
         self.harvester.log.info(
             f"{len(awaitables)} plots were eligible for farming {new_challenge.challenge_hash.hex()[:10]}..."
-            f" Found {total_proofs_found} proofs. Time: {time.time() - start:.5f} s. "
+            f" Found {total_proofs_found} proofs. Time: {time.time() - start:.5f} s, "
+            f"filter: {filter_time:.5f} s. "
             f"Total {self.harvester.plot_manager.plot_count()} plots"
         )
 
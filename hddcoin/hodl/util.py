@@ -239,12 +239,26 @@ SELECT cr.coin_name, cr.spent
 FROM coin_record cr INNER JOIN initial i ON i.coin_name = cr.coin_parent
 WHERE puzzle_hash = ?
 """
+sql_databaseVersionTable = """\
+SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'database_version'
+"""
+
+
+def isBlockchainDbV2(config: th.Optional[th.Dict] = None) -> bool:
+    """v2 blockchain databases store hashes as blobs instead of hex strings."""
+    if not queryBlockchainDB(sql_databaseVersionTable, (), config = config):
+        return False
+    rows = queryBlockchainDB("SELECT version FROM database_version", (), config = config)
+    return bool(rows) and rows[0][0] == 2
+
+
 def getContractSpendInfo(contractAddress: str,
                          config: th.Optional[th.Dict] = None,
                          ) -> th.List[th.Tuple[str, bool]]:
-    ph = addr2puzhash(contractAddress, True)
+    isV2 = isBlockchainDbV2(config)
+    ph = addr2puzhash(contractAddress, not isV2)
     rows = queryBlockchainDB(sql_hodlContractSpendInfo, (ph, ph), config = config)
-    ret = [(row[0], bool(row[1])) for row in rows]
+    ret = [(row[0].hex() if isV2 else row[0], bool(row[1])) for row in rows]
     return ret
 
 
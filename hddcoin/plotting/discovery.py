@@ -0,0 +1,249 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from hddcoin.plotting.util import get_filenames
+from hddcoin.util.ints import uint16, uint64
+from hddcoin.util.path import mkdir
+from hddcoin.util.streamable import Streamable, streamable
+
+log = logging.getLogger(__name__)
+
+CURRENT_VERSION: uint16 = uint16(0)
+
+# Listings of directories modified less than this many seconds before the scan aren't trusted, a file added in
+# the same mtime tick wouldn't change the mtime again
+MTIME_GRACE_SECONDS = 2
+
+
+@dataclass(frozen=True)
+@streamable
+class DirectoryEntry(Streamable):
+    path: str
+    mtime_ns: uint64
+    filenames: List[str]
+
+
+@dataclass(frozen=True)
+@streamable
+class DiskDirectoryIndex(Streamable):
+    version: uint16
+    data: List[DirectoryEntry]
+
+
+class InotifyWatcher:
+    """
+    Calls the callback with the directory whenever a plot file is added to, moved or removed from one of the
+    watched directories. Uses inotify through libc, so it's only available on Linux.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, libc: ctypes.CDLL, fd: int, callback: Callable[[Path], None]):
+        self._libc = libc
+        self._fd = fd
+        self._callback = callback
+        self._watches: Dict[Path, int] = {}
+        self._directories: Dict[int, Path] = {}
+        self._lock = threading.Lock()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="plot_inotify", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def create(cls, callback: Callable[[Path], None]) -> Optional["InotifyWatcher"]:
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            log.info(f"inotify is not available: {e}")
+            return None
+        if fd < 0:
+            log.info(f"inotify is not available: {os.strerror(ctypes.get_errno())}")
+            return None
+        return cls(libc, fd, callback)
+
+    def watch(self, directories: Set[Path]) -> None:
+        """
+        Watches exactly the given directories
+        """
+        with self._lock:
+            for directory in list(self._watches.keys()):
+                if directory not in directories:
+                    wd = self._watches.pop(directory)
+                    self._directories.pop(wd, None)
+                    self._libc.inotify_rm_watch(self._fd, wd)
+            for directory in directories:
+                if directory in self._watches:
+                    continue
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+                if wd < 0:
+                    log.debug(f"Can't watch {directory}: {os.strerror(ctypes.get_errno())}")
+                    continue
+                self._watches[directory] = wd
+                self._directories[wd] = directory
+
+    def _run(self) -> None:
+        while self._running:
+            try:
+                readable, _, _ = select.select([self._fd], [], [], 1)
+                if len(readable) == 0:
+                    continue
+                data = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                log.error(f"Failed to read inotify events: {e}")
+                return
+            changed: Set[Path] = set()
+            pos = 0
+            while pos + self.EVENT_HEADER.size <= len(data):
+                wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, pos)
+                pos += self.EVENT_HEADER.size
+                name = data[pos : pos + name_len].rstrip(b"\0")
+                pos += name_len
+                with self._lock:
+                    directory = self._directories.get(wd)
+                    if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF) and directory is not None:
+                        # the watch is gone, it's added again when the directory shows up in a scan
+                        self._watches.pop(directory, None)
+                        self._directories.pop(wd, None)
+                if directory is not None and (name.endswith(b".plot") or len(name) == 0):
+                    changed.add(directory)
+            for directory in changed:
+                try:
+                    self._callback(directory)
+                except Exception as e:
+                    log.error(f"Error handling inotify event for {directory}: {e}")
+
+    def close(self) -> None:
+        self._running = False
+        self._thread.join()
+        os.close(self._fd)
+
+
+class PlotDiscovery:
+    """
+    Lists the plot files of the plot directories. The listing and the mtime of every directory are kept in an
+    index, which is stored next to the plot cache, and a directory is only listed again when its mtime changed
+    or inotify reported a change in it.
+    """
+
+    _index: Dict[Path, Tuple[int, List[Path]]]
+    _changed_directories: Set[Path]
+    _changed: bool
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._index = {}
+        self._changed_directories = set()
+        self._changed = False
+        self._lock = threading.Lock()
+        self._watcher: Optional[InotifyWatcher] = None
+        self.directories_listed = 0
+        if not path.parent.exists():
+            mkdir(path.parent)
+
+    def load(self) -> None:
+        try:
+            serialized = self._path.read_bytes()
+            stored: DiskDirectoryIndex = DiskDirectoryIndex.from_bytes(serialized)
+            if stored.version != CURRENT_VERSION:
+                raise ValueError(f"Invalid index version {stored.version}. Expected version {CURRENT_VERSION}.")
+            self._index = {
+                Path(entry.path): (int(entry.mtime_ns), [Path(entry.path) / name for name in entry.filenames])
+                for entry in stored.data
+            }
+        except FileNotFoundError:
+            log.debug(f"Directory index {self._path} not found")
+        except Exception as e:
+            log.error(f"Failed to load directory index: {e}, {traceback.format_exc()}")
+
+    def save(self) -> None:
+        if not self._changed:
+            return
+        try:
+            index = DiskDirectoryIndex(
+                CURRENT_VERSION,
+                [
+                    DirectoryEntry(str(directory), uint64(mtime_ns), [path.name for path in paths])
+                    for directory, (mtime_ns, paths) in self._index.items()
+                ],
+            )
+            self._path.write_bytes(bytes(index))
+            self._changed = False
+        except Exception as e:
+            log.error(f"Failed to save directory index: {e}, {traceback.format_exc()}")
+
+    def start_watching(self) -> None:
+        if self._watcher is None:
+            self._watcher = InotifyWatcher.create(self.directory_changed)
+
+    def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def watching(self) -> bool:
+        return self._watcher is not None
+
+    def directory_changed(self, directory: Path) -> None:
+        with self._lock:
+            self._changed_directories.add(directory)
+
+    def has_changes(self) -> bool:
+        """
+        Returns True if inotify reported changes since the last scan
+        """
+        return len(self._changed_directories) > 0
+
+    def scan(self, directories: List[Path]) -> Dict[Path, List[Path]]:
+        """
+        Returns a map from directory to a list of all plots in the directory, like get_plot_filenames()
+        """
+        with self._lock:
+            changed_directories = self._changed_directories
+            self._changed_directories = set()
+        all_files: Dict[Path, List[Path]] = {}
+        for directory in directories:
+            try:
+                mtime_ns = directory.stat().st_mtime_ns
+            except OSError:
+                mtime_ns = 0
+            entry = self._index.get(directory)
+            if entry is not None and mtime_ns != 0 and entry[0] == mtime_ns and directory not in changed_directories:
+                all_files[directory] = entry[1]
+                continue
+            all_files[directory] = get_filenames(directory)
+            self.directories_listed += 1
+            if time.time() - mtime_ns / 1e9 < MTIME_GRACE_SECONDS:
+                mtime_ns = 0
+            self._index[directory] = (mtime_ns, all_files[directory])
+            self._changed = True
+        for directory in list(self._index.keys()):
+            if directory not in all_files:
+                del self._index[directory]
+                self._changed = True
+        if self._watcher is not None:
+            self._watcher.watch(set(directories))
+        return all_files
@@ -1,22 +1,27 @@
 from dataclasses import dataclass
 import logging
+import mmap
+import struct
 import threading
 import time
 import traceback
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Iterator
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Iterator, Union
 from concurrent.futures.thread import ThreadPoolExecutor
 
 from blspy import G1Element
 from chiapos import DiskProver
 
 from hddcoin.consensus.pos_quality import UI_ACTUAL_SPACE_CONSTANT_FACTOR, _expected_plot_size
+from hddcoin.plotting.discovery import PlotDiscovery
+from hddcoin.plotting.prover_pool import LazyDiskProver, ProverPool
 from hddcoin.plotting.util import (
     PlotInfo,
     PlotRefreshResult,
     PlotsRefreshParameter,
     PlotRefreshEvents,
-    get_plot_filenames,
+    get_plot_directories,
+    parse_plot_filename,
     parse_plot_info,
     stream_plot_info_pk,
     stream_plot_info_ph,
@@ -30,7 +35,18 @@ from hddcoin.wallet.derive_keys import master_sk_to_local_sk
 
 log = logging.getLogger(__name__)
 
-CURRENT_VERSION: uint16 = uint16(0)
+# Version 0 was a single serialized DiskCache, it's converted to the log format when loaded
+CURRENT_VERSION: uint16 = uint16(1)
+
+# The cache file is the version followed by a log of records. A record is a header (RECORD_HEADER) with the type,
+# the plot ID and the length of the serialized CacheEntry that follows. A removal has no entry.
+RECORD_HEADER = struct.Struct("!B32sI")
+RECORD_UPDATE = 1
+RECORD_REMOVE = 2
+
+# The log is rewritten with only the current entries once it holds more than this many outdated records, and
+# more outdated records than current ones
+COMPACT_MIN_OUTDATED = 1000
 
 
 @dataclass(frozen=True)
@@ -49,63 +65,187 @@ class DiskCache(Streamable):
 
 
 class Cache:
+    """
+    The keys of the plots, by plot ID. The cache file is an append-only log, so saving only appends the records
+    of the entries which changed since the last save. The file is memory-mapped when loaded and the entries are
+    only parsed when they're first used.
+    """
+
     _changed: bool
     _data: Dict[bytes32, CacheEntry]
+    # entries in the mapped file which weren't parsed yet, their offset and length
+    _unparsed: Dict[bytes32, Tuple[int, int]]
+    _pending: List[bytes]
+    _records: int
+    _file_size: int
+    _rewrite: bool
+    _mmap: Optional[mmap.mmap]
 
     def __init__(self, path: Path):
         self._changed = False
         self._data = {}
+        self._unparsed = {}
+        self._pending = []
+        self._records = 0
+        self._file_size = 0
+        self._rewrite = False
+        self._mmap = None
+        self._lock = threading.Lock()
         self._path = path
         if not path.parent.exists():
             mkdir(path.parent)
 
     def __len__(self):
-        return len(self._data)
+        return len(self._data) + len(self._unparsed)
 
     def update(self, plot_id: bytes32, entry: CacheEntry):
-        self._data[plot_id] = entry
-        self._changed = True
+        entry_bytes = bytes(entry)
+        with self._lock:
+            self._data[plot_id] = entry
+            self._unparsed.pop(plot_id, None)
+            self._pending.append(RECORD_HEADER.pack(RECORD_UPDATE, plot_id, len(entry_bytes)) + entry_bytes)
+            self._changed = True
 
     def remove(self, cache_keys: List[bytes32]):
-        for key in cache_keys:
-            if key in self._data:
-                del self._data[key]
-                self._changed = True
+        with self._lock:
+            for key in cache_keys:
+                if key in self._data or key in self._unparsed:
+                    self._data.pop(key, None)
+                    self._unparsed.pop(key, None)
+                    self._pending.append(RECORD_HEADER.pack(RECORD_REMOVE, key, 0))
+                    self._changed = True
+
+    def _needs_compaction(self) -> bool:
+        outdated = self._records + len(self._pending) - len(self)
+        return outdated > COMPACT_MIN_OUTDATED and outdated > len(self)
+
+    def _compact(self):
+        # Writes a new log with one record per entry, the unparsed entries are copied from the old file
+        records: List[bytes] = [bytes(CURRENT_VERSION)]
+        unparsed: Dict[bytes32, Tuple[int, int]] = {}
+        offset = len(records[0])
+        for plot_id, (entry_offset, length) in self._unparsed.items():
+            assert self._mmap is not None
+            records.append(RECORD_HEADER.pack(RECORD_UPDATE, plot_id, length))
+            records.append(self._mmap[entry_offset : entry_offset + length])
+            unparsed[plot_id] = (offset + RECORD_HEADER.size, length)
+            offset += RECORD_HEADER.size + length
+        for plot_id, entry in self._data.items():
+            entry_bytes = bytes(entry)
+            records.append(RECORD_HEADER.pack(RECORD_UPDATE, plot_id, len(entry_bytes)) + entry_bytes)
+        serialized = b"".join(records)
+        tmp_path = self._path.with_suffix(".tmp")
+        tmp_path.write_bytes(serialized)
+        self._unmap()
+        tmp_path.replace(self._path)
+        self._map()
+        self._unparsed = unparsed
+        self._records = len(self)
+        self._file_size = len(serialized)
+        self._rewrite = False
 
     def save(self):
         try:
-            disk_cache: DiskCache = DiskCache(
-                CURRENT_VERSION, [(plot_id, cache_entry) for plot_id, cache_entry in self.items()]
-            )
-            serialized: bytes = bytes(disk_cache)
-            self._path.write_bytes(serialized)
-            self._changed = False
-            log.info(f"Saved {len(serialized)} bytes of cached data")
+            with self._lock:
+                if self._rewrite or not self._path.exists() or self._needs_compaction():
+                    self._compact()
+                    log.info(f"Saved {self._file_size} bytes of cached data")
+                elif len(self._pending) > 0:
+                    appended = b"".join(self._pending)
+                    # a mapped file can't be shrunk on Windows
+                    self._unmap()
+                    try:
+                        with open(self._path, "r+b") as file:
+                            # drops a partially written record of an interrupted save
+                            file.truncate(self._file_size)
+                            file.seek(self._file_size)
+                            file.write(appended)
+                    finally:
+                        self._map()
+                    self._records += len(self._pending)
+                    self._file_size += len(appended)
+                    log.info(f"Appended {len(appended)} bytes of cached data")
+                self._pending = []
+                self._changed = False
         except Exception as e:
             log.error(f"Failed to save cache: {e}, {traceback.format_exc()}")
 
+    def _map(self):
+        with open(self._path, "rb") as file:
+            size = self._path.stat().st_size
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else None
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
     def load(self):
         try:
-            serialized = self._path.read_bytes()
-            log.info(f"Loaded {len(serialized)} bytes of cached data")
-            stored_cache: DiskCache = DiskCache.from_bytes(serialized)
-            if stored_cache.version != CURRENT_VERSION:
-                # TODO, Migrate or drop current cache if the version changes.
-                raise ValueError(f"Invalid cache version {stored_cache.version}. Expected version {CURRENT_VERSION}.")
-            self._data = {plot_id: cache_entry for plot_id, cache_entry in stored_cache.data}
+            with self._lock:
+                self._unmap()
+                self._data = {}
+                self._unparsed = {}
+                self._pending = []
+                self._records = 0
+                self._file_size = 0
+                # the file is rewritten with the next save if it can't be appended to
+                self._rewrite = True
+                self._map()
+                if self._mmap is None:
+                    raise ValueError("Empty cache file")
+                log.info(f"Loaded {len(self._mmap)} bytes of cached data")
+                version = uint16.from_bytes(self._mmap[:2])
+                if version == 0:
+                    stored_cache: DiskCache = DiskCache.from_bytes(self._mmap[:])
+                    self._data = {plot_id: cache_entry for plot_id, cache_entry in stored_cache.data}
+                    self._changed = True
+                    return
+                if version != CURRENT_VERSION:
+                    raise ValueError(f"Invalid cache version {version}. Expected version {CURRENT_VERSION}.")
+                offset = 2
+                while offset + RECORD_HEADER.size <= len(self._mmap):
+                    record_type, plot_id, length = RECORD_HEADER.unpack_from(self._mmap, offset)
+                    entry_offset = offset + RECORD_HEADER.size
+                    if entry_offset + length > len(self._mmap) or record_type not in [RECORD_UPDATE, RECORD_REMOVE]:
+                        break
+                    plot_id = bytes32(plot_id)
+                    if record_type == RECORD_UPDATE:
+                        self._unparsed[plot_id] = (entry_offset, length)
+                    else:
+                        self._unparsed.pop(plot_id, None)
+                    self._records += 1
+                    offset = entry_offset + length
+                if offset != len(self._mmap):
+                    log.warning(f"Ignoring {len(self._mmap) - offset} bytes at the end of the cache {self._path}")
+                self._file_size = offset
+                self._rewrite = False
         except FileNotFoundError:
             log.debug(f"Cache {self._path} not found")
         except Exception as e:
             log.error(f"Failed to load cache: {e}, {traceback.format_exc()}")
+            self._data = {}
+            self._unparsed = {}
 
     def keys(self):
-        return self._data.keys()
+        return [*self._data.keys(), *self._unparsed.keys()]
 
     def items(self):
-        return self._data.items()
+        return [(plot_id, self.get(plot_id)) for plot_id in self.keys()]
 
     def get(self, plot_id):
-        return self._data.get(plot_id)
+        entry = self._data.get(plot_id)
+        if entry is not None:
+            return entry
+        with self._lock:
+            location = self._unparsed.get(plot_id)
+            if location is None or self._mmap is None:
+                return None
+            entry_offset, length = location
+            entry = CacheEntry.from_bytes(self._mmap[entry_offset : entry_offset + length])
+            self._data[plot_id] = entry
+            del self._unparsed[plot_id]
+            return entry
 
     def changed(self):
         return self._changed
@@ -123,13 +263,17 @@ class PlotManager:
     farmer_public_keys: List[G1Element]
     pool_public_keys: List[G1Element]
     cache: Cache
+    discovery: PlotDiscovery
     match_str: Optional[str]
     show_memo: bool
     open_no_key_filenames: bool
     last_refresh_time: float
     refresh_parameter: PlotsRefreshParameter
+    prover_pool: Optional[ProverPool]
     log: Any
     _lock: threading.Lock
+    _plot_ids: bytes
+    _plot_id_paths: List[Path]
     _refresh_thread: Optional[threading.Thread]
     _refreshing_enabled: bool
     _refresh_callback: Callable
@@ -142,6 +286,7 @@ class PlotManager:
         show_memo: bool = False,
         open_no_key_filenames: bool = False,
         refresh_parameter: PlotsRefreshParameter = PlotsRefreshParameter(),
+        prover_pool: Optional[ProverPool] = None,
     ):
         self.root_path = root_path
         self.plots = {}
@@ -152,13 +297,21 @@ class PlotManager:
         self.farmer_public_keys = []
         self.pool_public_keys = []
         self.cache = Cache(self.root_path.resolve() / "cache" / "plot_manager.dat")
+        self.discovery = PlotDiscovery(self.root_path.resolve() / "cache" / "plot_directories.dat")
         self.match_str = match_str
         self.show_memo = show_memo
         self.open_no_key_filenames = open_no_key_filenames
         self.last_refresh_time = 0
         self.refresh_parameter = refresh_parameter
+        # With a prover pool, plots with a cache entry are registered without opening them, and their DiskProvers
+        # are only opened (and kept in the pool) when they're used
+        self.prover_pool = prover_pool
         self.log = logging.getLogger(__name__)
         self._lock = threading.Lock()
+        # The IDs of all plots back to back, in the order of _plot_id_paths. Rebuilt when plots are added or
+        # removed, so the plot filter can be evaluated without touching the PlotInfo objects.
+        self._plot_ids = b""
+        self._plot_id_paths = []
         self._refresh_thread = None
         self._refreshing_enabled = False
         self._refresh_callback = refresh_callback  # type: ignore
@@ -183,6 +336,18 @@ class PlotManager:
         with self:
             return len(self.plots)
 
+    def get_plot_ids(self) -> Tuple[bytes, List[Path]]:
+        """
+        Returns the concatenated IDs of all plots, and the path of every plot in the same order
+        """
+        with self:
+            return self._plot_ids, self._plot_id_paths
+
+    def _update_plot_ids(self):
+        # must be called with the lock held
+        self._plot_id_paths = list(self.plots.keys())
+        self._plot_ids = b"".join(bytes(self.plots[path].prover.get_id()) for path in self._plot_id_paths)
+
     def get_duplicates(self):
         result = []
         for plot_filename, paths_entry in self.plot_filename_paths.items():
@@ -192,12 +357,18 @@ class PlotManager:
         return result
 
     def needs_refresh(self) -> bool:
-        return time.time() - self.last_refresh_time > float(self.refresh_parameter.interval_seconds)
+        # with inotify, plots show up without waiting for the next refresh interval
+        return (
+            time.time() - self.last_refresh_time > float(self.refresh_parameter.interval_seconds)
+            or self.discovery.has_changes()
+        )
 
     def start_refreshing(self):
         self._refreshing_enabled = True
         if self._refresh_thread is None or not self._refresh_thread.is_alive():
             self.cache.load()
+            self.discovery.load()
+            self.discovery.start_watching()
             self._refresh_thread = threading.Thread(target=self._refresh_task)
             self._refresh_thread.start()
 
@@ -206,6 +377,7 @@ class PlotManager:
         if self._refresh_thread is not None and self._refresh_thread.is_alive():
             self._refresh_thread.join()
             self._refresh_thread = None
+        self.discovery.stop_watching()
 
     def trigger_refresh(self):
         log.debug("trigger_refresh")
@@ -220,11 +392,15 @@ class PlotManager:
             if not self._refreshing_enabled:
                 return
 
-            plot_filenames: Dict[Path, List[Path]] = get_plot_filenames(self.root_path)
+            # Only the directories which changed since the last refresh are listed again
+            plot_filenames: Dict[Path, List[Path]] = self.discovery.scan(
+                [Path(directory).resolve() for directory in get_plot_directories(self.root_path)]
+            )
             plot_directories: Set[Path] = set(plot_filenames.keys())
             plot_paths: List[Path] = []
             for paths in plot_filenames.values():
                 plot_paths += paths
+            plot_path_set: Set[Path] = set(plot_paths)
 
             total_result: PlotRefreshResult = PlotRefreshResult()
             total_size = len(plot_paths)
@@ -233,7 +409,7 @@ class PlotManager:
 
             # First drop all plots we have in plot_filename_paths but not longer in the filesystem or set in config
             def plot_removed(test_path: Path):
-                return not test_path.exists() or test_path.parent not in plot_directories
+                return test_path not in plot_path_set
 
             filenames_to_remove: List[str] = []
             for plot_filename, paths_entry in self.plot_filename_paths.items():
@@ -243,6 +419,8 @@ class PlotManager:
                     filenames_to_remove.append(plot_filename)
                     if loaded_plot in self.plots:
                         del self.plots[loaded_plot]
+                    if self.prover_pool is not None:
+                        self.prover_pool.close(str(loaded_plot))
                     total_result.removed += 1
                     # No need to check the duplicates here since we drop the whole entry
                     continue
@@ -258,6 +436,10 @@ class PlotManager:
             for filename in filenames_to_remove:
                 del self.plot_filename_paths[filename]
 
+            if total_result.removed > 0:
+                with self:
+                    self._update_plot_ids()
+
             def batches() -> Iterator[Tuple[int, List[Path]]]:
                 if total_size > 0:
                     for batch_start in range(0, total_size, self.refresh_parameter.batch_size):
@@ -295,6 +477,7 @@ class PlotManager:
 
             if self.cache.changed():
                 self.cache.save()
+            self.discovery.save()
 
             self.last_refresh_time = time.time()
 
@@ -304,6 +487,17 @@ class PlotManager:
                 f"total_duration {total_result.duration:.2f} seconds"
             )
 
+    def _lazy_prover(self, file_path: Path) -> Optional[LazyDiskProver]:
+        # The ID and size are taken from the file name, they're verified when the plot is opened
+        assert self.prover_pool is not None
+        parsed = parse_plot_filename(file_path)
+        if parsed is None:
+            return None
+        size, plot_id = parsed
+        if self.cache.get(plot_id) is None:
+            return None
+        return LazyDiskProver(str(file_path), plot_id, size, self.prover_pool)
+
     def refresh_batch(self, plot_paths: List[Path], plot_directories: Set[Path]) -> PlotRefreshResult:
         start_time: float = time.time()
         result: PlotRefreshResult = PlotRefreshResult(processed=len(plot_paths))
@@ -341,7 +535,10 @@ class PlotManager:
                 if not file_path.exists():
                     return None
 
-                prover = DiskProver(str(file_path))
+                lazy_prover = self._lazy_prover(file_path) if self.prover_pool is not None else None
+                prover: Union[DiskProver, LazyDiskProver] = (
+                    lazy_prover if lazy_prover is not None else DiskProver(str(file_path))
+                )
 
                 log.debug(f"process_file {str(file_path)}")
 
@@ -406,6 +603,10 @@ class PlotManager:
                         log.warning(f"Have multiple copies of the plot {file_path.name} in {[paths[0], *paths[1]]}.")
                         return None
 
+                if self.prover_pool is not None and isinstance(prover, DiskProver):
+                    # not kept open, it's opened again through the pool when the plot is used
+                    prover = LazyDiskProver(str(file_path), prover.get_id(), prover.get_size(), self.prover_pool)
+
                 new_plot_info: PlotInfo = PlotInfo(
                     prover,
                     cache_entry.pool_public_key,
@@ -445,6 +646,8 @@ class PlotManager:
                 if new_plot is not None:
                     plots_refreshed[Path(new_plot.prover.get_filename())] = new_plot
             self.plots.update(plots_refreshed)
+            if result.loaded > 0:
+                self._update_plot_ids()
 
         result.duration = time.time() - start_time
 
@@ -0,0 +1,145 @@
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from chiapos import DiskProver
+
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+
+log = logging.getLogger(__name__)
+
+
+def process_memory() -> Optional[int]:
+    """
+    Returns the resident memory of this process in bytes, or the peak resident memory where the current one isn't
+    available, or None on Windows
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform in ["win32", "cygwin"]:
+        return None
+    import resource
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def process_open_files() -> Optional[int]:
+    """
+    Returns the number of open file descriptors of this process, or None if it can't be determined
+    """
+    for fd_directory in ["/proc/self/fd", "/dev/fd"]:
+        try:
+            return len(os.listdir(fd_directory))
+        except OSError:
+            continue
+    return None
+
+
+class LazyDiskProver:
+    """
+    Stands in for a DiskProver of a plot whose ID and size are already known from the plot cache. The DiskProver is
+    only opened, through the ProverPool, when the plot is actually used.
+    """
+
+    def __init__(self, filename: str, plot_id: bytes32, size: int, pool: "ProverPool"):
+        self._filename = filename
+        self._plot_id = plot_id
+        self._size = size
+        self._pool = pool
+        self._memo: Optional[bytes] = None
+
+    def get_filename(self) -> str:
+        return self._filename
+
+    def get_id(self) -> bytes32:
+        return self._plot_id
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_memo(self) -> bytes:
+        if self._memo is None:
+            self._memo = self._pool.get(self).get_memo()
+        return self._memo
+
+    def get_qualities_for_challenge(self, challenge: bytes32) -> List[bytes]:
+        return self._pool.get(self).get_qualities_for_challenge(challenge)
+
+    def get_full_proof(self, challenge: bytes32, index: int, parallel_read: bool = True) -> bytes:
+        return self._pool.get(self).get_full_proof(challenge, index, parallel_read)
+
+    def is_open(self) -> bool:
+        return self._pool.is_open(self._filename)
+
+
+class ProverPool:
+    """
+    The DiskProvers opened for LazyDiskProvers. At most max_open provers are kept, the least recently used one is
+    closed when another one is opened.
+    """
+
+    max_open: int
+    opened: int
+    evicted: int
+    _provers: "OrderedDict[str, DiskProver]"
+
+    def __init__(self, max_open: int):
+        self.max_open = max_open
+        self.opened = 0
+        self.evicted = 0
+        self._provers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._provers)
+
+    def get(self, lazy_prover: LazyDiskProver) -> DiskProver:
+        filename = lazy_prover.get_filename()
+        with self._lock:
+            prover = self._provers.get(filename)
+            if prover is not None:
+                self._provers.move_to_end(filename)
+                return prover
+        # opening reads the plot header, so it's done without holding the lock
+        prover = DiskProver(filename)
+        if prover.get_id() != lazy_prover.get_id() or prover.get_size() != lazy_prover.get_size():
+            raise ValueError(
+                f"Plot {filename} has ID {prover.get_id().hex()} and size {prover.get_size()}, expected ID "
+                f"{lazy_prover.get_id().hex()} and size {lazy_prover.get_size()}"
+            )
+        with self._lock:
+            existing = self._provers.get(filename)
+            if existing is not None:
+                # opened by another thread in the meantime
+                self._provers.move_to_end(filename)
+                return existing
+            self._provers[filename] = prover
+            self.opened += 1
+            while len(self._provers) > self.max_open:
+                self._provers.popitem(last=False)
+                self.evicted += 1
+        return prover
+
+    def is_open(self, filename: str) -> bool:
+        with self._lock:
+            return filename in self._provers
+
+    def close(self, filename: str) -> None:
+        with self._lock:
+            self._provers.pop(filename, None)
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        return {
+            "open": len(self._provers),
+            "max_open": self.max_open,
+            "opened": self.opened,
+            "evicted": self.evicted,
+        }
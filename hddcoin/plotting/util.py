@@ -2,12 +2,14 @@ import logging
 
 from dataclasses import dataclass
 from enum import Enum
+from hashlib import sha256
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Union
 
 from blspy import G1Element, PrivateKey
 from chiapos import DiskProver
 
+from hddcoin.plotting.prover_pool import LazyDiskProver
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.util.config import load_config, save_config
 
@@ -24,7 +26,7 @@ class PlotsRefreshParameter:
 
 @dataclass
 class PlotInfo:
-    prover: DiskProver
+    prover: Union[DiskProver, LazyDiskProver]
     pool_public_key: Optional[G1Element]
     pool_contract_puzzle_hash: Optional[bytes32]
     plot_public_key: G1Element
@@ -132,6 +134,22 @@ def get_filenames(directory: Path) -> List[Path]:
     return all_files
 
 
+def parse_plot_filename(path: Path) -> Optional[Tuple[int, bytes32]]:
+    """
+    Returns the k size and the plot ID in the name of a plot file (plot-k32-...-[64 char plot ID].plot), or None if
+    the name doesn't have them. The name isn't verified against the plot itself.
+    """
+    filename_parts: List[str] = path.stem.split("-")
+    if len(filename_parts) < 3 or filename_parts[0] != "plot" or not filename_parts[1].startswith("k"):
+        return None
+    try:
+        size = int(filename_parts[1][1:])
+        plot_id = bytes32(bytes.fromhex(filename_parts[-1]))
+    except ValueError:
+        return None
+    return size, plot_id
+
+
 def parse_plot_info(memo: bytes) -> Tuple[Union[G1Element, bytes32], G1Element, PrivateKey]:
     # Parses the plot info bytes into keys
     if len(memo) == (48 + 48 + 32):
@@ -176,6 +194,25 @@ def stream_plot_info_ph(
     return data
 
 
+def plots_passing_filter(
+    plot_ids: bytes, start: int, end: int, challenge_hash: bytes32, signage_point: bytes32, zero_bits: int
+) -> List[int]:
+    """
+    Returns the indices in [start, end) of the plots which pass the plot filter, plot_ids holds the 32 byte plot
+    IDs back to back. This is the same as calling ProofOfSpace.passes_plot_filter for every plot.
+    """
+    suffix = bytes(challenge_hash) + bytes(signage_point)
+    num_bytes = (zero_bits + 7) // 8
+    shift = num_bytes * 8 - zero_bits
+    view = memoryview(plot_ids)
+    passed: List[int] = []
+    for index in range(start, end):
+        digest = sha256(view[index * 32 : index * 32 + 32].tobytes() + suffix).digest()
+        if int.from_bytes(digest[:num_bytes], "big") >> shift == 0:
+            passed.append(index)
+    return passed
+
+
 def find_duplicate_plot_IDs(all_filenames=None) -> None:
     if all_filenames is None:
         all_filenames = []
@@ -0,0 +1,66 @@
+from enum import IntEnum
+from typing import Dict
+
+from hddcoin.protocols.protocol_message_types import ProtocolMessageTypes as pmt
+
+
+class MessagePriority(IntEnum):
+    # Lower values are sent first
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+# Messages that farming and infusion wait on, sent ahead of everything else queued for the peer
+HIGH_PRIORITY = [
+    # full_node -> full_node, wallet
+    pmt.new_peak,
+    pmt.new_unfinished_block,
+    pmt.new_signage_point_or_end_of_sub_slot,
+    pmt.respond_unfinished_block,
+    pmt.request_signage_point_or_end_of_sub_slot,
+    pmt.respond_signage_point,
+    pmt.respond_end_of_sub_slot,
+    pmt.new_peak_wallet,
+    # farmer, harvester
+    pmt.new_signage_point,
+    pmt.new_signage_point_harvester,
+    pmt.new_proof_of_space,
+    pmt.request_signatures,
+    pmt.respond_signatures,
+    pmt.declare_proof_of_space,
+    pmt.request_signed_values,
+    pmt.signed_values,
+    # timelord
+    pmt.new_peak_timelord,
+    pmt.new_unfinished_block_timelord,
+    pmt.new_infusion_point_vdf,
+    pmt.new_signage_point_vdf,
+    pmt.new_end_of_sub_slot_vdf,
+]
+
+# Bulk gossip and sync, sent after everything else queued for the peer
+LOW_PRIORITY = [
+    pmt.request_blocks,
+    pmt.respond_blocks,
+    pmt.request_proof_of_weight,
+    pmt.respond_proof_of_weight,
+    pmt.new_transaction,
+    pmt.request_transaction,
+    pmt.respond_transaction,
+    pmt.request_mempool_transactions,
+    pmt.new_compact_vdf,
+    pmt.request_compact_vdf,
+    pmt.respond_compact_vdf,
+    pmt.request_peers,
+    pmt.respond_peers,
+]
+
+PRIORITY_OF_MESSAGE_TYPE: Dict[int, MessagePriority] = {
+    **{msg_type.value: MessagePriority.HIGH for msg_type in HIGH_PRIORITY},
+    **{msg_type.value: MessagePriority.LOW for msg_type in LOW_PRIORITY},
+}
+
+
+def message_priority(msg_type: int) -> MessagePriority:
+    return PRIORITY_OF_MESSAGE_TYPE.get(msg_type, MessagePriority.NORMAL)
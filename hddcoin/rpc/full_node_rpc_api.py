@@ -40,6 +40,7 @@ class FullNodeRpcApi:
             # be removed in the future
             "/get_initial_freeze_period": self.get_initial_freeze_period,
             "/get_network_info": self.get_network_info,
+            "/get_sync_metrics": self.get_sync_metrics,
             "/get_recent_signage_point_or_eos": self.get_recent_signage_point_or_eos,
             # Coins
             "/get_coin_records_by_puzzle_hash": self.get_coin_records_by_puzzle_hash,
@@ -53,6 +54,7 @@ class FullNodeRpcApi:
             "/get_all_mempool_tx_ids": self.get_all_mempool_tx_ids,
             "/get_all_mempool_items": self.get_all_mempool_items,
             "/get_mempool_item_by_tx_id": self.get_mempool_item_by_tx_id,
+            "/get_mempool_validation_metrics": self.get_mempool_validation_metrics,
         }
 
     async def _state_changed(self, change: str) -> List[WsRpcMessage]:
@@ -173,6 +175,15 @@ class FullNodeRpcApi:
         address_prefix = self.service.config["network_overrides"]["config"][network_name]["address_prefix"]
         return {"network_name": network_name, "network_prefix": address_prefix}
 
+    async def get_sync_metrics(self, _request: Dict):
+        """
+        Returns the throughput, queue depth and stalls of the current (or last) long sync, and the batch size,
+        latency and throughput of every peer blocks were fetched from.
+        """
+        if self.service.sync_scheduler is None:
+            return {"sync_metrics": None}
+        return {"sync_metrics": self.service.sync_scheduler.to_json_dict()}
+
     async def get_recent_signage_point_or_eos(self, request: Dict):
         if "sp_hash" not in request:
             challenge_hash: bytes32 = hexstr_to_bytes(request["challenge_hash"])
@@ -601,3 +612,14 @@ class FullNodeRpcApi:
             raise ValueError(f"Tx id 0x{tx_id.hex()} not in the mempool")
 
         return {"mempool_item": item}
+
+    async def get_mempool_validation_metrics(self, _request: Dict) -> Optional[Dict]:
+        """
+        Returns the queue depth, latency of every stage and the results of the transaction validation workers, and
+        the number of transactions waiting for them or dropped because the transaction queue was full.
+        """
+        metrics = self.service.mempool_manager.validation_pool.to_json_dict()
+        metrics["transaction_queue"] = self.service.transaction_queue.qsize()
+        metrics["dropped"] = len(self.service.dropped_tx)
+        metrics["not_dropped"] = self.service.not_dropped_tx
+        return {"mempool_validation_metrics": metrics}
@@ -204,6 +204,14 @@ class FullNodeRpcClient(RpcClient):
         except Exception:
             return None
 
+    async def get_mempool_validation_metrics(self) -> Dict:
+        response = await self.fetch("get_mempool_validation_metrics", {})
+        return response["mempool_validation_metrics"]
+
+    async def get_sync_metrics(self) -> Optional[Dict]:
+        response = await self.fetch("get_sync_metrics", {})
+        return response["sync_metrics"]
+
     async def get_recent_signage_point_or_eos(
         self, sp_hash: Optional[bytes32], challenge_hash: Optional[bytes32]
     ) -> Optional[Any]:
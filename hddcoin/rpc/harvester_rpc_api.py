@@ -17,6 +17,7 @@ class HarvesterRpcApi:
             "/add_plot_directory": self.add_plot_directory,
             "/get_plot_directories": self.get_plot_directories,
             "/remove_plot_directory": self.remove_plot_directory,
+            "/get_disk_stats": self.get_disk_stats,
         }
 
     async def _state_changed(self, change: str) -> List[WsRpcMessage]:
@@ -32,6 +33,7 @@ class HarvesterRpcApi:
             "plots": plots,
             "failed_to_open_filenames": failed_to_open,
             "not_found_filenames": not_found,
+            "resource_usage": self.service.get_resource_usage(),
         }
 
     async def refresh_plots(self, request: Dict) -> Dict:
@@ -59,3 +61,6 @@ class HarvesterRpcApi:
         if await self.service.remove_plot_directory(directory_name):
             return {}
         raise ValueError(f"Did not remove plot directory {directory_name}")
+
+    async def get_disk_stats(self, request: Dict) -> Dict:
+        return {"disks": self.service.disk_scheduler.to_json_dict()}
@@ -58,6 +58,14 @@ class RpcClient:
             connection["node_id"] = hexstr_to_bytes(connection["node_id"])
         return response["connections"]
 
+    async def get_api_scheduler_metrics(self) -> Dict:
+        response = await self.fetch("get_api_scheduler_metrics", {})
+        return response["metrics"]
+
+    async def get_message_type_stats(self) -> Dict:
+        response = await self.fetch("get_message_type_stats", {})
+        return {"inbound": response["inbound"], "outbound": response["outbound"]}
+
     async def open_connection(self, host: str, port: int) -> Dict:
         return await self.fetch("open_connection", {"host": host, "port": int(port)})
 
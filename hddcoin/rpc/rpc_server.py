@@ -8,6 +8,7 @@ from typing import Any, Callable, Dict, List, Optional
 import aiohttp
 
 from hddcoin.server.outbound_message import NodeType
+from hddcoin.server.rate_limits import INBOUND_STATS, OUTBOUND_STATS
 from hddcoin.server.server import ssl_context_for_server
 from hddcoin.types.peer_info import PeerInfo
 from hddcoin.util.byte_types import hexstr_to_bytes
@@ -129,6 +130,7 @@ class RpcServer:
                     "bytes_read": con.bytes_read,
                     "bytes_written": con.bytes_written,
                     "last_message_time": con.last_message_time,
+                    "outbound": con.get_outbound_metrics(),
                     "peak_height": peak_height,
                     "peak_weight": peak_weight,
                     "peak_hash": peak_hash,
@@ -148,11 +150,23 @@ class RpcServer:
                     "bytes_read": con.bytes_read,
                     "bytes_written": con.bytes_written,
                     "last_message_time": con.last_message_time,
+                    "outbound": con.get_outbound_metrics(),
                 }
                 for con in connections
             ]
         return {"connections": con_info}
 
+    async def get_api_scheduler_metrics(self, request: Dict) -> Dict:
+        if self.rpc_api.service.server is None:
+            raise ValueError("Global connections is not set")
+        return {"metrics": self.rpc_api.service.server.incoming_messages.get_metrics()}
+
+    async def get_message_type_stats(self, request: Dict) -> Dict:
+        """
+        Messages and bytes of each message type, received from and sent to all the peers.
+        """
+        return {"inbound": INBOUND_STATS.to_json_dict(), "outbound": OUTBOUND_STATS.to_json_dict()}
+
     async def open_connection(self, request: Dict):
         host = request["host"]
         port = request["port"]
@@ -313,6 +327,14 @@ async def start_rpc_server(
             "/get_connections",
             rpc_server._wrap_http_handler(rpc_server.get_connections),
         ),
+        aiohttp.web.post(
+            "/get_api_scheduler_metrics",
+            rpc_server._wrap_http_handler(rpc_server.get_api_scheduler_metrics),
+        ),
+        aiohttp.web.post(
+            "/get_message_type_stats",
+            rpc_server._wrap_http_handler(rpc_server.get_message_type_stats),
+        ),
         aiohttp.web.post(
             "/open_connection",
             rpc_server._wrap_http_handler(rpc_server.open_connection),
@@ -172,6 +172,10 @@ class AddressManager:
     used_new_matrix_positions: Set[Tuple[int, int]]
     used_tried_matrix_positions: Set[Tuple[int, int]]
     allow_private_subnets: bool
+    dirty_new_buckets: Set[int]
+    dirty_tried_buckets: Set[int]
+    dirty_nodes: Set[int]
+    full_snapshot_needed: bool
 
     def __init__(self) -> None:
         self.clear()
@@ -192,6 +196,12 @@ class AddressManager:
         self.used_new_matrix_positions = set()
         self.used_tried_matrix_positions = set()
         self.allow_private_subnets = False
+        # What changed since the last time the tables were stored, so only those buckets are written again.
+        # The nodes are the ones whose stored information (the timestamp) changed, in the buckets they are in.
+        self.dirty_new_buckets = set()
+        self.dirty_tried_buckets = set()
+        self.dirty_nodes = set()
+        self.full_snapshot_needed = True
 
     def make_private_subnets_valid(self) -> None:
         self.allow_private_subnets = True
@@ -199,6 +209,7 @@ class AddressManager:
     # Use only this method for modifying new matrix.
     def _set_new_matrix(self, row: int, col: int, value: int) -> None:
         self.new_matrix[row][col] = value
+        self.dirty_new_buckets.add(row)
         if value == -1:
             if (row, col) in self.used_new_matrix_positions:
                 self.used_new_matrix_positions.remove((row, col))
@@ -209,6 +220,7 @@ class AddressManager:
     # Use only this method for modifying tried matrix.
     def _set_tried_matrix(self, row: int, col: int, value: int) -> None:
         self.tried_matrix[row][col] = value
+        self.dirty_tried_buckets.add(row)
         if value == -1:
             if (row, col) in self.used_tried_matrix_positions:
                 self.used_tried_matrix_positions.remove((row, col))
@@ -377,6 +389,8 @@ class AddressManager:
                 info.timestamp > 0 or info.timestamp < addr.timestamp - update_interval - penalty
             ):
                 info.timestamp = max(0, addr.timestamp - penalty)
+                assert node_id is not None
+                self.dirty_nodes.add(node_id)
 
             # do not update if no new information is present
             if addr.timestamp == 0 or (info.timestamp > 0 and addr.timestamp <= info.timestamp):
@@ -578,8 +592,8 @@ class AddressManager:
                         self.clear_new_(bucket, pos)
 
     def connect_(self, addr: PeerInfo, timestamp: int):
-        info, _ = self.find_(addr)
-        if info is None:
+        info, node_id = self.find_(addr)
+        if info is None or node_id is None:
             return None
 
         # check whether we are talking about the exact same peer
@@ -589,6 +603,28 @@ class AddressManager:
         update_interval = 20 * 60
         if timestamp - info.timestamp > update_interval:
             info.timestamp = timestamp
+            self.dirty_nodes.add(node_id)
+
+    def take_dirty_buckets_(self) -> Tuple[List[int], List[int]]:
+        """
+        Returns the new and tried buckets changed since the last call, and starts tracking the changes again
+        """
+        if len(self.dirty_nodes) > 0:
+            for bucket, pos in self.used_new_matrix_positions:
+                if self.new_matrix[bucket][pos] in self.dirty_nodes:
+                    self.dirty_new_buckets.add(bucket)
+            for bucket, pos in self.used_tried_matrix_positions:
+                if self.tried_matrix[bucket][pos] in self.dirty_nodes:
+                    self.dirty_tried_buckets.add(bucket)
+        if self.full_snapshot_needed:
+            new_buckets, tried_buckets = list(range(NEW_BUCKET_COUNT)), list(range(TRIED_BUCKET_COUNT))
+        else:
+            new_buckets, tried_buckets = sorted(self.dirty_new_buckets), sorted(self.dirty_tried_buckets)
+        self.dirty_new_buckets = set()
+        self.dirty_tried_buckets = set()
+        self.dirty_nodes = set()
+        self.full_snapshot_needed = False
+        return new_buckets, tried_buckets
 
     async def size(self) -> int:
         async with self.lock:
@@ -1,18 +1,85 @@
+import ipaddress
 import logging
+import struct
 from typing import Dict, List, Tuple
 
 import aiosqlite
 
 from hddcoin.server.address_manager import (
-    BUCKET_SIZE,
     NEW_BUCKET_COUNT,
     NEW_BUCKETS_PER_ADDRESS,
+    TRIED_BUCKET_COUNT,
     AddressManager,
     ExtendedPeerInfo,
 )
+from hddcoin.types.peer_info import PeerInfo, TimestampedPeerInfo
+from hddcoin.util.ints import uint16, uint64
 
 log = logging.getLogger(__name__)
 
+# Version 1 stored the nodes as text rows, and the new table as (node, bucket) rows
+BINARY_FORMAT_VERSION = 2
+
+# The hosts are stored as 4 or 16 bytes when they are IP addresses, and as text otherwise
+HOST_IPV4 = 4
+HOST_IPV6 = 6
+HOST_TEXT = 0
+
+
+def encode_host(host: str) -> bytes:
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        ip = None
+    # Hosts which aren't written the standard way are kept as they are, since they are looked up as text
+    if ip is not None and str(ip) == host:
+        return bytes([HOST_IPV4 if ip.version == 4 else HOST_IPV6]) + ip.packed
+    encoded = host.encode()
+    return bytes([HOST_TEXT, len(encoded)]) + encoded
+
+
+def decode_host(data: bytes, offset: int) -> Tuple[str, int]:
+    kind = data[offset]
+    if kind == HOST_IPV4:
+        return str(ipaddress.IPv4Address(data[offset + 1 : offset + 5])), offset + 5
+    if kind == HOST_IPV6:
+        return str(ipaddress.IPv6Address(data[offset + 1 : offset + 17])), offset + 17
+    if kind != HOST_TEXT:
+        raise ValueError(f"Invalid host encoding {kind}")
+    length = data[offset + 1]
+    return data[offset + 2 : offset + 2 + length].decode(), offset + 2 + length
+
+
+def encode_peers(infos: List[ExtendedPeerInfo]) -> bytes:
+    """
+    Host, port and timestamp of each peer, with the host and port of the peer it came from
+    """
+    encoded: List[bytes] = []
+    for info in infos:
+        assert info.src is not None
+        encoded.append(encode_host(info.peer_info.host))
+        encoded.append(struct.pack(">HQ", info.peer_info.port, int(info.timestamp)))
+        encoded.append(encode_host(info.src.host))
+        encoded.append(struct.pack(">H", info.src.port))
+    return b"".join(encoded)
+
+
+def decode_peers(data: bytes) -> List[ExtendedPeerInfo]:
+    infos: List[ExtendedPeerInfo] = []
+    offset = 0
+    while offset < len(data):
+        host, offset = decode_host(data, offset)
+        port, timestamp = struct.unpack_from(">HQ", data, offset)
+        src_host, offset = decode_host(data, offset + 10)
+        (src_port,) = struct.unpack_from(">H", data, offset)
+        offset += 2
+        infos.append(
+            ExtendedPeerInfo(
+                TimestampedPeerInfo(host, uint16(port), uint64(timestamp)), PeerInfo(src_host, uint16(src_port))
+            )
+        )
+    return infos
+
 
 class AddressManagerStore:
     """
@@ -20,15 +87,18 @@ class AddressManagerStore:
     - private key
     - new table count
     - tried table count
-    Nodes table:
-    * Maps entries from new/tried table to unique node ids.
-    - node_id
-    - IP, port, together with the IP, port of the source peer.
-    New table:
-    * Stores node_id, bucket for each occurrence in the new table of an entry.
-    * Once we know the buckets, we can also deduce the bucket positions.
-    Every other information, such as tried_matrix, map_addr, map_info, random_pos,
+    - format version
+    Buckets table:
+    * One row for each bucket of the new and tried tables which has entries.
+    - whether it's a tried bucket, and the bucket
+    - IP, port, timestamp together with the IP, port of the source peer of its entries, in binary.
+    * A node in several new buckets is in each of them. Once we know the buckets, we can also deduce the
+      bucket positions.
+    * Only the buckets which changed since the last time are written again.
+    Every other information, such as map_addr, map_info, random_pos,
     be deduced and it is not explicitly stored, instead it is recalculated.
+
+    The nodes table and new table of version 1 are still read, and replaced at the next serialize.
     """
 
     db: aiosqlite.Connection
@@ -46,6 +116,11 @@ class AddressManagerStore:
 
         await self.db.execute("CREATE TABLE IF NOT EXISTS peer_new_table(node_id int,bucket int)")
         await self.db.commit()
+
+        await self.db.execute(
+            "CREATE TABLE IF NOT EXISTS peer_buckets(is_tried int,bucket int,value blob,PRIMARY KEY(is_tried, bucket))"
+        )
+        await self.db.commit()
         return self
 
     async def clear(self) -> None:
@@ -55,6 +130,8 @@ class AddressManagerStore:
         await cursor.close()
         cursor = await self.db.execute("DELETE from peer_new_table")
         await cursor.close()
+        cursor = await self.db.execute("DELETE from peer_buckets")
+        await cursor.close()
         await self.db.commit()
 
     async def get_metadata(self) -> Dict[str, str]:
@@ -94,63 +171,105 @@ class AddressManagerStore:
             await cursor.close()
         await self.db.commit()
 
-    async def set_nodes(self, node_list) -> None:
-        for node_id, peer_info in node_list:
-            cursor = await self.db.execute(
-                "INSERT OR REPLACE INTO peer_nodes VALUES(?, ?)",
-                (node_id, peer_info.to_string()),
+    async def serialize(self, address_manager: AddressManager) -> None:
+        """
+        Writes the buckets changed since the last time, or all of them the first time. The snapshot is taken without
+        awaiting, so the address manager doesn't have to be locked while it's written.
+        """
+        async with address_manager.lock:
+            new_buckets, tried_buckets = address_manager.take_dirty_buckets_()
+            full_snapshot = len(new_buckets) == NEW_BUCKET_COUNT and len(tried_buckets) == TRIED_BUCKET_COUNT
+            metadata = [
+                ("key", str(address_manager.key)),
+                ("new_count", str(address_manager.new_count)),
+                ("tried_count", str(address_manager.tried_count)),
+                ("version", str(BINARY_FORMAT_VERSION)),
+            ]
+            buckets: List[Tuple[int, int, bytes]] = []
+            for is_tried, bucket_numbers, matrix in [
+                (False, new_buckets, address_manager.new_matrix),
+                (True, tried_buckets, address_manager.tried_matrix),
+            ]:
+                for bucket in bucket_numbers:
+                    infos = [address_manager.map_info[node_id] for node_id in matrix[bucket] if node_id != -1]
+                    buckets.append((int(is_tried), bucket, encode_peers(infos)))
+
+        try:
+            if full_snapshot:
+                for table in ["peer_buckets", "peer_nodes", "peer_new_table"]:
+                    cursor = await self.db.execute(f"DELETE from {table}")
+                    await cursor.close()
+            cursor = await self.db.executemany(
+                "DELETE from peer_buckets WHERE is_tried=? AND bucket=?",
+                [(is_tried, bucket) for is_tried, bucket, value in buckets if len(value) == 0],
             )
             await cursor.close()
-        await self.db.commit()
-
-    async def set_new_table(self, entries) -> None:
-        for node_id, bucket in entries:
-            cursor = await self.db.execute(
-                "INSERT OR REPLACE INTO peer_new_table VALUES(?, ?)",
-                (node_id, bucket),
+            cursor = await self.db.executemany(
+                "INSERT OR REPLACE INTO peer_buckets VALUES(?, ?, ?)",
+                [(is_tried, bucket, value) for is_tried, bucket, value in buckets if len(value) > 0],
             )
             await cursor.close()
-        await self.db.commit()
-
-    async def serialize(self, address_manager: AddressManager):
-        metadata = []
-        nodes = []
-        new_table_entries = []
-        metadata.append(("key", str(address_manager.key)))
-
-        unique_ids = {}
-        count_ids = 0
-
-        for node_id, info in address_manager.map_info.items():
-            unique_ids[node_id] = count_ids
-            if info.ref_count > 0:
-                assert count_ids != address_manager.new_count
-                nodes.append((count_ids, info))
-                count_ids += 1
-        metadata.append(("new_count", str(count_ids)))
-
-        tried_ids = 0
-        for node_id, info in address_manager.map_info.items():
-            if info.is_tried:
-                assert info is not None
-                assert tried_ids != address_manager.tried_count
-                nodes.append((count_ids, info))
-                count_ids += 1
-                tried_ids += 1
-        metadata.append(("tried_count", str(tried_ids)))
-
-        for bucket in range(NEW_BUCKET_COUNT):
-            for i in range(BUCKET_SIZE):
-                if address_manager.new_matrix[bucket][i] != -1:
-                    index = unique_ids[address_manager.new_matrix[bucket][i]]
-                    new_table_entries.append((index, bucket))
-
-        await self.clear()
-        await self.set_metadata(metadata)
-        await self.set_nodes(nodes)
-        await self.set_new_table(new_table_entries)
+            await self.set_metadata(metadata)
+        except Exception:
+            # The changes taken aren't stored, so everything is written again next time
+            address_manager.full_snapshot_needed = True
+            raise
 
     async def deserialize(self) -> AddressManager:
+        metadata = await self.get_metadata()
+        if int(metadata.get("version", 1)) < BINARY_FORMAT_VERSION:
+            return await self.deserialize_v1()
+
+        address_manager = AddressManager()
+        address_manager.key = int(metadata["key"])
+        cursor = await self.db.execute("SELECT is_tried, bucket, value from peer_buckets ORDER BY is_tried DESC")
+        rows = await cursor.fetchall()
+        await cursor.close()
+        for is_tried, bucket, value in rows:
+            for info in decode_peers(value):
+                if is_tried:
+                    # the tried table is loaded first, a node there isn't in the new table
+                    bucket_pos = info.get_bucket_position(address_manager.key, False, bucket)
+                    if (
+                        info.peer_info.host in address_manager.map_addr
+                        or address_manager.tried_matrix[bucket][bucket_pos] != -1
+                    ):
+                        continue
+                    node_id = address_manager.id_count
+                    info.is_tried = True
+                    address_manager.tried_matrix[bucket][bucket_pos] = node_id
+                    address_manager.tried_count += 1
+                else:
+                    bucket_pos = info.get_bucket_position(address_manager.key, True, bucket)
+                    if address_manager.new_matrix[bucket][bucket_pos] != -1:
+                        continue
+                    if info.peer_info.host in address_manager.map_addr:
+                        # the same node, in another of its new buckets
+                        node_id = address_manager.map_addr[info.peer_info.host]
+                        existing = address_manager.map_info[node_id]
+                        if existing.is_tried or existing.ref_count >= NEW_BUCKETS_PER_ADDRESS:
+                            continue
+                        existing.ref_count += 1
+                        address_manager.new_matrix[bucket][bucket_pos] = node_id
+                        continue
+                    node_id = address_manager.id_count
+                    info.ref_count = 1
+                    address_manager.new_matrix[bucket][bucket_pos] = node_id
+                    address_manager.new_count += 1
+                address_manager.map_addr[info.peer_info.host] = node_id
+                address_manager.map_info[node_id] = info
+                info.random_pos = len(address_manager.random_pos)
+                address_manager.random_pos.append(node_id)
+                address_manager.id_count += 1
+
+        address_manager.load_used_table_positions()
+        address_manager.full_snapshot_needed = False
+        return address_manager
+
+    async def deserialize_v1(self) -> AddressManager:
+        """
+        Loads the tables stored as text rows, the next serialize stores them in buckets
+        """
         address_manager = AddressManager()
         metadata = await self.get_metadata()
         nodes = await self.get_nodes()
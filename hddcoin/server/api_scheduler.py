@@ -0,0 +1,148 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from hddcoin.protocols.message_priorities import MessagePriority, message_priority
+from hddcoin.server.outbound_message import Message
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+
+# The share of the API calls each class of messages gets while the other classes have messages waiting too
+DEFAULT_WEIGHTS: Dict[MessagePriority, int] = {
+    MessagePriority.HIGH: 16,
+    MessagePriority.NORMAL: 4,
+    MessagePriority.LOW: 1,
+}
+
+
+class ApiScheduler:
+    """
+    Orders the messages received from the peers before their API calls are started, and limits how many of the calls
+    run at the same time. It replaces the queue of incoming messages, the connections put (message, connection) in it.
+
+    The messages are in classes by priority, each class gets a share of the calls by its weight when the others have
+    messages waiting too (weighted fair queuing, the class with the earliest virtual finish time goes next). Within a
+    class the peers take turns, so a peer flooding messages mostly delays its own.
+
+    The calls of the high priority messages aren't counted in the limit, and start even when slow calls of the other
+    classes use it up. They are few and small, and farming waits on them.
+    """
+
+    max_concurrent_calls: int
+    weights: Dict[MessagePriority, int]
+    running: List[int]
+
+    def __init__(self, max_concurrent_calls: int, weights: Optional[Dict[MessagePriority, int]] = None):
+        self.max_concurrent_calls = max_concurrent_calls
+        self.weights = DEFAULT_WEIGHTS if weights is None else weights
+        self.running = [0] * len(MessagePriority)
+        # Messages with the connection and the time they arrived, by class and peer. Peers are in the order of turns.
+        self._queues: List["OrderedDict[bytes32, Deque[Tuple[Message, Any, float]]]"] = [
+            OrderedDict() for _ in MessagePriority
+        ]
+        self._queued: List[int] = [0] * len(MessagePriority)
+        # The virtual time is the finish time of the last message started. A class gets the finish time of its next
+        # message when it starts having messages, and after each of them, one message later by its weight.
+        self._virtual_time: float = 0
+        self._last_finish: List[float] = [0.0] * len(MessagePriority)
+        self._next_finish: List[float] = [0.0] * len(MessagePriority)
+        # Set when a message could be started
+        self._wakeup = asyncio.Event()
+
+        # Metrics
+        self.started: List[int] = [0] * len(MessagePriority)
+        self.total_wait: List[float] = [0.0] * len(MessagePriority)
+        self.max_wait: List[float] = [0.0] * len(MessagePriority)
+
+    def qsize(self) -> int:
+        return sum(self._queued)
+
+    async def put(self, item: Tuple[Message, Any]) -> None:
+        message, connection = item
+        priority = message_priority(message.type)
+        peers = self._queues[priority]
+        if connection.peer_node_id not in peers:
+            peers[connection.peer_node_id] = deque()
+        peers[connection.peer_node_id].append((message, connection, time.monotonic()))
+        if self._queued[priority] == 0:
+            self._next_finish[priority] = (
+                max(self._virtual_time, self._last_finish[priority]) + 1 / self.weights[priority]
+            )
+        self._queued[priority] += 1
+        self._wakeup.set()
+
+    async def get(self) -> Tuple[Message, Any]:
+        """
+        Waits until a call can be started, and returns the next message with its connection. The caller must call
+        task_done with the message when the call is over.
+        """
+        while True:
+            best: Optional[MessagePriority] = None
+            for priority in MessagePriority:
+                if self._queued[priority] == 0 or not self._can_start(priority):
+                    continue
+                if best is None or self._next_finish[priority] < self._next_finish[best]:
+                    best = priority
+            if best is not None:
+                break
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+        finish = self._next_finish[best]
+        self._virtual_time = finish
+        self._last_finish[best] = finish
+        self._next_finish[best] = finish + 1 / self.weights[best]
+
+        peers = self._queues[best]
+        peer_id, messages = next(iter(peers.items()))
+        message, connection, queued_time = messages.popleft()
+        if len(messages) == 0:
+            del peers[peer_id]
+        else:
+            peers.move_to_end(peer_id)
+        self._queued[best] -= 1
+
+        self.running[best] += 1
+        wait = time.monotonic() - queued_time
+        self.started[best] += 1
+        self.total_wait[best] += wait
+        self.max_wait[best] = max(self.max_wait[best], wait)
+        return message, connection
+
+    def _can_start(self, priority: MessagePriority) -> bool:
+        if priority == MessagePriority.HIGH:
+            return True
+        return sum(self.running) - self.running[MessagePriority.HIGH] < self.max_concurrent_calls
+
+    def task_done(self, message: Message) -> None:
+        self.running[message_priority(message.type)] -= 1
+        self._wakeup.set()
+
+    def remove_peer(self, peer_id: bytes32) -> None:
+        """
+        Drops the messages of a peer which haven't been started
+        """
+        for priority, peers in enumerate(self._queues):
+            messages = peers.pop(peer_id, None)
+            if messages is not None:
+                self._queued[priority] -= len(messages)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "running": sum(self.running),
+            "max_concurrent_calls": self.max_concurrent_calls,
+            "priorities": {
+                priority.name.lower(): {
+                    "weight": self.weights[priority],
+                    "queued": self._queued[priority],
+                    "peers_queued": len(self._queues[priority]),
+                    "running": self.running[priority],
+                    "started": self.started[priority],
+                    "average_wait": self.total_wait[priority] / self.started[priority]
+                    if self.started[priority] > 0
+                    else 0,
+                    "max_wait": self.max_wait[priority],
+                }
+                for priority in MessagePriority
+            },
+        }
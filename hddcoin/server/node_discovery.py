@@ -431,8 +431,7 @@ class FullNodeDiscovery:
                 continue
             serialize_interval = random.randint(15 * 60, 30 * 60)
             await asyncio.sleep(serialize_interval)
-            async with self.address_manager.lock:
-                await self.address_manager_store.serialize(self.address_manager)
+            await self.address_manager_store.serialize(self.address_manager)
 
     async def _periodically_cleanup(self) -> None:
         while not self.is_closed:
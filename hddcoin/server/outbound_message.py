@@ -1,3 +1,4 @@
+import struct
 from dataclasses import dataclass
 from enum import IntEnum
 from typing import Any, Optional
@@ -43,3 +44,46 @@ class Message(Streamable):
 
 def make_msg(msg_type: ProtocolMessageTypes, data: Any) -> Message:
     return Message(uint8(msg_type.value), None, bytes(data))
+
+
+# The header of a message with an id: type, the optional flag, id and the length of the data
+MESSAGE_HEADER_WITH_ID = struct.Struct(">BBHI")
+# The header of a message without an id: type, the optional flag and the length of the data
+MESSAGE_HEADER_WITHOUT_ID = struct.Struct(">BBI")
+
+
+def encode_message(message: Message) -> bytes:
+    """
+    Serializes a message, the same as bytes(message) without going through the generic streamable code
+    """
+    if message.id is None:
+        header = MESSAGE_HEADER_WITHOUT_ID.pack(message.type, 0, len(message.data))
+    else:
+        header = MESSAGE_HEADER_WITH_ID.pack(message.type, 1, message.id, len(message.data))
+    return header + message.data
+
+
+def decode_message(blob: bytes) -> Message:
+    """
+    Parses a message received from a peer, the same as Message.from_bytes(blob) in one pass over the blob, only the
+    data of the message is copied out of it
+    """
+    if len(blob) < MESSAGE_HEADER_WITHOUT_ID.size:
+        raise ValueError(f"Message of {len(blob)} bytes is too short")
+    has_id = blob[1]
+    if has_id == 0:
+        msg_type, _, size = MESSAGE_HEADER_WITHOUT_ID.unpack_from(blob)
+        msg_id = None
+        offset = MESSAGE_HEADER_WITHOUT_ID.size
+    elif has_id == 1:
+        msg_type, _, msg_id, size = MESSAGE_HEADER_WITH_ID.unpack_from(blob)
+        msg_id = uint16(msg_id)
+        offset = MESSAGE_HEADER_WITH_ID.size
+    else:
+        raise ValueError("Optional must be 0 or 1")
+    if offset + size != len(blob):
+        raise ValueError(f"Message data of {size} bytes doesn't match the {len(blob) - offset} bytes received")
+    # Create the object without calling __init__(), like Streamable.parse
+    message: Message = object.__new__(Message)
+    message.__dict__.update(type=uint8(msg_type), id=msg_id, data=blob[offset:])
+    return message
@@ -1,8 +1,8 @@
 import dataclasses
+import functools
 import logging
 import time
-from collections import Counter
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from hddcoin.protocols.protocol_message_types import ProtocolMessageTypes
 from hddcoin.server.outbound_message import Message
@@ -111,95 +111,173 @@ rate_limits_other = {
 
 # TODO: only full node disconnects based on rate limits
 
+NUM_MESSAGE_TYPES: int = max(message_type.value for message_type in ProtocolMessageTypes) + 1
+
+# The limits of the message types, indexed by their values so they aren't looked up by type for every message
+LIMITS_BY_TYPE: List[Optional[RLSettings]] = [None] * NUM_MESSAGE_TYPES
+NON_TX_BY_TYPE: List[bool] = [False] * NUM_MESSAGE_TYPES
+MISSING_LIMITS_BY_TYPE: List[bool] = [False] * NUM_MESSAGE_TYPES
+for message_type in ProtocolMessageTypes:
+    settings = DEFAULT_SETTINGS
+    if message_type in rate_limits_tx:
+        settings = rate_limits_tx[message_type]
+    elif message_type in rate_limits_other:
+        settings = rate_limits_other[message_type]
+        NON_TX_BY_TYPE[message_type.value] = True
+    else:
+        MISSING_LIMITS_BY_TYPE[message_type.value] = True
+    if settings.max_total_size is None:
+        settings = dataclasses.replace(settings, max_total_size=settings.frequency * settings.max_size)
+    LIMITS_BY_TYPE[message_type.value] = settings
+
+
+@functools.lru_cache(maxsize=None)
+def bucket_capacities(percentage_of_limit: int) -> Tuple[List[float], List[float]]:
+    """
+    The number of messages and bytes of each message type allowed in a period, with the percentage of the limits
+    """
+    proportion_of_limit: float = percentage_of_limit / 100
+    message_capacities: List[float] = [0.0] * NUM_MESSAGE_TYPES
+    size_capacities: List[float] = [0.0] * NUM_MESSAGE_TYPES
+    for msg_type, settings in enumerate(LIMITS_BY_TYPE):
+        if settings is not None:
+            assert settings.max_total_size is not None
+            message_capacities[msg_type] = settings.frequency * proportion_of_limit
+            size_capacities[msg_type] = settings.max_total_size * proportion_of_limit
+    return message_capacities, size_capacities
+
+
+class MessageTypeStats:
+    """
+    The messages and bytes of each message type, of all the peers
+    """
+
+    messages: List[int]
+    bytes: List[int]
+    rate_limited: List[int]
+
+    def __init__(self) -> None:
+        self.messages = [0] * NUM_MESSAGE_TYPES
+        self.bytes = [0] * NUM_MESSAGE_TYPES
+        self.rate_limited = [0] * NUM_MESSAGE_TYPES
+
+    def to_json_dict(self) -> Dict[str, Dict[str, int]]:
+        return {
+            ProtocolMessageTypes(msg_type).name: {
+                "messages": self.messages[msg_type],
+                "bytes": self.bytes[msg_type],
+                "rate_limited": self.rate_limited[msg_type],
+            }
+            for msg_type in range(NUM_MESSAGE_TYPES)
+            if self.messages[msg_type] > 0 or self.rate_limited[msg_type] > 0
+        }
+
+
+# Messages received (including the rate limited ones) and sent (the rate limited ones aren't sent) by this process
+INBOUND_STATS = MessageTypeStats()
+OUTBOUND_STATS = MessageTypeStats()
+
 
 class RateLimiter:
+    """
+    Token buckets for the number of messages and bytes of each message type, and for all the non transaction messages
+    together. A bucket holds the limit for reset_seconds, and refills continuously at that rate, so a peer can send a
+    burst of up to the limit and then messages at the rate of the limit, instead of everything again at the start of
+    each period.
+    """
+
     incoming: bool
     reset_seconds: int
-    current_minute: int
-    message_counts: Counter
-    message_cumulative_sizes: Counter
     percentage_of_limit: int
-    non_tx_message_counts: int = 0
-    non_tx_cumulative_size: int = 0
+    message_capacities: List[float]
+    size_capacities: List[float]
+    message_tokens: List[float]
+    size_tokens: List[float]
+    refill_times: List[float]
+    non_tx_message_capacity: float
+    non_tx_size_capacity: float
+    non_tx_message_tokens: float
+    non_tx_size_tokens: float
+    non_tx_refill_time: float
+    stats: MessageTypeStats
 
     def __init__(self, incoming: bool, reset_seconds=60, percentage_of_limit=100):
         """
-        The incoming parameter affects whether counters are incremented
-        unconditionally or not. For incoming messages, the counters are always
-        incremeneted. For outgoing messages, the counters are only incremented
+        The incoming parameter affects whether the buckets are used up
+        unconditionally or not. For incoming messages, the buckets are always
+        used up. For outgoing messages, the buckets are only used up
         if they are allowed to be sent by the rate limiter, since we won't send
         the messages otherwise.
         """
         self.incoming = incoming
         self.reset_seconds = reset_seconds
-        self.current_minute = time.time() // reset_seconds
-        self.message_counts = Counter()
-        self.message_cumulative_sizes = Counter()
         self.percentage_of_limit = percentage_of_limit
-        self.non_tx_message_counts = 0
-        self.non_tx_cumulative_size = 0
+        self.message_capacities, self.size_capacities = bucket_capacities(percentage_of_limit)
+        # The buckets start full
+        self.message_tokens = list(self.message_capacities)
+        self.size_tokens = list(self.size_capacities)
+        now = time.monotonic()
+        self.refill_times = [now] * NUM_MESSAGE_TYPES
+        self.non_tx_message_capacity = NON_TX_FREQ * percentage_of_limit / 100
+        self.non_tx_size_capacity = NON_TX_MAX_TOTAL_SIZE * percentage_of_limit / 100
+        self.non_tx_message_tokens = self.non_tx_message_capacity
+        self.non_tx_size_tokens = self.non_tx_size_capacity
+        self.non_tx_refill_time = now
+        self.stats = INBOUND_STATS if incoming else OUTBOUND_STATS
 
     def process_msg_and_check(self, message: Message) -> bool:
         """
         Returns True if message can be processed successfully, false if a rate limit is passed.
         """
-
-        current_minute = int(time.time() // self.reset_seconds)
-        if current_minute != self.current_minute:
-            self.current_minute = current_minute
-            self.message_counts = Counter()
-            self.message_cumulative_sizes = Counter()
-            self.non_tx_message_counts = 0
-            self.non_tx_cumulative_size = 0
-        try:
-            message_type = ProtocolMessageTypes(message.type)
-        except Exception as e:
-            log.warning(f"Invalid message: {message.type}, {e}")
+        msg_type: int = message.type
+        settings: Optional[RLSettings] = LIMITS_BY_TYPE[msg_type] if msg_type < NUM_MESSAGE_TYPES else None
+        if settings is None:
+            log.warning(f"Invalid message: {msg_type}")
             return True
+        if MISSING_LIMITS_BY_TYPE[msg_type]:
+            log.warning(f"Message type {ProtocolMessageTypes(msg_type)} not found in rate limits")
 
-        new_message_counts: int = self.message_counts[message_type] + 1
-        new_cumulative_size: int = self.message_cumulative_sizes[message_type] + len(message.data)
-        new_non_tx_count: int = self.non_tx_message_counts
-        new_non_tx_size: int = self.non_tx_cumulative_size
-        proportion_of_limit: float = self.percentage_of_limit / 100
-
-        ret: bool = False
-        try:
-
-            limits = DEFAULT_SETTINGS
-            if message_type in rate_limits_tx:
-                limits = rate_limits_tx[message_type]
-            elif message_type in rate_limits_other:
-                limits = rate_limits_other[message_type]
-                new_non_tx_count = self.non_tx_message_counts + 1
-                new_non_tx_size = self.non_tx_cumulative_size + len(message.data)
-                if new_non_tx_count > NON_TX_FREQ * proportion_of_limit:
-                    return False
-                if new_non_tx_size > NON_TX_MAX_TOTAL_SIZE * proportion_of_limit:
-                    return False
-            else:
-                log.warning(f"Message type {message_type} not found in rate limits")
-
-            if limits.max_total_size is None:
-                limits = dataclasses.replace(limits, max_total_size=limits.frequency * limits.max_size)
-            assert limits.max_total_size is not None
-
-            if new_message_counts > limits.frequency * proportion_of_limit:
-                return False
-            if len(message.data) > limits.max_size:
-                return False
-            if new_cumulative_size > limits.max_total_size * proportion_of_limit:
-                return False
-
-            ret = True
-            return True
-        finally:
-            if self.incoming or ret:
-                # now that we determined that it's OK to send the message, commit the
-                # updates to the counters. Alternatively, if this was an
-                # incoming message, we already received it and it should
-                # increment the counters unconditionally
-                self.message_counts[message_type] = new_message_counts
-                self.message_cumulative_sizes[message_type] = new_cumulative_size
-                self.non_tx_message_counts = new_non_tx_count
-                self.non_tx_cumulative_size = new_non_tx_size
+        size: int = len(message.data)
+        now = time.monotonic()
+        refill: float = (now - self.refill_times[msg_type]) / self.reset_seconds
+        self.refill_times[msg_type] = now
+        message_tokens: float = min(
+            self.message_capacities[msg_type],
+            self.message_tokens[msg_type] + refill * self.message_capacities[msg_type],
+        )
+        size_tokens: float = min(
+            self.size_capacities[msg_type], self.size_tokens[msg_type] + refill * self.size_capacities[msg_type]
+        )
+        allowed: bool = message_tokens >= 1 and size_tokens >= size and size <= settings.max_size
+        # Incoming messages were received already, so they use up the buckets even if they aren't allowed
+        use_up: bool = allowed or self.incoming
+
+        if NON_TX_BY_TYPE[msg_type]:
+            refill = (now - self.non_tx_refill_time) / self.reset_seconds
+            self.non_tx_refill_time = now
+            non_tx_message_tokens: float = min(
+                self.non_tx_message_capacity, self.non_tx_message_tokens + refill * self.non_tx_message_capacity
+            )
+            non_tx_size_tokens: float = min(
+                self.non_tx_size_capacity, self.non_tx_size_tokens + refill * self.non_tx_size_capacity
+            )
+            allowed = allowed and non_tx_message_tokens >= 1 and non_tx_size_tokens >= size
+            use_up = allowed or self.incoming
+            if use_up:
+                non_tx_message_tokens = max(0.0, non_tx_message_tokens - 1)
+                non_tx_size_tokens = max(0.0, non_tx_size_tokens - size)
+            self.non_tx_message_tokens = non_tx_message_tokens
+            self.non_tx_size_tokens = non_tx_size_tokens
+
+        if use_up:
+            message_tokens = max(0.0, message_tokens - 1)
+            size_tokens = max(0.0, size_tokens - size)
+        self.message_tokens[msg_type] = message_tokens
+        self.size_tokens[msg_type] = size_tokens
+
+        if use_up:
+            self.stats.messages[msg_type] += 1
+            self.stats.bytes[msg_type] += size
+        if not allowed:
+            self.stats.rate_limited[msg_type] += 1
+        return allowed
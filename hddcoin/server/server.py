@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import logging
 import ssl
 import time
@@ -22,7 +23,8 @@ from hddcoin.protocols.protocol_state_machine import message_requires_reply
 from hddcoin.protocols.protocol_timing import INVALID_PROTOCOL_BAN_SECONDS, API_EXCEPTION_BAN_SECONDS
 from hddcoin.protocols.shared_protocol import protocol_version
 from hddcoin.server.introducer_peers import IntroducerPeers
-from hddcoin.server.outbound_message import Message, NodeType
+from hddcoin.server.api_scheduler import ApiScheduler
+from hddcoin.server.outbound_message import Message, NodeType, encode_message
 from hddcoin.server.ssl_context import private_ssl_paths, public_ssl_paths
 from hddcoin.server.ws_connection import WSHDDcoinConnection
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
@@ -132,7 +134,7 @@ class HDDcoinServer:
         self.root_path = root_path
         self.config = config
         self.on_connect: Optional[Callable] = None
-        self.incoming_messages: asyncio.Queue = asyncio.Queue()
+        self.incoming_messages: ApiScheduler = ApiScheduler(config.get("max_concurrent_api_calls", 250))
         self.shut_down_event = asyncio.Event()
 
         if self._local_type is NodeType.INTRODUCER:
@@ -496,10 +498,14 @@ class HDDcoinServer:
                 f" while closing. Handshake never finished."
             )
         self.cancel_tasks_from_peer(connection.peer_node_id)
+        self.incoming_messages.remove_peer(connection.peer_node_id)
         on_disconnect = getattr(self.node, "on_disconnect", None)
         if on_disconnect is not None:
             on_disconnect(connection)
 
+    def finish_api_call(self, message: Message, task: asyncio.Task) -> None:
+        self.incoming_messages.task_done(message)
+
     def cancel_tasks_from_peer(self, peer_id: bytes32):
         if peer_id not in self.tasks_from_peer:
             return None
@@ -516,8 +522,6 @@ class HDDcoinServer:
         message_types: typing_Counter[str] = Counter()  # Used for debugging information.
         while True:
             payload_inc, connection_inc = await self.incoming_messages.get()
-            if payload_inc is None or connection_inc is None:
-                continue
 
             async def api_call(full_message: Message, connection: WSHDDcoinConnection, task_id):
                 nonlocal message_types
@@ -605,6 +609,8 @@ class HDDcoinServer:
 
             task_id = token_bytes()
             api_task = asyncio.create_task(api_call(payload_inc, connection_inc, task_id))
+            # the task can be cancelled before it starts, so the call is over when the task is done
+            api_task.add_done_callback(functools.partial(self.finish_api_call, payload_inc))
             self.api_tasks[task_id] = api_task
             if connection_inc.peer_node_id not in self.tasks_from_peer:
                 self.tasks_from_peer[connection_inc.peer_node_id] = set()
@@ -616,12 +622,21 @@ class HDDcoinServer:
         node_type: NodeType,
         origin_peer: WSHDDcoinConnection,
     ):
-        for node_id, connection in self.all_connections.items():
-            if node_id == origin_peer.peer_node_id:
-                continue
-            if connection.connection_type is node_type:
-                for message in messages:
-                    await connection.send_message(message)
+        await self._broadcast(
+            messages,
+            [
+                connection
+                for node_id, connection in self.all_connections.items()
+                if node_id != origin_peer.peer_node_id and connection.connection_type is node_type
+            ],
+        )
+
+    async def _broadcast(self, messages: List[Message], connections: List[WSHDDcoinConnection]):
+        # Each message is serialized once, all the connections queue the same bytes
+        encoded_messages: List[bytes] = [encode_message(message) for message in messages]
+        for connection in connections:
+            for message, encoded in zip(messages, encoded_messages):
+                await connection.send_message(message, encoded)
 
     async def validate_broadcast_message_type(self, messages: List[Message], node_type: NodeType):
         for message in messages:
@@ -639,17 +654,21 @@ class HDDcoinServer:
 
     async def send_to_all(self, messages: List[Message], node_type: NodeType):
         await self.validate_broadcast_message_type(messages, node_type)
-        for _, connection in self.all_connections.items():
-            if connection.connection_type is node_type:
-                for message in messages:
-                    await connection.send_message(message)
+        await self._broadcast(
+            messages,
+            [connection for connection in self.all_connections.values() if connection.connection_type is node_type],
+        )
 
     async def send_to_all_except(self, messages: List[Message], node_type: NodeType, exclude: bytes32):
         await self.validate_broadcast_message_type(messages, node_type)
-        for _, connection in self.all_connections.items():
-            if connection.connection_type is node_type and connection.peer_node_id != exclude:
-                for message in messages:
-                    await connection.send_message(message)
+        await self._broadcast(
+            messages,
+            [
+                connection
+                for connection in self.all_connections.values()
+                if connection.connection_type is node_type and connection.peer_node_id != exclude
+            ],
+        )
 
     async def send_to_specific(self, messages: List[Message], node_id: bytes32):
         if node_id in self.all_connections:
@@ -1,17 +1,20 @@
 import asyncio
+import itertools
 import logging
+import socket
 import time
 import traceback
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from aiohttp import WSCloseCode, WSMessage, WSMsgType
 
 from hddcoin.cmds.init_funcs import hddcoin_full_version_str
+from hddcoin.protocols.message_priorities import MessagePriority, message_priority
 from hddcoin.protocols.protocol_message_types import ProtocolMessageTypes
 from hddcoin.protocols.protocol_state_machine import message_response_ok
 from hddcoin.protocols.protocol_timing import INTERNAL_PROTOCOL_ERROR_BAN_SECONDS
 from hddcoin.protocols.shared_protocol import Capability, Handshake
-from hddcoin.server.outbound_message import Message, NodeType, make_msg
+from hddcoin.server.outbound_message import Message, NodeType, decode_message, encode_message, make_msg
 from hddcoin.server.rate_limits import RateLimiter
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.types.peer_info import PeerInfo
@@ -24,6 +27,10 @@ from hddcoin.util.network import class_for_type, is_localhost
 # Max size 2^(8*4) which is around 4GiB
 LENGTH_BYTES: int = 4
 
+# The outbound handler sends the messages waiting in the queue together, up to these
+MAX_COALESCED_MESSAGES: int = 64
+MAX_COALESCED_BYTES: int = 1024 * 1024
+
 
 class WSHDDcoinConnection:
     """
@@ -77,9 +84,21 @@ class WSHDDcoinConnection:
         self.bytes_written = 0
         self.last_message_time: float = 0
 
+        # Outbound metrics, the queue is backed up when the messages wait long or the socket buffer stays full
+        self.messages_written = 0
+        self.batches_written = 0
+        self.max_outgoing_queue_size = 0
+        self.total_queue_wait: float = 0
+        self.max_queue_wait: float = 0
+        self.queued_by_priority: List[int] = [0] * len(MessagePriority)
+        self.max_queue_wait_by_priority: List[float] = [0.0] * len(MessagePriority)
+
         # Messaging
         self.incoming_queue: asyncio.Queue = incoming_queue
-        self.outgoing_queue: asyncio.Queue = asyncio.Queue()
+        # The messages to send as (priority, sequence, time queued, message, serialized message or None). The
+        # sequence number keeps the messages of the same priority in order.
+        self.outgoing_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.outgoing_sequence = itertools.count()
 
         self.inbound_task: Optional[asyncio.Task] = None
         self.outbound_task: Optional[asyncio.Task] = None
@@ -240,9 +259,27 @@ class WSHDDcoinConnection:
     async def outbound_handler(self):
         try:
             while not self.closed:
-                msg = await self.outgoing_queue.get()
-                if msg is not None:
-                    await self._send_message(msg)
+                batch: List[Tuple[MessagePriority, int, float, Message, Optional[bytes]]] = [
+                    await self.outgoing_queue.get()
+                ]
+                self.max_outgoing_queue_size = max(self.max_outgoing_queue_size, self.outgoing_queue.qsize() + 1)
+                batch_size = len(batch[0][3].data)
+                while (
+                    not self.outgoing_queue.empty()
+                    and len(batch) < MAX_COALESCED_MESSAGES
+                    and batch_size < MAX_COALESCED_BYTES
+                ):
+                    batch.append(self.outgoing_queue.get_nowait())
+                    batch_size += len(batch[-1][3].data)
+                now = time.monotonic()
+                for priority, _, queued_time, _, _ in batch:
+                    self.queued_by_priority[priority] -= 1
+                    self.total_queue_wait += now - queued_time
+                    self.max_queue_wait = max(self.max_queue_wait, now - queued_time)
+                    self.max_queue_wait_by_priority[priority] = max(
+                        self.max_queue_wait_by_priority[priority], now - queued_time
+                    )
+                await self._send_messages([(msg, encoded) for _, _, _, msg, encoded in batch])
         except asyncio.CancelledError:
             pass
         except BrokenPipeError as e:
@@ -274,11 +311,19 @@ class WSHDDcoinConnection:
             self.log.error(f"Exception: {e}")
             self.log.error(f"Exception Stack: {error_stack}")
 
-    async def send_message(self, message: Message):
-        """Send message sends a message with no tracking / callback."""
+    async def send_message(self, message: Message, encoded: Optional[bytes] = None):
+        """
+        Send message sends a message with no tracking / callback. A broadcast passes the message serialized already,
+        the same bytes for all the peers.
+        """
         if self.closed:
             return None
-        await self.outgoing_queue.put(message)
+        await self._queue_message(message, encoded)
+
+    async def _queue_message(self, message: Message, encoded: Optional[bytes] = None):
+        priority = message_priority(message.type)
+        self.queued_by_priority[priority] += 1
+        await self.outgoing_queue.put((priority, next(self.outgoing_sequence), time.monotonic(), message, encoded))
 
     def __getattr__(self, attr_name: str):
         # TODO KWARGS
@@ -342,7 +387,7 @@ class WSHDDcoinConnection:
         message = Message(message_no_id.type, request_id, message_no_id.data)
 
         self.pending_requests[message.id] = event
-        await self.outgoing_queue.put(message)
+        await self._queue_message(message)
 
         # If the timeout passes, we set the event
         async def time_out(req_id, req_timeout):
@@ -372,25 +417,28 @@ class WSHDDcoinConnection:
     async def reply_to_request(self, response: Message):
         if self.closed:
             return None
-        await self.outgoing_queue.put(response)
+        await self._queue_message(response)
 
     async def send_messages(self, messages: List[Message]):
         if self.closed:
             return None
         for message in messages:
-            await self.outgoing_queue.put(message)
+            await self._queue_message(message)
 
-    async def _wait_and_retry(self, msg: Message, queue: asyncio.Queue):
+    async def _wait_and_retry(self, msg: Message, encoded: bytes):
         try:
             await asyncio.sleep(1)
-            await queue.put(msg)
+            await self._queue_message(msg, encoded)
         except Exception as e:
             self.log.debug(f"Exception {e} while waiting to retry sending rate limited message")
             return None
 
-    async def _send_message(self, message: Message):
-        encoded: bytes = bytes(message)
-        size = len(encoded)
+    def _encode_if_allowed(self, message: Message, encoded: Optional[bytes] = None) -> Optional[bytes]:
+        """
+        Returns the bytes to send for the message, or None if it's rate limited
+        """
+        if encoded is None:
+            encoded = encode_message(message)
         assert len(encoded) < (2 ** (LENGTH_BYTES * 8))
         if not self.outbound_rate_limiter.process_msg_and_check(message):
             if not is_localhost(self.peer_host):
@@ -401,7 +449,7 @@ class WSHDDcoinConnection:
 
                 # TODO: fix this special case. This function has rate limits which are too low.
                 if ProtocolMessageTypes(message.type) != ProtocolMessageTypes.respond_peers:
-                    asyncio.create_task(self._wait_and_retry(message, self.outgoing_queue))
+                    asyncio.create_task(self._wait_and_retry(message, encoded))
 
                 return None
             else:
@@ -409,10 +457,49 @@ class WSHDDcoinConnection:
                     f"Not rate limiting ourselves. message type: {ProtocolMessageTypes(message.type).name}, "
                     f"peer: {self.peer_host}"
                 )
+        return encoded
 
-        await self.ws.send_bytes(encoded)
-        self.log.debug(f"-> {ProtocolMessageTypes(message.type).name} to peer {self.peer_host} {self.peer_node_id}")
-        self.bytes_written += size
+    async def _send_message(self, message: Message):
+        await self._send_messages([(message, None)])
+
+    def _set_cork(self, cork: bool) -> None:
+        """
+        While the socket is corked, the kernel only sends full segments, so the frames of a batch go out together
+        instead of a packet each. Only on Linux, elsewhere the frames are sent as they are written.
+        """
+        transport = self.ws._writer.transport
+        sock = transport.get_extra_info("socket") if transport is not None else None
+        if sock is None or not hasattr(socket, "TCP_CORK"):
+            return None
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1 if cork else 0)
+        except OSError:
+            pass
+
+    async def _send_messages(self, messages: List[Tuple[Message, Optional[bytes]]]):
+        sent: List[Tuple[Message, bytes]] = []
+        for message, already_encoded in messages:
+            encoded = self._encode_if_allowed(message, already_encoded)
+            if encoded is not None:
+                sent.append((message, encoded))
+        if len(sent) == 0:
+            return None
+
+        if len(sent) == 1:
+            await self.ws.send_bytes(sent[0][1])
+        else:
+            self._set_cork(True)
+            try:
+                for _, encoded in sent:
+                    await self.ws.send_bytes(encoded)
+            finally:
+                self._set_cork(False)
+        self.batches_written += 1
+
+        for message, encoded in sent:
+            self.log.debug(f"-> {ProtocolMessageTypes(message.type).name} to peer {self.peer_host} {self.peer_node_id}")
+            self.bytes_written += len(encoded)
+        self.messages_written += len(sent)
 
     async def _read_one_message(self) -> Optional[Message]:
         try:
@@ -452,7 +539,7 @@ class WSHDDcoinConnection:
                 return None
         elif message.type == WSMsgType.BINARY:
             data = message.data
-            full_message_loaded: Message = Message.from_bytes(data)
+            full_message_loaded: Message = decode_message(data)
             self.bytes_read += len(data)
             self.last_message_time = time.time()
             try:
@@ -490,6 +577,25 @@ class WSHDDcoinConnection:
             await asyncio.sleep(3)
         return None
 
+    def get_outbound_metrics(self) -> Dict[str, Any]:
+        transport = self.ws._writer.transport
+        return {
+            "outgoing_queue_size": self.outgoing_queue.qsize(),
+            "max_outgoing_queue_size": self.max_outgoing_queue_size,
+            "write_buffer_size": transport.get_write_buffer_size() if transport is not None else 0,
+            "messages_written": self.messages_written,
+            "batches_written": self.batches_written,
+            "average_queue_wait": self.total_queue_wait / self.messages_written if self.messages_written > 0 else 0,
+            "max_queue_wait": self.max_queue_wait,
+            "priorities": {
+                priority.name.lower(): {
+                    "outgoing_queue_size": self.queued_by_priority[priority],
+                    "max_queue_wait": self.max_queue_wait_by_priority[priority],
+                }
+                for priority in MessagePriority
+            },
+        }
+
     # Used by crawler/dns introducer
     def get_version(self):
         return self.version
@@ -6,6 +6,15 @@ from blspy import AugSchemeMPL, G1Element, G2Element, GTElement
 from hddcoin.types.blockchain_format.sized_bytes import bytes48
 from hddcoin.util.hash import std_hash
 from hddcoin.util.lru_cache import LRUCache
+from hddcoin.util.shared_pairing_cache import SharedPairingCache
+
+# Pairings shared with the other processes of the node, used when a pairing isn't in the cache of this process
+SHARED_CACHE: Optional[SharedPairingCache] = None
+
+
+def set_shared_cache(shared_cache: Optional[SharedPairingCache]) -> None:
+    global SHARED_CACHE
+    SHARED_CACHE = shared_cache
 
 
 def get_pairings(cache: LRUCache, pks: List[bytes48], msgs: List[bytes], force_cache: bool) -> List[GTElement]:
@@ -15,6 +24,10 @@ def get_pairings(cache: LRUCache, pks: List[bytes48], msgs: List[bytes], force_c
         aug_msg: bytes = pk + msg
         h: bytes = bytes(std_hash(aug_msg))
         pairing: Optional[GTElement] = cache.get(h)
+        if pairing is None and SHARED_CACHE is not None:
+            pairing = SHARED_CACHE.get(h)
+            if pairing is not None:
+                cache.put(h, pairing)
         if not force_cache and pairing is None:
             missing_count += 1
             # Heuristic to avoid more expensive sig validation with pairing
@@ -32,6 +45,8 @@ def get_pairings(cache: LRUCache, pks: List[bytes48], msgs: List[bytes], force_c
 
             h = bytes(std_hash(aug_msg))
             cache.put(h, pairing)
+            if SHARED_CACHE is not None:
+                SHARED_CACHE.put(h, pairing)
             pairings[i] = pairing
     return pairings
 
@@ -10,10 +10,13 @@ class DBWrapper:
 
     db: aiosqlite.Connection
     lock: asyncio.Lock
+    # 1 stores hashes as hex text, 2 stores them as 32 byte blobs
+    db_version: int
 
-    def __init__(self, connection: aiosqlite.Connection):
+    def __init__(self, connection: aiosqlite.Connection, db_version: int = 1):
         self.db = connection
         self.lock = asyncio.Lock()
+        self.db_version = db_version
 
     async def begin_transaction(self):
         cursor = await self.db.execute("BEGIN TRANSACTION")
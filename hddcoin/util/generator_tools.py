@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import Any, List, Tuple
 from chiabip158 import PyBIP158
 
 from hddcoin.types.blockchain_format.coin import Coin
@@ -7,10 +7,11 @@ from hddcoin.types.full_block import FullBlock
 from hddcoin.types.header_block import HeaderBlock
 from hddcoin.types.name_puzzle_condition import NPC
 from hddcoin.util.condition_tools import created_outputs_for_conditions_dict
+from hddcoin.util.streamable_view import StreamableView
 
 
-def get_block_header(block: FullBlock, tx_addition_coins: List[Coin], removals_names: List[bytes32]) -> HeaderBlock:
-    # Create filter
+def get_block_filter(block: Any, tx_addition_coins: List[Coin], removals_names: List[bytes32]) -> bytes:
+    # block is a FullBlock or a StreamableView of one
     byte_array_tx: List[bytes32] = []
     addition_coins = tx_addition_coins + list(block.get_included_reward_coins())
     if block.is_transaction_block():
@@ -20,7 +21,11 @@ def get_block_header(block: FullBlock, tx_addition_coins: List[Coin], removals_n
             byte_array_tx.append(bytearray(name))
 
     bip158: PyBIP158 = PyBIP158(byte_array_tx)
-    encoded_filter: bytes = bytes(bip158.GetEncoded())
+    return bytes(bip158.GetEncoded())
+
+
+def get_block_header(block: FullBlock, tx_addition_coins: List[Coin], removals_names: List[bytes32]) -> HeaderBlock:
+    encoded_filter: bytes = get_block_filter(block, tx_addition_coins, removals_names)
 
     return HeaderBlock(
         block.finished_sub_slots,
@@ -37,6 +42,24 @@ def get_block_header(block: FullBlock, tx_addition_coins: List[Coin], removals_n
     )
 
 
+def get_block_header_bytes(
+    block: StreamableView, tx_addition_coins: List[Coin], removals_names: List[bytes32]
+) -> bytes:
+    """
+    Same as bytes(get_block_header(...)) for a view of a FullBlock. The HeaderBlock fields are the FullBlock
+    fields up to the transactions info, with the filter in between, so they are copied from the block bytes.
+    """
+    encoded_filter: bytes = get_block_filter(block, tx_addition_coins, removals_names)
+    return b"".join(
+        [
+            block.fields_bytes("finished_sub_slots", "foliage_transaction_block"),
+            len(encoded_filter).to_bytes(4, "big"),
+            encoded_filter,
+            block.fields_bytes("transactions_info", "transactions_info"),
+        ]
+    )
+
+
 def additions_for_npc(npc_list: List[NPC]) -> List[Coin]:
     additions: List[Coin] = []
 
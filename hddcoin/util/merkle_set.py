@@ -1,6 +1,6 @@
 from abc import ABCMeta, abstractmethod
 from hashlib import sha256
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 
@@ -116,7 +116,12 @@ class Node(metaclass=ABCMeta):
         pass
 
 
-class MerkleSet:
+class NodeMerkleSet:
+    """
+    A MerkleSet kept as a tree of nodes, updated on every add and remove. This is what proofs deserialize to,
+    as they can contain truncated subtrees.
+    """
+
     root: Node
 
     def __init__(self, root: Node = None):
@@ -145,6 +150,121 @@ class MerkleSet:
         assert newhashes == sorted(newhashes)
 
 
+class MerkleSet:
+    """
+    A MerkleSet kept as a sorted array of its leaves. Adding and removing only updates the set of leaves, the
+    tree is built in one pass the next time the root or a proof is needed. Every subtree is a range of the
+    sorted leaves that share the same leading bits, so the tree is never materialized, only the hashes of its
+    middle nodes are kept for the proofs.
+
+    Roots and proofs are the same as the ones of NodeMerkleSet.
+    """
+
+    def __init__(self) -> None:
+        self._leaves: Set[bytes] = set()
+        self._sorted: Optional[List[bytes]] = None
+        # hashes of the middle nodes of more than two leaves, by (first leaf << 8) | depth
+        self._hashes: Dict[int, bytes] = {}
+
+    def add_already_hashed(self, toadd: bytes):
+        assert len(toadd) == 32
+        if toadd not in self._leaves:
+            self._leaves.add(toadd)
+            self._sorted = None
+
+    def remove_already_hashed(self, toremove: bytes):
+        if toremove in self._leaves:
+            self._leaves.remove(toremove)
+            self._sorted = None
+
+    def _get_sorted(self) -> List[bytes]:
+        if self._sorted is None:
+            self._sorted = sorted(self._leaves)
+            self._hashes = {}
+        return self._sorted
+
+    def get_root(self) -> bytes:
+        leaves = self._get_sorted()
+        return compress_root(self._node_hash(leaves, 0, len(leaves), 0))
+
+    def is_included_already_hashed(self, tocheck: bytes) -> Tuple[bool, bytes]:
+        proof: List[bytes] = []
+        r = self._is_included(self._get_sorted(), 0, len(self._leaves), tocheck, 0, proof)
+        return r, b"".join(proof)
+
+    @staticmethod
+    def _split(leaves: List[bytes], lo: int, hi: int, depth: int) -> int:
+        """
+        Returns the index of the first leaf in [lo, hi) with bit depth set. The leaves in the range share the
+        bits before depth, so they're sorted by that bit.
+        """
+        pos = depth >> 3
+        mask = 0x80 >> (depth & 7)
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if leaves[mid][pos] & mask:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _node_hash(self, leaves: List[bytes], lo: int, hi: int, depth: int) -> bytes:
+        # the same as Node.get_hash() of the subtree
+        if hi == lo:
+            return EMPTY + BLANK
+        if hi - lo == 1:
+            return TERMINAL + leaves[lo]
+        return MIDDLE + self._middle_hash(leaves, lo, hi, depth)
+
+    def _middle_hash(self, leaves: List[bytes], lo: int, hi: int, depth: int) -> bytes:
+        if hi - lo == 2:
+            # exactly two leaves are hashed together, no matter how many bits they share
+            return hashdown(TERMINAL + leaves[lo] + TERMINAL + leaves[lo + 1])
+        key = (lo << 8) | depth
+        h = self._hashes.get(key)
+        if h is not None:
+            return h
+        mid = self._split(leaves, lo, hi, depth)
+        if mid == hi:
+            h = hashdown(MIDDLE + self._middle_hash(leaves, lo, hi, depth + 1) + EMPTY + BLANK)
+        elif mid == lo:
+            h = hashdown(EMPTY + BLANK + MIDDLE + self._middle_hash(leaves, lo, hi, depth + 1))
+        else:
+            h = hashdown(self._node_hash(leaves, lo, mid, depth + 1) + self._node_hash(leaves, mid, hi, depth + 1))
+        self._hashes[key] = h
+        return h
+
+    def _is_included(self, leaves: List[bytes], lo: int, hi: int, tocheck: bytes, depth: int, p: List[bytes]) -> bool:
+        if hi == lo:
+            p.append(EMPTY)
+            return False
+        if hi - lo == 1:
+            p.append(TERMINAL + leaves[lo])
+            return tocheck == leaves[lo]
+        p.append(MIDDLE)
+        mid = self._split(leaves, lo, hi, depth)
+        if get_bit(tocheck, depth) == 0:
+            r = self._is_included(leaves, lo, mid, tocheck, depth + 1, p)
+            self._other_included(leaves, mid, hi, tocheck, depth + 1, p, mid > lo)
+            return r
+        else:
+            self._other_included(leaves, lo, mid, tocheck, depth + 1, p, hi > mid)
+            return self._is_included(leaves, mid, hi, tocheck, depth + 1, p)
+
+    def _other_included(
+        self, leaves: List[bytes], lo: int, hi: int, tocheck: bytes, depth: int, p: List[bytes], collapse: bool
+    ):
+        if hi == lo:
+            p.append(EMPTY)
+        elif hi - lo == 1:
+            p.append(TERMINAL + leaves[lo])
+        elif collapse or hi - lo > 2:
+            p.append(TRUNCATED + self._middle_hash(leaves, lo, hi, depth))
+        else:
+            # a middle node of two leaves is expanded if its sibling is empty
+            self._is_included(leaves, lo, hi, tocheck, depth, p)
+
+
 class EmptyNode(Node):
     def __init__(self):
         self.hash = BLANK
@@ -376,12 +496,12 @@ def _confirm(root: Node, val: bytes, proof: bytes32, expected: bool) -> bool:
         return False
 
 
-def deserialize_proof(proof: bytes32) -> MerkleSet:
+def deserialize_proof(proof: bytes32) -> NodeMerkleSet:
     try:
         r, pos = _deserialize(proof, 0, [])
         if pos != len(proof):
             raise SetError()
-        return MerkleSet(r)
+        return NodeMerkleSet(r)
     except IndexError:
         raise SetError()
 
@@ -0,0 +1,69 @@
+from typing import Optional
+
+from blspy import GTElement
+
+from hddcoin.util.hash import std_hash
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None  # type: ignore
+
+KEY_SIZE = 32
+CHECK_SIZE = 8
+SLOT_SIZE = KEY_SIZE + GTElement.SIZE + CHECK_SIZE
+
+
+class SharedPairingCache:
+    """
+    BLS pairings in shared memory, so a pairing computed by one process of the node is found by the others.
+
+    It's a table of fixed size slots, the slot of a pairing is chosen from the first bytes of its key (the hash of
+    the public key and message), and a new pairing replaces the one in its slot. Every slot ends with a checksum of
+    the key and the pairing. There are no locks, a reader copies the slot and checks the checksum, so a slot which
+    was being written at the same time is a miss instead of a wrong pairing.
+    """
+
+    shm: "shared_memory.SharedMemory"
+    num_slots: int
+    owner: bool
+
+    def __init__(self, shm: "shared_memory.SharedMemory", owner: bool):
+        self.shm = shm
+        self.num_slots = shm.size // SLOT_SIZE
+        self.owner = owner
+
+    @classmethod
+    def create(cls, num_slots: int) -> "SharedPairingCache":
+        # new shared memory is filled with zeros, which is never a valid slot
+        return cls(shared_memory.SharedMemory(create=True, size=num_slots * SLOT_SIZE), True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedPairingCache":
+        return cls(shared_memory.SharedMemory(name=name), False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _offset(self, key: bytes) -> int:
+        return int.from_bytes(key[:8], "big") % self.num_slots * SLOT_SIZE
+
+    def get(self, key: bytes) -> Optional[GTElement]:
+        offset = self._offset(key)
+        slot = bytes(self.shm.buf[offset : offset + SLOT_SIZE])
+        if slot[:KEY_SIZE] != key:
+            return None
+        if std_hash(slot[:-CHECK_SIZE])[:CHECK_SIZE] != slot[-CHECK_SIZE:]:
+            return None
+        return GTElement.from_bytes(slot[KEY_SIZE:-CHECK_SIZE])
+
+    def put(self, key: bytes, value: GTElement) -> None:
+        data = key + bytes(value)
+        offset = self._offset(key)
+        self.shm.buf[offset : offset + SLOT_SIZE] = data + std_hash(data)[:CHECK_SIZE]
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
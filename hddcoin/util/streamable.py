@@ -5,9 +5,12 @@ from __future__ import annotations
 import dataclasses
 import io
 import pprint
+import struct
 import sys
 from enum import Enum
-from typing import Any, BinaryIO, Dict, List, Tuple, Type, Callable, Optional, Iterator
+from functools import partial
+from operator import attrgetter
+from typing import Any, BinaryIO, Dict, List, Tuple, Type, Callable, Optional
 
 from blspy import G1Element, G2Element, PrivateKey
 
@@ -15,6 +18,7 @@ from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.util.byte_types import hexstr_to_bytes
 from hddcoin.util.hash import std_hash
 from hddcoin.util.ints import int64, int512, uint32, uint64, uint128
+from hddcoin.util.struct_stream import StructStream
 from hddcoin.util.type_checking import is_type_List, is_type_SpecificOptional, is_type_Tuple, strictdataclass
 
 if sys.version_info < (3, 8):
@@ -124,7 +128,11 @@ def recurse_jsonify(d):
     return d
 
 
+FIELDS_FOR_STREAMABLE_CLASS = {}
 PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS = {}
+STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS = {}
+# built on first use, only views need them, see streamable_view.py
+SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS = {}
 
 
 def streamable(cls: Any):
@@ -164,6 +172,10 @@ def streamable(cls: Any):
 
     Furthermore, a get_hash() member is added, which performs a serialization and a sha256.
 
+    The parse and stream functions for each class are built once, here, from its fields. Runs of
+    fields with a fixed size serialization (sized ints, sized bytes, bools, BLS elements) are
+    parsed and streamed with a single pre-compiled struct, see fixed_size_item().
+
     This class is used for deterministic serialization and hashing, for consensus critical
     objects such as the block header.
 
@@ -176,16 +188,14 @@ def streamable(cls: Any):
     cls1 = strictdataclass(cls)
     t = type(cls.__name__, (cls1, Streamable), {})
 
-    parse_functions = []
     try:
         fields = cls1.__annotations__  # pylint: disable=no-member
     except Exception:
         fields = {}
 
-    for _, f_type in fields.items():
-        parse_functions.append(cls.function_to_parse_one_item(f_type))
-
-    PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[t] = parse_functions
+    FIELDS_FOR_STREAMABLE_CLASS[t] = tuple(fields.keys())
+    PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[t] = function_to_parse_items(list(fields.values()))
+    STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS[t] = function_to_stream_fields(fields)
     return t
 
 
@@ -257,6 +267,276 @@ def parse_str(f: BinaryIO) -> str:
     return bytes.decode(str_read_bytes, "utf-8")
 
 
+def bool_from_byte(value: int) -> bool:
+    if value == 0:
+        return False
+    elif value == 1:
+        return True
+    else:
+        raise ValueError("Bool byte must be 0 or 1")
+
+
+def fixed_size_item(f_type: Type) -> Optional[Tuple[str, Callable[[Any], Any], Optional[Callable[[Any], Any]]]]:
+    """
+    For types with a fixed size serialization, returns the struct format of the item, the function
+    converting the unpacked value into the type, and the function converting an item into the value
+    to pack (or None if the item can be packed as is). Returns None for all other types.
+
+    The values coming out of struct.unpack are known to fit, so the ints and sized bytes are created
+    without the range and size checks of their constructors.
+    """
+    if f_type is bool:
+        return "B", bool_from_byte, int
+    if not isinstance(f_type, type):
+        return None
+    if issubclass(f_type, StructStream) and f_type.PACK.startswith("!"):
+        return f_type.PACK[1:], partial(int.__new__, f_type), None
+    if issubclass(f_type, bytes) and hasattr(f_type, "parse") and hasattr(f_type, "SIZE"):
+        return f"{f_type.SIZE}s", partial(bytes.__new__, f_type), None
+    if not hasattr(f_type, "parse") and hasattr(f_type, "from_bytes") and f_type.__name__ in size_hints:
+        return f"{size_hints[f_type.__name__]}s", f_type.from_bytes, bytes
+    return None
+
+
+def parse_fixed_size(f: BinaryIO, item_struct: struct.Struct, convert: Callable[[Any], Any]) -> Any:
+    bytes_read = f.read(item_struct.size)
+    assert bytes_read is not None and len(bytes_read) == item_struct.size  # Checks for EOF
+    return convert(item_struct.unpack(bytes_read)[0])
+
+
+def parse_fixed_size_list(f: BinaryIO, item_struct: struct.Struct, convert: Callable[[Any], Any]) -> List[Any]:
+    list_size = parse_uint32(f)
+    bytes_to_read = list_size * item_struct.size
+    bytes_read = f.read(bytes_to_read)
+    assert bytes_read is not None and len(bytes_read) == bytes_to_read  # Checks for EOF
+    return [convert(value) for (value,) in item_struct.iter_unpack(bytes_read)]
+
+
+def function_to_parse_items(f_types: List[Type]) -> Callable[[BinaryIO], List[Any]]:
+    """
+    Returns a function parsing the given types one after the other, returning the list of values.
+    Consecutive fixed size items are read and unpacked together.
+    """
+    steps: List[Callable[[BinaryIO, List[Any]], None]] = []
+    run: List[Tuple[str, Callable[[Any], Any], Optional[Callable[[Any], Any]]]] = []
+
+    def parse_run_f(run_struct: struct.Struct, converters: List[Callable[[Any], Any]]):
+        size = run_struct.size
+
+        def parse_run(f: BinaryIO, values: List[Any]) -> None:
+            bytes_read = f.read(size)
+            assert bytes_read is not None and len(bytes_read) == size  # Checks for EOF
+            values.extend([convert(value) for convert, value in zip(converters, run_struct.unpack(bytes_read))])
+
+        return parse_run
+
+    def parse_one_f(parse_f: Callable[[BinaryIO], Any]):
+        def parse_one(f: BinaryIO, values: List[Any]) -> None:
+            values.append(parse_f(f))
+
+        return parse_one
+
+    def end_run() -> None:
+        if len(run) > 0:
+            run_struct = struct.Struct("!" + "".join(item[0] for item in run))
+            steps.append(parse_run_f(run_struct, [item[1] for item in run]))
+            run.clear()
+
+    for f_type in f_types:
+        fixed = fixed_size_item(f_type)
+        if fixed is not None:
+            run.append(fixed)
+        else:
+            end_run()
+            steps.append(parse_one_f(Streamable.function_to_parse_one_item(f_type)))
+    end_run()
+
+    def parse_items(f: BinaryIO) -> List[Any]:
+        values: List[Any] = []
+        for step in steps:
+            step(f, values)
+        return values
+
+    return parse_items
+
+
+def function_to_stream_items(f_types: List[Type]) -> Callable[[List[Any], BinaryIO], None]:
+    """
+    Returns a function streaming a list of values of the given types. Consecutive fixed size items are
+    packed together.
+    """
+    steps: List[Callable[[List[Any], BinaryIO], None]] = []
+    run: List[Tuple[int, Tuple[str, Callable[[Any], Any], Optional[Callable[[Any], Any]]]]] = []
+
+    def stream_run_f(run_struct: struct.Struct, indices: List[int], to_values: List[Optional[Callable[[Any], Any]]]):
+        if all(to_value is None for to_value in to_values):
+            first = indices[0]
+            last = indices[-1] + 1
+
+            def stream_run(items: List[Any], f: BinaryIO) -> None:
+                f.write(run_struct.pack(*items[first:last]))
+
+        else:
+
+            def stream_run(items: List[Any], f: BinaryIO) -> None:
+                f.write(
+                    run_struct.pack(
+                        *[
+                            items[i] if to_value is None else to_value(items[i])
+                            for i, to_value in zip(indices, to_values)
+                        ]
+                    )
+                )
+
+        return stream_run
+
+    def stream_one_f(index: int, stream_f: Callable[[Any, BinaryIO], None]):
+        def stream_one(items: List[Any], f: BinaryIO) -> None:
+            stream_f(items[index], f)
+
+        return stream_one
+
+    def end_run() -> None:
+        if len(run) > 0:
+            run_struct = struct.Struct("!" + "".join(item[1][0] for item in run))
+            steps.append(stream_run_f(run_struct, [item[0] for item in run], [item[1][2] for item in run]))
+            run.clear()
+
+    for index, f_type in enumerate(f_types):
+        fixed = fixed_size_item(f_type)
+        if fixed is not None:
+            run.append((index, fixed))
+        else:
+            end_run()
+            steps.append(stream_one_f(index, Streamable.function_to_stream_one_item(f_type)))
+    end_run()
+
+    def stream_items(items: List[Any], f: BinaryIO) -> None:
+        for step in steps:
+            step(items, f)
+
+    return stream_items
+
+
+def function_to_skip_one_item(f_type: Type) -> Callable[[memoryview, int], int]:
+    """
+    This function returns a function taking two arguments `buf: memoryview` and `pos: int` that returns
+    the position right after the serialized item of the given type starting at pos, without parsing it.
+    """
+    inner_type: Type
+    size = fixed_size(f_type)
+    if size is not None:
+        return lambda buf, pos: skip_to(buf, pos + size)
+    if is_type_SpecificOptional(f_type):
+        skip_inner_type_f = function_to_skip_one_item(get_args(f_type)[0])
+
+        def skip_optional(buf: memoryview, pos: int) -> int:
+            assert pos < len(buf)  # Checks for EOF
+            if buf[pos] == 0:
+                return pos + 1
+            elif buf[pos] == 1:
+                return skip_inner_type_f(buf, pos + 1)
+            else:
+                raise ValueError("Optional must be 0 or 1")
+
+        return skip_optional
+    if f_type in FIELDS_FOR_STREAMABLE_CLASS:
+        skip_fields_f = SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS.get(f_type)
+        if skip_fields_f is None:
+            annotations = getattr(f_type, "__annotations__", {})
+            skip_fields_f = function_to_skip_items([annotations[name] for name in FIELDS_FOR_STREAMABLE_CLASS[f_type]])
+            SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS[f_type] = skip_fields_f
+        return skip_fields_f
+    if f_type == bytes or f_type is str:
+        return lambda buf, pos: skip_to(buf, pos + 4 + int.from_bytes(buf[pos : pos + 4], "big"))
+    if is_type_List(f_type):
+        inner_type = get_args(f_type)[0]
+        inner_size = fixed_size(inner_type)
+        if inner_size is not None:
+            return lambda buf, pos: skip_to(buf, pos + 4 + inner_size * int.from_bytes(buf[pos : pos + 4], "big"))
+        skip_inner_type_f = function_to_skip_one_item(inner_type)
+
+        def skip_list(buf: memoryview, pos: int) -> int:
+            list_size = int.from_bytes(buf[pos : pos + 4], "big")
+            pos = skip_to(buf, pos + 4)
+            for _ in range(list_size):
+                pos = skip_inner_type_f(buf, pos)
+            return pos
+
+        return skip_list
+    if is_type_Tuple(f_type):
+        return function_to_skip_items(list(get_args(f_type)))
+    if hasattr(f_type, "parse"):
+        # custom types, like programs, have to be parsed to know their size
+        def skip_parse(buf: memoryview, pos: int) -> int:
+            f = io.BytesIO(buf[pos:])
+            f_type.parse(f)
+            return pos + f.tell()
+
+        return skip_parse
+    raise NotImplementedError(f"Type {f_type} does not have parse")
+
+
+def skip_to(buf: memoryview, pos: int) -> int:
+    assert pos <= len(buf)  # Checks for EOF
+    return pos
+
+
+def fixed_size(f_type: Type) -> Optional[int]:
+    fixed = fixed_size_item(f_type)
+    if fixed is not None:
+        return struct.calcsize("!" + fixed[0])
+    if f_type is uint128:
+        return 16
+    if f_type is int512:
+        return 64
+    return None
+
+
+def function_to_skip_items(f_types: List[Type]) -> Callable[[memoryview, int], int]:
+    """
+    Returns a function skipping the given types one after the other. Consecutive fixed size items are
+    skipped at once.
+    """
+    skip_functions: List[Callable[[memoryview, int], int]] = []
+    run_size = 0
+
+    def skip_run_f(size: int) -> Callable[[memoryview, int], int]:
+        return lambda buf, pos: skip_to(buf, pos + size)
+
+    for f_type in f_types:
+        size = fixed_size(f_type)
+        if size is not None:
+            run_size += size
+            continue
+        if run_size > 0:
+            skip_functions.append(skip_run_f(run_size))
+            run_size = 0
+        skip_functions.append(function_to_skip_one_item(f_type))
+    if run_size > 0:
+        skip_functions.append(skip_run_f(run_size))
+
+    def skip_items(buf: memoryview, pos: int) -> int:
+        for skip_f in skip_functions:
+            pos = skip_f(buf, pos)
+        return pos
+
+    return skip_items
+
+
+def function_to_stream_fields(fields: Dict[str, Type]) -> Callable[[Any, BinaryIO], None]:
+    """
+    Returns a function streaming all the fields of a streamable object, in order.
+    """
+    if len(fields) == 0:
+        return lambda obj, f: None
+    stream_items = function_to_stream_items(list(fields.values()))
+    get_fields = attrgetter(*fields.keys())
+    if len(fields) == 1:
+        return lambda obj, f: stream_items([get_fields(obj)], f)
+    return lambda obj, f: stream_items(get_fields(obj), f)
+
+
 class Streamable:
     @classmethod
     def function_to_parse_one_item(cls: Type[cls.__name__], f_type: Type):  # type: ignore
@@ -271,21 +551,27 @@ class Streamable:
             inner_type = get_args(f_type)[0]
             parse_inner_type_f = cls.function_to_parse_one_item(inner_type)
             return lambda f: parse_optional(f, parse_inner_type_f)
+        fixed = fixed_size_item(f_type)
+        if fixed is not None:
+            item_struct = struct.Struct("!" + fixed[0])
+            convert = fixed[1]
+            return lambda f: parse_fixed_size(f, item_struct, convert)
         if hasattr(f_type, "parse"):
             return f_type.parse
         if f_type == bytes:
             return parse_bytes
         if is_type_List(f_type):
             inner_type = get_args(f_type)[0]
+            fixed = fixed_size_item(inner_type)
+            if fixed is not None:
+                item_struct = struct.Struct("!" + fixed[0])
+                convert = fixed[1]
+                return lambda f: parse_fixed_size_list(f, item_struct, convert)
             parse_inner_type_f = cls.function_to_parse_one_item(inner_type)
             return lambda f: parse_list(f, parse_inner_type_f)
         if is_type_Tuple(f_type):
-            inner_types = get_args(f_type)
-            list_parse_inner_type_f = [cls.function_to_parse_one_item(_) for _ in inner_types]
-            return lambda f: parse_tuple(f, list_parse_inner_type_f)
-        if hasattr(f_type, "from_bytes") and f_type.__name__ in size_hints:
-            bytes_to_read = size_hints[f_type.__name__]
-            return lambda f: parse_size_hints(f, f_type, bytes_to_read)
+            parse_items = function_to_parse_items(list(get_args(f_type)))
+            return lambda f: tuple(parse_items(f))
         if f_type is str:
             return parse_str
         raise NotImplementedError(f"Type {f_type} does not have parse")
@@ -294,63 +580,100 @@ class Streamable:
     def parse(cls: Type[cls.__name__], f: BinaryIO) -> cls.__name__:  # type: ignore
         # Create the object without calling __init__() to avoid unnecessary post-init checks in strictdataclass
         obj: Streamable = object.__new__(cls)
-        fields: Iterator[str] = iter(getattr(cls, "__annotations__", {}))
-        values: Iterator = (parse_f(f) for parse_f in PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[cls])
-        for field, value in zip(fields, values):
-            object.__setattr__(obj, field, value)
-
-        # Use -1 as a sentinel value as it's not currently serializable
-        if next(fields, -1) != -1:
-            raise ValueError("Failed to parse incomplete Streamable object")
-        if next(values, -1) != -1:
-            raise ValueError("Failed to parse unknown data in Streamable object")
+        # the parse function is built from the same fields, so it returns exactly one value per field
+        obj.__dict__.update(zip(FIELDS_FOR_STREAMABLE_CLASS[cls], PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[cls](f)))
         return obj
 
-    def stream_one_item(self, f_type: Type, item, f: BinaryIO) -> None:
+    @classmethod
+    def function_to_stream_one_item(cls: Type[cls.__name__], f_type: Type):  # type: ignore
+        """
+        This function returns a function taking two arguments `item: Any` and `f: BinaryIO` that streams
+        the item, of the given type, into f.
+        """
         inner_type: Type
         if is_type_SpecificOptional(f_type):
             inner_type = get_args(f_type)[0]
-            if item is None:
-                f.write(bytes([0]))
-            else:
-                f.write(bytes([1]))
-                self.stream_one_item(inner_type, item, f)
-        elif f_type == bytes:
-            write_uint32(f, uint32(len(item)))
-            f.write(item)
-        elif hasattr(f_type, "stream"):
-            item.stream(f)
-        elif hasattr(f_type, "__bytes__"):
-            f.write(bytes(item))
-        elif is_type_List(f_type):
-            assert is_type_List(type(item))
-            write_uint32(f, uint32(len(item)))
+            stream_inner_type_f = cls.function_to_stream_one_item(inner_type)
+
+            def stream_optional(item: Any, f: BinaryIO) -> None:
+                if item is None:
+                    f.write(bytes([0]))
+                else:
+                    f.write(bytes([1]))
+                    stream_inner_type_f(item, f)
+
+            return stream_optional
+        if f_type == bytes:
+
+            def stream_bytes(item: Any, f: BinaryIO) -> None:
+                write_uint32(f, uint32(len(item)))
+                f.write(item)
+
+            return stream_bytes
+        fixed = fixed_size_item(f_type)
+        if fixed is not None and f_type is not bool:
+            item_struct = struct.Struct("!" + fixed[0])
+            to_value = fixed[2]
+            if to_value is None:
+                return lambda item, f: f.write(item_struct.pack(item))
+            return lambda item, f: f.write(item_struct.pack(to_value(item)))
+        if hasattr(f_type, "stream"):
+            return lambda item, f: item.stream(f)
+        if hasattr(f_type, "__bytes__"):
+            return lambda item, f: f.write(bytes(item))
+        if is_type_List(f_type):
             inner_type = get_args(f_type)[0]
-            # wjb assert inner_type != get_args(List)[0]  # type: ignore
-            for element in item:
-                self.stream_one_item(inner_type, element, f)
-        elif is_type_Tuple(f_type):
-            inner_types = get_args(f_type)
-            assert len(item) == len(inner_types)
-            for i in range(len(item)):
-                self.stream_one_item(inner_types[i], item[i], f)
-
-        elif f_type is str:
-            str_bytes = item.encode("utf-8")
-            write_uint32(f, uint32(len(str_bytes)))
-            f.write(str_bytes)
-        elif f_type is bool:
-            f.write(int(item).to_bytes(1, "big"))
-        else:
-            raise NotImplementedError(f"can't stream {item}, {f_type}")
+            fixed = fixed_size_item(inner_type)
+            if fixed is not None:
+                item_struct = struct.Struct("!" + fixed[0])
+                to_value = fixed[2]
+
+                def stream_fixed_size_list(item: Any, f: BinaryIO) -> None:
+                    assert is_type_List(type(item))
+                    write_uint32(f, uint32(len(item)))
+                    if to_value is None:
+                        f.write(b"".join([item_struct.pack(element) for element in item]))
+                    else:
+                        f.write(b"".join([item_struct.pack(to_value(element)) for element in item]))
+
+                return stream_fixed_size_list
+            stream_inner_type_f = cls.function_to_stream_one_item(inner_type)
+
+            def stream_list(item: Any, f: BinaryIO) -> None:
+                assert is_type_List(type(item))
+                write_uint32(f, uint32(len(item)))
+                for element in item:
+                    stream_inner_type_f(element, f)
+
+            return stream_list
+        if is_type_Tuple(f_type):
+            inner_types = list(get_args(f_type))
+            stream_items = function_to_stream_items(inner_types)
+
+            def stream_tuple(item: Any, f: BinaryIO) -> None:
+                assert len(item) == len(inner_types)
+                stream_items(item, f)
+
+            return stream_tuple
+        if f_type is str:
+
+            def stream_str(item: Any, f: BinaryIO) -> None:
+                str_bytes = item.encode("utf-8")
+                write_uint32(f, uint32(len(str_bytes)))
+                f.write(str_bytes)
+
+            return stream_str
+        if f_type is bool:
+            return lambda item, f: f.write(int(item).to_bytes(1, "big"))
+        raise NotImplementedError(f"can't stream {f_type}")
 
     def stream(self, f: BinaryIO) -> None:
-        try:
-            fields = self.__annotations__  # pylint: disable=no-member
-        except Exception:
-            fields = {}
-        for f_name, f_type in fields.items():
-            self.stream_one_item(f_type, getattr(self, f_name), f)
+        stream_f = STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS.get(type(self))
+        if stream_f is None:
+            # a subclass of a streamable class, that wasn't decorated itself
+            stream_f = function_to_stream_fields(getattr(self, "__annotations__", {}))
+            STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS[type(self)] = stream_f
+        stream_f(self, f)
 
     def get_hash(self) -> bytes32:
         return bytes32(std_hash(bytes(self)))
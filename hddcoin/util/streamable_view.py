@@ -0,0 +1,128 @@
+import inspect
+import io
+from types import MethodType
+from typing import Any, Callable, Dict, List, Tuple, Type, Union
+
+from hddcoin.util.streamable import (
+    FIELDS_FOR_STREAMABLE_CLASS,
+    Streamable,
+    function_to_skip_one_item,
+)
+
+
+class ViewLayout:
+    """
+    The per-class functions a StreamableView needs, built the first time a view of the class is created
+    """
+
+    fields: Tuple[str, ...]
+    field_index: Dict[str, int]
+    field_types: List[Type]
+    skip_functions: List[Callable[[memoryview, int], int]]
+    parse_functions: List[Callable[[io.BytesIO], Any]]
+    stream_functions: Dict[str, Callable[[Any, io.BytesIO], None]]
+
+    def __init__(self, cls: Type[Streamable]):
+        self.fields = FIELDS_FOR_STREAMABLE_CLASS[cls]
+        self.field_index = {name: index for index, name in enumerate(self.fields)}
+        annotations = getattr(cls, "__annotations__", {})
+        self.field_types = [annotations[name] for name in self.fields]
+        self.skip_functions = [function_to_skip_one_item(f_type) for f_type in self.field_types]
+        self.parse_functions = [Streamable.function_to_parse_one_item(f_type) for f_type in self.field_types]
+        self.stream_functions = {}
+
+    def stream_function(self, name: str) -> Callable[[Any, io.BytesIO], None]:
+        stream_f = self.stream_functions.get(name)
+        if stream_f is None:
+            stream_f = Streamable.function_to_stream_one_item(self.field_types[self.field_index[name]])
+            self.stream_functions[name] = stream_f
+        return stream_f
+
+
+VIEW_LAYOUTS: Dict[Type[Streamable], ViewLayout] = {}
+
+
+class StreamableView:
+    """
+    A read-only view of a serialized Streamable object. Nothing is parsed up front, each field is parsed
+    from the buffer the first time it's accessed. Properties and methods of the class can be used on the
+    view as long as they only read fields, e.g. FullBlock.header_hash only parses the foliage.
+
+    The bytes of fields can be spliced into other messages without parsing them, see fields_bytes() and
+    replace(). Use to_object() to get the fully parsed object.
+    """
+
+    def __init__(self, cls: Type[Streamable], data: Union[bytes, memoryview]):
+        layout = VIEW_LAYOUTS.get(cls)
+        if layout is None:
+            layout = ViewLayout(cls)
+            VIEW_LAYOUTS[cls] = layout
+        self._cls = cls
+        self._layout = layout
+        self._buf = memoryview(data)
+        # _offsets[i] is where field i starts, it's extended as far as the fields that are accessed
+        self._offsets: List[int] = [0]
+
+    def _field_span(self, index: int) -> Tuple[int, int]:
+        while len(self._offsets) <= index + 1:
+            i = len(self._offsets) - 1
+            self._offsets.append(self._layout.skip_functions[i](self._buf, self._offsets[i]))
+        return self._offsets[index], self._offsets[index + 1]
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for attributes that aren't set on the instance, parsed fields are stored there
+        if name.startswith("_"):
+            raise AttributeError(name)
+        index = self._layout.field_index.get(name)
+        if index is not None:
+            start, end = self._field_span(index)
+            f = io.BytesIO(self._buf[start:end])
+            value = self._layout.parse_functions[index](f)
+            assert f.tell() == end - start
+            self.__dict__[name] = value
+            return value
+
+        attribute = inspect.getattr_static(self._cls, name)
+        if isinstance(attribute, property):
+            return attribute.fget(self)  # type: ignore
+        if isinstance(attribute, (classmethod, staticmethod)):
+            return getattr(self._cls, name)
+        if inspect.isfunction(attribute):
+            return MethodType(attribute, self)
+        return attribute
+
+    def fields_bytes(self, first: str, last: str) -> memoryview:
+        """
+        Returns the serialized fields from first up to and including last
+        """
+        start, _ = self._field_span(self._layout.field_index[first])
+        _, end = self._field_span(self._layout.field_index[last])
+        return self._buf[start:end]
+
+    def replace(self, **changes: Any) -> bytes:
+        """
+        Returns the serialization of the object with the given fields replaced, like dataclasses.replace().
+        Only the new values are serialized, the other fields are copied from the buffer.
+        """
+        spans = sorted((self._field_span(self._layout.field_index[name]), name) for name in changes)
+        parts: List[Any] = []
+        pos = 0
+        for (start, end), name in spans:
+            parts.append(self._buf[pos:start])
+            f = io.BytesIO()
+            self._layout.stream_function(name)(changes[name], f)
+            parts.append(f.getvalue())
+            pos = end
+        _, last_end = self._field_span(len(self._layout.fields) - 1)
+        assert last_end == len(self._buf)
+        parts.append(self._buf[pos:])
+        return b"".join(parts)
+
+    def to_object(self) -> Any:
+        return self._cls.from_bytes(bytes(self._buf))
+
+    def stream(self, f: io.BytesIO) -> None:
+        f.write(self._buf)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._buf)
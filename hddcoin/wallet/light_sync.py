@@ -0,0 +1,90 @@
+from typing import Dict, Iterable, List
+
+from hddcoin.protocols import wallet_protocol
+from hddcoin.server.ws_connection import WSHDDcoinConnection
+from hddcoin.types.blockchain_format.coin import Coin
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.util.ints import uint32
+
+
+class CoinStateIndex:
+    """
+    The states of the coins a wallet is interested in, by the heights the coins were created and spent at.
+
+    The states are fetched from a full node in bulk, by subscribing to the puzzle hashes and coin ids of the wallet
+    in batches, so syncing a block doesn't need requests for its additions and removals. The states come without
+    proofs, so this is only used with trusted peers. The states are the latest ones of the peer, the sync checks
+    them against the header blocks it receives from the same peer.
+
+    This only replaces the additions and removals requests. The sync still fetches and adds every header block, as
+    the wallet blockchain keeps all of them to follow the peak and handle reorgs.
+    """
+
+    min_height: uint32
+    puzzle_hashes: Dict[bytes32, None]
+    coin_ids: Dict[bytes32, None]
+    requests: int
+
+    def __init__(self, min_height: uint32):
+        self.min_height = min_height
+        # dicts rather than sets, to subscribe in the order of the wallet's derivation indexes
+        self.puzzle_hashes = {}
+        self.coin_ids = {}
+        self.requests = 0
+        self._additions: Dict[uint32, Dict[bytes32, Coin]] = {}
+        self._removals: Dict[uint32, Dict[bytes32, Coin]] = {}
+
+    def add_states(self, coin_states: List[wallet_protocol.CoinState]) -> None:
+        for coin_state in coin_states:
+            coin = coin_state.coin
+            name = coin.name()
+            # the states of hinted coins are sent along, the wallet only gets the coins it's interested in
+            if coin.puzzle_hash not in self.puzzle_hashes and name not in self.coin_ids:
+                continue
+            if coin_state.created_height is not None:
+                self._additions.setdefault(coin_state.created_height, {})[name] = coin
+            if coin_state.spent_height is not None:
+                self._removals.setdefault(coin_state.spent_height, {})[name] = coin
+
+    def additions_at(self, height: uint32) -> List[Coin]:
+        return list(self._additions.get(height, {}).values())
+
+    def removals_at(self, height: uint32) -> List[Coin]:
+        return list(self._removals.get(height, {}).values())
+
+    def has_changes_at(self, height: uint32) -> bool:
+        return height in self._additions or height in self._removals
+
+    async def subscribe(
+        self,
+        peer: WSHDDcoinConnection,
+        puzzle_hashes: Iterable[bytes32],
+        coin_ids: Iterable[bytes32],
+        batch_size: int,
+    ) -> None:
+        """
+        Fetches the states of the puzzle hashes and coin ids which aren't subscribed yet, batch_size at a time
+        """
+        new_puzzle_hashes = [ph for ph in dict.fromkeys(puzzle_hashes) if ph not in self.puzzle_hashes]
+        self.puzzle_hashes.update(dict.fromkeys(new_puzzle_hashes))
+        for i in range(0, len(new_puzzle_hashes), batch_size):
+            ph_response = await peer.register_interest_in_puzzle_hash(
+                wallet_protocol.RegisterForPhUpdates(new_puzzle_hashes[i : i + batch_size], self.min_height)
+            )
+            if ph_response is None or not isinstance(ph_response, wallet_protocol.RespondToPhUpdates):
+                raise ValueError(f"Was not able to obtain coin states of puzzle hashes {ph_response}")
+            self.add_states(ph_response.coin_states)
+            self.requests += 1
+
+        new_coin_ids = [coin_id for coin_id in dict.fromkeys(coin_ids) if coin_id not in self.coin_ids]
+        self.coin_ids.update(dict.fromkeys(new_coin_ids))
+        for i in range(0, len(new_coin_ids), batch_size):
+            # the peer only sends the states of coins created from the given height, the coins of the wallet were
+            # usually created before the sync started
+            coin_response = await peer.register_interest_in_coin(
+                wallet_protocol.RegisterForCoinUpdates(new_coin_ids[i : i + batch_size], uint32(0))
+            )
+            if coin_response is None or not isinstance(coin_response, wallet_protocol.RespondToCoinUpdates):
+                raise ValueError(f"Was not able to obtain coin states of coins {coin_response}")
+            self.add_states(coin_response.coin_states)
+            self.requests += 1
@@ -13,7 +13,11 @@ from hddcoin.consensus.constants import ConsensusConstants
 from hddcoin.consensus.difficulty_adjustment import get_next_sub_slot_iters_and_difficulty
 from hddcoin.consensus.find_fork_point import find_fork_point_in_chain
 from hddcoin.consensus.full_block_to_block_record import block_to_block_record
-from hddcoin.consensus.multiprocess_validation import PreValidationResult, pre_validate_blocks_multiprocessing
+from hddcoin.consensus.multiprocess_validation import (
+    PreValidationResult,
+    create_validation_pool,
+    pre_validate_blocks_multiprocessing,
+)
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.types.blockchain_format.sub_epoch_summary import SubEpochSummary
 from hddcoin.types.coin_spend import CoinSpend
@@ -103,10 +107,11 @@ class WalletBlockchain(BlockchainInterface):
         if cpu_count > 61:
             cpu_count = 61  # Windows Server 2016 has an issue https://bugs.python.org/issue26903
         num_workers = max(cpu_count - 2, 1)
-        self.pool = ProcessPoolExecutor(max_workers=num_workers)
-        log.info(f"Started {num_workers} processes for block validation")
         self.constants = consensus_constants
         self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
+        # the workers get the constants when they start, so they're not sent with every batch
+        self.pool = create_validation_pool(num_workers, self.constants_json)
+        log.info(f"Started {num_workers} processes for block validation")
         self.block_store = block_store
         self._shut_down = False
         self.new_transaction_block_callback = new_transaction_block_callback
@@ -381,7 +386,7 @@ class WalletBlockchain(BlockchainInterface):
         self, blocks: List[HeaderBlock], batch_size: int = 4
     ) -> Optional[List[PreValidationResult]]:
         return await pre_validate_blocks_multiprocessing(
-            self.constants, self.constants_json, self, blocks, self.pool, True, {}, None, batch_size
+            self.constants, None, self, blocks, self.pool, True, {}, None, batch_size
         )
 
     def contains_block(self, header_hash: bytes32) -> bool:
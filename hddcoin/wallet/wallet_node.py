@@ -54,6 +54,7 @@ from hddcoin.util.merkle_set import MerkleSet, confirm_included_already_hashed,
 from hddcoin.util.path import mkdir, path_from_root
 from hddcoin.wallet.block_record import HeaderBlockRecord
 from hddcoin.wallet.derivation_record import DerivationRecord
+from hddcoin.wallet.light_sync import CoinStateIndex
 from hddcoin.wallet.settings.settings_objects import BackupInitialized
 from hddcoin.wallet.transaction_record import TransactionRecord
 from hddcoin.wallet.util.backup_utils import open_backup_file
@@ -553,6 +554,8 @@ class WalletNode:
     async def batch_sync_to_peak(self, fork_height, peak):
         advanced_peak = False
         batch_size = self.constants.MAX_BLOCK_COUNT_PER_REQUESTS
+        # coin states of the trusted peers, by peer id
+        coin_state_indexes: Dict[bytes32, CoinStateIndex] = {}
         for i in range(max(0, fork_height - 1), peak.height, batch_size):
             start_height = i
             end_height = min(peak.height, start_height + batch_size)
@@ -560,8 +563,21 @@ class WalletNode:
             added = False
             for peer in peers:
                 try:
+                    coin_states: Optional[CoinStateIndex] = None
+                    if self.config.get("light_sync", True) and self.server.is_trusted_peer(
+                        peer, self.config["trusted_peers"]
+                    ):
+                        if peer.peer_node_id not in coin_state_indexes:
+                            coin_state_indexes[peer.peer_node_id] = CoinStateIndex(uint32(start_height))
+                        coin_states = coin_state_indexes[peer.peer_node_id]
+                        # the wallet may have new puzzle hashes after the previous batch
+                        await self.subscribe_coin_states(peer, coin_states)
                     added, advanced_peak = await self.fetch_blocks_and_validate(
-                        peer, uint32(start_height), uint32(end_height), None if advanced_peak else fork_height
+                        peer,
+                        uint32(start_height),
+                        uint32(end_height),
+                        None if advanced_peak else fork_height,
+                        coin_states,
                     )
                     if added:
                         break
@@ -681,9 +697,11 @@ class WalletNode:
         height_start: uint32,
         height_end: uint32,
         fork_point_with_peak: Optional[uint32],
+        coin_states: Optional[CoinStateIndex] = None,
     ) -> Tuple[bool, bool]:
         """
-        Returns whether the blocks validated, and whether the peak was advanced
+        Returns whether the blocks validated, and whether the peak was advanced. The coins of the wallet in the
+        blocks are taken from coin_states if given, instead of requesting the additions and removals of every block.
         """
         if self.wallet_state_manager is None:
             return False, False
@@ -715,20 +733,23 @@ class WalletNode:
 
             fork_point_with_old_peak = None if advanced_peak else fork_point_with_peak
             if header_block.is_transaction_block:
-                # Find additions and removals
-                (additions, removals,) = await self.wallet_state_manager.get_filter_additions_removals(
-                    header_block, header_block.transactions_filter, fork_point_with_old_peak
-                )
+                if coin_states is not None:
+                    added_coins, removed_coins = await self.get_coins_from_coin_states(peer, header_block, coin_states)
+                else:
+                    # Find additions and removals
+                    (additions, removals,) = await self.wallet_state_manager.get_filter_additions_removals(
+                        header_block, header_block.transactions_filter, fork_point_with_old_peak
+                    )
 
-                # Get Additions
-                added_coins = await self.get_additions(peer, header_block, additions)
-                if added_coins is None:
-                    raise ValueError("Failed to fetch additions")
+                    # Get Additions
+                    added_coins = await self.get_additions(peer, header_block, additions)
+                    if added_coins is None:
+                        raise ValueError("Failed to fetch additions")
 
-                # Get removals
-                removed_coins = await self.get_removals(peer, header_block, added_coins, removals)
-                if removed_coins is None:
-                    raise ValueError("Failed to fetch removals")
+                    # Get removals
+                    removed_coins = await self.get_removals(peer, header_block, added_coins, removals)
+                    if removed_coins is None:
+                        raise ValueError("Failed to fetch removals")
 
                 # If there is a launcher created, or we have a singleton spent, fetches the required solutions
                 additional_coin_spends: List[CoinSpend] = await self.get_additional_coin_spends(
@@ -737,6 +758,8 @@ class WalletNode:
 
                 header_block_record = HeaderBlockRecord(header_block, added_coins, removed_coins)
             else:
+                if coin_states is not None and coin_states.has_changes_at(header_block.height):
+                    raise ValueError(f"Coin states don't match the blocks of peer {peer.get_peer_logging()}")
                 header_block_record = HeaderBlockRecord(header_block, [], [])
                 additional_coin_spends = []
             start_t = time.time()
@@ -766,10 +789,48 @@ class WalletNode:
                 self.wallet_state_manager.state_changed("new_block")
             elif result == ReceiveBlockResult.INVALID_BLOCK:
                 raise ValueError("Value error peer sent us invalid block")
+            if coin_states is not None and (len(header_block_record.additions) > 0 or len(additional_coin_spends) > 0):
+                # The coins use up puzzle hashes and the spends can make more coins interesting, the next blocks can
+                # have coins of either
+                await self.wallet_state_manager.create_more_puzzle_hashes()
+                await self.subscribe_coin_states(peer, coin_states)
         if advanced_peak:
             await self.wallet_state_manager.create_more_puzzle_hashes()
         return True, advanced_peak
 
+    async def subscribe_coin_states(self, peer: WSHDDcoinConnection, coin_states: CoinStateIndex) -> None:
+        """
+        Fetches the coin states of the puzzle hashes and coins the wallet is interested in, which aren't in
+        coin_states yet
+        """
+        assert self.wallet_state_manager is not None
+        wsm = self.wallet_state_manager
+        puzzle_hashes: List[bytes32] = list(wsm.puzzle_store.all_puzzle_hashes)
+        puzzle_hashes.extend(ph for ph, _ in await wsm.interested_store.get_interested_puzzle_hashes())
+        coin_ids: List[bytes32] = await wsm.interested_store.get_interested_coin_ids()
+        # spends of coins created before the sync started
+        unspent_records = await wsm.coin_store.get_unspent_coins_at_height(coin_states.min_height)
+        coin_ids.extend(record.name() for record in unspent_records)
+        trade_removals, trade_additions = await wsm.trade_manager.get_coins_of_interest()
+        coin_ids.extend(coin.name() for coin in trade_removals.values())
+        puzzle_hashes.extend(coin.puzzle_hash for coin in trade_additions.values())
+        await coin_states.subscribe(peer, puzzle_hashes, coin_ids, self.config.get("light_sync_batch_size", 1000))
+
+    async def get_coins_from_coin_states(
+        self, peer: WSHDDcoinConnection, header_block: HeaderBlock, coin_states: CoinStateIndex
+    ) -> Tuple[List[Coin], List[Coin]]:
+        """
+        Returns the coins of the wallet added and removed in the block
+        """
+        added_coins = coin_states.additions_at(header_block.height)
+        if await self.needs_all_removals(added_coins):
+            removed_coins = await self.get_removals(peer, header_block, added_coins, [], request_all_removals=True)
+            if removed_coins is None:
+                raise ValueError("Failed to fetch removals")
+        else:
+            removed_coins = coin_states.removals_at(header_block.height)
+        return added_coins, removed_coins
+
     def validate_additions(
         self,
         coins: List[Tuple[bytes32, List[Coin]]],
@@ -967,11 +1028,8 @@ class WalletNode:
         else:
             return []  # No added coins
 
-    async def get_removals(
-        self, peer: WSHDDcoinConnection, block_i, additions, removals, request_all_removals=False
-    ) -> Optional[List[Coin]]:
+    async def needs_all_removals(self, additions: List[Coin]) -> bool:
         assert self.wallet_state_manager is not None
-        # Check if we need all removals
         for coin in additions:
             puzzle_store = self.wallet_state_manager.puzzle_store
             record_info: Optional[DerivationRecord] = await puzzle_store.get_derivation_record_for_puzzle_hash(
@@ -979,11 +1037,18 @@ class WalletNode:
             )
             if record_info is not None and record_info.wallet_type == WalletType.COLOURED_COIN:
                 # TODO why ?
-                request_all_removals = True
-                break
+                return True
             if record_info is not None and record_info.wallet_type == WalletType.DISTRIBUTED_ID:
-                request_all_removals = True
-                break
+                return True
+        return False
+
+    async def get_removals(
+        self, peer: WSHDDcoinConnection, block_i, additions, removals, request_all_removals=False
+    ) -> Optional[List[Coin]]:
+        assert self.wallet_state_manager is not None
+        # Check if we need all removals
+        if not request_all_removals:
+            request_all_removals = await self.needs_all_removals(additions)
         if len(removals) > 0 or request_all_removals:
             if request_all_removals:
                 removals_request = wallet_protocol.RequestRemovals(block_i.height, block_i.header_hash, None)
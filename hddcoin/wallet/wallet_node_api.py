@@ -132,3 +132,16 @@ class WalletNodeAPI:
     @api_request
     async def reject_header_blocks(self, request: wallet_protocol.RejectHeaderBlocks):
         self.log.warning(f"Reject header blocks: {request}")
+
+    @api_request
+    async def respond_to_ph_update(self, request: wallet_protocol.RespondToPhUpdates):
+        pass
+
+    @api_request
+    async def respond_to_coin_update(self, request: wallet_protocol.RespondToCoinUpdates):
+        pass
+
+    @api_request
+    async def coin_state_update(self, request: wallet_protocol.CoinStateUpdate):
+        # The subscriptions are only used to fetch coin states while syncing, new blocks come as header blocks
+        pass
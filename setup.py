@@ -38,6 +38,10 @@ upnp_dependencies = [
     "miniupnpc==2.2.3",  # Allows users to open ports on their router
 ]
 
+zstd_dependencies = [
+    "zstandard==0.16.0",  # zstd compressed blocks in the v2 blockchain database, zlib is used without it
+]
+
 dev_dependencies = [
     "pytest",
     "pytest-asyncio",
@@ -65,6 +69,7 @@ kwargs = dict(
         uvloop=["uvloop"],
         dev=dev_dependencies,
         upnp=upnp_dependencies,
+        zstd=zstd_dependencies,
     ),
     packages=[
         "build_scripts",
@@ -11,6 +11,7 @@ import pytest
 from blspy import AugSchemeMPL, G2Element
 from clvm.casts import int_to_bytes
 
+from hddcoin.consensus import multiprocess_validation
 from hddcoin.consensus.block_rewards import calculate_base_farmer_reward
 from hddcoin.consensus.blockchain import ReceiveBlockResult
 from hddcoin.consensus.coinbase import create_farmer_coin
@@ -1620,6 +1621,21 @@ class TestPreValidation:
         log.info(f"Average pv: {sum(times_pv)/(len(blocks)/n_at_a_time)}")
         log.info(f"Average rb: {sum(times_rb)/(len(blocks))}")
 
+    @pytest.mark.asyncio
+    async def test_pre_validation_without_shared_memory(self, empty_blockchain, default_400_blocks, monkeypatch):
+        blocks = default_400_blocks[:40]
+        for block in blocks[:20]:
+            assert (await empty_blockchain.receive_block(block))[0] == ReceiveBlockResult.NEW_PEAK
+
+        res_shared = await empty_blockchain.pre_validate_blocks_multiprocessing(blocks[20:], {}, 8)
+        # the workers keep the block records of earlier batches
+        assert res_shared == await empty_blockchain.pre_validate_blocks_multiprocessing(blocks[20:], {}, 8)
+        monkeypatch.setattr(multiprocess_validation, "shared_memory", None)
+        res_pickled = await empty_blockchain.pre_validate_blocks_multiprocessing(blocks[20:], {}, 8)
+        assert res_shared is not None
+        assert res_shared == res_pickled
+        assert all(res.error is None for res in res_shared)
+
 
 class TestBodyValidation:
     @pytest.mark.asyncio
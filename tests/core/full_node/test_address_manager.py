@@ -578,6 +578,86 @@ class TestPeerManager:
         await connection.close()
         db_filename.unlink()
 
+    @pytest.mark.asyncio
+    async def test_incremental_serialization(self):
+        addrman = AddressManagerTest()
+        now = int(math.floor(time.time()))
+        source = PeerInfo("252.5.1.1", 8333)
+        peers = [TimestampedPeerInfo(f"250.{i}.1.1", 8444, now - 10000) for i in range(1, 21)]
+        peers.append(TimestampedPeerInfo("2001:db8::7", 8444, now - 10000))
+        await addrman.add_to_new_table(peers, source)
+        await addrman.mark_good(PeerInfo("250.1.1.1", 8444))
+
+        db_filename = Path("peer_table_incremental.db")
+        if db_filename.exists():
+            db_filename.unlink()
+        connection = await aiosqlite.connect(db_filename)
+        try:
+            address_manager_store = await AddressManagerStore.create(connection)
+            await address_manager_store.serialize(addrman)
+            assert not addrman.full_snapshot_needed and len(addrman.dirty_new_buckets) == 0
+
+            # Only the buckets of the changed peers are written again
+            await addrman.connect(PeerInfo("250.2.1.1", 8444), now)
+            await addrman.mark_good(PeerInfo("250.3.1.1", 8444))
+            assert len(addrman.dirty_nodes) == 1 and len(addrman.dirty_new_buckets) == 1
+            assert len(addrman.dirty_tried_buckets) == 1
+            await address_manager_store.serialize(addrman)
+            assert addrman.take_dirty_buckets_() == ([], [])
+
+            addrman2 = await address_manager_store.deserialize()
+            assert addrman2.key == addrman.key
+            assert addrman2.new_count == addrman.new_count == 19
+            assert addrman2.tried_count == addrman.tried_count == 2
+            assert addrman2.used_new_matrix_positions == addrman.used_new_matrix_positions
+            assert addrman2.used_tried_matrix_positions == addrman.used_tried_matrix_positions
+            for addr in peers:
+                info, _ = addrman.find_(addr)
+                info2, _ = addrman2.find_(addr)
+                assert (info2.peer_info, info2.src, info2.timestamp, info2.is_tried, info2.ref_count) == (
+                    info.peer_info,
+                    info.src,
+                    info.timestamp,
+                    info.is_tried,
+                    info.ref_count,
+                )
+            info2, _ = addrman2.find_(PeerInfo("250.2.1.1", 8444))
+            assert info2.timestamp == now
+        finally:
+            await connection.close()
+            db_filename.unlink()
+
+    @pytest.mark.asyncio
+    async def test_text_rows_migration(self):
+        now = int(math.floor(time.time()))
+        db_filename = Path("peer_table_migration.db")
+        if db_filename.exists():
+            db_filename.unlink()
+        connection = await aiosqlite.connect(db_filename)
+        try:
+            address_manager_store = await AddressManagerStore.create(connection)
+            # The tables as they were stored before the binary format
+            key = 2 ** 256 - 1
+            info = ExtendedPeerInfo(TimestampedPeerInfo("250.7.1.1", 8444, now), PeerInfo("252.5.1.1", 8333))
+            await address_manager_store.set_metadata([("key", str(key)), ("new_count", "1"), ("tried_count", "0")])
+            await connection.execute("INSERT INTO peer_nodes VALUES(?, ?)", (0, info.to_string()))
+            await connection.execute("INSERT INTO peer_new_table VALUES(?, ?)", (0, info.get_new_bucket(key)))
+            await connection.commit()
+
+            addrman = await address_manager_store.deserialize()
+            assert addrman.new_count == 1 and addrman.full_snapshot_needed
+            await address_manager_store.serialize(addrman)
+            cursor = await connection.execute("SELECT COUNT(*) from peer_nodes")
+            assert (await cursor.fetchone())[0] == 0
+            await cursor.close()
+
+            addrman2 = await address_manager_store.deserialize()
+            info2, _ = addrman2.find_(info.peer_info)
+            assert (info2.peer_info, info2.src, info2.timestamp) == (info.peer_info, info.src, info.timestamp)
+        finally:
+            await connection.close()
+            db_filename.unlink()
+
     @pytest.mark.asyncio
     async def test_cleanup(self):
         addrman = AddressManagerTest()
@@ -0,0 +1,131 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from hddcoin.full_node.block_height_map import BlockHeightMap
+from hddcoin.full_node.block_store import BlockStore
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.blockchain_format.sub_epoch_summary import SubEpochSummary
+from hddcoin.util.db_wrapper import DBWrapper
+from hddcoin.util.ints import uint8, uint32
+from tests.util.db_connection import DBConnection
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+def gen_block_hash(height: int, fork: int = 0) -> bytes32:
+    return bytes32(height.to_bytes(4, byteorder="big") + fork.to_bytes(4, byteorder="big") + b"\1" * 24)
+
+
+def gen_ses(height: int) -> SubEpochSummary:
+    return SubEpochSummary(gen_block_hash(height), gen_block_hash(height, 1), uint8(0), None, None)
+
+
+async def setup_chain(db_wrapper: DBWrapper, length: int, ses_every: Optional[int] = None, fork: int = 0) -> None:
+    block_store = await BlockStore.create(db_wrapper)
+    await db_wrapper.db.execute("UPDATE block_records SET is_peak=0 WHERE is_peak=1")
+    prev_hash = bytes32(b"\0" * 32)
+    for height in range(length):
+        header_hash = gen_block_hash(height, fork)
+        ses = None
+        if ses_every is not None and height % ses_every == 0:
+            ses = bytes(gen_ses(height))
+        await db_wrapper.db.execute(
+            "INSERT OR REPLACE INTO block_records VALUES(?, ?, ?, ?, ?, ?, ?)",
+            (header_hash.hex(), prev_hash.hex(), height, b"", ses, height == length - 1, False),
+        )
+        prev_hash = header_hash
+    await db_wrapper.db.commit()
+    assert await block_store.get_peak() == (prev_hash, length - 1)
+
+
+class TestBlockHeightMap:
+    @pytest.mark.asyncio
+    async def test_height_to_hash(self):
+        async with DBConnection() as db_wrapper:
+            await setup_chain(db_wrapper, 10, ses_every=3)
+            height_map = await BlockHeightMap.create(await BlockStore.create(db_wrapper))
+
+            assert not height_map.contains_height(uint32(10))
+            for height in range(10):
+                assert height_map.contains_height(uint32(height))
+                assert height_map.get_hash(uint32(height)) == gen_block_hash(height)
+            assert height_map.get_ses_heights() == [0, 3, 6, 9]
+            assert height_map.get_ses(uint32(6)) == gen_ses(6)
+
+    @pytest.mark.asyncio
+    async def test_empty_chain(self):
+        async with DBConnection() as db_wrapper:
+            height_map = await BlockHeightMap.create(await BlockStore.create(db_wrapper))
+            assert not height_map.contains_height(uint32(0))
+            assert height_map.get_ses_heights() == []
+
+    @pytest.mark.asyncio
+    async def test_save_restore(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = Path(tmp_dir) / "blockchain.sqlite"
+            async with DBConnection() as db_wrapper:
+                await setup_chain(db_wrapper, 3000, ses_every=20)
+                block_store = await BlockStore.create(db_wrapper)
+                height_map = await BlockHeightMap.create(block_store, db_path)
+                height_map.flush()
+                assert (Path(tmp_dir) / "blockchain.height-to-hash").stat().st_size == 3000 * 32
+
+                # when the files match the peak in the database, the block records are not loaded again
+                await db_wrapper.db.execute("DELETE FROM block_records WHERE height < 2999")
+                await db_wrapper.db.commit()
+
+                height_map = await BlockHeightMap.create(block_store, db_path)
+                for height in range(3000):
+                    assert height_map.get_hash(uint32(height)) == gen_block_hash(height)
+                assert height_map.get_ses_heights() == list(range(0, 3000, 20))
+
+    @pytest.mark.asyncio
+    async def test_restore_after_reorg(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = Path(tmp_dir) / "blockchain.sqlite"
+            async with DBConnection() as db_wrapper:
+                await setup_chain(db_wrapper, 2500, ses_every=20)
+                block_store = await BlockStore.create(db_wrapper)
+                height_map = await BlockHeightMap.create(block_store, db_path)
+                height_map.flush()
+
+                # the database moves to a shorter chain forking at height 1999, which the files don't know about
+                await db_wrapper.db.execute("DELETE FROM block_records WHERE height >= 2000")
+                await db_wrapper.db.execute("UPDATE block_records SET is_peak=0")
+                prev_hash = gen_block_hash(1999)
+                for height in range(2000, 2100):
+                    header_hash = gen_block_hash(height, 1)
+                    await db_wrapper.db.execute(
+                        "INSERT INTO block_records VALUES(?, ?, ?, ?, ?, ?, ?)",
+                        (header_hash.hex(), prev_hash.hex(), height, b"", None, height == 2099, False),
+                    )
+                    prev_hash = header_hash
+                await db_wrapper.db.commit()
+
+                height_map = await BlockHeightMap.create(block_store, db_path)
+                assert height_map.contains_height(uint32(2099))
+                assert not height_map.contains_height(uint32(2100))
+                assert height_map.get_hash(uint32(1999)) == gen_block_hash(1999)
+                assert height_map.get_hash(uint32(2000)) == gen_block_hash(2000, 1)
+                assert height_map.get_ses_heights() == list(range(0, 2000, 20))
+                height_map.flush()
+                assert (Path(tmp_dir) / "blockchain.height-to-hash").stat().st_size == 2100 * 32
+
+    @pytest.mark.asyncio
+    async def test_rollback(self):
+        async with DBConnection() as db_wrapper:
+            await setup_chain(db_wrapper, 100, ses_every=10)
+            height_map = await BlockHeightMap.create(await BlockStore.create(db_wrapper))
+            height_map.rollback(55)
+            assert height_map.get_ses_heights() == [0, 10, 20, 30, 40, 50]
+            height_map.update_height(uint32(60), gen_block_hash(60, 1), gen_ses(60))
+            assert height_map.get_hash(uint32(60)) == gen_block_hash(60, 1)
+            assert height_map.get_ses_heights() == [0, 10, 20, 30, 40, 50, 60]
@@ -1,4 +1,5 @@
 import asyncio
+import dataclasses
 import logging
 import random
 import sqlite3
@@ -8,11 +9,15 @@ import aiosqlite
 import pytest
 
 from hddcoin.consensus.blockchain import Blockchain
+from hddcoin.full_node.block_compression import BlockCompression
 from hddcoin.full_node.block_store import BlockStore
 from hddcoin.full_node.coin_store import CoinStore
 from hddcoin.full_node.hint_store import HintStore
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.util.db_wrapper import DBWrapper
+from hddcoin.util.generator_tools import get_block_header, get_block_header_bytes
 from tests.setup_nodes import bt, test_constants
+from tests.util.db_connection import DBConnection
 
 log = logging.getLogger(__name__)
 
@@ -130,3 +135,65 @@ class TestBlockStore:
         await connection_2.close()
         db_filename.unlink()
         db_filename_2.unlink()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("compression", [BlockCompression.NONE, BlockCompression.ZLIB])
+    async def test_compressed_blocks(self, compression):
+        blocks = bt.get_consecutive_blocks(10)
+
+        async with DBConnection() as db_wrapper, DBConnection(2) as db_wrapper_2:
+            coin_store = await CoinStore.create(db_wrapper)
+            hint_store = await HintStore.create(db_wrapper)
+            bc = await Blockchain.create(coin_store, await BlockStore.create(db_wrapper), test_constants, hint_store)
+
+            store = await BlockStore.create(db_wrapper_2, compression)
+            for block in blocks:
+                await bc.receive_block(block)
+                await store.add_full_block(block.header_hash, block, bc.block_record(block.header_hash))
+
+            cursor = await db_wrapper_2.db.execute("SELECT DISTINCT compression FROM full_blocks")
+            assert [row[0] for row in await cursor.fetchall()] == [compression]
+            await cursor.close()
+
+            # a new store has nothing cached, all blocks are read back from the database
+            store = await BlockStore.create(db_wrapper_2, compression)
+            for block in blocks:
+                assert await store.get_full_block_bytes(block.header_hash) == bytes(block)
+            store = await BlockStore.create(db_wrapper_2, compression)
+            assert await store.get_blocks_by_hash([b.header_hash for b in blocks]) == blocks
+            assert await store.get_block_bytes_by_hash([b.header_hash for b in blocks]) == [bytes(b) for b in blocks]
+            assert await store.get_full_blocks_at([5]) == [blocks[5]]
+            store = await BlockStore.create(db_wrapper_2, compression)
+            for block in blocks:
+                assert await store.get_full_block(block.header_hash) == block
+
+    @pytest.mark.asyncio
+    async def test_block_views(self):
+        blocks = bt.get_consecutive_blocks(10)
+
+        async with DBConnection(2) as db_wrapper:
+            coin_store = await CoinStore.create(db_wrapper)
+            hint_store = await HintStore.create(db_wrapper)
+            store = await BlockStore.create(db_wrapper)
+            bc = await Blockchain.create(coin_store, store, test_constants, hint_store)
+            for block in blocks:
+                await bc.receive_block(block)
+
+            assert await store.get_full_block_view(bytes32([0] * 32)) is None
+            views = await store.get_block_views_by_hash([b.header_hash for b in blocks])
+            for block, view in zip(blocks, views):
+                assert bytes(view) == bytes(block)
+                assert view.height == block.height
+                assert view.header_hash == block.header_hash
+                assert view.is_transaction_block() == block.is_transaction_block()
+                assert view.get_included_reward_coins() == block.get_included_reward_coins()
+                assert view.to_object() == block
+
+                no_generator = dataclasses.replace(block, transactions_generator=None)
+                assert view.replace(transactions_generator=None) == bytes(no_generator)
+                header_block = get_block_header(block, [], [])
+                assert get_block_header_bytes(view, [], []) == bytes(header_block)
+
+                view = await store.get_full_block_view(block.header_hash)
+                assert view is not None
+                assert bytes(view) == bytes(block)
@@ -0,0 +1,100 @@
+from blspy import AugSchemeMPL
+
+from hddcoin.consensus.cost_calculator import NPCResult
+from hddcoin.full_node.block_template import BlockTemplateBuilder
+from hddcoin.full_node.bundle_tools import simple_solution_generator
+from hddcoin.full_node.mempool import Mempool
+from hddcoin.types.blockchain_format.coin import Coin
+from hddcoin.types.blockchain_format.program import SerializedProgram
+from hddcoin.types.coin_spend import CoinSpend
+from hddcoin.types.mempool_item import MempoolItem
+from hddcoin.types.spend_bundle import SpendBundle
+from hddcoin.util.hash import std_hash
+from hddcoin.util.ints import uint64
+
+PEAK = std_hash(b"peak")
+MAX_COST = 1000
+MAX_FEES = 1000000
+
+
+def make_item(index: int, fee: int, cost: int) -> MempoolItem:
+    coin = Coin(std_hash(index.to_bytes(4, "big")), std_hash(b"puzzle"), uint64(index + 1))
+    sk = AugSchemeMPL.key_gen(std_hash(b"key" + index.to_bytes(4, "big")))
+    spend_bundle = SpendBundle(
+        [CoinSpend(coin, SerializedProgram.from_bytes(b"\x01"), SerializedProgram.from_bytes(b"\x80"))],
+        AugSchemeMPL.sign(sk, coin.name()),
+    )
+    return MempoolItem(
+        spend_bundle,
+        uint64(fee),
+        NPCResult(None, [], uint64(cost)),
+        uint64(cost),
+        spend_bundle.name(),
+        [],
+        [coin],
+        SerializedProgram.from_bytes(b"\x80"),
+    )
+
+
+def add(mempool: Mempool, builder: BlockTemplateBuilder, item: MempoolItem) -> MempoolItem:
+    mempool.add_to_pool(item)
+    builder.item_added(item)
+    return item
+
+
+class TestBlockTemplate:
+    def test_fills_remaining_cost(self):
+        mempool = Mempool(10 * MAX_COST)
+        builder = BlockTemplateBuilder()
+        high = add(mempool, builder, make_item(0, 6000, 600))
+        add(mempool, builder, make_item(1, 2500, 500))
+        low = add(mempool, builder, make_item(2, 300, 300))
+        template = builder.get(mempool, PEAK, MAX_COST, MAX_FEES)
+        # the second item doesn't fit after the first one, the third one does
+        assert template.items == [high, low]
+        assert template.cost == 900
+        assert template.fees == 6300
+        assert template.removals == high.removals + low.removals
+        spend_bundle = SpendBundle.aggregate([high.spend_bundle, low.spend_bundle])
+        assert template.spend_bundle == spend_bundle
+        assert template.simple_generator() == simple_solution_generator(spend_bundle)
+        assert template.suitable_for_compression is False
+
+        # the fee limit is honored too
+        template = builder.get(mempool, PEAK, MAX_COST, 6000)
+        assert template.items == [high]
+
+    def test_incremental_updates(self):
+        mempool = Mempool(10 * MAX_COST)
+        builder = BlockTemplateBuilder()
+        first = add(mempool, builder, make_item(0, 5000, 500))
+        template = builder.get(mempool, PEAK, MAX_COST, MAX_FEES)
+        assert builder.builds == 1
+
+        # fits, so it's added to the template
+        small = add(mempool, builder, make_item(1, 200, 200))
+        assert builder.get(mempool, PEAK, MAX_COST, MAX_FEES) is template
+        assert template.items == [first, small]
+        assert builder.builds == 1 and builder.updates == 1
+        assert template.spend_bundle == SpendBundle.aggregate([first.spend_bundle, small.spend_bundle])
+
+        # doesn't fit with a lower fee rate than the template
+        add(mempool, builder, make_item(2, 400, 400))
+        assert builder.get(mempool, PEAK, MAX_COST, MAX_FEES) is template
+        assert builder.builds == 1
+
+        # doesn't fit, but pays more than an item in the template
+        better = add(mempool, builder, make_item(3, 2000, 400))
+        template = builder.get(mempool, PEAK, MAX_COST, MAX_FEES)
+        assert builder.builds == 2
+        assert template.items == [first, better]
+
+        # an item of the template left the mempool
+        mempool.remove_from_pool(better)
+        template = builder.get(mempool, PEAK, MAX_COST, MAX_FEES)
+        assert builder.builds == 3
+        assert template.items == [first, small]
+
+        # a new peak
+        builder.get(mempool, std_hash(b"other peak"), MAX_COST, MAX_FEES)
+        assert builder.builds == 4
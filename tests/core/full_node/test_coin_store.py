@@ -186,6 +186,40 @@ class TestCoinStoreWithBlocks:
                         assert record.spent
                         assert record.spent_block_index == block.height
 
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("cache_size", [0, 10, 100000])
+    @pytest.mark.parametrize("db_version", [1, 2])
+    async def test_new_blocks_batch(self, cache_size: uint32, db_version: int):
+        blocks = bt.get_consecutive_blocks(9, [], guarantee_transaction_block=True)
+
+        async with DBConnection(db_version) as db_wrapper:
+            coin_store = await CoinStore.create(db_wrapper, cache_size=cache_size)
+
+            batch = []
+            prev_rewards: List[bytes32] = []
+            for block in blocks:
+                assert block.foliage_transaction_block is not None
+                rewards = block.get_included_reward_coins()
+                # every block spends the rewards of the previous block in the batch
+                batch.append((block.height, block.foliage_transaction_block.timestamp, rewards, [], prev_rewards))
+                prev_rewards = [coin.name() for coin in rewards]
+
+            added = await coin_store.new_blocks(batch)
+            assert len(added) == len(blocks)
+
+            for block, records in zip(blocks, added):
+                assert set(r.coin for r in records) == block.get_included_reward_coins()
+                for coin in block.get_included_reward_coins():
+                    record = await coin_store.get_coin_record(coin.name())
+                    assert record is not None
+                    assert record.confirmed_block_index == block.height
+                    assert record.coinbase
+                    if block is blocks[-1]:
+                        assert not record.spent
+                    else:
+                        assert record.spent
+                        assert record.spent_block_index == block.height + 1
+
     @pytest.mark.asyncio
     @pytest.mark.parametrize("cache_size", [0, 10, 100000])
     async def test_rollback(self, cache_size: uint32):
@@ -300,8 +334,9 @@ class TestCoinStoreWithBlocks:
 
     @pytest.mark.asyncio
     @pytest.mark.parametrize("cache_size", [0, 10, 100000])
-    async def test_get_puzzle_hash(self, cache_size: uint32):
-        async with DBConnection() as db_wrapper:
+    @pytest.mark.parametrize("db_version", [1, 2])
+    async def test_get_puzzle_hash(self, cache_size: uint32, db_version: int):
+        async with DBConnection(db_version) as db_wrapper:
             num_blocks = 20
             farmer_ph = 32 * b"0"
             pool_ph = 32 * b"1"
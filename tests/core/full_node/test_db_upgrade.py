@@ -0,0 +1,144 @@
+import asyncio
+import secrets
+import tempfile
+from pathlib import Path
+from typing import List
+
+import aiosqlite
+import pytest
+
+from hddcoin.cmds.db_upgrade_func import convert_v1_to_v2
+from hddcoin.full_node.block_compression import BlockCompressor
+from hddcoin.full_node.block_store import BlockStore
+from hddcoin.full_node.coin_store import CoinStore
+from hddcoin.full_node.hint_store import HintStore
+from hddcoin.types.blockchain_format.coin import Coin
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.util.db_version import lookup_db_version
+from hddcoin.util.db_wrapper import DBWrapper
+from hddcoin.util.ints import uint32, uint64
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+def rand_coin() -> Coin:
+    return Coin(bytes32(secrets.token_bytes(32)), bytes32(secrets.token_bytes(32)), uint64(1337))
+
+
+async def schema(db: aiosqlite.Connection) -> List[str]:
+    cursor = await db.execute("SELECT type, name, tbl_name FROM sqlite_master ORDER BY name")
+    rows = await cursor.fetchall()
+    await cursor.close()
+    return [" ".join(row) for row in rows if not row[1].startswith("sqlite_")]
+
+
+async def create_stores(db_wrapper: DBWrapper):
+    return (
+        await BlockStore.create(db_wrapper),
+        await CoinStore.create(db_wrapper),
+        await HintStore.create(db_wrapper),
+    )
+
+
+class TestDbUpgrade:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("dictionary", [False, True])
+    async def test_blobs(self, dictionary: bool):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_path = Path(tmp_dir) / "blockchain_v1_test.sqlite"
+            out_path = Path(tmp_dir) / "blockchain_v2_test.sqlite"
+
+            coins: List[Coin] = []
+            spent: List[bytes32] = []
+            hints = []
+            async with aiosqlite.connect(in_path) as connection:
+                db_wrapper = DBWrapper(connection)
+                block_store, coin_store, hint_store = await create_stores(db_wrapper)
+
+                prev_hash = bytes32(b"\0" * 32)
+                for height in range(1, 20):
+                    header_hash = bytes32(secrets.token_bytes(32))
+                    await connection.execute(
+                        "INSERT INTO block_records VALUES(?, ?, ?, ?, ?, ?, ?)",
+                        (header_hash.hex(), prev_hash.hex(), height, b"record", None, height == 19, True),
+                    )
+                    await connection.execute(
+                        "INSERT INTO full_blocks VALUES(?, ?, ?, ?, ?)",
+                        (header_hash.hex(), height, True, False, b"block" * height),
+                    )
+                    prev_hash = header_hash
+
+                    additions = [rand_coin() for _ in range(10)]
+                    await coin_store.new_block(
+                        uint32(height), uint64(height * 19), {rand_coin(), rand_coin()}, additions, spent[-3:]
+                    )
+                    coins += additions
+                    spent = [c.name() for c in additions]
+                    hints.append((additions[0].name(), secrets.token_bytes(32)))
+                await hint_store.add_hints(hints)
+                await connection.commit()
+
+            convert_v1_to_v2(in_path, out_path, dictionary)
+
+            async with aiosqlite.connect(in_path) as connection_1, aiosqlite.connect(out_path) as connection_2:
+                assert await lookup_db_version(connection_1) == 1
+                assert await lookup_db_version(connection_2) == 2
+
+                db_wrapper_1 = DBWrapper(connection_1, db_version=1)
+                db_wrapper_2 = DBWrapper(connection_2, db_version=2)
+                block_store_1, coin_store_1, hint_store_1 = await create_stores(db_wrapper_1)
+                block_store_2, coin_store_2, hint_store_2 = await create_stores(db_wrapper_2)
+
+                peak = await block_store_1.get_peak()
+                assert peak is not None
+                assert await block_store_2.get_peak() == peak
+                assert await block_store_2.get_full_block_bytes(peak[0]) == b"block" * 19
+                cursor = await connection_2.execute("SELECT compression, dictionary FROM full_blocks WHERE height=19")
+                assert await cursor.fetchone() == (BlockCompressor().compression, 1 if dictionary else None)
+                await cursor.close()
+                assert await block_store_2.get_prev_hash_and_ses(0, 100) == await block_store_1.get_prev_hash_and_ses(
+                    0, 100
+                )
+
+                for coin in coins:
+                    record = await coin_store_2.get_coin_record(coin.name())
+                    assert record is not None
+                    assert record == await coin_store_1.get_coin_record(coin.name())
+                ph = [coin.puzzle_hash for coin in coins]
+                assert set(await coin_store_2.get_coin_records_by_puzzle_hashes(True, ph)) == set(
+                    await coin_store_1.get_coin_records_by_puzzle_hashes(True, ph)
+                )
+                for height in range(1, 20):
+                    assert await coin_store_2.get_coins_removed_at_height(
+                        uint32(height)
+                    ) == await coin_store_1.get_coins_removed_at_height(uint32(height))
+
+                for coin_id, hint in hints:
+                    assert await hint_store_2.get_coin_ids(hint) == [coin_id]
+
+                # the converted database has the same tables and indices as a new v2 database
+                async with aiosqlite.connect(":memory:") as connection_3:
+                    await create_stores(DBWrapper(connection_3, db_version=2))
+                    expected = await schema(connection_3)
+                expected.append("table database_version database_version")
+                assert sorted(await schema(connection_2)) == sorted(expected)
+
+    def test_already_v2(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_path = Path(tmp_dir) / "in.sqlite"
+            out_path = Path(tmp_dir) / "out.sqlite"
+
+            async def make_v2():
+                async with aiosqlite.connect(in_path) as connection:
+                    await connection.execute("CREATE TABLE database_version(version int)")
+                    await connection.execute("INSERT INTO database_version VALUES(2)")
+                    await connection.commit()
+
+            asyncio.get_event_loop().run_until_complete(make_v2())
+            with pytest.raises(RuntimeError):
+                convert_v1_to_v2(in_path, out_path)
+            assert not out_path.exists()
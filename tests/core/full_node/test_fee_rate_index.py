@@ -0,0 +1,96 @@
+import random
+from typing import Dict, List, Tuple
+
+import pytest
+from blspy import G2Element
+
+from hddcoin.consensus.cost_calculator import NPCResult
+from hddcoin.full_node.fee_rate_index import FeeRateIndex
+from hddcoin.full_node.mempool import Mempool
+from hddcoin.types.blockchain_format.coin import Coin
+from hddcoin.types.blockchain_format.program import SerializedProgram
+from hddcoin.types.mempool_item import MempoolItem
+from hddcoin.types.spend_bundle import SpendBundle
+from hddcoin.util.hash import std_hash
+from hddcoin.util.ints import uint64
+
+
+def make_item(index: int, fee: int, cost: int) -> MempoolItem:
+    name = std_hash(index.to_bytes(4, "big"))
+    removal = Coin(name, std_hash(b"puzzle"), uint64(index + 1))
+    return MempoolItem(
+        SpendBundle([], G2Element()),
+        uint64(fee),
+        NPCResult(None, [], uint64(cost)),
+        uint64(cost),
+        name,
+        [],
+        [removal],
+        SerializedProgram.from_bytes(b"\x80"),
+    )
+
+
+def check_index(index: FeeRateIndex[int], expected: List[Tuple[Tuple[float, int], int]]) -> None:
+    assert list(index.items()) == expected
+    assert len(index) == len(expected)
+    assert index.total_cost() == sum(cost for _, cost in expected)
+    assert list(index.items_descending()) == sorted(expected, key=lambda e: (-e[0][0], e[0][1]))
+    assert index.first() == (expected[0] if len(expected) > 0 else None)
+    cumulative = 0
+    for key, cost in expected:
+        # the cumulative cost reaches any amount in (previous sum, sum] at this key
+        assert index.find_cumulative_cost(cumulative + 1) == (key, cost)
+        cumulative += cost
+        assert index.find_cumulative_cost(cumulative) == (key, cost)
+    assert index.find_cumulative_cost(cumulative + 1) is None
+
+
+class TestFeeRateIndex:
+    def test_against_sorted_list(self):
+        rand = random.Random(1)
+        index: FeeRateIndex[int] = FeeRateIndex()
+        expected: Dict[Tuple[float, int], int] = {}
+        for i in range(3000):
+            if len(expected) > 0 and rand.random() < 0.4:
+                key = rand.choice(list(expected.keys()))
+                assert index.remove(key) == expected.pop(key)
+            else:
+                # few distinct fee rates, so there are many ties
+                key = (float(rand.randrange(20)), i)
+                expected[key] = rand.randrange(1, 100)
+                index.insert(key, expected[key], expected[key])
+            if i % 100 == 0:
+                check_index(index, sorted(expected.items()))
+        check_index(index, sorted(expected.items()))
+        with pytest.raises(KeyError):
+            index.remove((1000.0, 0))
+
+    def test_mempool(self):
+        mempool = Mempool(1000)
+        assert mempool.get_min_fee_rate(1000) == 0
+        with pytest.raises(ValueError):
+            mempool.get_min_fee_rate(1001)
+        # fee rates 1, 2, 2, 3
+        items = [make_item(0, 200, 200), make_item(1, 600, 300), make_item(2, 400, 200), make_item(3, 900, 300)]
+        for item in items:
+            mempool.add_to_pool(item)
+        assert mempool.total_mempool_cost == 1000
+        assert mempool.get_min_fee_rate(200) == 1
+        assert mempool.get_min_fee_rate(300) == 2
+        assert mempool.get_min_fee_rate(700) == 2
+        assert mempool.get_min_fee_rate(701) == 3
+        assert [item.name for item in mempool.items_by_fee_rate()] == [items[i].name for i in [3, 1, 2]] + [
+            items[0].name
+        ]
+
+        # evicts the lowest fee rates first, the oldest first for the same fee rate
+        mempool.add_to_pool(make_item(4, 1000, 400))
+        assert items[0].name not in mempool.spends
+        assert items[1].name not in mempool.spends
+        assert items[2].name in mempool.spends
+        assert items[0].removals[0].name() not in mempool.removals
+        assert mempool.total_mempool_cost == 900
+        mempool.remove_from_pool(items[2])
+        assert [item.name for item in mempool.items_by_fee_rate()] == [items[3].name, make_item(4, 0, 1).name]
+        assert mempool.get_min_fee_rate(101) == 0
+        assert mempool.get_min_fee_rate(400) == 2.5
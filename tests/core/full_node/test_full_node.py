@@ -1165,6 +1165,12 @@ class TestFullNodeProtocol:
         assert fetched_blocks[-1].transactions_generator is not None
         assert std_hash(fetched_blocks[-1]) == std_hash(blocks_t[-1])
 
+        # Ask again, the response is served from the cache
+        cache_key = (uint32(peak_height - 5), blocks_t[-1].header_hash, True)
+        assert full_node_1.served_blocks_cache.get(cache_key) == res.data
+        res_2 = await full_node_1.request_blocks(fnp.RequestBlocks(uint32(peak_height - 5), uint32(peak_height), True))
+        assert res_2.data == res.data
+
     @pytest.mark.asyncio
     async def test_new_unfinished_block(self, wallet_nodes):
         full_node_1, full_node_2, server_1, server_2, wallet_a, wallet_receiver = wallet_nodes
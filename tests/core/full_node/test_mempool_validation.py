@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from blspy import AugSchemeMPL, G2Element
+
+from hddcoin.consensus.cost_calculator import NPCResult
+from hddcoin.consensus.default_constants import DEFAULT_CONSTANTS
+from hddcoin.full_node.mempool_validation import MempoolValidationPool
+from hddcoin.types.blockchain_format.coin import Coin
+from hddcoin.types.blockchain_format.program import Program, SerializedProgram
+from hddcoin.types.coin_spend import CoinSpend
+from hddcoin.types.condition_opcodes import ConditionOpcode
+from hddcoin.types.spend_bundle import SpendBundle
+from hddcoin.util.errors import Err
+from hddcoin.util.hash import std_hash
+from hddcoin.util.ints import uint64
+
+# the puzzle returns its solution as the conditions
+PUZZLE = SerializedProgram.from_bytes(b"\x01")
+PARAMS = (
+    DEFAULT_CONSTANTS.MAX_BLOCK_COST_CLVM // 2,
+    DEFAULT_CONSTANTS.COST_PER_BYTE,
+    DEFAULT_CONSTANTS.AGG_SIG_ME_ADDITIONAL_DATA,
+)
+
+
+def make_spend_bundle(index: int, signed: bool = True) -> bytes:
+    coin = Coin(std_hash(index.to_bytes(4, "big")), PUZZLE.get_tree_hash(), uint64(index + 1))
+    sk = AugSchemeMPL.key_gen(std_hash(b"key" + index.to_bytes(4, "big")))
+    message = b"message"
+    solution = Program.to([[ConditionOpcode.AGG_SIG_UNSAFE, bytes(sk.get_g1()), message]])
+    signature = AugSchemeMPL.sign(sk, message) if signed else G2Element()
+    return bytes(SpendBundle([CoinSpend(coin, PUZZLE, SerializedProgram.from_bytes(bytes(solution)))], signature))
+
+
+@pytest.fixture(scope="function")
+def validation_pool():
+    pool = MempoolValidationPool(1, 4)
+    yield pool
+    pool.shutdown()
+
+
+class TestMempoolValidationPool:
+    @pytest.mark.asyncio
+    async def test_batches(self, validation_pool):
+        bundles = [make_spend_bundle(i, signed=i % 3 != 0) for i in range(10)]
+        results = await asyncio.gather(*[validation_pool.validate(bundle, *PARAMS) for bundle in bundles])
+        for i, (err, npc_result_bytes, new_cache_entries) in enumerate(results):
+            if i % 3 == 0:
+                assert err == Err.BAD_AGGREGATE_SIGNATURE
+            else:
+                assert err is None
+                assert NPCResult.from_bytes(npc_result_bytes).error is None
+                assert len(new_cache_entries) == 1
+
+        metrics = validation_pool.to_json_dict()
+        assert metrics["validated"] == 10
+        assert metrics["failed"] == 4
+        # the first one is sent right away, the others wait for the worker in batches of up to 4
+        assert metrics["batches"] == 4
+        assert metrics["queued"] == 0 and metrics["in_flight"] == 0
+        assert metrics["queue_latency"]["count"] == 10
+        assert metrics["validation_latency"]["count"] == 10
+        assert metrics["round_trip_latency"]["count"] == 4
+
+    @pytest.mark.asyncio
+    async def test_worker_keeps_cache(self, validation_pool):
+        bundle = make_spend_bundle(1)
+        err, _, new_cache_entries = await validation_pool.validate(bundle, *PARAMS)
+        assert err is None and len(new_cache_entries) == 1
+        # the pairing is already cached in the worker
+        err, _, new_cache_entries = await validation_pool.validate(bundle, *PARAMS)
+        assert err is None and new_cache_entries == {}
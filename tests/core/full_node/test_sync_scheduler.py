@@ -0,0 +1,100 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+
+from hddcoin.full_node import sync_scheduler
+from hddcoin.full_node.sync_scheduler import INITIAL_BATCH_SIZE, PeerSyncStats, SyncScheduler
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.util.hash import std_hash
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+@dataclass
+class FakePeer:
+    peer_node_id: bytes32
+
+
+class TestSyncScheduler:
+    def test_peer_stats(self):
+        stats = PeerSyncStats()
+        assert stats.batch_size(32) == INITIAL_BATCH_SIZE
+        assert stats.batch_size(4) == 4
+
+        # 10 blocks per second, a request should take about TARGET_REQUEST_TIME
+        stats.add_request(10, 1.0)
+        assert stats.batch_size(32) == int(10 * sync_scheduler.TARGET_REQUEST_TIME)
+        stats.add_request(1000, 1.0)
+        assert stats.batch_size(32) == 32
+        blocks_per_second = stats.blocks_per_second
+        stats.add_failure()
+        assert stats.failures == 1
+        assert stats.requests == 2
+        assert stats.blocks_per_second == blocks_per_second / 2
+
+    @pytest.mark.asyncio
+    async def test_batches_in_order(self):
+        peers = [FakePeer(std_hash(bytes([i]))) for i in range(2)]
+        scheduler = SyncScheduler(10, 40, 32, 3)
+        slow = scheduler.stats(peers[1].peer_node_id)
+        slow.add_request(1, 1.0)
+
+        first = await scheduler.take(peers[0].peer_node_id)
+        second = await scheduler.take(peers[1].peer_node_id)
+        third = await scheduler.take(peers[0].peer_node_id)
+        assert first == (10, 10 + INITIAL_BATCH_SIZE - 1)
+        # the batch of a slow peer is smaller
+        assert second == (first[1] + 1, first[1] + slow.batch_size(32))
+        assert third[0] == second[1] + 1
+        # no more than 3 batches in flight
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.take(peers[0].peer_node_id), 0.1)
+
+        # the batches are validated in height order, no matter in which order they were fetched
+        scheduler.fetched(third[0], peers[0], [third[0]])
+        scheduler.fetched(first[0], peers[0], [first[0]])
+        assert await scheduler.next_batch() == (peers[0], [first[0]])
+        # validating the first batch made room for another one
+        fourth = await scheduler.take(peers[0].peer_node_id)
+        assert fourth[0] == third[1] + 1
+
+        # a failed batch is fetched again by the next peer
+        scheduler.failed(second[0], peers[1].peer_node_id)
+        assert await scheduler.take(peers[0].peer_node_id) == second
+        scheduler.fetched(second[0], peers[0], [second[0]])
+        assert await scheduler.next_batch() == (peers[0], [second[0]])
+        assert await scheduler.next_batch() == (peers[0], [third[0]])
+
+        metrics = scheduler.to_json_dict()
+        assert metrics["blocks_validated"] == 3
+        assert metrics["next_height"] == fourth[0]
+        assert metrics["in_flight"] == 1
+        assert metrics["queue_depth"] == 0
+        assert metrics["peers"][peers[1].peer_node_id.hex()]["requests"] == 1
+
+        scheduler.fail()
+        assert await scheduler.next_batch() is None
+        assert await scheduler.take(peers[0].peer_node_id) is None
+
+    @pytest.mark.asyncio
+    async def test_steal_batch(self, monkeypatch):
+        monkeypatch.setattr(sync_scheduler, "STEAL_AFTER", 0.05)
+        peers = [FakePeer(std_hash(bytes([i]))) for i in range(2)]
+        scheduler = SyncScheduler(0, 7, 32, 1)
+
+        assert await scheduler.take(peers[0].peer_node_id) == (0, 7)
+        # the only batch is taking too long, so the other peer fetches it too
+        assert await asyncio.wait_for(scheduler.take(peers[1].peer_node_id), 1) == (0, 7)
+        next_batch = asyncio.create_task(scheduler.next_batch())
+        await asyncio.sleep(0.01)
+        scheduler.fetched(0, peers[1], [1])
+        scheduler.fetched(0, peers[0], [0])
+        assert await next_batch == (peers[1], [1])
+        assert scheduler.to_json_dict()["stalls"] == 1
+        assert scheduler.done()
+        assert await scheduler.next_batch() is None
@@ -0,0 +1,100 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+
+from hddcoin.protocols.protocol_message_types import ProtocolMessageTypes
+from hddcoin.server.api_scheduler import ApiScheduler
+from hddcoin.server.outbound_message import make_msg
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+@dataclass
+class FakeConnection:
+    peer_node_id: bytes32
+
+
+peer_1 = FakeConnection(bytes32(b"\1" * 32))
+peer_2 = FakeConnection(bytes32(b"\2" * 32))
+
+
+class TestApiScheduler:
+    @pytest.mark.asyncio
+    async def test_max_concurrent_calls(self):
+        scheduler = ApiScheduler(1)
+        for _ in range(2):
+            await scheduler.put((make_msg(ProtocolMessageTypes.new_transaction, b""), peer_1))
+        first, _ = await scheduler.get()
+        second = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0.1)
+        assert not second.done()
+        scheduler.task_done(first)
+        await asyncio.wait_for(second, 1)
+        assert scheduler.get_metrics()["running"] == 1 and scheduler.qsize() == 0
+
+    @pytest.mark.asyncio
+    async def test_high_priority_not_capped(self):
+        scheduler = ApiScheduler(2)
+        for _ in range(3):
+            await scheduler.put((make_msg(ProtocolMessageTypes.respond_transaction, b""), peer_1))
+        # the slow calls use up the limit
+        blocked = [await scheduler.get() for _ in range(2)]
+
+        await scheduler.put((make_msg(ProtocolMessageTypes.new_peak, b""), peer_2))
+        message, connection = await asyncio.wait_for(scheduler.get(), 1)
+        assert message.type == ProtocolMessageTypes.new_peak.value and connection == peer_2
+        metrics = scheduler.get_metrics()
+        assert metrics["running"] == 3 and metrics["priorities"]["high"]["running"] == 1
+
+        # the high priority calls don't hold back the others
+        waiting = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        scheduler.task_done(message)
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        scheduler.task_done(blocked[0][0])
+        message, _ = await asyncio.wait_for(waiting, 1)
+        assert message.type == ProtocolMessageTypes.respond_transaction.value
+
+    @pytest.mark.asyncio
+    async def test_weighted_fair_queuing(self):
+        scheduler = ApiScheduler(1000)
+        for _ in range(40):
+            await scheduler.put((make_msg(ProtocolMessageTypes.respond_transaction, b""), peer_1))
+        for _ in range(40):
+            await scheduler.put((make_msg(ProtocolMessageTypes.new_signage_point_or_end_of_sub_slot, b""), peer_1))
+
+        types = [(await scheduler.get())[0].type for _ in range(34)]
+        # the signage points get 16 calls for each transaction, the transactions still get theirs
+        assert types.count(ProtocolMessageTypes.respond_transaction.value) == 2
+        metrics = scheduler.get_metrics()["priorities"]
+        assert metrics["high"]["started"] == 32 and metrics["high"]["queued"] == 8
+        assert metrics["low"]["started"] == 2 and metrics["low"]["queued"] == 38
+
+    @pytest.mark.asyncio
+    async def test_peers_take_turns(self):
+        scheduler = ApiScheduler(1000)
+        for i in range(3):
+            await scheduler.put((make_msg(ProtocolMessageTypes.request_block, bytes([i])), peer_1))
+        await scheduler.put((make_msg(ProtocolMessageTypes.request_block, b""), peer_2))
+
+        order = [(await scheduler.get())[1] for _ in range(4)]
+        assert order == [peer_1, peer_2, peer_1, peer_1]
+
+    @pytest.mark.asyncio
+    async def test_remove_peer(self):
+        scheduler = ApiScheduler(1000)
+        await scheduler.put((make_msg(ProtocolMessageTypes.new_peak, b""), peer_1))
+        await scheduler.put((make_msg(ProtocolMessageTypes.new_transaction, b""), peer_1))
+        await scheduler.put((make_msg(ProtocolMessageTypes.new_transaction, b""), peer_2))
+        scheduler.remove_peer(peer_1.peer_node_id)
+        assert scheduler.qsize() == 1
+        message, connection = await scheduler.get()
+        assert connection == peer_2 and message.type == ProtocolMessageTypes.new_transaction.value
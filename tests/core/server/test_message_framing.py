@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from typing import List
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from hddcoin.protocols.protocol_message_types import ProtocolMessageTypes
+from hddcoin.server.outbound_message import Message, NodeType, decode_message, encode_message, make_msg
+from hddcoin.server.ws_connection import WSHDDcoinConnection
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.types.peer_info import PeerInfo
+from hddcoin.util.ints import uint8, uint16
+
+MAX_MESSAGE_SIZE = 50 * 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+@pytest.fixture(scope="function")
+async def connection():
+    """
+    A connection over a websocket of an aiohttp client to an aiohttp server, the server puts what it receives in
+    connection.received
+    """
+    received: asyncio.Queue = asyncio.Queue()
+
+    async def receive(request):
+        ws = web.WebSocketResponse(max_msg_size=MAX_MESSAGE_SIZE)
+        await ws.prepare(request)
+        async for message in ws:
+            received.put_nowait(message.data)
+        return ws
+
+    app = web.Application()
+    app.add_routes([web.get("/ws", receive)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    session = aiohttp.ClientSession()
+    ws = await session.ws_connect(f"http://127.0.0.1:{port}/ws", max_msg_size=MAX_MESSAGE_SIZE)
+    connection = WSHDDcoinConnection(
+        NodeType.FULL_NODE,
+        ws,
+        port,
+        logging.getLogger(__name__),
+        True,
+        False,
+        "127.0.0.1",
+        asyncio.Queue(),
+        lambda *args: None,
+        bytes32(bytes(32)),
+        100,
+        100,
+        session=session,
+    )
+    connection.received = received
+    yield connection
+
+    connection.closed = True
+    if connection.outbound_task is not None:
+        connection.outbound_task.cancel()
+    await ws.close()
+    await session.close()
+    await runner.cleanup()
+
+
+async def receive_messages(connection: WSHDDcoinConnection, count: int) -> List[bytes]:
+    return [await asyncio.wait_for(connection.received.get(), 5) for _ in range(count)]
+
+
+class TestMessageFraming:
+    def test_encode_decode(self):
+        messages = [
+            make_msg(ProtocolMessageTypes.new_peak, bytes([1] * 40)),
+            Message(uint8(ProtocolMessageTypes.request_block.value), uint16(2 ** 15 + 3), bytes([2] * 10)),
+            Message(uint8(ProtocolMessageTypes.request_peers.value), uint16(0), b""),
+        ]
+        for message in messages:
+            assert encode_message(message) == bytes(message)
+            assert decode_message(bytes(message)) == Message.from_bytes(bytes(message))
+
+        encoded = bytes(messages[1])
+        with pytest.raises(ValueError):
+            decode_message(encoded[:-1])
+        with pytest.raises(ValueError):
+            decode_message(encoded + b"\0")
+        with pytest.raises(ValueError):
+            decode_message(encoded[:1] + b"\2" + encoded[2:])
+        with pytest.raises(ValueError):
+            decode_message(b"\1\0")
+
+    @pytest.mark.asyncio
+    async def test_outbound_coalescing(self, connection):
+        messages = [make_msg(ProtocolMessageTypes.new_peak, bytes([i] * 40)) for i in range(5)]
+        await connection.send_messages(messages)
+        assert connection.get_outbound_metrics()["outgoing_queue_size"] == 5
+
+        # all the queued messages are sent together
+        connection.outbound_task = asyncio.create_task(connection.outbound_handler())
+        assert await receive_messages(connection, 5) == [bytes(message) for message in messages]
+        metrics = connection.get_outbound_metrics()
+        assert metrics["outgoing_queue_size"] == 0
+        assert metrics["max_outgoing_queue_size"] == 5
+        assert metrics["messages_written"] == 5
+        assert metrics["batches_written"] == 1
+        assert connection.get_peer_info() == PeerInfo("127.0.0.1", connection.peer_port)
+
+        # a single message is sent on its own
+        await connection.send_message(messages[0])
+        assert await receive_messages(connection, 1) == [bytes(messages[0])]
+        assert connection.bytes_written == 6 * len(bytes(messages[0]))
+        assert connection.get_outbound_metrics()["batches_written"] == 2
+
+    @pytest.mark.asyncio
+    async def test_large_messages(self, connection):
+        # the client masks and compresses the frames, large ones included
+        messages = [make_msg(ProtocolMessageTypes.respond_block, bytes([i % 7] * (100 * i))) for i in range(1, 5)]
+        messages.append(make_msg(ProtocolMessageTypes.respond_blocks, bytes(range(256)) * 20000))
+        messages.append(make_msg(ProtocolMessageTypes.new_peak, bytes([3] * 40)))
+        await connection.send_messages(messages)
+        connection.outbound_task = asyncio.create_task(connection.outbound_handler())
+        received = await receive_messages(connection, len(messages))
+        assert sorted(received) == sorted(bytes(message) for message in messages)
+
+    @pytest.mark.asyncio
+    async def test_priorities(self, connection):
+        transactions = [make_msg(ProtocolMessageTypes.new_transaction, bytes([i] * 40)) for i in range(3)]
+        blocks = [make_msg(ProtocolMessageTypes.respond_block, bytes([i] * 40)) for i in range(2)]
+        peak = make_msg(ProtocolMessageTypes.new_peak, bytes([9] * 40))
+        for message in transactions + blocks:
+            await connection.send_message(message)
+        # a broadcast message is queued serialized already
+        await connection.send_message(peak, encode_message(peak))
+        priorities = connection.get_outbound_metrics()["priorities"]
+        assert [priorities[name]["outgoing_queue_size"] for name in ["high", "normal", "low"]] == [1, 2, 3]
+
+        # the peak jumps ahead, the messages of the same priority stay in order
+        connection.outbound_task = asyncio.create_task(connection.outbound_handler())
+        received = await receive_messages(connection, 6)
+        assert received == [bytes(message) for message in [peak] + blocks + transactions]
+        priorities = connection.get_outbound_metrics()["priorities"]
+        assert all(priority["outgoing_queue_size"] == 0 for priority in priorities.values())
@@ -4,7 +4,7 @@ import pytest
 
 from hddcoin.protocols.protocol_message_types import ProtocolMessageTypes
 from hddcoin.server.outbound_message import make_msg
-from hddcoin.server.rate_limits import RateLimiter, NON_TX_FREQ
+from hddcoin.server.rate_limits import INBOUND_STATS, NON_TX_FREQ, OUTBOUND_STATS, RateLimiter
 from tests.setup_nodes import test_constants
 
 
@@ -261,3 +261,42 @@ class TestRateLimits:
 
         new_signatures_message = make_msg(ProtocolMessageTypes.respond_signatures, bytes([1]))
         assert not r.process_msg_and_check(new_signatures_message)
+
+    @pytest.mark.asyncio
+    async def test_smooth_refill(self):
+        r = RateLimiter(True, 1)
+        new_peers_message = make_msg(ProtocolMessageTypes.respond_peers, bytes([1]))
+        for i in range(10):
+            assert r.process_msg_and_check(new_peers_message)
+        assert not r.process_msg_and_check(new_peers_message)
+
+        # The limit comes back gradually over the period, not all at once at its end
+        await asyncio.sleep(0.3)
+        passed = 0
+        for i in range(10):
+            if r.process_msg_and_check(new_peers_message):
+                passed += 1
+        assert 1 <= passed < 10
+
+    @pytest.mark.asyncio
+    async def test_message_type_stats(self):
+        peers_type = ProtocolMessageTypes.respond_peers.value
+        inbound_messages = INBOUND_STATS.messages[peers_type]
+        inbound_bytes = INBOUND_STATS.bytes[peers_type]
+        inbound_limited = INBOUND_STATS.rate_limited[peers_type]
+        outbound_messages = OUTBOUND_STATS.messages[peers_type]
+        outbound_limited = OUTBOUND_STATS.rate_limited[peers_type]
+
+        new_peers_message = make_msg(ProtocolMessageTypes.respond_peers, bytes([1] * 100))
+        for incoming in [True, False]:
+            r = RateLimiter(incoming)
+            for i in range(12):
+                r.process_msg_and_check(new_peers_message)
+
+        # Incoming messages are counted even when they are rate limited, outgoing ones aren't sent then
+        assert INBOUND_STATS.messages[peers_type] == inbound_messages + 12
+        assert INBOUND_STATS.bytes[peers_type] == inbound_bytes + 12 * 100
+        assert INBOUND_STATS.rate_limited[peers_type] == inbound_limited + 2
+        assert OUTBOUND_STATS.messages[peers_type] == outbound_messages + 10
+        assert OUTBOUND_STATS.rate_limited[peers_type] == outbound_limited + 2
+        assert INBOUND_STATS.to_json_dict()["respond_peers"]["messages"] == INBOUND_STATS.messages[peers_type]
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from hddcoin.harvester.disk_scheduler import (
+    LATENCY_BUCKETS,
+    DeadlineExpired,
+    DiskQueue,
+    DiskScheduler,
+    LatencyHistogram,
+)
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+class TestDiskScheduler:
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        histogram.add(0.01)
+        histogram.add(LATENCY_BUCKETS[1])
+        histogram.add(1000)
+        assert histogram.counts[0] == 1
+        assert histogram.counts[1] == 1
+        assert histogram.counts[-1] == 1
+        assert histogram.to_json_dict()["count"] == 3
+        assert histogram.max == 1000
+
+    @pytest.mark.asyncio
+    async def test_deadline_order(self):
+        queue = DiskQueue(0, "/", 1)
+        blocked = threading.Event()
+        order = []
+
+        def lookup(name: str):
+            if name == "first":
+                blocked.wait()
+            order.append(name)
+            return name
+
+        now = time.monotonic()
+        first = queue.submit(now + 100, lookup, "first")
+        # the only thread is busy, these are queued and run earliest deadline first
+        late = queue.submit(now + 20, lookup, "late")
+        early = queue.submit(now + 10, lookup, "early")
+        expired = queue.submit(now + 0.05, lookup, "expired")
+        await asyncio.sleep(0.1)
+        blocked.set()
+
+        assert await first == "first"
+        assert await early == "early"
+        assert await late == "late"
+        with pytest.raises(DeadlineExpired):
+            await expired
+        assert order == ["first", "early", "late"]
+        stats = queue.to_json_dict()
+        assert stats["expired"] == 1
+        assert stats["lookup_latency"]["count"] == 3
+        assert stats["queued"] == 0 and stats["running"] == 0
+        queue.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_scheduler(self, tmp_path: Path):
+        scheduler = DiskScheduler(2)
+        path = tmp_path / "plot.plot"
+
+        def fail():
+            raise ValueError("bad plot")
+
+        assert await scheduler.run(path, time.monotonic() + 10, lambda x: x + 1, 1) == 2
+        with pytest.raises(ValueError):
+            await scheduler.run(path, time.monotonic() + 10, fail)
+        stats = scheduler.to_json_dict()
+        assert len(stats) == 1
+        assert stats[0]["device"] == tmp_path.stat().st_dev
+        assert stats[0]["lookup_latency"]["count"] == 2
+        scheduler.shutdown()
@@ -10,7 +10,13 @@ from blspy import AugSchemeMPL
 from chiapos import DiskPlotter
 
 from hddcoin.consensus.coinbase import create_puzzlehash_for_pk
-from hddcoin.plotting.util import stream_plot_info_ph, stream_plot_info_pk, PlotRefreshResult, PlotRefreshEvents
+from hddcoin.plotting.util import (
+    plots_passing_filter,
+    stream_plot_info_ph,
+    stream_plot_info_pk,
+    PlotRefreshResult,
+    PlotRefreshEvents,
+)
 from hddcoin.plotting.manager import PlotManager
 from hddcoin.protocols import farmer_protocol
 from hddcoin.rpc.farmer_rpc_api import FarmerRpcApi
@@ -18,6 +24,7 @@ from hddcoin.rpc.farmer_rpc_client import FarmerRpcClient
 from hddcoin.rpc.harvester_rpc_api import HarvesterRpcApi
 from hddcoin.rpc.harvester_rpc_client import HarvesterRpcClient
 from hddcoin.rpc.rpc_server import start_rpc_server
+from hddcoin.types.blockchain_format.proof_of_space import ProofOfSpace
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.util.bech32m import decode_puzzle_hash, encode_puzzle_hash
 from tests.block_tools import get_plot_dir
@@ -253,6 +260,25 @@ class TestRpc:
                 assert len(harvester.plot_manager.cache) == expect_total_plots
                 assert len(harvester.plot_manager.get_duplicates()) == expect_duplicates
                 assert len(harvester.plot_manager.failed_to_open_filenames) == 0
+                plot_ids, plot_id_paths = harvester.plot_manager.get_plot_ids()
+                assert set(plot_id_paths) == set(harvester.plot_manager.plots.keys())
+                assert plot_ids == b"".join(
+                    harvester.plot_manager.plots[path].prover.get_id() for path in plot_id_paths
+                )
+                challenge_hash, sp_hash = std_hash(b"challenge"), std_hash(b"sp")
+                for zero_bits in range(1, 5):
+                    assert plots_passing_filter(
+                        plot_ids, 0, len(plot_id_paths), challenge_hash, sp_hash, zero_bits
+                    ) == [
+                        index
+                        for index in range(len(plot_id_paths))
+                        if ProofOfSpace.passes_plot_filter(
+                            test_constants.replace(NUMBER_ZERO_BITS_PLOT_FILTER=zero_bits),
+                            plot_ids[index * 32 : index * 32 + 32],
+                            challenge_hash,
+                            sp_hash,
+                        )
+                    ]
 
             # Add plot_dir with two new plots
             await test_case(
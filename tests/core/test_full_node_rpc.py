@@ -200,6 +200,8 @@ class TestRpc:
             assert NodeType(connections[0]["type"]) == NodeType.FULL_NODE.value
             assert len(await client.get_connections(NodeType.FULL_NODE)) == 1
             assert len(await client.get_connections(NodeType.FARMER)) == 0
+            stats = await client.get_message_type_stats()
+            assert stats["inbound"]["handshake"]["messages"] > 0 and stats["outbound"]["handshake"]["messages"] > 0
             await client.close_connection(connections[0]["node_id"])
             await time_out_assert(10, num_connections, 0)
         finally:
@@ -1,9 +1,15 @@
 import asyncio
 import itertools
+import random
 
 import pytest
 
-from hddcoin.util.merkle_set import MerkleSet, confirm_included_already_hashed
+from hddcoin.util.merkle_set import (
+    MerkleSet,
+    NodeMerkleSet,
+    confirm_included_already_hashed,
+    confirm_not_included_already_hashed,
+)
 from tests.setup_nodes import bt
 
 
@@ -44,3 +50,34 @@ class TestMerkleSet:
 
         # Test if the order of adding items changes the outcome
         assert merkle_set.get_root() == merkle_set_reverse.get_root()
+
+    def test_same_as_node_merkle_set(self):
+        rand = random.Random(1)
+
+        def rand_leaf(prefix: bytes) -> bytes:
+            return prefix + bytes(rand.getrandbits(8) for _ in range(32 - len(prefix)))
+
+        # leaves with long common prefixes make for chains of middle nodes with an empty child
+        prefixes = [b"", b"\x00", b"\xff\xff", b"\x80" * 30]
+        for num_leaves in [0, 1, 2, 3, 4, 5, 8, 17, 100]:
+            leaves = [rand_leaf(rand.choice(prefixes)) for _ in range(num_leaves)]
+            merkle_set = MerkleSet()
+            node_merkle_set = NodeMerkleSet()
+            for leaf in leaves:
+                merkle_set.add_already_hashed(leaf)
+                node_merkle_set.add_already_hashed(leaf)
+            assert merkle_set.get_root() == node_merkle_set.get_root()
+
+            for leaf in leaves[: num_leaves // 3]:
+                merkle_set.remove_already_hashed(leaf)
+                node_merkle_set.remove_already_hashed(leaf)
+            root = merkle_set.get_root()
+            assert root == node_merkle_set.get_root()
+
+            for leaf in leaves + [rand_leaf(prefix) for prefix in prefixes]:
+                included, proof = merkle_set.is_included_already_hashed(leaf)
+                assert (included, proof) == node_merkle_set.is_included_already_hashed(leaf)
+                if included:
+                    assert confirm_included_already_hashed(root, leaf, proof)
+                else:
+                    assert confirm_not_included_already_hashed(root, leaf, proof)
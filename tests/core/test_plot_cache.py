@@ -0,0 +1,123 @@
+from pathlib import Path
+
+from blspy import AugSchemeMPL
+
+from hddcoin.plotting import manager
+from hddcoin.plotting.manager import CURRENT_VERSION, RECORD_HEADER, Cache, CacheEntry, DiskCache
+from hddcoin.types.blockchain_format.sized_bytes import bytes32
+from hddcoin.util.hash import std_hash
+from hddcoin.util.ints import uint16
+
+
+def make_entry(seed: int, pooling: bool) -> CacheEntry:
+    sk = AugSchemeMPL.key_gen(std_hash(seed.to_bytes(4, "big")))
+    if pooling:
+        return CacheEntry(None, std_hash(seed.to_bytes(4, "big") + b"\x01"), sk.get_g1())
+    return CacheEntry(sk.get_g1(), None, sk.get_g1())
+
+
+def plot_id(seed: int) -> bytes32:
+    return std_hash(seed.to_bytes(4, "big"))
+
+
+class TestPlotCache:
+    def test_append_and_load(self, tmp_path: Path):
+        path = tmp_path / "cache" / "plot_manager.dat"
+        cache = Cache(path)
+        entries = {plot_id(i): make_entry(i, i % 2 == 0) for i in range(10)}
+        for key, entry in entries.items():
+            cache.update(key, entry)
+        cache.save()
+        assert not cache.changed()
+        size = path.stat().st_size
+
+        # a new plot costs one appended record
+        new_entry = make_entry(100, False)
+        cache.update(plot_id(100), new_entry)
+        cache.remove([plot_id(0)])
+        cache.save()
+        assert path.stat().st_size == size + 2 * RECORD_HEADER.size + len(bytes(new_entry))
+        entries[plot_id(100)] = new_entry
+        del entries[plot_id(0)]
+
+        loaded = Cache(path)
+        loaded.load()
+        assert len(loaded) == len(entries)
+        assert set(loaded.keys()) == set(entries.keys())
+        # entries are parsed when they're used
+        assert len(loaded._unparsed) == len(entries)
+        assert loaded.get(plot_id(1)) == entries[plot_id(1)]
+        assert len(loaded._unparsed) == len(entries) - 1
+        assert loaded.get(plot_id(0)) is None
+        assert dict(loaded.items()) == entries
+
+        # a partially written record is dropped
+        with open(path, "ab") as file:
+            file.write(RECORD_HEADER.pack(1, plot_id(200), 100))
+        loaded = Cache(path)
+        loaded.load()
+        loaded.update(plot_id(300), make_entry(300, True))
+        loaded.save()
+        # the file is mapped again after it's truncated and appended to
+        assert loaded._mmap is not None and len(loaded._mmap) == path.stat().st_size
+        assert dict(loaded.items()) == {**entries, plot_id(300): make_entry(300, True)}
+        entries[plot_id(300)] = make_entry(300, True)
+        reloaded = Cache(path)
+        reloaded.load()
+        assert dict(reloaded.items()) == entries
+
+    def test_compaction(self, tmp_path: Path, monkeypatch):
+        monkeypatch.setattr(manager, "COMPACT_MIN_OUTDATED", 5)
+        path = tmp_path / "plot_manager.dat"
+        cache = Cache(path)
+        entry = make_entry(1, False)
+        for i in range(4):
+            cache.update(plot_id(i), entry)
+        cache.save()
+        size = path.stat().st_size
+        for _ in range(2):
+            cache.update(plot_id(0), entry)
+            cache.update(plot_id(1), entry)
+            cache.save()
+        assert path.stat().st_size > size
+
+        loaded = Cache(path)
+        loaded.load()
+        # more than 5 outdated records, and more than current ones, so the log is rewritten
+        loaded.update(plot_id(0), entry)
+        loaded.remove([plot_id(3)])
+        loaded.save()
+        assert path.stat().st_size < size
+        assert loaded._records == 3
+        loaded.update(plot_id(4), entry)
+        loaded.save()
+        reloaded = Cache(path)
+        reloaded.load()
+        assert sorted(reloaded.keys()) == sorted([plot_id(0), plot_id(1), plot_id(2), plot_id(4)])
+        assert reloaded.get(plot_id(1)) == entry
+
+    def test_version_0(self, tmp_path: Path):
+        path = tmp_path / "plot_manager.dat"
+        entries = [(plot_id(i), make_entry(i, i % 2 == 0)) for i in range(3)]
+        path.write_bytes(bytes(DiskCache(uint16(0), entries)))
+        cache = Cache(path)
+        cache.load()
+        assert dict(cache.items()) == dict(entries)
+        assert cache.changed()
+        cache.save()
+        assert path.read_bytes()[:2] == bytes(CURRENT_VERSION)
+        loaded = Cache(path)
+        loaded.load()
+        assert dict(loaded.items()) == dict(entries)
+
+        # an unknown version is dropped, and the file is rewritten
+        with open(path, "r+b") as file:
+            file.write(b"\xff\xff")
+        invalid = Cache(path)
+        invalid.load()
+        assert len(invalid) == 0
+        invalid.update(plot_id(5), entries[0][1])
+        invalid.save()
+        loaded = Cache(path)
+        loaded.load()
+        assert loaded.keys() == [plot_id(5)]
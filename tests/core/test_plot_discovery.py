@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from hddcoin.plotting import discovery
+from hddcoin.plotting.discovery import PlotDiscovery
+
+
+def set_mtime(directory: Path, seconds_ago: float) -> None:
+    mtime = time.time() - seconds_ago
+    os.utime(directory, (mtime, mtime))
+
+
+class TestPlotDiscovery:
+    def test_rescan_changed_directories(self, tmp_path: Path):
+        directories = [tmp_path / "disk_1", tmp_path / "disk_2", tmp_path / "missing"]
+        for directory in directories[:2]:
+            directory.mkdir()
+            (directory / "plot-1.plot").touch()
+            (directory / "not-a-plot.txt").touch()
+            set_mtime(directory, 60)
+
+        index_path = tmp_path / "cache" / "plot_directories.dat"
+        plot_discovery = PlotDiscovery(index_path)
+        plots = plot_discovery.scan(directories)
+        assert plots == {
+            directories[0]: [directories[0] / "plot-1.plot"],
+            directories[1]: [directories[1] / "plot-1.plot"],
+            directories[2]: [],
+        }
+        assert plot_discovery.directories_listed == 3
+
+        # only the directory that changed is listed again, missing directories are always checked
+        (directories[1] / "plot-2.plot").touch()
+        set_mtime(directories[1], 30)
+        plots = plot_discovery.scan(directories)
+        assert sorted(plots[directories[1]]) == [directories[1] / "plot-1.plot", directories[1] / "plot-2.plot"]
+        assert plot_discovery.directories_listed == 5
+
+        # a directory that was just modified is listed again on the next scan, another file might be added in
+        # the same mtime tick
+        (directories[0] / "plot-2.plot").touch()
+        plot_discovery.scan(directories)
+        plot_discovery.scan(directories)
+        assert plot_discovery.directories_listed == 9
+
+        # the index survives restarts
+        set_mtime(directories[0], 10)
+        plot_discovery.scan(directories)
+        plot_discovery.save()
+        restarted = PlotDiscovery(index_path)
+        restarted.load()
+        assert restarted.scan(directories) == plot_discovery.scan(directories)
+        assert restarted.directories_listed == 1
+
+        # directories that were removed from the config are dropped from the index
+        restarted.scan(directories[:1])
+        assert restarted.scan(directories) == plot_discovery.scan(directories)
+        assert restarted.directories_listed == 3
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+    def test_inotify(self, tmp_path: Path, monkeypatch):
+        monkeypatch.setattr(discovery, "MTIME_GRACE_SECONDS", 0)
+        directory = tmp_path / "disk"
+        directory.mkdir()
+        plot_discovery = PlotDiscovery(tmp_path / "cache" / "plot_directories.dat")
+        plot_discovery.start_watching()
+        try:
+            assert plot_discovery.watching()
+            assert plot_discovery.scan([directory]) == {directory: []}
+            assert not plot_discovery.has_changes()
+
+            (directory / "not-a-plot.txt").write_bytes(b"data")
+            (directory / "plot-1.plot").write_bytes(b"data")
+            deadline = time.time() + 5
+            while not plot_discovery.has_changes() and time.time() < deadline:
+                time.sleep(0.01)
+            assert plot_discovery.has_changes()
+            # the directory is listed again, even if its mtime didn't change
+            set_mtime(directory, 60)
+            listed = plot_discovery.directories_listed
+            assert plot_discovery.scan([directory]) == {directory: [directory / "plot-1.plot"]}
+            assert plot_discovery.directories_listed == listed + 1
+            assert not plot_discovery.has_changes()
+        finally:
+            plot_discovery.stop_watching()
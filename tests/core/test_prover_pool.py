@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+from chiapos import DiskProver
+
+from hddcoin.plotting.prover_pool import LazyDiskProver, ProverPool, process_memory
+from hddcoin.plotting.util import get_filenames, parse_plot_filename
+from hddcoin.util.hash import std_hash
+from tests.setup_nodes import bt
+
+
+def lazy_provers(pool: ProverPool):
+    provers = []
+    for path in sorted(get_filenames(bt.plot_dir))[:3]:
+        parsed = parse_plot_filename(path)
+        assert parsed is not None
+        size, plot_id = parsed
+        provers.append(LazyDiskProver(str(path), plot_id, size, pool))
+    return provers
+
+
+class TestProverPool:
+    def test_lazy_prover(self):
+        pool = ProverPool(2)
+        provers = lazy_provers(pool)
+        assert len(pool) == 0
+        for lazy_prover in provers:
+            prover = DiskProver(lazy_prover.get_filename())
+            assert lazy_prover.get_id() == prover.get_id()
+            assert lazy_prover.get_size() == prover.get_size()
+            assert not lazy_prover.is_open()
+            challenge = std_hash(b"challenge")
+            assert lazy_prover.get_qualities_for_challenge(challenge) == prover.get_qualities_for_challenge(challenge)
+            assert lazy_prover.get_memo() == prover.get_memo()
+            assert lazy_prover.is_open()
+
+        # the least recently used prover was closed
+        assert len(pool) == 2
+        assert not provers[0].is_open()
+        assert pool.to_json_dict()["opened"] == 3
+        assert pool.to_json_dict()["evicted"] == 1
+        provers[1].get_qualities_for_challenge(std_hash(b"challenge"))
+        provers[0].get_qualities_for_challenge(std_hash(b"challenge"))
+        assert provers[1].is_open() and provers[0].is_open() and not provers[2].is_open()
+        pool.close(provers[1].get_filename())
+        assert len(pool) == 1
+        assert process_memory() > 0
+
+    def test_wrong_id(self):
+        pool = ProverPool(2)
+        provers = lazy_provers(pool)
+        wrong = LazyDiskProver(provers[0].get_filename(), provers[1].get_id(), provers[0].get_size(), pool)
+        with pytest.raises(ValueError):
+            wrong.get_memo()
+        assert len(pool) == 0
+
+    def test_parse_plot_filename(self):
+        plot_id = std_hash(b"plot")
+        assert parse_plot_filename(Path(f"/plots/plot-k32-2021-07-01-12-30-{plot_id.hex()}.plot")) == (32, plot_id)
+        assert parse_plot_filename(Path(f"plot-k25-{plot_id.hex()}.plot")) == (25, plot_id)
+        assert parse_plot_filename(Path("plot-k32-2021-07-01-12-30-abcd.plot")) is None
+        assert parse_plot_filename(Path(f"other-k32-{plot_id.hex()}.plot")) is None
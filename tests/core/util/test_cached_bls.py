@@ -1,7 +1,17 @@
 import unittest
-from blspy import AugSchemeMPL, G1Element
+from concurrent.futures.process import ProcessPoolExecutor
+from typing import List
+
+from blspy import AugSchemeMPL, G1Element, G2Element
 from hddcoin.util import cached_bls
+from hddcoin.util.hash import std_hash
 from hddcoin.util.lru_cache import LRUCache
+from hddcoin.util.shared_pairing_cache import SLOT_SIZE, SharedPairingCache
+
+
+def verify_in_worker(shared_cache_name: str, pks: List[bytes], msgs: List[bytes], sig: bytes) -> bool:
+    cached_bls.set_shared_cache(SharedPairingCache.attach(shared_cache_name))
+    return cached_bls.aggregate_verify(pks, msgs, G2Element.from_bytes(sig), True, LRUCache(10))
 
 
 class TestCachedBLS(unittest.TestCase):
@@ -38,3 +48,35 @@ class TestCachedBLS(unittest.TestCase):
         assert cached_bls.aggregate_verify(pks_half, msgs_half, agg_sig_half, False, local_cache)
         # Verify more messages (partial cache hit)
         assert cached_bls.aggregate_verify(pks, msgs, agg_sig, False, local_cache)
+
+    def test_shared_cache(self):
+        n_keys = 4
+        sks = [AugSchemeMPL.key_gen(b"b" * 31 + bytes([i])) for i in range(n_keys)]
+        pks = [bytes(sk.get_g1()) for sk in sks]
+        msgs = [("msg-%d" % (i,)).encode() for i in range(n_keys)]
+        agg_sig = AugSchemeMPL.aggregate([AugSchemeMPL.sign(sk, msg) for sk, msg in zip(sks, msgs)])
+        keys = [bytes(std_hash(pk + msg)) for pk, msg in zip(pks, msgs)]
+
+        shared_cache = SharedPairingCache.create(1000)
+        try:
+            # the pairings computed in another process are in the shared cache
+            with ProcessPoolExecutor(1) as pool:
+                assert pool.submit(verify_in_worker, shared_cache.name, pks, msgs, bytes(agg_sig)).result()
+            for key in keys:
+                assert shared_cache.get(key) is not None
+
+            cached_bls.set_shared_cache(shared_cache)
+            local_cache = LRUCache(10)
+            # all of them are found without the force_cache heuristic giving up
+            assert cached_bls.get_pairings(local_cache, pks, msgs, False) != []
+            assert len(local_cache.cache) == n_keys
+            assert cached_bls.aggregate_verify(pks, msgs, agg_sig, False, LRUCache(10))
+
+            # a slot which is being written is a miss
+            offset = shared_cache._offset(keys[0])
+            shared_cache.shm.buf[offset + SLOT_SIZE - 1] ^= 1
+            assert shared_cache.get(keys[0]) is None
+            assert shared_cache.get(bytes(32)) is None
+        finally:
+            cached_bls.set_shared_cache(None)
+            shared_cache.close()
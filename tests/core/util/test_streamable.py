@@ -1,8 +1,9 @@
 import unittest
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import List, Optional, Tuple
 import io
 
+from blspy import G1Element
 from clvm_tools import binutils
 from pytest import raises
 
@@ -12,7 +13,7 @@ from hddcoin.types.blockchain_format.program import Program
 from hddcoin.types.blockchain_format.sized_bytes import bytes32
 from hddcoin.types.full_block import FullBlock
 from hddcoin.types.weight_proof import SubEpochChallengeSegment
-from hddcoin.util.ints import uint8, uint32
+from hddcoin.util.ints import uint8, uint16, uint32, uint64
 from hddcoin.util.streamable import (
     Streamable,
     streamable,
@@ -26,6 +27,7 @@ from hddcoin.util.streamable import (
     parse_size_hints,
     parse_str,
 )
+from hddcoin.util.streamable_view import StreamableView
 from tests.setup_nodes import bt, test_constants
 
 
@@ -68,6 +70,106 @@ class TestStreamable(unittest.TestCase):
         except NotImplementedError:
             pass
 
+    def test_fixed_size_runs(self):
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassFixed(Streamable):
+            a: uint8
+            b: bool
+            c: bytes32
+            d: uint64
+            e: List[uint16]
+            f: Tuple[uint16, bool]
+            g: Optional[uint32]
+            h: G1Element
+            i: bool
+
+        a = TestClassFixed(
+            uint8(7),
+            True,
+            bytes32([3] * 32),
+            uint64(2 ** 40),
+            [uint16(1), uint16(2)],
+            (uint16(9), False),
+            uint32(5),
+            G1Element.generator(),
+            False,
+        )
+        expected = (
+            bytes([7, 1])
+            + bytes([3] * 32)
+            + (2 ** 40).to_bytes(8, "big")
+            + bytes([0, 0, 0, 2, 0, 1, 0, 2])
+            + bytes([0, 9, 0])
+            + bytes([1, 0, 0, 0, 5])
+            + bytes(G1Element.generator())
+            + bytes([0])
+        )
+        assert bytes(a) == expected
+        b = TestClassFixed.from_bytes(expected)
+        assert b == a
+        assert type(b.a) is uint8
+        assert type(b.c) is bytes32
+        assert type(b.e[0]) is uint16
+        assert b.b is True
+
+        # bools are validated, even when they're parsed as part of a run of fixed size fields
+        with raises(ValueError):
+            TestClassFixed.from_bytes(expected[:1] + bytes([2]) + expected[2:])
+        with raises(ValueError):
+            TestClassFixed.from_bytes(expected[:-1] + bytes([2]))
+
+        # EOF in the middle of a run
+        with raises(AssertionError):
+            TestClassFixed.from_bytes(expected[:20])
+        # EOF in a list
+        with raises(AssertionError):
+            TestClassFixed.from_bytes(expected[:45])
+
+    def test_view(self):
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassView(Streamable):
+            a: uint32
+            b: Optional[List[bytes]]
+            c: str
+            d: Tuple[uint8, bytes32]
+            e: Program
+            f: List[uint64]
+
+            def sum_f(self) -> int:
+                return sum(self.f)
+
+        a = TestClassView(
+            uint32(1),
+            [b"abc", b""],
+            "hello",
+            (uint8(2), bytes32([4] * 32)),
+            Program.to([1, 2]),
+            [uint64(3), uint64(4)],
+        )
+        view = StreamableView(TestClassView, bytes(a))
+        assert "c" not in view.__dict__
+        assert view.c == "hello"
+        assert "c" in view.__dict__
+        assert "e" not in view.__dict__
+        assert view.b == a.b
+        assert view.d == a.d
+        assert view.e == a.e
+        assert view.sum_f() == 7
+        assert view.get_hash() == a.get_hash()
+        assert bytes(view.fields_bytes("c", "d")) == bytes([0, 0, 0, 5]) + b"hello" + bytes([2] + [4] * 32)
+        assert view.to_object() == a
+
+        assert view.replace(b=None, f=[]) == bytes(replace(a, b=None, f=[]))
+        assert view.replace(c="a longer string") == bytes(replace(a, c="a longer string"))
+
+        # the view doesn't parse fields it doesn't need, but trailing bytes are found once it gets to the end
+        view = StreamableView(TestClassView, bytes(a) + b"\x00")
+        assert view.a == 1
+        with raises(AssertionError):
+            view.replace(a=uint32(2))
+
     def test_json(self):
         block = bt.create_genesis_block(test_constants, bytes([0] * 32), b"0")
 
@@ -229,3 +229,41 @@ class TestWalletSync:
 
         await time_out_assert(10, get_tx_count, 2, 1)
         await time_out_assert(10, wallet.get_confirmed_balance, funds)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("light_sync", [True, False])
+    async def test_light_sync_wallet(self, wallet_node_simulator, default_400_blocks, light_sync, monkeypatch):
+        full_nodes, wallets = wallet_node_simulator
+        full_node_api = full_nodes[0]
+        wallet_node, server_2 = wallets[0]
+        fn_server = full_node_api.full_node.server
+        # the coin states are only fetched from trusted peers
+        full_node_cert = fn_server.root_path / fn_server.config["ssl"]["public_crt"]
+        monkeypatch.setitem(wallet_node.config, "trusted_peers", {"full_node": str(full_node_cert)})
+        monkeypatch.setitem(wallet_node.config, "light_sync", light_sync)
+        wsm = wallet_node.wallet_state_manager
+        wallet = wsm.main_wallet
+        ph = await wallet.get_new_puzzlehash()
+
+        # Rewards for the wallet in blocks it batch syncs
+        num_blocks = 5
+        blocks = bt.get_consecutive_blocks(
+            num_blocks,
+            pool_reward_puzzle_hash=ph,
+            farmer_reward_puzzle_hash=ph,
+            block_list_input=default_400_blocks[:100],
+            guarantee_transaction_block=True,
+        )
+        blocks = bt.get_consecutive_blocks(40, block_list_input=blocks)
+        for block in blocks:
+            await full_node_api.full_node.respond_block(full_node_protocol.RespondBlock(block))
+
+        await server_2.start_client(PeerInfo(self_hostname, uint16(fn_server._port)), None)
+        await time_out_assert(100, wallet_height_at_least, True, wallet_node, len(blocks) - 1)
+
+        funds = sum(
+            [calculate_pool_reward(uint32(i)) + calculate_base_farmer_reward(uint32(i)) for i in range(100, 105)]
+        )
+        await time_out_assert(10, wallet.get_confirmed_balance, funds)
+        # the coin states were fetched with subscriptions
+        assert (len(full_node_api.full_node.peer_puzzle_hash) > 0) == light_sync